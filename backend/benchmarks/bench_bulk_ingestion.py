@@ -0,0 +1,100 @@
+"""
+Benchmark de ingesta de muchos PDFs: uno tras otro vs ingestas concurrentes.
+
+Genera PDFs sintéticos pequeños (el caso típico de una subida múltiple de manuales)
+y los ingiere con ingest_pdf contra un índice LocalVectorRepository temporal y el
+servidor de embeddings falso de bench_embedding_batcher. Con un archivo a la vez la
+latencia de cada documento (extracción, embeddings, upsert) se paga en serie; con
+varias ingestas simultáneas las etapas de unos documentos se solapan con las de otros,
+siempre bajo los límites globales del EmbeddingBatcher (peticiones simultáneas) y de
+ingest_upsert_concurrency.
+
+La deduplicación se desactiva: todos los PDFs comparten vocabulario y sus chunks se
+reutilizarían entre archivos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_bulk_ingestion --files 24 --pages 12 --jobs 1 4 8
+"""
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+from openai import AsyncOpenAI
+from src.settings import settings
+from src.utils import embedding_batcher
+from src.utils.embedding_batcher import EmbeddingBatcher
+from src.repositories.local_vector_repository import LocalVectorRepository
+from src.services.ingestion_pipeline import ingest_pdf
+from benchmarks.bench_pdf_extraction import write_synthetic_pdf
+from benchmarks.bench_embedding_batcher import FakeEmbeddingsServer
+
+
+async def ingest_all(paths, repo, jobs: int):
+    """Ingiere los PDFs con como máximo `jobs` ingestas simultáneas (como IngestionJobManager)"""
+    slots = asyncio.Semaphore(jobs)
+
+    async def one(path: str):
+        async with slots:
+            return await ingest_pdf(path, uuid.uuid4().hex, repo)
+
+    return await asyncio.gather(*(one(path) for path in paths))
+
+
+async def run(args):
+    settings.ingest_dedup_enabled = False
+    settings.ingest_upsert_concurrency = args.upsert_concurrency
+    server = FakeEmbeddingsServer(base_latency=args.latency)
+    server.start()
+    client = AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+    # Un único batcher para todas las ingestas: su semáforo es el límite global de peticiones
+    embedding_batcher._embedding_batcher = EmbeddingBatcher(
+        max_batch_tokens=settings.embedding_batch_max_tokens,
+        max_batch_inputs=settings.embedding_batch_max_inputs,
+        concurrency=args.embedding_concurrency,
+        client_factory=lambda: client
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for index in range(args.files):
+            path = os.path.join(tmp, f"manual_{index}.pdf")
+            write_synthetic_pdf(path, args.pages)
+            paths.append(path)
+
+        print(f"PDFs: {args.files} x {args.pages} páginas  embeddings simultáneos: {args.embedding_concurrency}  "
+              f"upserts simultáneos: {args.upsert_concurrency}")
+        print(f"{'ingestas':>9} {'s':>8} {'docs/s':>8} {'pág/s':>8} {'chunks/s':>9} {'speedup':>8}")
+        baseline = None
+        for jobs in args.jobs:
+            repo = LocalVectorRepository(base_dir=os.path.join(tmp, f"index_{jobs}"), collection_name="bench")
+            start = time.perf_counter()
+            results = await ingest_all(paths, repo, jobs)
+            elapsed = time.perf_counter() - start
+            pages = sum(progress.pages for progress in results)
+            chunks = sum(progress.chunks_stored for progress in results)
+            baseline = baseline or elapsed
+            print(
+                f"{jobs:>9} {elapsed:>8.2f} {len(paths) / elapsed:>8.2f} {pages / elapsed:>8.1f} "
+                f"{chunks / elapsed:>9.1f} {baseline / elapsed:>7.2f}x"
+            )
+
+    await client.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta secuencial vs concurrente de muchos PDFs")
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4, 8], help="Ingestas simultáneas")
+    parser.add_argument("--embedding-concurrency", type=int, default=4, help="Peticiones de embeddings simultáneas (global)")
+    parser.add_argument("--upsert-concurrency", type=int, default=4, help="Upserts simultáneos (global)")
+    parser.add_argument("--latency", type=float, default=0.08, help="Latencia base del servidor de embeddings (s)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark de perfiles de colección de Qdrant: recall@k, latencia y RAM estimada.
+
+Para cada perfil de repositories/collection_profiles.py crea una colección temporal
+con vectores sintéticos agrupados (se parecen más a embeddings reales que el ruido
+uniforme), espera a que termine la indexación y mide:
+  - recall@k frente a la búsqueda exacta calculada con NumPy
+  - latencia p50/p95/p99 de query_points con los parámetros de búsqueda del perfil
+  - RAM estimada por millón de chunks (vectores en RAM, cuantización y grafo HNSW)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_collection_profiles --points 50000 --queries 200
+    python -m benchmarks.bench_collection_profiles --profiles default balanced compact
+"""
+import time
+import uuid
+import argparse
+import statistics
+from typing import Dict, List
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+from src.core.qdrant_connection import build_client_kwargs
+from src.repositories.collection_profiles import (
+    PROFILES,
+    resolve_profile,
+    dense_vector_params,
+    collection_profile_kwargs,
+    search_params,
+)
+
+DIMENSIONS = 1536
+TOP_K = 10
+# Qdrant por defecto: m=16
+DEFAULT_HNSW_M = 16
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _clustered_vectors(count: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    labels = rng.integers(0, len(centers), size=count)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def estimate_ram_bytes(profile: Dict, points: int, dimensions: int = DIMENSIONS) -> int:
+    """
+    RAM residente aproximada de la parte vectorial de la colección.
+    Vectores float32 (si no están en disco) + cuantización en RAM + enlaces del grafo HNSW.
+    """
+    ram = 0
+    if not profile.get("vectors_on_disk"):
+        ram += points * dimensions * 4
+    quantization = (profile.get("quantization") or "none").lower()
+    if quantization == "scalar" and profile.get("quantization_always_ram") is not False:
+        ram += points * dimensions
+    elif quantization == "binary" and profile.get("quantization_always_ram") is not False:
+        ram += points * dimensions // 8
+    if not profile.get("hnsw_on_disk"):
+        m = profile.get("hnsw_m") or DEFAULT_HNSW_M
+        # Capa 0 con 2*m enlaces de 4 bytes por punto
+        ram += points * m * 2 * 4
+    return ram
+
+
+def _populate(client: QdrantClient, collection: str, profile: Dict, vectors: np.ndarray):
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=dense_vector_params(DIMENSIONS, profile),
+        **collection_profile_kwargs(profile)
+    )
+    batch = 500
+    for start in range(0, len(vectors), batch):
+        client.upsert(
+            collection_name=collection,
+            points=qmodels.Batch(
+                ids=list(range(start, min(start + batch, len(vectors)))),
+                vectors=vectors[start:start + batch].tolist()
+            ),
+            wait=True
+        )
+    # Esperar a que se construyan el índice HNSW y la cuantización
+    while "green" not in str(client.get_collection(collection).status).lower():
+        time.sleep(1.0)
+
+
+def _measure(client: QdrantClient, collection: str, profile: Dict, queries: np.ndarray,
+             truth: np.ndarray, warmup: int) -> Dict[str, float]:
+    params = search_params(profile)
+    latencies = []
+    recalls = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        result = client.query_points(
+            collection_name=collection,
+            query=query.tolist(),
+            limit=TOP_K,
+            search_params=params,
+            with_payload=False,
+            with_vectors=False
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        found = {point.id for point in result.points}
+        recalls.append(len(found & set(truth[i].tolist())) / TOP_K)
+    return {
+        "recall": statistics.mean(recalls),
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles de colección en Qdrant")
+    parser.add_argument("--points", type=int, default=50000, help="Vectores por colección temporal")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas medidas por perfil")
+    parser.add_argument("--warmup", type=int, default=20, help="Consultas iniciales descartadas")
+    parser.add_argument("--clusters", type=int, default=200, help="Centros de los vectores sintéticos")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, DIMENSIONS)).astype(np.float32)
+    vectors = _clustered_vectors(args.points, centers, rng)
+    queries = _clustered_vectors(args.queries + args.warmup, centers, rng)
+
+    # Ground truth exacto: producto punto sobre vectores normalizados (= coseno)
+    print(f"Calculando vecinos exactos para {len(queries)} consultas sobre {args.points} vectores...")
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :TOP_K]
+
+    client = QdrantClient(**build_client_kwargs())
+    print(
+        f"\n{'perfil':<10} {'recall@' + str(TOP_K):>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'RAM MB':>8} {'RAM GB/1M':>10} {'RAM GB/10M':>11}"
+    )
+    for name in args.profiles:
+        profile = resolve_profile(name)
+        collection = f"bench_profile_{name}_{uuid.uuid4().hex[:8]}"
+        try:
+            _populate(client, collection, profile, vectors)
+            stats = _measure(client, collection, profile, queries, truth, args.warmup)
+        finally:
+            client.delete_collection(collection)
+        print(
+            f"{name:<10} {stats['recall']:>10.4f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f} "
+            f"{estimate_ram_bytes(profile, args.points) / 1024 ** 2:>8.1f} "
+            f"{estimate_ram_bytes(profile, 1_000_000) / 1024 ** 3:>10.2f} "
+            f"{estimate_ram_bytes(profile, 10_000_000) / 1024 ** 3:>11.2f}"
+        )
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark de throughput del batcher de embeddings contra un servidor falso local.
+
+Levanta un servidor HTTP compatible con POST /v1/embeddings que simula la API:
+latencia por petición y por token, límites por petición (entradas y tokens, error 400),
+límite de tokens por minuto (429 con Retry-After) y una tasa de errores 5xx. Mide:
+
+  - "1 petición": todos los chunks en una sola llamada (comportamiento anterior)
+  - EmbeddingBatcher con distintos niveles de concurrencia
+
+y comprueba que los vectores vuelven en el orden de los textos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_embedding_batcher --chunks 5000 --concurrency 1 4 8
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from openai import AsyncOpenAI
+from src.utils.embedding_batcher import EmbeddingBatcher
+
+WORDS = (
+    "el protocolo TCP garantiza la entrega ordenada de segmentos mediante confirmaciones "
+    "y ventanas deslizantes mientras UDP prioriza la latencia sobre la fiabilidad en redes "
+    "de area local y enlaces WAN con enrutamiento OSPF BGP y resolucion DNS"
+).split()
+
+DIMENSIONS = 8
+
+
+class FakeEmbeddingsServer:
+    """Servidor de embeddings falso con los límites de la API simulados"""
+
+    def __init__(
+        self,
+        base_latency: float = 0.08,
+        latency_per_1k_tokens: float = 0.02,
+        max_inputs: int = 2048,
+        max_request_tokens: int = 300000,
+        tokens_per_minute: int = 0,
+        error_rate: float = 0.0
+    ):
+        self.base_latency = base_latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.max_inputs = max_inputs
+        self.max_request_tokens = max_request_tokens
+        self.tokens_per_minute = tokens_per_minute
+        self.error_rate = error_rate
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_tokens = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _over_tpm(self, tokens: int) -> bool:
+        if not self.tokens_per_minute:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._window_tokens = now, 0
+            if self._window_tokens + tokens > self.tokens_per_minute:
+                return True
+            self._window_tokens += tokens
+            return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict, headers: dict = None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _error(self, status: int, message: str, headers: dict = None):
+                with server._lock:
+                    server.rejected += 1
+                self._reply(status, {"error": {"message": message, "type": "fake", "code": status}}, headers)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                tokens = sum(int(len(text.split()) * 1.3) + 1 for text in inputs)
+                with server._lock:
+                    server.requests += 1
+                if len(inputs) > server.max_inputs or tokens > server.max_request_tokens:
+                    return self._error(400, f"Petición demasiado grande: {len(inputs)} entradas, {tokens} tokens")
+                if server._over_tpm(tokens):
+                    return self._error(429, "Rate limit de tokens por minuto", {"Retry-After": "1"})
+                if random.random() < server.error_rate:
+                    return self._error(500, "Error interno simulado")
+                time.sleep(server.base_latency + server.latency_per_1k_tokens * tokens / 1000)
+                dimensions = body.get("dimensions") or DIMENSIONS
+                data = [
+                    # La primera componente identifica el texto para comprobar el orden
+                    {"object": "embedding", "index": i, "embedding": [float(len(text))] + [0.0] * (dimensions - 1)}
+                    for i, text in enumerate(inputs)
+                ]
+                # Orden inverso: el cliente debe reordenar por "index"
+                self._reply(200, {
+                    "object": "list",
+                    "data": data[::-1],
+                    "model": body["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+        return Handler
+
+
+def synthetic_chunks(count: int, chunk_chars: int = 500) -> List[str]:
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chunk_chars - rng.randint(0, 120):
+            words.append(rng.choice(WORDS))
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def _check_order(chunks: List[str], vectors: List[List[float]]) -> bool:
+    return len(vectors) == len(chunks) and all(vector[0] == len(text) for text, vector in zip(chunks, vectors))
+
+
+async def run(args):
+    server = FakeEmbeddingsServer(
+        base_latency=args.latency,
+        tokens_per_minute=args.server_tpm,
+        error_rate=args.error_rate
+    )
+    server.start()
+    client = AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+    chunks = synthetic_chunks(args.chunks)
+
+    print(f"Chunks: {len(chunks)}  servidor: {server.base_url}")
+    print(f"{'modo':>14} {'s':>8} {'chunks/s':>10} {'peticiones':>11} {'reintentos':>11} {'orden':>6}")
+
+    start = time.perf_counter()
+    try:
+        response = await client.embeddings.create(model="fake", input=chunks, dimensions=DIMENSIONS)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        elapsed = time.perf_counter() - start
+        print(f"{'1 petición':>14} {elapsed:>8.2f} {len(chunks) / elapsed:>10.1f} {1:>11} {0:>11} {str(_check_order(chunks, vectors)):>6}")
+    except Exception as e:
+        print(f"{'1 petición':>14} falló: {e.__class__.__name__}")
+
+    for concurrency in args.concurrency:
+        batcher = EmbeddingBatcher(
+            max_batch_tokens=args.batch_tokens,
+            max_batch_inputs=args.batch_inputs,
+            concurrency=concurrency,
+            tokens_per_minute=args.tpm,
+            requests_per_minute=args.rpm,
+            max_retries=args.retries,
+            client_factory=lambda: client,
+            model="text-embedding-3-large",
+            dimensions=DIMENSIONS
+        )
+        start = time.perf_counter()
+        vectors = await batcher.embed(chunks)
+        elapsed = time.perf_counter() - start
+        stats = batcher.stats()
+        print(
+            f"{'batcher x' + str(concurrency):>14} {elapsed:>8.2f} {len(chunks) / elapsed:>10.1f} "
+            f"{stats['requests']:>11} {stats['retries']:>11} {str(_check_order(chunks, vectors)):>6}"
+        )
+
+    await client.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del batcher de embeddings con un servidor falso")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch-tokens", type=int, default=8000, help="Tokens máximos por petición")
+    parser.add_argument("--batch-inputs", type=int, default=512, help="Textos máximos por petición")
+    parser.add_argument("--tpm", type=int, default=0, help="Límite TPM del batcher (0 = sin límite)")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite RPM del batcher (0 = sin límite)")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.08, help="Latencia base del servidor por petición (s)")
+    parser.add_argument("--server-tpm", type=int, default=0, help="TPM del servidor: por encima responde 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones con error 500")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
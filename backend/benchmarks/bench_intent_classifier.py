@@ -0,0 +1,101 @@
+"""
+Benchmark del clasificador local de intención (relevancia y complejidad del RAG).
+
+Reproduce un fichero de consultas reales (una por línea, p. ej. extraídas de los
+logs "[RAG] Llamando a rag_tool.aquery()") y mide cuántas de las 2 llamadas al LLM
+por consulta (check_relevance + check_complexity) resuelve el clasificador sin LLM.
+Con --compare-llm también ejecuta los prompts originales y mide el acuerdo con el LLM
+en las decisiones locales; con --learn las respuestas del LLM se incorporan como
+ejemplos igual que en producción.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_intent_classifier --queries consultas.txt
+    python -m benchmarks.bench_intent_classifier --queries consultas.txt --compare-llm --learn
+"""
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+from src.settings import settings
+from src.core.async_clients import get_async_openai
+from src.tools.rag_tool import RAGTool
+from src.utils.embeddings import aembedding_for_text
+from src.utils.intent_classifier import IntentClassifier, RELEVANCE, COMPLEXITY
+
+LLM_CALLS_BEFORE = 2
+
+
+async def _llm_label(task: str, query: str) -> Optional[str]:
+    """Etiqueta que daría el prompt original de RAGTool"""
+    if task == RELEVANCE:
+        system, prompt = RAGTool.RELEVANCE_SYSTEM_MESSAGE, RAGTool.RELEVANCE_CHECK_PROMPT_TEMPLATE.format(query_text=query)
+    else:
+        system, prompt = RAGTool.COMPLEXITY_SYSTEM_MESSAGE, RAGTool.COMPLEXITY_PROMPT_TEMPLATE.format(query_text=query)
+    response = await get_async_openai().chat.completions.create(
+        model=settings.llm_model,
+        messages=[{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+        temperature=0.0,
+        max_tokens=10
+    )
+    text = response.choices[0].message.content.strip().lower()
+    if task == RELEVANCE:
+        return "no_relevante" if "no_relevante" in text else ("relevante" if "relevante" in text else None)
+    return next((label for label in ("simple", "moderada", "compleja") if label in text), None)
+
+
+async def run(queries: List[str], compare_llm: bool, learn: bool):
+    classifier = IntentClassifier(
+        k=settings.intent_classifier_k,
+        min_confidence=settings.intent_classifier_min_confidence,
+        min_similarity=settings.intent_classifier_min_similarity,
+        max_learned=settings.intent_classifier_max_learned if learn else 0
+    )
+    if not await classifier.ensure_ready():
+        raise SystemExit("No se pudieron calcular los embeddings de ejemplo")
+
+    agreement: Dict[str, List[bool]] = {RELEVANCE: [], COMPLEXITY: []}
+    for query in queries:
+        vector = await aembedding_for_text(query)
+        local: Dict[str, bool] = {}
+        for task in (RELEVANCE, COMPLEXITY):
+            label, _ = classifier.classify(task, vector)
+            if task == RELEVANCE and label == "no_relevante":
+                label = None  # Igual que RAGTool: solo el LLM rechaza una pregunta
+            local[task] = label is not None
+            if not (compare_llm or (learn and label is None)):
+                continue
+            llm_label = await _llm_label(task, query)
+            if label is not None and llm_label is not None:
+                agreement[task].append(label == llm_label)
+            elif label is None and llm_label is not None:
+                classifier.learn(task, vector, llm_label)
+        classifier.record(local)
+
+    stats = classifier.stats()
+    requests = stats["requests"]
+    print(f"Consultas: {requests}")
+    for task in (RELEVANCE, COMPLEXITY):
+        local_count = stats["local_decisions"][task]
+        line = f"  {task:<11} locales: {local_count:>5} ({local_count / requests:.1%})"
+        if agreement[task]:
+            line += f"  acuerdo con el LLM: {sum(agreement[task]) / len(agreement[task]):.1%} de {len(agreement[task])}"
+        print(line)
+    print(
+        f"Llamadas al LLM por consulta: {LLM_CALLS_BEFORE} -> {stats['llm_calls_per_request']:.2f} "
+        f"({stats['llm_calls_avoided_per_request']:.2f} evitadas por consulta)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del clasificador local de intención")
+    parser.add_argument("--queries", required=True, help="Fichero de consultas, una por línea")
+    parser.add_argument("--compare-llm", action="store_true", help="Medir el acuerdo con los prompts del LLM")
+    parser.add_argument("--learn", action="store_true", help="Aprender de las respuestas del LLM como en producción")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    asyncio.run(run(queries, args.compare_llm, args.learn))
+
+
+if __name__ == "__main__":
+    main()
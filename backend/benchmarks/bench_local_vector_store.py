@@ -0,0 +1,65 @@
+"""
+Benchmark del backend vectorial local (vector_backend = "local").
+
+Llena un índice LocalVectorRepository temporal con vectores aleatorios y mide la
+latencia de search() (producto matriz-vector + top-k + lectura de payloads) para
+distintos tamaños de corpus y dimensiones.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_local_vector_store --sizes 10000 50000 100000 --dimensions 256 1536
+"""
+import time
+import tempfile
+import argparse
+import statistics
+from typing import List
+import numpy as np
+from src.repositories.local_vector_repository import LocalVectorRepository
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice vectorial local")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 1536])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'puntos':>8} {'dims':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'media ms':>9}")
+    for dimensions in args.dimensions:
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as base_dir:
+                repo = LocalVectorRepository(base_dir=base_dir, collection_name="bench")
+                batch = 5000
+                for start in range(0, size, batch):
+                    vectors = rng.standard_normal((min(batch, size - start), dimensions)).astype(np.float32)
+                    repo.upsert_points([
+                        {"id": f"p{start + i}", "vector": vector, "payload": {"text": f"chunk {start + i}"}}
+                        for i, vector in enumerate(vectors)
+                    ])
+
+                queries = rng.standard_normal((args.queries, dimensions)).astype(np.float32)
+                repo.search(queries[0], top_k=args.top_k)  # calentar la page cache
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    repo.search(query, top_k=args.top_k, payload_fields=["text"])
+                    latencies.append((time.perf_counter() - start) * 1000)
+                repo._db.close()
+
+            print(
+                f"{size:>8} {dimensions:>6} {_percentile(latencies, 50):>8.3f} {_percentile(latencies, 95):>8.3f} "
+                f"{_percentile(latencies, 99):>8.3f} {statistics.mean(latencies):>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
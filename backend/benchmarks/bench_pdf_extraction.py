@@ -0,0 +1,99 @@
+"""
+Benchmark de extracción de texto de PDFs: serie vs pool de procesos por rangos de páginas.
+
+Genera PDFs sintéticos de varios cientos de páginas (texto técnico repetido, sin
+dependencias externas) y mide el tiempo de iter_pdf_pages frente a
+iter_pdf_pages_parallel con distinto número de procesos, junto con el speedup y la
+eficiencia por núcleo.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_pdf_extraction --pages 200 500 --workers 2 4 8
+"""
+import os
+import time
+import argparse
+import tempfile
+from typing import List, Tuple
+from src.utils.text_processing import iter_pdf_pages, iter_pdf_pages_parallel, get_pdf_process_pool
+
+WORDS = (
+    "el protocolo TCP garantiza la entrega ordenada de segmentos mediante confirmaciones "
+    "y ventanas deslizantes mientras UDP prioriza la latencia sobre la fiabilidad en redes "
+    "de area local y enlaces WAN con enrutamiento OSPF BGP y resolucion DNS"
+).split()
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 45):
+    """Escribe un PDF mínimo válido con `pages` páginas de texto (Helvetica 10pt)"""
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page in range(pages):
+        lines = []
+        for line in range(lines_per_page):
+            offset = (page * lines_per_page + line) % len(WORDS)
+            text = " ".join((WORDS * 2)[offset:offset + 14])
+            lines.append(f"({text}) Tj T*")
+        stream = ("BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[page] + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def _timed(pages_iter) -> Tuple[float, int]:
+    start = time.perf_counter()
+    count = sum(1 for _ in pages_iter)
+    elapsed = time.perf_counter() - start
+    return elapsed, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extracción de PDFs en paralelo")
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--pages-per-shard", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"CPUs disponibles: {os.cpu_count()}")
+    print(f"{'páginas':>8} {'modo':>10} {'s':>8} {'pág/s':>8} {'speedup':>8} {'efic./núcleo':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+            write_synthetic_pdf(path, pages)
+
+            serial, count = _timed(iter_pdf_pages(path))
+            print(f"{pages:>8} {'serie':>10} {serial:>8.2f} {count / serial:>8.1f} {1.0:>8.2f} {1.0:>13.2f}")
+            for workers in sorted(set(args.workers)):
+                if workers < 2:
+                    continue
+                # Arrancar los procesos fuera de la medición
+                list(get_pdf_process_pool(workers).map(abs, range(workers)))
+                elapsed, count = _timed(iter_pdf_pages_parallel(
+                    path, workers=workers, pages_per_shard=args.pages_per_shard, min_pages=0
+                ))
+                speedup = serial / elapsed
+                print(
+                    f"{pages:>8} {str(workers) + ' proc':>10} {elapsed:>8.2f} {count / elapsed:>8.1f} "
+                    f"{speedup:>8.2f} {speedup / workers:>13.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark de latencia de búsqueda en Qdrant: REST (keep-alive) vs gRPC.
+
+Crea una colección temporal con vectores aleatorios de 1536 dimensiones, ejecuta
+búsquedas con top_k 10-50 por ambos transportes y reporta p50/p95/p99.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_qdrant_transport --points 20000 --queries 300
+"""
+import time
+import uuid
+import argparse
+import statistics
+from typing import Dict, List
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+from src.core.qdrant_connection import build_client_kwargs
+
+DIMENSIONS = 1536
+TOP_KS = (10, 20, 30, 50)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _random_unit_vectors(count: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _populate(client: QdrantClient, collection: str, points: int, rng: np.random.Generator):
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=qmodels.VectorParams(size=DIMENSIONS, distance=qmodels.Distance.COSINE)
+    )
+    batch = 500
+    for start in range(0, points, batch):
+        vectors = _random_unit_vectors(min(batch, points - start), rng)
+        client.upsert(
+            collection_name=collection,
+            points=[
+                qmodels.PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=vector.tolist(),
+                    payload={"text": f"chunk {start + i}", "chunk_index": start + i}
+                )
+                for i, vector in enumerate(vectors)
+            ],
+            wait=True
+        )
+
+
+def _measure(client: QdrantClient, collection: str, queries: np.ndarray, top_k: int, warmup: int) -> List[float]:
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        client.query_points(collection_name=collection, query=query.tolist(), limit=top_k, with_payload=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            latencies.append(elapsed)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark REST vs gRPC en Qdrant")
+    parser.add_argument("--points", type=int, default=20000, help="Número de vectores en la colección temporal")
+    parser.add_argument("--queries", type=int, default=300, help="Consultas por combinación transporte/top_k")
+    parser.add_argument("--warmup", type=int, default=20, help="Consultas iniciales descartadas")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    collection = f"bench_transport_{uuid.uuid4().hex[:8]}"
+    clients: Dict[str, QdrantClient] = {
+        "rest": QdrantClient(**build_client_kwargs(prefer_grpc=False)),
+        "grpc": QdrantClient(**build_client_kwargs(prefer_grpc=True)),
+    }
+
+    print(f"Poblando colección temporal '{collection}' con {args.points} vectores de {DIMENSIONS} dims...")
+    _populate(clients["rest"], collection, args.points, rng)
+    queries = _random_unit_vectors(args.queries + args.warmup, rng)
+
+    try:
+        print(f"\n{'transporte':<10} {'top_k':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'media ms':>9}")
+        for top_k in TOP_KS:
+            for name, client in clients.items():
+                latencies = _measure(client, collection, queries, top_k, args.warmup)
+                print(
+                    f"{name:<10} {top_k:>5} {_percentile(latencies, 50):>8.2f} {_percentile(latencies, 95):>8.2f} "
+                    f"{_percentile(latencies, 99):>8.2f} {statistics.mean(latencies):>9.2f}"
+                )
+    finally:
+        clients["rest"].delete_collection(collection)
+        for client in clients.values():
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
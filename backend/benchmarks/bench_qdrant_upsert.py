@@ -0,0 +1,83 @@
+"""
+Benchmark de upsert masivo en Qdrant con QdrantRepository.upsert_points.
+
+Inserta N puntos aleatorios (1536 dimensiones, payload de chunk típico) en una
+colección temporal con distintas configuraciones de lote, paralelismo y espera:
+
+  - anterior: lotes de 100 en serie, esperando la indexación de cada uno
+  - lotes de qdrant_upsert_batch_size en serie y en paralelo, con wait=True
+  - pipelined: lotes en paralelo con wait=False y una barrera de consistencia final
+
+y comprueba que todos los puntos son visibles al retornar. Requiere un Qdrant en
+settings.qdrant_url.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_qdrant_upsert --points 50000 --batch-size 256 --parallel 4 8
+"""
+import time
+import uuid
+import argparse
+from typing import Dict, List
+import numpy as np
+from src.settings import settings
+from src.repositories.qdrant_repository import QdrantRepository
+
+DIMENSIONS = 1536
+
+
+def _points(count: int, rng: np.random.Generator) -> List[Dict]:
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "vector": vector.tolist(),
+            "payload": {"text": "x" * 1500, "document_id": "bench", "chunk_index": index}
+        }
+        for index, vector in enumerate(vectors)
+    ]
+
+
+def _run(points: List[Dict], batch_size: int, parallel: int, pipelined: bool) -> float:
+    settings.qdrant_upsert_batch_size = batch_size
+    settings.qdrant_upsert_parallel = parallel
+    settings.qdrant_upsert_pipelined = pipelined
+    repo = QdrantRepository(collection_name=f"bench_upsert_{uuid.uuid4().hex[:8]}")
+    try:
+        # La primera llamada ajusta la colección al tamaño de vector: fuera de la medición
+        repo.upsert_points(points[:1])
+        start = time.perf_counter()
+        repo.upsert_points(points)
+        elapsed = time.perf_counter() - start
+        visible = repo.client.count(repo.collection_name, exact=True).count
+        if visible != len(points):
+            print(f"  ⚠️ {visible}/{len(points)} puntos visibles al retornar")
+        return elapsed
+    finally:
+        # La colección temporal queda detrás de un alias con su nombre
+        repo.client.delete_collection(repo.resolve_collection())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de upsert masivo en Qdrant")
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parallel", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    settings.hybrid_search_enabled = False
+    points = _points(args.points, np.random.default_rng(args.seed))
+    runs = [("anterior (100, serie, wait)", 100, 1, False), (f"{args.batch_size}, serie, wait", args.batch_size, 1, False)]
+    for parallel in args.parallel:
+        runs.append((f"{args.batch_size}, x{parallel}, wait", args.batch_size, parallel, False))
+        runs.append((f"{args.batch_size}, x{parallel}, pipelined", args.batch_size, parallel, True))
+
+    print(f"Puntos: {len(points)}  dimensiones: {DIMENSIONS}  Qdrant: {settings.qdrant_url}")
+    print(f"{'modo':<30} {'s':>8} {'puntos/s':>10}")
+    for name, batch_size, parallel, pipelined in runs:
+        elapsed = _run(points, batch_size, parallel, pipelined)
+        print(f"{name:<30} {elapsed:>8.2f} {len(points) / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
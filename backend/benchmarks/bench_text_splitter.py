@@ -0,0 +1,96 @@
+"""
+Microbenchmark de los divisores de texto sobre textos de varios MB.
+
+Compara text_splitter (re-slicing y re-join de la lista de palabras por ventana),
+iter_text_chunks (ventana incremental por páginas) y TokenTextSplitter (offsets de
+caracteres de una sola pasada, tokens del modelo de embeddings, cortes en fin de frase),
+en texto completo y por páginas. Mide MB/s (mejor de 3), chunks y memoria pico
+(tracemalloc, en una ejecución aparte). Los divisores por palabras no cuentan tokens:
+sus chunks de 500 palabras superan con frecuencia los 512 tokens.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_text_splitter --mb 2 8 --chunk-words 500 --chunk-tokens 512
+"""
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Callable, List, Tuple
+from src.utils.text_processing import text_splitter, iter_text_chunks, TokenTextSplitter
+
+WORDS = (
+    "el protocolo TCP garantiza la entrega ordenada de segmentos mediante confirmaciones "
+    "y ventanas deslizantes mientras UDP prioriza la latencia sobre la fiabilidad en redes "
+    "de área local y enlaces WAN con enrutamiento OSPF BGP y resolución DNS 192.168.0.1/24"
+).split()
+
+
+def synthetic_pages(megabytes: float, page_chars: int = 3000, seed: int = 0) -> List[str]:
+    """Páginas de frases de longitud variable hasta sumar `megabytes` MB"""
+    rng = random.Random(seed)
+    pages: List[str] = []
+    total = 0
+    target = int(megabytes * 1024 * 1024)
+    while total < target:
+        sentences = []
+        length = 0
+        while length < page_chars:
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 35)))
+            sentence = sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", ":", ";"])
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        page = " ".join(sentences)
+        pages.append(page)
+        total += len(page.encode("utf-8"))
+    return pages
+
+
+def _measure(run: Callable[[], int], repeat: int = 3) -> Tuple[float, int, float]:
+    """Mejor tiempo de `repeat` ejecuciones y memoria pico en una ejecución aparte (tracemalloc ralentiza)"""
+    best = float("inf")
+    chunks = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = run()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, chunks, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de los divisores de texto")
+    parser.add_argument("--mb", type=float, nargs="+", default=[2, 8])
+    parser.add_argument("--chunk-words", type=int, default=500)
+    parser.add_argument("--overlap-words", type=int, default=50)
+    parser.add_argument("--chunk-tokens", type=int, default=512)
+    parser.add_argument("--overlap-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'MB':>5} {'divisor':<28} {'s':>7} {'MB/s':>7} {'chunks':>7} {'pico MB':>8}")
+    for megabytes in args.mb:
+        pages = synthetic_pages(megabytes)
+        text = "\n".join(pages)
+        size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+        # Splitter "en caliente": el cache de tokens por palabra ya está poblado, como en una ingesta larga
+        warm = TokenTextSplitter(args.chunk_tokens, args.overlap_tokens)
+        warm.split_spans(text[:200000])
+
+        runs = [
+            ("text_splitter (palabras)", lambda: len(text_splitter(text, args.chunk_words, args.overlap_words))),
+            ("iter_text_chunks (páginas)", lambda: sum(1 for _ in iter_text_chunks(pages, args.chunk_words, args.overlap_words))),
+            ("TokenTextSplitter (texto)", lambda: len(warm.split_spans(text))),
+            ("TokenTextSplitter (páginas)", lambda: sum(1 for _ in warm.iter_chunks(pages))),
+            ("TokenTextSplitter sin frases", lambda: len(
+                TokenTextSplitter(args.chunk_tokens, args.overlap_tokens, sentence_aware=False).split_spans(text)
+            )),
+        ]
+        for name, run in runs:
+            elapsed, chunks, peak = _measure(run)
+            print(f"{size_mb:>5.1f} {name:<28} {elapsed:>7.2f} {size_mb / elapsed:>7.1f} {chunks:>7} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Aplicación principal de NetMind
 """
+import asyncio
 import logging
 import os
 from pathlib import Path
@@ -8,8 +9,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from src.api import files, agent, streaming, tools_router
+from src.api import files, agent, streaming, tools_router, metrics
 from src.models.database import init_db
+from src.services.document_gc import get_document_gc
+from src.core.active_embedding import refresh_active_embedding
+from src.repositories.tombstone_repository import get_tombstone_repository
 import uvicorn
 
 # Configuración centralizada de logging
@@ -64,14 +68,24 @@ app.add_middleware(
 # Inicializar base de datos al arrancar
 @app.on_event("startup")
 async def startup_event():
-    """Inicializa las tablas de la base de datos al arrancar la aplicación"""
+    """Inicializa las tablas de la base de datos y el recolector de documentos borrados"""
     init_db()
+    # Modelo de embeddings activo antes de atender consultas (luego se renueva en segundo plano)
+    await asyncio.to_thread(refresh_active_embedding)
+    # Documentos borrados pendientes de purgar, antes de la primera búsqueda
+    await asyncio.to_thread(get_tombstone_repository().refresh)
+    get_document_gc().start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_document_gc().stop()
 
 # Incluir routers de la API (deben ir antes del catch-all del frontend)
 app.include_router(files.router)
 app.include_router(agent.router)
 app.include_router(streaming.router)
 app.include_router(tools_router.router)
+app.include_router(metrics.router)
 
 # Configurar archivos estáticos del frontend (solo en producción)
 # El directorio frontend_dist estará en el directorio backend (generado por build.sh)
@@ -86,7 +100,7 @@ if static_dir.exists() and os.getenv("APP_ENV") == "production":
     @app.get("/{filename:path}")
     async def serve_frontend(filename: str):
         # Excluir rutas de API
-        if filename.startswith(("files/", "agent/", "streaming/", "docs", "openapi.json", "redoc")):
+        if filename.startswith(("files/", "agent/", "streaming/", "metrics", "docs", "openapi.json", "redoc")):
             return {"error": "Not found"}
         
         # Si es un archivo estático en la raíz, servirlo
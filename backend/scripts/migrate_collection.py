@@ -0,0 +1,69 @@
+"""
+Aplica un perfil de colección (HNSW, cuantización, vectores en disco, optimizador)
+a una colección existente de Qdrant sin recrearla ni reindexar los documentos.
+
+Qdrant reconstruye el índice y la cuantización en segundo plano; la colección sigue
+atendiendo búsquedas mientras su estado sea 'yellow'.
+
+Uso (desde backend/):
+    python -m scripts.migrate_collection --profile balanced --dry-run
+    python -m scripts.migrate_collection --profile balanced --wait
+"""
+import time
+import argparse
+from src.core.qdrant_connection import get_qdrant_client
+from src.repositories.collection_profiles import PROFILES, resolve_profile, describe_profile, apply_profile
+from src.repositories.qdrant_repository import QDRANT_ALIAS, resolve_alias
+
+
+def _print_current(client, collection: str):
+    params = client.get_collection(collection)
+    config = params.config
+    print(f"Colección '{collection}': {params.points_count} puntos, estado {params.status}")
+    print(f"  vectores: {config.params.vectors}")
+    print(f"  hnsw: {config.hnsw_config}")
+    print(f"  cuantización: {config.quantization_config}")
+    print(f"  optimizador: indexing_threshold={config.optimizer_config.indexing_threshold}, "
+          f"memmap_threshold={config.optimizer_config.memmap_threshold}")
+
+
+def _wait_until_green(client, collection: str, poll_seconds: float = 5.0):
+    while True:
+        info = client.get_collection(collection)
+        status = str(info.status).lower()
+        print(f"  estado={status}, vectores indexados={info.indexed_vectors_count}/{info.points_count}")
+        if "green" in status:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra una colección de Qdrant a un perfil de configuración")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=None,
+                        help="Perfil a aplicar (por defecto settings.qdrant_collection_profile)")
+    parser.add_argument("--collection", default=None,
+                        help="Colección a migrar (por defecto la colección viva tras el alias)")
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar la configuración actual y la objetivo sin aplicar")
+    parser.add_argument("--wait", action="store_true", help="Esperar a que Qdrant termine de reoptimizar")
+    args = parser.parse_args()
+
+    client = get_qdrant_client()
+    args.collection = args.collection or resolve_alias(client, QDRANT_ALIAS)
+    profile = resolve_profile(args.profile)
+
+    _print_current(client, args.collection)
+    print(f"\nPerfil objetivo {describe_profile(profile)}")
+    if args.dry_run:
+        return
+
+    if not apply_profile(client, args.collection, profile):
+        raise SystemExit("Qdrant rechazó la actualización de la colección")
+    print("\nActualización aceptada; Qdrant está reoptimizando la colección")
+
+    if args.wait:
+        _wait_until_green(client, args.collection)
+        _print_current(client, args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Re-embebe la colección de Qdrant con otro modelo o dimensiones sin cortar el servicio.
+
+Los vectores nuevos se escriben en una colección sombra mientras la colección viva sigue
+atendiendo búsquedas; al terminar, el alias cambia de forma atómica y los workers adoptan
+el modelo nuevo (ver src/services/reembedding.py). El progreso se guarda tras cada página:
+si el proceso se interrumpe, --resume continúa donde se quedó.
+
+Uso (desde backend/):
+    python -m scripts.reembed_collection --model text-embedding-3-small --dimensions 1024
+    python -m scripts.reembed_collection --status
+    python -m scripts.reembed_collection --resume <id> [--drop-old]
+    python -m scripts.reembed_collection --abort <id>
+"""
+import asyncio
+import argparse
+from src.settings import settings
+from src.models.database import init_db
+from src.repositories.qdrant_repository import QDRANT_ALIAS
+from src.services.reembedding import ReembeddingJob, start_migration, abort_migration, list_migrations
+
+
+def _print_progress(progress: dict):
+    print(
+        f"  [{progress['status']}] {progress['percent']:>5.1f}%  "
+        f"{progress['points_copied']}/{progress['points_total']} puntos  "
+        f"{progress['tokens']} tokens  {progress['elapsed_seconds']:.0f}s "
+        f"(esperando TPM: {progress['throttled_seconds']:.0f}s)",
+        flush=True
+    )
+
+
+def _print_status():
+    migrations = list_migrations()
+    if not migrations:
+        print("No hay re-embeddings registrados")
+        return
+    print(f"{'id':<36} {'estado':<12} {'modelo':<24} {'dims':>5} {'copiados':>10} {'total':>8}  sombra")
+    for migration in migrations:
+        print(
+            f"{migration.id:<36} {migration.status:<12} {migration.model[:24]:<24} {migration.dimensions:>5} "
+            f"{migration.points_copied or 0:>10} {migration.points_total or 0:>8}  {migration.target_collection}"
+        )
+        if migration.error:
+            print(f"  último error: {migration.error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embebe la colección de Qdrant en una colección sombra y cambia el alias")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--model", help="Modelo de embeddings nuevo")
+    action.add_argument("--resume", metavar="ID", help="Reanudar un re-embedding interrumpido")
+    action.add_argument("--abort", metavar="ID", help="Descartar un re-embedding sin cambiar el alias")
+    action.add_argument("--status", action="store_true", help="Listar los re-embeddings y su progreso")
+    parser.add_argument("--dimensions", type=int, default=None,
+                        help="Dimensiones del modelo nuevo (por defecto settings.embedding_dimensions)")
+    parser.add_argument("--tpm", type=int, default=None,
+                        help=f"Tokens por minuto (por defecto settings.reembed_tpm_limit = {settings.reembed_tpm_limit})")
+    parser.add_argument("--page-size", type=int, default=None, help="Puntos por página (settings.reembed_page_size)")
+    parser.add_argument("--drop-old", action="store_true", help="Eliminar la colección anterior al terminar")
+    args = parser.parse_args()
+
+    if settings.vector_backend != "qdrant":
+        raise SystemExit("El re-embedding requiere vector_backend = \"qdrant\"; con el índice local usa scripts.reindex_documents")
+    init_db()
+    if args.status:
+        _print_status()
+        return
+    if args.abort:
+        migration = abort_migration(args.abort)
+        print(f"Re-embedding {migration.id} abortado; colección {migration.target_collection} eliminada")
+        return
+    if args.tpm is not None:
+        settings.reembed_tpm_limit = args.tpm
+
+    if args.model:
+        migration = start_migration(args.model, args.dimensions or settings.embedding_dimensions)
+        print(f"Re-embedding {migration.id}: {migration.source_collection} -> {migration.target_collection} "
+              f"({migration.model}, {migration.dimensions} dimensiones, {migration.points_total} puntos)")
+        migration_id = migration.id
+    else:
+        migration_id = args.resume
+
+    job = ReembeddingJob(migration_id, page_size=args.page_size, drop_old=args.drop_old, on_progress=_print_progress)
+    try:
+        progress = asyncio.run(job.run())
+    except Exception as e:
+        raise SystemExit(f"Re-embedding interrumpido: {e}\nReanúdalo con --resume {migration_id}")
+    print(f"\nAlias '{QDRANT_ALIAS}' -> {progress['target']} "
+          f"({progress['points_copied']} puntos, {progress['points_skipped']} sin texto, {progress['tokens']} tokens)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Re-indexa documentos ya subidos con la configuración de chunking actual.
+
+Tras cambiar la configuración de chunking (settings.text_splitter, chunk_size,
+chunk_overlap, chunk_tokens...) no hace falta volver a subir los PDFs: el texto por
+página se guardó en la ingesta (junto al PDF), se vuelve a dividir en chunks y solo
+se piden embeddings para los chunks cuyo texto cambió.
+Los documentos ingeridos antes de guardar el texto se extraen del PDF una única vez.
+
+Al terminar se invalidan las respuestas RAG cacheadas (en Redis; los caches en memoria
+de los workers en ejecución se renuevan por TTL o al reiniciar).
+
+Uso (desde backend/):
+    python -m scripts.reindex_documents --all --dry-run
+    python -m scripts.reindex_documents --all
+    python -m scripts.reindex_documents --document-id <id> [--document-id <id> ...]
+"""
+import asyncio
+import argparse
+from typing import List
+from src.settings import settings
+from src.models.database import SessionLocal
+from src.repositories.document_repository import DocumentRepository
+from src.services.embeddings_service import reindex_document
+from src.core.semantic_cache import invalidate_semantic_cache
+from src.core.cache import get_cache_manager
+from src.core.active_embedding import refresh_active_embedding
+
+
+async def run(document_ids: List[str], dry_run: bool):
+    document_repo = DocumentRepository()
+    db = SessionLocal()
+    try:
+        documents = []
+        for document_id in document_ids:
+            doc = document_repo.get_document_by_id(db, document_id)
+            if doc is None:
+                print(f"  {document_id}: no existe en la base de datos, se omite")
+                continue
+            documents.append(doc)
+
+        if settings.text_splitter == "tokens":
+            print(f"Chunking por tokens: chunk_tokens={settings.chunk_tokens}, chunk_overlap_tokens={settings.chunk_overlap_tokens}")
+        else:
+            print(f"Chunking por palabras: chunk_size={settings.chunk_size}, chunk_overlap={settings.chunk_overlap}")
+        print(f"{'documento':<40} {'texto':>6} {'chunks antes':>13}")
+        for doc in documents:
+            stored = "sí" if document_repo.has_page_text(doc.document_id) else "no"
+            print(f"{doc.filename[:40]:<40} {stored:>6} {doc.chunk_count or 0:>13}")
+        if dry_run:
+            return
+
+        print()
+        reindexed = 0
+        for doc in documents:
+            try:
+                progress = await reindex_document(doc.document_id)
+            except Exception as e:
+                print(f"  ✗ {doc.filename}: {e}")
+                continue
+            document_repo.update_chunk_count(db, doc.document_id, progress.chunks_stored)
+            reindexed += 1
+            embedded = progress.chunks_stored - progress.chunks_reused
+            print(
+                f"  ✓ {doc.filename}: {progress.chunks_stored} chunks, {embedded} embebidos, "
+                f"{progress.chunks_reused} reutilizados en {progress.elapsed:.1f}s"
+            )
+    finally:
+        db.close()
+
+    if reindexed:
+        invalidate_semantic_cache()
+        get_cache_manager().clear_prefix("rag")
+    print(f"\n{reindexed}/{len(documents)} documentos re-indexados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-indexa documentos con la configuración de chunking actual")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Re-indexar todos los documentos")
+    target.add_argument("--document-id", action="append", help="Documento a re-indexar (repetible)")
+    parser.add_argument("--dry-run", action="store_true", help="Listar los documentos sin re-indexar")
+    args = parser.parse_args()
+
+    if args.all:
+        db = SessionLocal()
+        try:
+            document_ids = [doc.document_id for doc in DocumentRepository().list_documents(db, limit=100000)]
+        finally:
+            db.close()
+    else:
+        document_ids = args.document_id
+    # Los chunks nuevos se embeben con el modelo activo (el de un re-embedding completado, si lo hay)
+    refresh_active_embedding()
+    asyncio.run(run(document_ids, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,11 @@ from ..tools.dns_tool import DNSTool
 from ..agent.router import NetMindAgent
 from ..agent.llm_client import LLMClient
 from ..core.cache import cache_result
+from ..core.answer_stream import get_stream_callback
+from ..agent.speculation import get_speculation
+from ..settings import settings
 import re
+import asyncio
 import logging
 import time
 
@@ -33,6 +37,9 @@ ip_tool = IPTool()
 dns_tool = DNSTool()
 llm = LLMClient()
 
+# Límite del prompt del usuario que reciben las herramientas
+MAX_PROMPT_LENGTH = 2000
+
 
 # ---------------------------------------------------------
 # Helpers para conversión de estado
@@ -202,7 +209,7 @@ def add_thought(thought_chain: List[Dict[str, Any]], node_name: str, action: str
 # Nodos del grafo
 # ---------------------------------------------------------
 
-def planner_node(state: GraphState) -> Dict[str, Any]:
+async def planner_node(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
     """
     Analiza el mensaje del usuario y define el plan de ejecución.
     
@@ -212,6 +219,9 @@ def planner_node(state: GraphState) -> Dict[str, Any]:
     
     NO debe acceder ni modificar otros campos del state.
     
+    Con rag_speculative_retrieval, la búsqueda del RAG se lanza en paralelo con el
+    router y el Ejecutor la reutiliza si el plan incluye un paso RAG.
+    
     Retorna un diccionario parcial con solo los campos modificados para que
     LangGraph propague correctamente los valores con LastValue.
     """
@@ -225,14 +235,22 @@ def planner_node(state: GraphState) -> Dict[str, Any]:
     # Convertir messages a AgentState para el router (solo contexto necesario)
     context = messages_to_agent_state(state.messages)
     
-    # Usar el router para generar el plan
+    # Búsqueda especulativa con la misma consulta que recibirá el paso RAG
+    speculation = get_speculation(config)
+    if speculation is not None:
+        rag_prompt = user_prompt[:MAX_PROMPT_LENGTH] + "..." if len(user_prompt) > MAX_PROMPT_LENGTH else user_prompt
+        speculation.start(rag_tool, rag_prompt)
+    
+    # Usar el router para generar el plan (síncrono: en un hilo para no bloquear la especulación)
     router = NetMindAgent()
-    decision = router.decide(user_prompt, context)
+    decision = await asyncio.to_thread(router.decide, user_prompt, context)
     
     # Verificar si la pregunta fue rechazada por estar fuera de tema
     if decision.get("rejection_message"):
         rejection_msg = decision.get("rejection_message")
         logger.info(f"[Planner] Pregunta rechazada: {rejection_msg}")
+        if speculation is not None:
+            speculation.discard("pregunta rechazada")
         
         thought_chain = add_thought(
             state.thought_chain or [],
@@ -251,6 +269,8 @@ def planner_node(state: GraphState) -> Dict[str, Any]:
         }
     
     plan_steps = decision.get("plan_steps", [])
+    if speculation is not None and not any(_extract_tool_from_step(step) == "rag" for step in plan_steps):
+        speculation.discard()
     
     # Registrar pensamiento: plan generado (consolidado)
     thought_chain = add_thought(
@@ -363,7 +383,7 @@ def orchestrator_node(state: GraphState) -> Dict[str, Any]:
     }
 
 
-def ejecutor_agent_node(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+async def ejecutor_agent_node(state: GraphState, config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
     """
     Agente Ejecutor: Ejecuta las herramientas (RAG e IP) según el plan.
     Combina la selección de herramienta y su ejecución en un solo nodo.
@@ -382,10 +402,10 @@ def ejecutor_agent_node(state: GraphState, config: Optional[RunnableConfig] = No
     """
     thought_chain = state.thought_chain or []
 
-    # Obtener callback de streaming si existe
-    stream_callback = None
-    if config and "configurable" in config:
-        stream_callback = config["configurable"].get("stream_callback")
+    # Callback de tokens: el RAG transmite su respuesta mientras se genera
+    stream_callback = get_stream_callback(config, "rag")
+    # Búsqueda especulativa lanzada por el Planner (si está activa)
+    speculation = get_speculation(config)
     
     # Extraer el paso actual del plan
     plan_steps_copy = list(state.plan_steps or [])
@@ -405,7 +425,6 @@ def ejecutor_agent_node(state: GraphState, config: Optional[RunnableConfig] = No
     user_prompt = get_user_prompt_from_messages(state.messages)
     
     # Limitar tamaño del prompt para evitar problemas de memoria
-    MAX_PROMPT_LENGTH = 2000
     if len(user_prompt) > MAX_PROMPT_LENGTH:
         user_prompt = user_prompt[:MAX_PROMPT_LENGTH] + "..."
     
@@ -415,12 +434,17 @@ def ejecutor_agent_node(state: GraphState, config: Optional[RunnableConfig] = No
     
     # Ejecutar la herramienta correspondiente
     try:
+        # RAG es asíncrono nativo; IP y DNS son síncronos (red/subprocesos) y van a un hilo
         if tool_name == "ip":
-            result = execute_ip_tool(current_step, user_prompt, state.messages, stream_callback=stream_callback)
+            result = await asyncio.to_thread(execute_ip_tool, current_step, user_prompt, state.messages, stream_callback=stream_callback)
         elif tool_name == "rag":
-            result = execute_rag_tool(current_step, user_prompt, state.messages, stream_callback=stream_callback)
+            result = await execute_rag_tool(
+                current_step, user_prompt, state.messages,
+                stream_callback=stream_callback,
+                speculation=speculation
+            )
         elif tool_name == "dns":
-            result = execute_dns_tool(current_step, user_prompt, state.messages, stream_callback=stream_callback)
+            result = await asyncio.to_thread(execute_dns_tool, current_step, user_prompt, state.messages, stream_callback=stream_callback)
         else:
             result = {"error": "tool_not_found"}
     except Exception as e:
@@ -663,7 +687,10 @@ Genera la respuesta con el disclaimer y la información técnica completa:
 """
         try:
             # ASYNC CHANGE
-            fallback_output = await llm.agenerate(fallback_prompt)
+            fallback_output = await llm.agenerate(
+                fallback_prompt,
+                stream_callback=get_stream_callback(config, "supervisor", reason="fallback")
+            )
             thought_chain = add_thought(
                 thought_chain,
                 "Supervisor",
@@ -680,11 +707,6 @@ Genera la respuesta con el disclaimer y la información técnica completa:
             logger.error(f"[Supervisor] Error en fallback de conocimiento general: {e}")
             # Si falla, continuar con flujo normal (probablemente mejorará la respuesta "no se" original)
     
-    # Obtener callback de streaming si existe (para mejoras)
-    stream_callback = None
-    if config and "configurable" in config:
-        stream_callback = config["configurable"].get("stream_callback")
-
     # Validar calidad de la respuesta usando LLM
     quality_prompt = f"""
 Evalúa la siguiente respuesta generada para el usuario y determina:
@@ -806,7 +828,7 @@ Respuesta mejorada (clara, natural, adaptada a la complejidad y fiel a la inform
                 # ASYNC CHANGE
                 improved_output = await llm.agenerate(
                     improvement_prompt, 
-                    stream_callback=stream_callback
+                    stream_callback=get_stream_callback(config, "supervisor", reason="improvement")
                 )
                 thought_chain = add_thought(
                     thought_chain,
@@ -875,7 +897,7 @@ Respuesta ajustada (adaptada a la complejidad, natural y fiel a la información)
                     # ASYNC CHANGE
                     shortened = await llm.agenerate(
                         shortening_prompt,
-                        stream_callback=stream_callback
+                        stream_callback=get_stream_callback(config, "supervisor", reason="shortening")
                     )
                     supervised_output = shortened.strip()
                     
@@ -965,10 +987,8 @@ async def synthesizer_node(state: GraphState, config: Optional[RunnableConfig] =
     results = state.results or []
     thought_chain = state.thought_chain or []
     
-    # Obtener callback de streaming si existe
-    stream_callback = None
-    if config and "configurable" in config:
-        stream_callback = config["configurable"].get("stream_callback")
+    # Callback de tokens: si el RAG ya transmitió su respuesta, la síntesis la reemplaza en el cliente
+    stream_callback = get_stream_callback(config, "synthesizer", reason="synthesis")
     
     # Verificar si hay un mensaje de rechazo (pregunta fuera de tema)
     rejection_message = getattr(state, 'rejection_message', None)
@@ -1025,6 +1045,21 @@ async def synthesizer_node(state: GraphState, config: Optional[RunnableConfig] =
             if isinstance(r, dict) and 'answer' in r:
                 rag_answers.append(r['answer'])
         
+        # Respuesta del RAG ya transmitida al cliente: usarla como definitiva sin re-sintetizar
+        streamed_rag = [r for r in results if isinstance(r, dict) and 'answer' in r and r.get('streamed')]
+        if settings.rag_stream_is_final and len(rag_answers) == 1 and len(streamed_rag) == 1 and not streamed_rag[0].get('error'):
+            thought_chain = add_thought(
+                thought_chain,
+                "Sintetizador",
+                "Síntesis: solo RAG (transmitida)",
+                "La respuesta del RAG ya se transmitió y se usa como definitiva",
+                "success"
+            )
+            return {
+                "final_output": rag_answers[0].strip(),
+                "thought_chain": thought_chain
+            }
+        
         if rag_answers:
             # Combinar respuestas si hay múltiples
             combined_raw = "\n\n".join(rag_answers).strip()
@@ -0,0 +1,160 @@
+"""
+Recuperación especulativa del RAG en paralelo con el Planner.
+
+El Planner espera la decisión del router (una llamada al LLM) antes de que el
+Ejecutor empiece la búsqueda, así que la latencia de la recuperación se suma a la del
+router. En modo especulativo (settings.rag_speculative_retrieval) el Planner lanza el
+embedding de la pregunta y la búsqueda híbrida en una tarea en segundo plano; el paso
+RAG la consume si el plan lo incluye y, si no, la tarea se cancela o se descarta.
+
+El estado especulativo vive en el config de la petición (configurable["speculation"]),
+igual que el AnswerStream del streaming.
+"""
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from ..settings import settings
+from ..core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculationStats:
+    """Tasa de acierto de la especulación y tiempo de reloj ahorrado"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.cancelled = 0
+        self.discarded = 0
+        self.failed = 0
+        self.saved_ms = 0.0
+        self.wasted_ms = 0.0
+
+    def record(self, outcome: str, saved_ms: float = 0.0, wasted_ms: float = 0.0):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.saved_ms += saved_ms
+            self.wasted_ms += wasted_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "cancelled": self.cancelled,
+                "discarded": self.discarded,
+                "failed": self.failed,
+                "hit_rate": round(self.hits / self.started, 4) if self.started else 0.0,
+                "saved_ms_total": round(self.saved_ms, 1),
+                "avg_saved_ms_per_hit": round(self.saved_ms / self.hits, 1) if self.hits else 0.0,
+                # Tiempo de búsqueda invertido en especulaciones que no se usaron
+                "wasted_ms_total": round(self.wasted_ms, 1),
+            }
+
+
+class SpeculativeRetrieval:
+    """
+    Búsqueda especulativa de una petición.
+    Solo se reutiliza para exactamente la misma consulta y top_k con que se lanzó.
+    """
+
+    def __init__(self, stats: Optional[SpeculationStats] = None):
+        self._stats = stats or get_speculation_stats()
+        self._task: Optional[asyncio.Task] = None
+        self._key: Optional[Tuple[str, int]] = None
+        self._duration_ms: Optional[float] = None
+        self._closed = False
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None and not self._closed
+
+    def start(self, rag_tool, query_text: str, top_k: int = 12):
+        """
+        Lanza embedding + búsqueda híbrida en segundo plano (no bloquea).
+
+        Args:
+            rag_tool: Instancia de RAGTool que ejecutará la búsqueda
+            query_text: Consulta tal como la recibirá rag_tool.aquery()
+            top_k: top_k con el que se llamará a rag_tool.aquery()
+        """
+        if self._task is not None or not settings.rag_speculative_retrieval or not query_text:
+            return
+        self._key = (query_text, top_k)
+        self._task = asyncio.create_task(self._run(rag_tool, query_text, top_k))
+        self._stats.record("started")
+        logger.debug(f"[Speculation] Búsqueda especulativa lanzada para: '{query_text[:50]}...'")
+
+    async def _run(self, rag_tool, query_text: str, top_k: int) -> Tuple[List[Dict], bool]:
+        start = time.perf_counter()
+        try:
+            return await rag_tool._hybrid_search(query_text, rag_tool._extract_keywords(query_text), top_k)
+        finally:
+            self._duration_ms = (time.perf_counter() - start) * 1000
+
+    async def consume(self, query_text: str, top_k: int) -> Optional[Tuple[List[Dict], bool]]:
+        """
+        Entrega el resultado especulativo si corresponde a esta búsqueda.
+
+        Returns:
+            Tupla (hits, fused) como RAGTool._hybrid_search, o None si no hay especulación utilizable
+        """
+        if not self.active:
+            return None
+        if self._key != (query_text, top_k):
+            self.discard("la consulta del paso RAG no coincide")
+            return None
+
+        self._closed = True
+        wait_start = time.perf_counter()
+        try:
+            hits, fused = await self._task
+        except Exception as e:
+            logger.warning(f"[Speculation] La búsqueda especulativa falló, se repite en el paso RAG: {e}")
+            self._stats.record("failed")
+            return None
+        waited_ms = (time.perf_counter() - wait_start) * 1000
+        # Lo ahorrado es la parte de la búsqueda que ya había corrido antes de necesitarla
+        saved_ms = max(0.0, (self._duration_ms or 0.0) - waited_ms)
+        self._stats.record("hits", saved_ms=saved_ms)
+        logger.info(f"[Speculation] Búsqueda especulativa reutilizada ({len(hits)} hits, {saved_ms:.0f} ms ahorrados)")
+        return hits, fused
+
+    def discard(self, reason: str = "el plan no usa RAG"):
+        """Cancela la búsqueda si sigue en curso o descarta su resultado. Idempotente."""
+        if not self.active:
+            return
+        self._closed = True
+        if not self._task.done():
+            self._task.cancel()
+            self._stats.record("cancelled")
+        else:
+            if not self._task.cancelled() and self._task.exception() is not None:
+                self._stats.record("failed")
+            else:
+                self._stats.record("discarded", wasted_ms=self._duration_ms or 0.0)
+        logger.debug(f"[Speculation] Especulación descartada: {reason}")
+
+
+def get_speculation(config: Optional[Dict]) -> Optional[SpeculativeRetrieval]:
+    """Obtiene la especulación de la petición desde el config de LangGraph (si existe)"""
+    if not config or "configurable" not in config:
+        return None
+    return config["configurable"].get("speculation")
+
+
+# Métricas globales de especulación
+_speculation_stats: Optional[SpeculationStats] = None
+
+
+def get_speculation_stats() -> SpeculationStats:
+    """Obtiene la instancia global de métricas de especulación."""
+    global _speculation_stats
+    if _speculation_stats is None:
+        _speculation_stats = SpeculationStats()
+        register_metrics("speculative_retrieval", _speculation_stats.stats)
+    return _speculation_stats
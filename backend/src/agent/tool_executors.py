@@ -537,15 +537,19 @@ Responde con los nombres (uno por línea):
     return hosts
 
 
-def execute_rag_tool(step: str, prompt: str, messages: List[AnyMessage], stream_callback=None) -> Dict[str, Any]:
+async def execute_rag_tool(step: str, prompt: str, messages: List[AnyMessage], stream_callback=None, speculation=None) -> Dict[str, Any]:
     """
     Ejecuta la herramienta RAG.
+    Es asíncrona de extremo a extremo: espera rag_tool.aquery() directamente en el
+    event loop del grafo, sin crear hilos ni event loops por consulta.
     
     Args:
         step: Paso del plan actual
         prompt: Prompt del usuario
         messages: Mensajes de la conversación
-        stream_callback: Callback opcional para streaming de resultados (no usado aquí, el streaming se hace en synthesizer)
+        stream_callback: Callback opcional de tokens; la respuesta del RAG se transmite mientras se genera
+            y el resultado queda marcado con "streamed"
+        speculation: Búsqueda especulativa lanzada por el Planner (SpeculativeRetrieval, opcional)
     
     Returns:
         Resultado de la ejecución
@@ -600,7 +604,7 @@ Ejemplos de "nueva" (usar RAG):
 
 Responde SOLO con una palabra: "seguimiento" o "nueva".
 """
-                llm_response = llm.generate(followup_detection_prompt).strip().lower()
+                llm_response = (await llm.agenerate(followup_detection_prompt)).strip().lower()
                 
                 # Solo considerar seguimiento si el LLM es MUY claro y específico
                 # Si hay cualquier ambigüedad, usar RAG (prioridad a RAG)
@@ -640,7 +644,7 @@ Responde SOLO con una palabra: "seguimiento" o "nueva".
                 from ..core.cache import cache_result
                 
                 @cache_result("conversation_context", ttl=1800)
-                def generate_from_context(context: str, user_prompt: str) -> str:
+                async def generate_from_context(context: str, user_prompt: str) -> str:
                     followup_prompt = f"""
 Basándote en la siguiente conversación previa, responde la pregunta del usuario de forma DIRECTA, PRECISA y COMPACTA.
 
@@ -666,9 +670,9 @@ Pregunta del usuario: {user_prompt}
 
 Respuesta (directa, precisa, con valores EXACTOS del contexto):
 """
-                    return llm.generate(followup_prompt).strip()
+                    return (await llm.agenerate(followup_prompt)).strip()
                 
-                answer = generate_from_context(context_text, prompt)
+                answer = await generate_from_context(context_text, prompt)
                 # Para RAGAS: usar el contexto de conversación como contexto si no hay documentos
                 # Esto permite evaluar faithfulness y relevancy incluso en seguimientos
                 conversation_contexts = [context_text] if context_text else []
@@ -699,11 +703,16 @@ Respuesta (directa, precisa, con valores EXACTOS del contexto):
     
     # SIEMPRE buscar en documentos - el contexto de conversación es solo complementario
     try:
-        logger.info(f"[RAG] Llamando a rag_tool.query() con prompt: {prompt[:100]}...")
-        result = rag_tool.query(prompt, conversation_context=conversation_context_for_rag)
-        logger.info(f"[RAG] rag_tool.query() retornó: {type(result)}, claves: {list(result.keys()) if isinstance(result, dict) else 'N/A'}")
+        logger.info(f"[RAG] Llamando a rag_tool.aquery() con prompt: {prompt[:100]}...")
+        result = await rag_tool.aquery(
+            prompt,
+            conversation_context=conversation_context_for_rag,
+            stream_callback=stream_callback,
+            speculation=speculation
+        )
+        logger.info(f"[RAG] rag_tool.aquery() retornó: {type(result)}, claves: {list(result.keys()) if isinstance(result, dict) else 'N/A'}")
     except Exception as e:
-        logger.error(f"[RAG] ❌ ERROR CRÍTICO al ejecutar rag_tool.query(): {e}", exc_info=True)
+        logger.error(f"[RAG] ❌ ERROR CRÍTICO al ejecutar rag_tool.aquery(): {e}", exc_info=True)
         # Retornar un resultado con error pero con estructura válida para RAGAS
         result = {
             "answer": f"Error al buscar información en los documentos: {str(e)}",
@@ -765,7 +774,7 @@ Pregunta del usuario: {prompt}
 
 Respuesta (directa y compacta):
 """
-                    answer = llm.generate(followup_prompt).strip()
+                    answer = (await llm.agenerate(followup_prompt)).strip()
                     # Para RAGAS: usar el contexto de conversación como contexto si no hay documentos
                     conversation_contexts = [context_text] if context_text else []
                     return {
@@ -9,6 +9,7 @@ from ..models.schemas import Message, AgentQuery, SimpleQuery
 from ..core.state_manager import SessionManager, get_session_manager
 from ..core.graph_state import GraphState
 from ..agent.agent_graph import graph
+from ..agent.speculation import SpeculativeRetrieval
 from ..settings import settings
 
 router = APIRouter(prefix="/agent", tags=["agent"])
@@ -124,8 +125,10 @@ async def agent_query(
         # Ejecutar el grafo completo de forma asíncrona
         # OPTIMIZACIÓN: Usar ainvoke() en lugar de invoke() para procesamiento asíncrono
         logging.info(f"[API] Iniciando ejecución del grafo para sesión {query.session_id}, mensaje: {user_message[:50]}...")
+        # Búsqueda especulativa del RAG de esta petición (solo actúa con rag_speculative_retrieval)
+        speculation = SpeculativeRetrieval()
         try:
-            final_state = await graph.ainvoke(initial_state)
+            final_state = await graph.ainvoke(initial_state, config={"configurable": {"speculation": speculation}})
             logging.info(f"[API] Grafo ejecutado exitosamente para sesión {query.session_id}")
         except Exception as e:
             logging.error(f"[API] Error al ejecutar el grafo para sesión {query.session_id}: {str(e)}", exc_info=True)
@@ -133,6 +136,9 @@ async def agent_query(
                 status_code=500,
                 detail=f"Error al ejecutar el agente: {str(e)}"
             )
+        finally:
+            # Una especulación que ningún paso consumió se cancela o descarta
+            speculation.discard("la petición terminó sin consumirla")
 
         # Obtener la respuesta final del grafo
         supervised_output = final_state.get('supervised_output')
@@ -1,91 +1,295 @@
 """
 API endpoints para gestión de archivos - Refactorizado para usar repositorios
 """
+import os
+import asyncio
 import logging
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+import zipfile
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Response
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session as SQLSession
-from ..models.schemas import FileUploadResponse, FileListResponse
-from ..models.database import get_db
+from ..models.schemas import (
+    IngestionJobResponse,
+    BulkIngestionItem,
+    BulkIngestionResponse,
+    IngestionBatchResponse,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    FileListResponse
+)
+from ..models.database import get_db, SessionLocal
 from ..repositories.document_repository import DocumentRepository
-from ..repositories.qdrant_repository import get_qdrant_repository
-from ..services.embeddings_service import process_and_store_pdf, delete_by_id
-from datetime import datetime
+from ..repositories.tombstone_repository import get_tombstone_repository
+from ..services.embeddings_service import find_document_by_file_hash
+from ..services.document_gc import get_document_gc
+from ..services.ingestion_jobs import get_ingestion_job_manager, JobQueueFullError
+from ..core.semantic_cache import invalidate_semantic_cache
+from ..core.cache import get_cache_manager
+from ..settings import settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/files", tags=["files"])
 
+
+def _invalidate_answer_caches():
+    """Invalida las respuestas RAG cacheadas (exactas y semánticas) tras un cambio en el corpus."""
+    try:
+        invalidate_semantic_cache()
+        get_cache_manager().clear_prefix("rag")
+    except Exception as e:
+        logger.warning(f"Error al invalidar caches de respuestas RAG: {e}")
+
 # Instancias de repositorios
 document_repo = DocumentRepository()
-qdrant_repo = get_qdrant_repository()
 
-@router.post("/upload", status_code=201, response_model=FileUploadResponse)
-async def upload_pdf(
-    file: UploadFile = File(...),
-    db: SQLSession = Depends(get_db)
-):
+def _find_duplicate(file_hash: str, filename: str) -> Optional[dict]:
+    """Job de un archivo con el mismo contenido ya indexado o en ingesta (None si es nuevo)."""
+    manager = get_ingestion_job_manager()
+    active = manager.find_active(file_hash)
+    if active is not None:
+        return {**active, "duplicate": True}
+
+    document_id = find_document_by_file_hash(file_hash)
+    if document_id is None:
+        return None
+    # Solo cuenta si la ingesta anterior terminó (tiene metadatos en BD)
+    db = SessionLocal()
+    try:
+        if document_repo.get_document_by_id(db, document_id) is None:
+            return None
+    finally:
+        db.close()
+    return manager.register_duplicate(document_id, filename, file_hash)
+
+
+@router.post("/upload", status_code=202, response_model=IngestionJobResponse)
+async def upload_pdf(response: Response, file: UploadFile = File(...)):
     """
-    Sube y procesa un archivo PDF.
-    Guarda el archivo, genera embeddings y almacena metadatos en BD.
+    Sube un archivo PDF y lanza su ingesta en segundo plano.
+    Responde 202 con el job de ingesta; el progreso se consulta en GET /files/jobs/{job_id}.
+    Si el mismo contenido ya está indexado responde 200 con un job terminado (duplicate=true).
     """
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
 
-    # Leer contenido del archivo
-    content = await file.read()
     logger.info(f"Iniciando procesamiento de archivo: {file.filename}")
     
-    # Guardar archivo usando el repositorio
-    document_id, file_path = document_repo.save_file(content, file.filename)
-    logger.info(f"Archivo guardado. Document ID: {document_id}, Path: {file_path}")
+    # Copiar la subida al directorio de uploads por bloques en un hilo (sin cargarla en
+    # memoria ni bloquear el event loop), calculando el SHA-256 y el tamaño en la copia
+    document_id, file_path, file_hash, size = await asyncio.to_thread(
+        document_repo.save_stream, file.file, file.filename
+    )
+    logger.info(f"Archivo guardado ({size} bytes). Document ID: {document_id}, Path: {file_path}")
     
-    # Procesar PDF (chunk + embeddings + store en Qdrant)
-    chunk_count = 0
     try:
-        # Obtener número de puntos antes de insertar
-        collection_info_before = qdrant_repo.get_collection_info()
-        points_before = collection_info_before.get('points_count', 0) if isinstance(collection_info_before, dict) else 0
-        
-        processed_doc_id = await process_and_store_pdf(file_path, document_id=document_id)
-        logger.info(f"PDF procesado exitosamente. Document ID: {processed_doc_id}")
-        
-        # Verificar que los datos se insertaron en Qdrant
-        collection_info_after = qdrant_repo.get_collection_info()
-        if "error" in collection_info_after:
-            logger.warning(f"Error al verificar colección Qdrant: {collection_info_after['error']}")
-        else:
-            points_after = collection_info_after.get('points_count', 0)
-            chunk_count = points_after - points_before
-            logger.info(f"✅ Colección Qdrant verificada. Puntos antes: {points_before}, después: {points_after}, nuevos chunks: {chunk_count}")
-            
-            if chunk_count == 0:
-                logger.error(f"❌ ERROR CRÍTICO: No se insertaron chunks en Qdrant. Puntos antes: {points_before}, después: {points_after}")
-                raise ValueError("No se insertaron chunks en Qdrant. Verifica los logs para más detalles.")
-    except Exception as e:
-        logger.error(f"Error al procesar PDF: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Error al procesar el PDF: {str(e)}"
+        job, status_code = await _start_ingestion(document_id, file_path, file.filename, file_hash)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    response.status_code = status_code
+    return IngestionJobResponse(**job, status_url=f"{router.prefix}/jobs/{job['job_id']}")
+
+
+async def _start_ingestion(document_id: str, file_path: str, filename: str, file_hash: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Lanza la ingesta de un archivo ya guardado (o reutiliza la de un duplicado).
+
+    Returns:
+        (job, código HTTP): 202 si queda en cola o en curso, 200 si el contenido ya estaba indexado
+
+    Raises:
+        JobQueueFullError: Si la cola de ingesta está llena (el archivo guardado se elimina)
+    """
+    if settings.ingest_dedup_enabled:
+        duplicate = await asyncio.to_thread(_find_duplicate, file_hash, filename)
+        if duplicate is not None:
+            await asyncio.to_thread(document_repo.delete_file, document_id)
+            return duplicate, 200 if duplicate["status"] == "done" else 202
+
+    # Chunk + embeddings + store en Qdrant en segundo plano; el job recibe la ruta del archivo guardado
+    try:
+        job = get_ingestion_job_manager().submit(
+            file_path,
+            filename,
+            document_id,
+            on_complete=_finalize_ingestion,
+            on_failure=_discard_failed_upload,
+            file_hash=file_hash
         )
-    
-    # Guardar metadatos en BD
-    document_repo.create_document_metadata(
-        db=db,
-        document_id=document_id,
-        filename=file.filename,
-        file_path=file_path,
-        chunk_count=chunk_count,
-        source=file.filename
+    except JobQueueFullError:
+        await asyncio.to_thread(document_repo.delete_file, document_id)
+        raise
+    return job, 202
+
+
+def _is_pdf_member(info: zipfile.ZipInfo) -> bool:
+    """Entradas de un ZIP que se ingieren: PDFs, sin directorios, ocultos ni metadatos de macOS"""
+    name = info.filename.replace("\\", "/")
+    parts = name.split("/")
+    if info.is_dir() or "__MACOSX" in parts or any(part.startswith(".") for part in parts if part):
+        return False
+    return name.lower().endswith(".pdf")
+
+
+def _save_zip_members(source, budget: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Extrae los PDFs de un ZIP al directorio de uploads por bloques (sin descomprimirlo en memoria).
+
+    Los límites de archivos y de bytes se comprueban con los tamaños declarados antes de
+    extraer cada entrada, lo que acota también los ZIP con mucha compresión.
+
+    Args:
+        source: Archivo ZIP abierto (binario, con seek)
+        budget: Archivos y bytes restantes de la subida ("files", "bytes"); se descuentan
+
+    Returns:
+        Un dict por entrada: filename y (document_id, file_path, file_hash) o error
+    """
+    entries: List[Dict[str, Any]] = []
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        return [{"error": "ZIP inválido"}]
+    with archive:
+        for info in archive.infolist():
+            if not _is_pdf_member(info):
+                continue
+            filename = os.path.basename(info.filename.replace("\\", "/"))
+            if budget["files"] <= 0:
+                entries.append({"filename": filename, "error": f"Se superó el máximo de {settings.bulk_upload_max_files} archivos"})
+                continue
+            if info.file_size > budget["bytes"]:
+                entries.append({"filename": filename, "error": "Se superó el tamaño máximo de la subida"})
+                continue
+            budget["files"] -= 1
+            budget["bytes"] -= info.file_size
+            try:
+                with archive.open(info) as member:
+                    document_id, file_path, file_hash, _ = document_repo.save_stream(member, filename)
+            except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+                # Entrada corrupta o cifrada: se descarta solo ese archivo
+                entries.append({"filename": filename, "error": f"No se pudo extraer: {e}"})
+                continue
+            entries.append({"filename": filename, "document_id": document_id, "file_path": file_path, "file_hash": file_hash})
+    return entries
+
+
+@router.post("/upload/bulk", status_code=202, response_model=BulkIngestionResponse)
+async def upload_bulk(files: List[UploadFile] = File(...)):
+    """
+    Sube varios PDFs (o ZIPs con PDFs) y lanza sus ingestas en paralelo.
+    Cada archivo es un job independiente con su propio estado; el estado conjunto y el
+    throughput agregado se consultan en GET /files/batches/{batch_id}.
+    Las ingestas concurrentes comparten los límites globales de peticiones de embeddings
+    y de upserts a la base vectorial.
+    """
+    budget = {"files": settings.bulk_upload_max_files, "bytes": settings.bulk_upload_max_bytes}
+    items: List[BulkIngestionItem] = []
+    job_ids: List[str] = []
+
+    async def start(document_id: str, file_path: str, filename: str, file_hash: str):
+        try:
+            job, status_code = await _start_ingestion(document_id, file_path, filename, file_hash)
+        except JobQueueFullError as e:
+            items.append(BulkIngestionItem(filename=filename, status="rejected", error=str(e)))
+            return
+        job_ids.append(job["job_id"])
+        status = "duplicate" if job.get("duplicate") else "queued"
+        items.append(BulkIngestionItem(
+            filename=filename,
+            status=status,
+            job=IngestionJobResponse(**job, status_url=f"{router.prefix}/jobs/{job['job_id']}")
+        ))
+
+    for upload in files:
+        name = upload.filename or ""
+        if name.lower().endswith(".zip"):
+            entries = await asyncio.to_thread(_save_zip_members, upload.file, budget)
+            for entry in entries:
+                if "error" in entry:
+                    items.append(BulkIngestionItem(filename=entry.get("filename", name), status="invalid", error=entry["error"]))
+                else:
+                    await start(entry["document_id"], entry["file_path"], entry["filename"], entry["file_hash"])
+            continue
+        if not name.lower().endswith(".pdf"):
+            items.append(BulkIngestionItem(filename=name, status="invalid", error="Only PDF or ZIP files are accepted."))
+            continue
+        if budget["files"] <= 0:
+            items.append(BulkIngestionItem(filename=name, status="invalid", error=f"Se superó el máximo de {settings.bulk_upload_max_files} archivos"))
+            continue
+        document_id, file_path, file_hash, size = await asyncio.to_thread(document_repo.save_stream, upload.file, name)
+        budget["files"] -= 1
+        budget["bytes"] -= size
+        if budget["bytes"] < 0:
+            await asyncio.to_thread(document_repo.delete_file, document_id)
+            items.append(BulkIngestionItem(filename=name, status="invalid", error="Se superó el tamaño máximo de la subida"))
+            continue
+        await start(document_id, file_path, name, file_hash)
+
+    accepted = sum(1 for item in items if item.job is not None)
+    logger.info(f"Subida múltiple: {accepted} archivos aceptados de {len(items)}")
+    if not job_ids:
+        return BulkIngestionResponse(accepted=0, rejected=len(items), items=items)
+    batch_id = get_ingestion_job_manager().register_batch(job_ids)
+    return BulkIngestionResponse(
+        batch_id=batch_id,
+        accepted=accepted,
+        rejected=len(items) - accepted,
+        items=items,
+        status_url=f"{router.prefix}/batches/{batch_id}"
     )
+
+
+@router.get("/batches/{batch_id}", response_model=IngestionBatchResponse)
+async def get_ingestion_batch(batch_id: str):
+    """
+    Estado de una subida múltiple: jobs por estado, progreso y throughput agregado.
+    """
+    # Los jobs de otros workers se leen de Redis (E/S bloqueante): en un hilo
+    batch = await asyncio.to_thread(get_ingestion_job_manager().get_batch, batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return IngestionBatchResponse(**batch)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(job_id: str):
+    """
+    Estado de un job de ingesta: etapa, páginas/chunks procesados y ETA.
+    """
+    job = await asyncio.to_thread(get_ingestion_job_manager().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestionJobResponse(**job)
+
+
+def _finalize_ingestion(job: dict):
+    """
+    Tras una ingesta completa: guardar metadatos en BD e invalidar caches.
+    Si falla el registro en BD, el job retira los vectores ya insertados.
+    """
+    db = SessionLocal()
+    try:
+        file_path = document_repo.get_file_path(job["document_id"])
+        document_repo.create_document_metadata(
+            db=db,
+            document_id=job["document_id"],
+            filename=job["filename"],
+            file_path=str(file_path) if file_path else "",
+            chunk_count=job["chunks_stored"],
+            source=job["filename"]
+        )
+    finally:
+        db.close()
     
-    return FileUploadResponse(
-        document_id=document_id,
-        filename=file.filename,
-        status="processed",
-        uploaded_at=datetime.utcnow()
-    )
+    # El corpus cambió: las respuestas cacheadas pueden estar desactualizadas
+    _invalidate_answer_caches()
+
+
+def _discard_failed_upload(job: dict):
+    """Una ingesta fallida no deja el archivo subido huérfano."""
+    document_repo.delete_file(job["document_id"])
 
 
 @router.get("/", response_model=List[FileListResponse])
@@ -104,6 +308,37 @@ async def list_files(db: SQLSession = Depends(get_db)):
     ]
 
 
+def _delete_documents(db: SQLSession, document_ids: List[str]) -> BulkDeleteResponse:
+    """
+    Borra documentos sin esperar a eliminar sus vectores.
+    Escribe las tombstones (las búsquedas dejan de verlos al instante) y elimina los
+    metadatos; el recolector en segundo plano elimina después vectores y archivos.
+    """
+    document_ids = list(dict.fromkeys(document_ids))
+    docs = document_repo.get_documents_by_ids(db, document_ids)
+    found = {doc.document_id for doc in docs}
+    if docs:
+        get_tombstone_repository().add(db, [(doc.document_id, doc.filename) for doc in docs])
+        document_repo.delete_documents(db, list(found))
+        # El corpus cambió: las respuestas cacheadas pueden citar los documentos eliminados
+        _invalidate_answer_caches()
+        get_document_gc().wake()
+        logger.info(f"{len(docs)} documentos marcados como borrados; vectores pendientes de recolectar")
+    return BulkDeleteResponse(
+        deleted=[document_id for document_id in document_ids if document_id in found],
+        not_found=[document_id for document_id in document_ids if document_id not in found]
+    )
+
+
+@router.post("/delete", response_model=BulkDeleteResponse)
+async def delete_files(request: BulkDeleteRequest, db: SQLSession = Depends(get_db)):
+    """
+    Elimina varios archivos en una llamada.
+    Los documentos desaparecen de las búsquedas de inmediato; sus vectores se eliminan en segundo plano.
+    """
+    return await asyncio.to_thread(_delete_documents, db, request.document_ids)
+
+
 @router.delete("/{document_id}")
 async def delete_file(
     document_id: str,
@@ -111,31 +346,17 @@ async def delete_file(
 ):
     """
     Elimina un archivo y todos sus vectores asociados.
+    El documento desaparece de las búsquedas de inmediato; sus vectores se eliminan en segundo plano.
     """
-    # Verificar que el documento existe
     doc = document_repo.get_document_by_id(db, document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    filename = doc.filename
 
-    # Eliminar archivo del sistema de archivos
-    document_repo.delete_file(document_id)
-    
-    # Eliminar vectores de Qdrant (no crítico si falla)
-    try:
-        deleted = delete_by_id(document_id)
-        if not deleted:
-            logger.warning(f"No se pudieron eliminar vectores de Qdrant para document_id={document_id}, pero continuando...")
-        else:
-            logger.info(f"Vectores eliminados exitosamente de Qdrant para document_id={document_id}")
-    except Exception as e:
-        logger.error(f"Error al eliminar vectores de Qdrant para document_id={document_id}: {e}", exc_info=True)
-        # Continuar con la eliminación aunque falle Qdrant
-
-    # Eliminar metadatos de BD
-    document_repo.delete_document(db, document_id)
+    await asyncio.to_thread(_delete_documents, db, [document_id])
     
     return {
         "status": "deleted",
         "document_id": document_id,
-        "filename": doc.filename
-    }
\ No newline at end of file
+        "filename": filename
+    }
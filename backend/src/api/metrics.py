@@ -0,0 +1,15 @@
+"""
+API endpoint para consultar métricas de rendimiento (caches, batching, ingestión)
+"""
+from fastapi import APIRouter
+from ..core.metrics import collect_metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/")
+async def get_metrics():
+    """
+    Retorna las métricas de rendimiento de los componentes registrados.
+    """
+    return collect_metrics()
@@ -1,5 +1,8 @@
 """
 Módulo para streaming de respuestas usando Server-Sent Events (SSE)
+
+Eventos: stream_start / token (segmentos de respuesta, ver core/answer_stream.py),
+final_response (respuesta definitiva), error y done.
 """
 import json
 import logging
@@ -10,6 +13,8 @@ from langchain_core.messages import HumanMessage, AIMessage
 from ..models.schemas import Message, AgentQuery
 from ..core.state_manager import SessionManager, get_session_manager
 from ..core.graph_state import GraphState
+from ..core.answer_stream import AnswerStream
+from ..agent.speculation import SpeculativeRetrieval
 from ..agent.agent_graph import graph
 from ..settings import settings
 
@@ -36,13 +41,13 @@ async def stream_graph_execution(
     # Cola para comunicar eventos desde el grafo (thread/task de fondo) hacia el generador SSE
     event_queue = asyncio.Queue()
     
-    # Callback para streaming de tokens desde el LLM
-    def stream_callback(token):
-        if token:
-            event_queue.put_nowait({
-                "type": "token",
-                "content": token
-            })
+    # Segmentos de respuesta: el RAG hace streaming de su respuesta y los nodos
+    # posteriores que la revisan abren un segmento nuevo que reemplaza al anterior
+    answer_stream = AnswerStream(event_queue.put_nowait)
+    # Callback plano para nodos que no declaran segmento propio
+    stream_callback = answer_stream.begin("agent")
+    # Búsqueda especulativa del RAG de esta petición (solo actúa con rag_speculative_retrieval)
+    speculation = SpeculativeRetrieval()
     
     # Función wrapper para ejecutar el grafo en background
     async def run_graph():
@@ -50,7 +55,9 @@ async def stream_graph_execution(
             # Configurar callback para que los nodos (Synthesizer/Supervisor) puedan usarlo
             config = {
                 "configurable": {
-                    "stream_callback": stream_callback
+                    "stream_callback": stream_callback,
+                    "answer_stream": answer_stream,
+                    "speculation": speculation
                 }
             }
             
@@ -72,6 +79,8 @@ async def stream_graph_execution(
                 "error_type": type(e).__name__
             })
         finally:
+            # Una especulación que ningún paso consumió se cancela o descarta
+            speculation.discard("la petición terminó sin consumirla")
             # Señal de finalización
             event_queue.put_nowait({"type": "done"})
 
@@ -91,10 +100,24 @@ async def stream_graph_execution(
                 token_data = {
                     "type": "token",
                     "data": {
-                        "content": event.get("content")
+                        "content": event.get("content"),
+                        "stream_id": event.get("stream_id")
                     }
                 }
                 yield f"data: {json.dumps(token_data)}\n\n"
+            
+            elif event_type == "stream_start":
+                # Nuevo segmento de respuesta; si "replaces" no es null el cliente descarta el texto mostrado
+                start_data = {
+                    "type": "stream_start",
+                    "data": {
+                        "stream_id": event.get("stream_id"),
+                        "node": event.get("node"),
+                        "replaces": event.get("replaces"),
+                        "reason": event.get("reason"),
+                    }
+                }
+                yield f"data: {json.dumps(start_data)}\n\n"
                 
             elif event_type == "node_update":
                 # (Opcional) Si implementamos callbacks de nodos en el futuro
@@ -0,0 +1,91 @@
+"""
+Modelo y dimensiones de embeddings activos.
+
+Los vectores de la colección viva se calcularon con un modelo concreto y las consultas
+deben embeberse con el mismo. Un re-embedding (services/reembedding.py) construye una
+colección sombra con otro modelo y, al cambiar el alias, registra el nuevo modelo como
+activo en la base de datos: cada worker lo adopta al renovar su copia (como mucho cada
+settings.active_embedding_refresh_seconds), sin reiniciar ni cambiar la configuración.
+
+Sin re-embeddings completados (o con vector_backend = "local") se usan
+settings.embedding_model y settings.embedding_dimensions.
+"""
+import time
+import logging
+import threading
+from typing import Optional, Tuple
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_active: Optional[Tuple[str, int]] = None
+_loaded_at = 0.0
+_refreshing = False
+
+
+def _load() -> Optional[Tuple[str, int]]:
+    """Modelo y dimensiones del último re-embedding que cambió el alias (None si no hay)"""
+    # Importación diferida: los modelos de BD no deben cargarse al importar utilidades de embeddings
+    from ..models.database import SessionLocal, EmbeddingMigration
+    db = SessionLocal()
+    try:
+        migration = (
+            db.query(EmbeddingMigration)
+            .filter(EmbeddingMigration.status == "swapped")
+            .order_by(EmbeddingMigration.swapped_at.desc())
+            .first()
+        )
+        return (migration.model, migration.dimensions) if migration is not None else None
+    finally:
+        db.close()
+
+
+def refresh_active_embedding():
+    """
+    Relee el modelo activo de la base de datos (bloqueante). Se ejecuta en un hilo aparte
+    cuando la copia caduca y al arrancar la aplicación; los scripts pueden llamarlo directamente.
+    """
+    global _active, _loaded_at, _refreshing
+    try:
+        try:
+            active = _load()
+        except Exception as e:
+            # Sin base de datos se mantiene el último valor conocido
+            logger.debug(f"[ActiveEmbedding] Error al leer el modelo activo: {e}")
+            active = _active
+        with _lock:
+            if active != _active and active is not None:
+                logger.info(f"[ActiveEmbedding] Modelo de embeddings activo: {active[0]} ({active[1]} dimensiones)")
+            _active = active
+            _loaded_at = time.monotonic()
+    finally:
+        _refreshing = False
+
+
+def get_active_embedding() -> Tuple[str, int]:
+    """
+    Modelo y dimensiones con los que embeber consultas y chunks nuevos.
+    Nunca consulta la base de datos en el hilo que llama (se usa dentro del event loop):
+    si la copia caducó, la renovación se lanza en un hilo y se retorna el último valor conocido.
+
+    Returns:
+        (modelo, dimensiones)
+    """
+    global _refreshing
+    default = (settings.embedding_model, settings.embedding_dimensions)
+    if settings.vector_backend == "local":
+        return default
+    if time.monotonic() - _loaded_at >= settings.active_embedding_refresh_seconds:
+        with _lock:
+            start = not _refreshing
+            _refreshing = True
+        if start:
+            threading.Thread(target=refresh_active_embedding, name="active-embedding-refresh", daemon=True).start()
+    return _active or default
+
+
+def invalidate_active_embedding():
+    """Fuerza a releer el modelo activo en la siguiente llamada (p. ej. tras cambiar el alias)"""
+    global _loaded_at
+    _loaded_at = 0.0
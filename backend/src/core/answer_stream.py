@@ -0,0 +1,87 @@
+"""
+Protocolo de streaming de la respuesta hacia /agent/query/stream.
+
+Varios nodos del grafo pueden generar texto visible para el usuario: primero el RAG
+(streaming real de su respuesta), después el Synthesizer y el Supervisor pueden
+revisarla. Cada generación es un segmento identificado por stream_id:
+
+    {"type": "stream_start", "data": {"stream_id", "node", "replaces", "reason"}}
+    {"type": "token",        "data": {"content", "stream_id"}}
+
+Si stream_start trae "replaces" (id del segmento anterior que ya mostró tokens), el
+cliente debe descartar el texto mostrado y renderizar el nuevo segmento desde cero.
+El evento final_response sigue siendo la versión definitiva de la respuesta.
+"""
+import uuid
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerStream:
+    """
+    Emisor de segmentos de respuesta de una petición.
+    stream_start se emite con el primer token del segmento: un nodo que abre un
+    segmento y no genera nada no borra el texto ya mostrado.
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None]):
+        """
+        Args:
+            emit: Función que encola un evento hacia el generador SSE
+        """
+        self._emit = emit
+        self.current_id: Optional[str] = None
+        self.current_node: Optional[str] = None
+        self.segments = 0
+
+    def begin(self, node: str, reason: Optional[str] = None) -> Callable[[str], None]:
+        """
+        Abre un segmento de respuesta para un nodo.
+
+        Args:
+            node: Nodo que genera el texto ("rag", "synthesizer", "supervisor"...)
+            reason: Motivo de la revisión (opcional, informativo para el cliente)
+
+        Returns:
+            Callback que recibe cada token generado
+        """
+        stream_id = uuid.uuid4().hex[:12]
+        started = False
+
+        def on_token(token: str):
+            nonlocal started
+            if not token:
+                return
+            if not started:
+                started = True
+                replaces = self.current_id
+                self.current_id = stream_id
+                self.current_node = node
+                self.segments += 1
+                if replaces:
+                    logger.info(f"[AnswerStream] '{node}' revisa la respuesta de '{replaces}' ({reason or 'revisión'})")
+                self._emit({
+                    "type": "stream_start",
+                    "stream_id": stream_id,
+                    "node": node,
+                    "replaces": replaces,
+                    "reason": reason,
+                })
+            self._emit({"type": "token", "content": token, "stream_id": stream_id})
+
+        return on_token
+
+
+def get_stream_callback(config: Optional[Dict], node: str, reason: Optional[str] = None) -> Optional[Callable[[str], None]]:
+    """
+    Obtiene el callback de tokens para un nodo a partir del config de LangGraph.
+    Usa el AnswerStream de la petición si existe; si no, el stream_callback plano.
+    """
+    if not config or "configurable" not in config:
+        return None
+    answer_stream = config["configurable"].get("answer_stream")
+    if answer_stream is not None:
+        return answer_stream.begin(node, reason)
+    return config["configurable"].get("stream_callback")
@@ -0,0 +1,45 @@
+"""
+Clientes asíncronos ligados al event loop.
+Los clientes async (AsyncOpenAI, AsyncQdrantClient) mantienen pools de conexiones
+que pertenecen al event loop donde se crearon. Si un llamador síncrono ejecuta el
+pipeline en un loop temporal (asyncio.run en otro hilo), reutilizar el cliente del
+loop principal rompe el pool. Este módulo crea una instancia por event loop.
+"""
+import asyncio
+import threading
+import weakref
+from typing import Callable, Generic, TypeVar
+from openai import AsyncOpenAI
+from ..settings import settings
+
+T = TypeVar("T")
+
+
+class LoopBound(Generic[T]):
+    """
+    Fábrica que mantiene una instancia por event loop en ejecución.
+    En el servidor (un único loop) se comporta como un singleton.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Retorna la instancia del event loop actual (debe llamarse dentro de una corrutina)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            instance = self._instances.get(loop)
+            if instance is None:
+                instance = self._factory()
+                self._instances[loop] = instance
+            return instance
+
+
+_async_openai = LoopBound(lambda: AsyncOpenAI(api_key=settings.openai_api_key, max_retries=2))
+
+
+def get_async_openai() -> AsyncOpenAI:
+    """Cliente AsyncOpenAI del event loop actual."""
+    return _async_openai.get()
@@ -2,7 +2,10 @@
 Sistema de cache con Redis para mejorar el rendimiento
 """
 import json
+import time
 import hashlib
+import asyncio
+import inspect
 import logging
 from functools import wraps
 from typing import Any, Optional, Callable, TYPE_CHECKING
@@ -36,15 +39,36 @@ if TYPE_CHECKING:
 
 # Instancia global del cliente Redis
 _redis_client: Optional[Any] = None
+# Instante (monotonic) a partir del cual se reintenta la conexión tras un fallo (None = sin fallos)
+_redis_retry_at: Optional[float] = None
 _cache_enabled = True
 
+# Cliente Redis binario (sin decode_responses) para valores empaquetados
+_binary_redis_client: Optional[Any] = None
+_binary_redis_retry_at: Optional[float] = None
+
+
+def _retry_due(retry_at: Optional[float]) -> bool:
+    """True si nunca se intentó conectar o ya pasó el backoff del último fallo"""
+    return retry_at is None or time.monotonic() >= retry_at
+
+
+def redis_reconnect_due(binary: bool = False) -> bool:
+    """
+    Indica si una conexión a Redis falló y ya se puede reintentar.
+    Los singletons que guardan el cliente lo usan para recuperarlo cuando Redis vuelve,
+    sin pagar el timeout de conexión en cada llamada.
+    """
+    client, retry_at = (_binary_redis_client, _binary_redis_retry_at) if binary else (_redis_client, _redis_retry_at)
+    return client is None and retry_at is not None and time.monotonic() >= retry_at
+
 
 def get_redis_client() -> Optional[Any]:
     """
     Obtiene o crea la instancia del cliente Redis.
     Retorna None si Redis no está disponible o está deshabilitado.
     """
-    global _redis_client, _cache_enabled
+    global _redis_client, _redis_retry_at, _cache_enabled
     
     if not REDIS_AVAILABLE:
         _cache_enabled = False
@@ -63,7 +87,11 @@ def get_redis_client() -> Optional[Any]:
         _cache_enabled = False
         return None
     
-    if _redis_client is None:
+    # Tras un fallo se espera redis_retry_interval antes de reintentar: sin Redis no se
+    # repite el timeout en cada llamada, pero el cache se recupera cuando Redis vuelve
+    if _redis_client is None and _retry_due(_redis_retry_at):
+        # Se reserva el siguiente intento antes de conectar: las llamadas concurrentes no esperan el timeout
+        _redis_retry_at = time.monotonic() + settings.redis_retry_interval
         try:
             logger.info(f"Intentando conectar a Redis para cache: {_mask_redis_url(redis_connection_url)}")
             
@@ -89,10 +117,63 @@ def get_redis_client() -> Optional[Any]:
             _redis_client.ping()
             logger.info(f"✅ Conexión a Redis establecida correctamente para cache: {_mask_redis_url(redis_connection_url)}")
             _cache_enabled = True
+            _redis_retry_at = None
         except (redis.ConnectionError, redis.TimeoutError, Exception) as e:
-            logger.warning(f"⚠️ No se pudo conectar a Redis: {str(e)}. El cache estará deshabilitado.")
+            logger.warning(
+                f"⚠️ No se pudo conectar a Redis: {str(e)}. El cache estará deshabilitado "
+                f"(reintento en {settings.redis_retry_interval}s)."
+            )
             _cache_enabled = False
             _redis_client = None
+    return _redis_client
+
+
+def get_binary_redis_client() -> Optional[Any]:
+    """
+    Obtiene o crea un cliente Redis que devuelve bytes (decode_responses=False).
+    Necesario para valores binarios como vectores empaquetados, que no sobreviven
+    a la decodificación UTF-8 del cliente de cache principal.
+    Retorna None si Redis no está disponible o está deshabilitado.
+    """
+    global _binary_redis_client, _binary_redis_retry_at
+    
+    if _binary_redis_client is not None or not _retry_due(_binary_redis_retry_at):
+        return _binary_redis_client
+    
+    if not REDIS_AVAILABLE or not settings.cache_enabled:
+        return None
+    
+    redis_connection_url = _build_redis_url(settings.redis_url, settings.redis_token)
+    if not redis_connection_url:
+        return None
+    
+    _binary_redis_retry_at = time.monotonic() + settings.redis_retry_interval
+    try:
+        import ssl
+        ssl_params = {}
+        if redis_connection_url.startswith('rediss://'):
+            ssl_params = {
+                'ssl_cert_reqs': ssl.CERT_NONE,
+                'ssl_check_hostname': False
+            }
+        client = redis.from_url(
+            redis_connection_url,
+            decode_responses=False,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            **ssl_params
+        )
+        client.ping()
+        _binary_redis_client = client
+        _binary_redis_retry_at = None
+        logger.info(f"✅ Cliente Redis binario conectado: {_mask_redis_url(redis_connection_url)}")
+    except Exception as e:
+        logger.warning(
+            f"⚠️ No se pudo conectar el cliente Redis binario: {str(e)} "
+            f"(reintento en {settings.redis_retry_interval}s)"
+        )
+        _binary_redis_client = None
+    return _binary_redis_client
 
 
 def _build_redis_url(redis_url: Optional[str], redis_token: Optional[str]) -> Optional[str]:
@@ -284,6 +365,12 @@ def get_cache_manager() -> CacheManager:
     global _cache_manager
     if _cache_manager is None:
         _cache_manager = CacheManager()
+    elif not _cache_manager.enabled and redis_reconnect_due():
+        # Redis no estaba disponible al crear el gestor: reintentar tras el backoff
+        client = get_redis_client()
+        if client is not None:
+            _cache_manager.redis_client = client
+            _cache_manager.enabled = True
     return _cache_manager
 
 
@@ -302,6 +389,41 @@ def cache_result(prefix: str, ttl: int = 3600):
             return result
     """
     def decorator(func: Callable) -> Callable:
+        def _cache_key(cache_manager: CacheManager, args, kwargs) -> str:
+            # Para métodos de instancia, excluir 'self' de los argumentos para la clave de cache
+            # Solo usar los argumentos reales de la función (sin self)
+            cache_args = args[1:] if args and hasattr(args[0], '__class__') else args
+            return cache_manager.get_cache_key(prefix, *cache_args, **kwargs)
+        
+        def _store(cache_manager: CacheManager, cache_key: str, result: Any):
+            # Almacenar en cache (solo si no hay error)
+            if result and not (isinstance(result, dict) and result.get("error")):
+                cache_manager.set(cache_key, result, ttl)
+                logger.debug(f"Resultado almacenado en cache: {prefix} - {cache_key[:50]}...")
+        
+        # Las corrutinas necesitan un wrapper asíncrono: de lo contrario se cachearía
+        # el objeto corrutina en lugar de su resultado. El cliente Redis es síncrono, así
+        # que la lectura y la escritura se hacen en un hilo para no bloquear el event loop
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_manager = get_cache_manager()
+                if not cache_manager.enabled:
+                    return await func(*args, **kwargs)
+                
+                cache_key = _cache_key(cache_manager, args, kwargs)
+                cached = await asyncio.to_thread(cache_manager.get, cache_key)
+                if cached is not None:
+                    logger.info(f"Cache HIT: {prefix} - {cache_key[:50]}...")
+                    return cached
+                
+                logger.info(f"Cache MISS: {prefix} - {cache_key[:50]}...")
+                result = await func(*args, **kwargs)
+                await asyncio.to_thread(_store, cache_manager, cache_key, result)
+                return result
+            
+            return async_wrapper
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
             cache_manager = get_cache_manager()
@@ -310,12 +432,8 @@ def cache_result(prefix: str, ttl: int = 3600):
             if not cache_manager.enabled:
                 return func(*args, **kwargs)
             
-            # Para métodos de instancia, excluir 'self' de los argumentos para la clave de cache
-            # Solo usar los argumentos reales de la función (sin self)
-            cache_args = args[1:] if args and hasattr(args[0], '__class__') else args
-            
             # Generar clave de cache
-            cache_key = cache_manager.get_cache_key(prefix, *cache_args, **kwargs)
+            cache_key = _cache_key(cache_manager, args, kwargs)
             
             # Intentar obtener del cache
             cached = cache_manager.get(cache_key)
@@ -326,14 +444,9 @@ def cache_result(prefix: str, ttl: int = 3600):
             # Cache miss: ejecutar función y almacenar resultado
             logger.info(f"Cache MISS: {prefix} - {cache_key[:50]}...")
             result = func(*args, **kwargs)
-            
-            # Almacenar en cache (solo si no hay error)
-            if result and not (isinstance(result, dict) and result.get("error")):
-                cache_manager.set(cache_key, result, ttl)
-                logger.debug(f"Resultado almacenado en cache: {prefix} - {cache_key[:50]}...")
+            _store(cache_manager, cache_key, result)
             
             return result
         
         return wrapper
     return decorator
-
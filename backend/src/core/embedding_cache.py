@@ -0,0 +1,224 @@
+"""
+Cache de embeddings de consultas en dos niveles:
+1. LRU en memoria del proceso, acotado por bytes (vectores float32 compactos)
+2. Redis opcional, con vectores empaquetados como bytes float32/float16 en lugar de listas JSON
+
+La clave es (modelo, dimensiones, texto normalizado), de modo que un cambio de modelo
+o de dimensiones nunca devuelve vectores incompatibles.
+"""
+import time
+import struct
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from ..settings import settings
+from .cache import get_binary_redis_client, redis_reconnect_due
+from .metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "emb"
+
+# Formatos struct (little-endian) por tipo de dato soportado en Redis
+_PACK_FORMATS = {"float32": "f", "float16": "e"}
+
+# Sobrecarga aproximada por entrada del LRU (clave, nodo del OrderedDict, objeto array)
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza el texto para la clave: Unicode NFC y espacios colapsados."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def pack_vector(vector: List[float], dtype: str = "float32") -> bytes:
+    """Empaqueta un vector como bytes little-endian del tipo indicado."""
+    fmt = _PACK_FORMATS[dtype]
+    return struct.pack(f"<{len(vector)}{fmt}", *vector)
+
+
+def unpack_vector(data: bytes, dtype: str = "float32") -> List[float]:
+    """Desempaqueta bytes little-endian a una lista de floats."""
+    fmt = _PACK_FORMATS[dtype]
+    count = len(data) // struct.calcsize(fmt)
+    return list(struct.unpack(f"<{count}{fmt}", data))
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings con LRU en memoria acotado por bytes y nivel Redis opcional.
+    Thread-safe: embedding_for_text se invoca desde hilos (asyncio.to_thread).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        redis_client: Optional[Any] = None,
+        redis_dtype: str = "float32",
+        redis_ttl: int = 604800
+    ):
+        """
+        Inicializa el cache.
+
+        Args:
+            max_bytes: Tamaño máximo del LRU en memoria (en bytes)
+            redis_client: Cliente Redis binario (None para usar solo memoria)
+            redis_dtype: Tipo de empaquetado en Redis ("float32" o "float16")
+            redis_ttl: Tiempo de vida de las entradas en Redis (segundos)
+        """
+        if redis_dtype not in _PACK_FORMATS:
+            raise ValueError(f"redis_dtype no soportado: {redis_dtype} (usar 'float32' o 'float16')")
+
+        self.max_bytes = max_bytes
+        self.redis_client = redis_client
+        self.redis_dtype = redis_dtype
+        self.redis_ttl = redis_ttl
+
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        # Contadores de rendimiento
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._miss_latency_total = 0.0
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        """Clave estable a partir de (modelo, dimensiones, texto normalizado)."""
+        digest = hashlib.sha256(
+            f"{model}|{dimensions}|{normalize_text(text)}".encode("utf-8")
+        ).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{model}:{dimensions}:{digest}"
+
+    def get(self, model: str, dimensions: int, text: str) -> Optional[List[float]]:
+        """
+        Busca un embedding en memoria y, si no está, en Redis.
+
+        Returns:
+            El vector o None si no está cacheado
+        """
+        key = self.make_key(model, dimensions, text)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return cached.tolist()
+
+        if self.redis_client is not None:
+            try:
+                data = self.redis_client.get(key)
+                if data:
+                    vector = unpack_vector(data, self.redis_dtype)
+                    if len(vector) == dimensions:
+                        self._store_memory(key, vector)
+                        with self._lock:
+                            self.redis_hits += 1
+                        return vector
+            except Exception as e:
+                logger.warning(f"[EmbeddingCache] Error al leer de Redis: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, model: str, dimensions: int, text: str, vector: List[float]):
+        """Almacena un embedding en ambos niveles."""
+        key = self.make_key(model, dimensions, text)
+        self._store_memory(key, vector)
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.setex(key, self.redis_ttl, pack_vector(vector, self.redis_dtype))
+            except Exception as e:
+                logger.warning(f"[EmbeddingCache] Error al escribir en Redis: {e}")
+
+    def record_miss_latency(self, seconds: float):
+        """Registra la latencia de una llamada real a la API (para estimar el ahorro)."""
+        with self._lock:
+            self._miss_latency_total += seconds
+
+    def _store_memory(self, key: str, vector: List[float]):
+        packed = array("f", vector)
+        size = packed.itemsize * len(packed) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._current_bytes -= previous.itemsize * len(previous) + _ENTRY_OVERHEAD_BYTES
+            self._entries[key] = packed
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= evicted.itemsize * len(evicted) + _ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def clear(self):
+        """Vacía el nivel en memoria (Redis expira por TTL)."""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos y ahorro estimado de llamadas a la API de embeddings."""
+        with self._lock:
+            hits = self.memory_hits + self.redis_hits
+            lookups = hits + self.misses
+            avg_miss_ms = (self._miss_latency_total / self.misses * 1000) if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "api_calls_saved": hits,
+                "avg_api_latency_ms": round(avg_miss_ms, 1),
+                "estimated_ms_saved": round(hits * avg_miss_ms, 1),
+                "redis_enabled": self.redis_client is not None,
+                "redis_dtype": self.redis_dtype,
+            }
+
+
+# Instancia global del cache de embeddings
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Obtiene la instancia global del cache de embeddings.
+    Retorna None si está deshabilitado por configuración.
+    """
+    global _embedding_cache
+    if not settings.embedding_cache_enabled:
+        return None
+    if _embedding_cache is None:
+        redis_client = get_binary_redis_client() if settings.embedding_cache_redis_enabled else None
+        _embedding_cache = EmbeddingCache(
+            max_bytes=settings.embedding_cache_max_bytes,
+            redis_client=redis_client,
+            redis_dtype=settings.embedding_cache_redis_dtype,
+            redis_ttl=settings.embedding_cache_ttl
+        )
+        register_metrics("embedding_cache", _embedding_cache.stats)
+        logger.info(
+            f"[EmbeddingCache] Inicializado: max_bytes={settings.embedding_cache_max_bytes}, "
+            f"redis={'sí' if redis_client is not None else 'no'} ({settings.embedding_cache_redis_dtype})"
+        )
+    elif _embedding_cache.redis_client is None and settings.embedding_cache_redis_enabled and redis_reconnect_due(binary=True):
+        # Redis no estaba disponible al crear el cache: reintentar tras el backoff
+        _embedding_cache.redis_client = get_binary_redis_client()
+    return _embedding_cache
@@ -0,0 +1,39 @@
+"""
+Registro centralizado de métricas de rendimiento.
+Cada componente (caches, batchers, pipelines) registra una función que devuelve
+sus contadores actuales; el endpoint /metrics los expone juntos.
+"""
+import logging
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], Dict[str, Any]]):
+    """
+    Registra un proveedor de métricas.
+
+    Args:
+        name: Nombre del componente (ej: "embedding_cache")
+        provider: Función sin argumentos que retorna un diccionario serializable a JSON
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    Recolecta las métricas de todos los proveedores registrados.
+
+    Returns:
+        Diccionario {nombre_componente: métricas}
+    """
+    snapshot = {}
+    for name, provider in _providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            logger.warning(f"[Metrics] Error al obtener métricas de '{name}': {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
@@ -0,0 +1,124 @@
+"""
+Capa de conexión compartida con Qdrant.
+Todo el proceso usa un único QdrantClient (pool HTTP keep-alive o canal gRPC) y un
+AsyncQdrantClient por event loop, en lugar de que cada módulo cree sus propios clientes
+con normalización de URL duplicada.
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from ..settings import settings
+from .async_clients import LoopBound
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[QdrantClient] = None
+_client_lock = threading.Lock()
+
+
+def normalize_qdrant_url(url: str) -> str:
+    """
+    Normaliza la URL de Qdrant.
+    - Si es HTTPS, asegura que no tenga puerto duplicado
+    - Si tiene puerto :6333 en HTTPS, lo quita (Qdrant Cloud usa 443 por defecto)
+    """
+    if not url:
+        return url
+
+    # Si es HTTPS y tiene :6333, quitar el puerto (Qdrant Cloud usa 443)
+    if url.startswith('https://') and ':6333' in url:
+        url = url.replace(':6333', '')
+        logger.info(f"[QdrantConnection] URL normalizada (puerto 6333 removido para HTTPS): {mask_url(url)}")
+
+    return url
+
+
+def mask_url(url: str) -> str:
+    """Enmascara información sensible en la URL para logging."""
+    try:
+        parsed = urlparse(url)
+        if parsed.hostname:
+            # Mostrar solo el dominio, no el path completo
+            return f"{parsed.scheme}://{parsed.hostname}{':' + str(parsed.port) if parsed.port else ''}"
+        return url
+    except Exception:
+        return url
+
+
+def build_client_kwargs(prefer_grpc: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Construye los argumentos de QdrantClient/AsyncQdrantClient desde settings.
+
+    Args:
+        prefer_grpc: Fuerza el transporte (None = usar settings.qdrant_prefer_grpc)
+
+    Returns:
+        Diccionario de argumentos para el cliente
+    """
+    use_grpc = settings.qdrant_prefer_grpc if prefer_grpc is None else prefer_grpc
+    client_kwargs: Dict[str, Any] = {
+        "url": normalize_qdrant_url(settings.qdrant_url),
+        "prefer_grpc": use_grpc,
+        "timeout": settings.qdrant_timeout,
+    }
+
+    if settings.qdrant_api_key:
+        client_kwargs["api_key"] = settings.qdrant_api_key
+
+    if use_grpc:
+        client_kwargs["grpc_port"] = settings.qdrant_grpc_port
+        # Keep-alive del canal HTTP/2 para no renegociar TLS tras periodos de inactividad
+        client_kwargs["grpc_options"] = {
+            "grpc.keepalive_time_ms": 30000,
+            "grpc.keepalive_permit_without_calls": 1,
+        }
+    else:
+        try:
+            import httpx
+            # Pool keep-alive explícito: el cliente REST no reutiliza conexiones por defecto en todos los hosts
+            client_kwargs["limits"] = httpx.Limits(
+                max_connections=settings.qdrant_pool_size,
+                max_keepalive_connections=settings.qdrant_pool_size,
+                keepalive_expiry=60.0
+            )
+        except ImportError:
+            logger.warning("[QdrantConnection] httpx no disponible, usando límites por defecto del cliente REST")
+
+    return client_kwargs
+
+
+def _log_configuration(client_kwargs: Dict[str, Any]):
+    transport = f"gRPC (puerto {settings.qdrant_grpc_port})" if client_kwargs["prefer_grpc"] else "REST keep-alive"
+    logger.info(f"[QdrantConnection] URL: {mask_url(client_kwargs['url'])}, transporte: {transport}")
+    if not settings.qdrant_api_key:
+        logger.warning("[QdrantConnection] Configurando Qdrant sin API key - puede fallar si Qdrant Cloud requiere autenticación")
+
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Obtiene el cliente Qdrant síncrono compartido por todo el proceso.
+    Thread-safe: se usa desde hilos del executor y desde el event loop.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client_kwargs = build_client_kwargs()
+                _log_configuration(client_kwargs)
+                try:
+                    _client = QdrantClient(**client_kwargs)
+                    logger.info("[QdrantConnection] Cliente Qdrant compartido creado exitosamente")
+                except Exception as e:
+                    logger.error(f"[QdrantConnection] Error al crear cliente Qdrant: {e}")
+                    raise
+    return _client
+
+
+_async_clients = LoopBound(lambda: AsyncQdrantClient(**build_client_kwargs()))
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Obtiene el AsyncQdrantClient compartido del event loop actual."""
+    return _async_clients.get()
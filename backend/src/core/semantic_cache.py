@@ -0,0 +1,263 @@
+"""
+Cache semántico de respuestas RAG.
+Devuelve una respuesta previa cuando la nueva consulta es semánticamente equivalente
+(similitud coseno entre embeddings por encima de un umbral), por ejemplo
+"¿qué es DNS?" / "que es el dns" / "explícame DNS".
+
+Las entradas se guardan en una matriz NumPy preasignada (buffer circular) para que
+la búsqueda sea un único producto matriz-vector. Cada entrada registra la versión del
+corpus: cualquier subida o eliminación de documentos incrementa la versión e invalida
+el cache (también entre workers si Redis está disponible). Los vectores de consulta
+son del modelo de embeddings activo: si un re-embedding lo cambia, el cache se vacía
+(con otro modelo las similitudes entre consultas antiguas y nuevas no significan nada).
+"""
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..settings import settings
+from .cache import get_binary_redis_client, redis_reconnect_due
+from .metrics import register_metrics
+from .active_embedding import get_active_embedding
+
+logger = logging.getLogger(__name__)
+
+CORPUS_VERSION_KEY = "rag:corpus_version"
+
+
+class SemanticCache:
+    """
+    Cache de respuestas indexado por similitud de embeddings de la consulta.
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        threshold: float = 0.92,
+        max_entries: int = 2048,
+        ttl: int = 7200,
+        redis_client: Optional[Any] = None,
+        model: Optional[str] = None
+    ):
+        """
+        Inicializa el cache semántico.
+
+        Args:
+            dimensions: Dimensiones de los embeddings de consulta
+            threshold: Similitud coseno mínima para considerar un acierto
+            max_entries: Capacidad máxima (se reemplazan las entradas más antiguas)
+            ttl: Tiempo de vida de cada entrada en segundos
+            redis_client: Cliente Redis binario para compartir la versión del corpus (opcional)
+            model: Modelo de embeddings de los vectores de consulta
+        """
+        self.model = model
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_client = redis_client
+
+        self._matrix = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._count = 0
+        self._next = 0
+        self._local_version = 0
+        self._lock = threading.Lock()
+
+        # Contadores de rendimiento
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def _corpus_version(self) -> int:
+        """Versión actual del corpus (compartida vía Redis si está disponible)."""
+        if self.redis_client is not None:
+            try:
+                value = self.redis_client.get(CORPUS_VERSION_KEY)
+                return int(value) if value else 0
+            except Exception as e:
+                logger.warning(f"[SemanticCache] Error al leer versión del corpus en Redis: {e}")
+        return self._local_version
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        if norm == 0.0:
+            return None
+        return arr / norm
+
+    def lookup(self, query_vector: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta para una consulta semánticamente equivalente.
+
+        Args:
+            query_vector: Embedding de la consulta
+
+        Returns:
+            Resultado RAG cacheado (con 'semantic_cache' añadido) o None
+        """
+        query = self._normalize(query_vector)
+        if query is None:
+            return None
+
+        version = self._corpus_version()
+        now = time.time()
+
+        with self._lock:
+            # Dimensiones comprobadas bajo el lock: use_embedding puede redimensionar la matriz
+            if self._count == 0 or len(query) != self.dimensions:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix[:self._count] @ query
+            # Revisar candidatos por similitud descendente hasta encontrar uno vigente
+            for idx in np.argsort(similarities)[::-1]:
+                similarity = float(similarities[idx])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[idx]
+                if entry is None:
+                    continue
+                if entry["corpus_version"] != version or now - entry["created_at"] > self.ttl:
+                    self.stale += 1
+                    continue
+                self.hits += 1
+                logger.info(
+                    f"[SemanticCache] HIT (similitud={similarity:.4f}) para consulta original: "
+                    f"'{entry['query'][:50]}...'"
+                )
+                return {**entry["result"], "semantic_cache": {"similarity": round(similarity, 4), "query": entry["query"]}}
+
+            self.misses += 1
+            return None
+
+    def store(self, query_text: str, query_vector: List[float], result: Dict[str, Any]):
+        """
+        Almacena la respuesta de una consulta.
+
+        Args:
+            query_text: Texto original de la consulta
+            query_vector: Embedding de la consulta
+            result: Resultado RAG (answer, hits, contexts)
+        """
+        vector = self._normalize(query_vector)
+        if vector is None:
+            return
+
+        version = self._corpus_version()
+        with self._lock:
+            if len(vector) != self.dimensions:
+                return
+            slot = self._next
+            self._matrix[slot] = vector
+            self._entries[slot] = {
+                "query": query_text,
+                "result": result,
+                "corpus_version": version,
+                "created_at": time.time(),
+            }
+            self._next = (slot + 1) % self.max_entries
+            self._count = min(self._count + 1, self.max_entries)
+
+    def use_embedding(self, model: str, dimensions: int):
+        """
+        Adopta el modelo de embeddings activo. Si cambió, se descartan todas las entradas
+        (y la matriz se redimensiona si cambian las dimensiones).
+        """
+        if model == self.model and dimensions == self.dimensions:
+            return
+        with self._lock:
+            if model == self.model and dimensions == self.dimensions:
+                return
+            logger.info(
+                f"[SemanticCache] Modelo de embeddings cambiado ({self.model}, {self.dimensions} -> "
+                f"{model}, {dimensions}): cache vaciado"
+            )
+            self.model = model
+            if dimensions != self.dimensions:
+                self.dimensions = dimensions
+                self._matrix = np.zeros((self.max_entries, dimensions), dtype=np.float32)
+            self._entries = [None] * self.max_entries
+            self._count = 0
+            self._next = 0
+            self.invalidations += 1
+
+    def invalidate(self):
+        """
+        Invalida todas las respuestas: incrementa la versión del corpus y vacía el cache local.
+        Se debe llamar tras cualquier cambio en los documentos indexados.
+        """
+        if self.redis_client is not None:
+            try:
+                self.redis_client.incr(CORPUS_VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"[SemanticCache] Error al incrementar versión del corpus en Redis: {e}")
+
+        with self._lock:
+            self._local_version += 1
+            self._entries = [None] * self.max_entries
+            self._count = 0
+            self._next = 0
+            self.invalidations += 1
+        logger.info("[SemanticCache] Cache invalidado por cambio en el corpus")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos del cache semántico."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._count,
+                "model": self.model,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_skipped": self.stale,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Instancia global del cache semántico
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Obtiene la instancia global del cache semántico, ligado al modelo de embeddings activo.
+    Retorna None si está deshabilitado por configuración.
+    """
+    global _semantic_cache
+    if not settings.semantic_cache_enabled:
+        return None
+    model, dimensions = get_active_embedding()
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache(
+            dimensions=dimensions,
+            model=model,
+            threshold=settings.semantic_cache_threshold,
+            max_entries=settings.semantic_cache_max_entries,
+            ttl=settings.semantic_cache_ttl,
+            redis_client=get_binary_redis_client()
+        )
+        register_metrics("semantic_cache", _semantic_cache.stats)
+        logger.info(
+            f"[SemanticCache] Inicializado: umbral={settings.semantic_cache_threshold}, "
+            f"capacidad={settings.semantic_cache_max_entries}"
+        )
+    else:
+        _semantic_cache.use_embedding(model, dimensions)
+        if _semantic_cache.redis_client is None and redis_reconnect_due(binary=True):
+            # Redis no estaba disponible al crear el cache: reintentar tras el backoff
+            _semantic_cache.redis_client = get_binary_redis_client()
+    return _semantic_cache
+
+
+def invalidate_semantic_cache():
+    """Invalida el cache semántico (si está habilitado) tras cambios en el corpus."""
+    cache = get_semantic_cache()
+    if cache is not None:
+        cache.invalidate()
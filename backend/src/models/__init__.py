@@ -6,6 +6,12 @@ from .schemas import (
     AgentState,
     AgentQuery,
     FileUploadResponse,
+    IngestionJobResponse,
+    BulkIngestionItem,
+    BulkIngestionResponse,
+    IngestionBatchResponse,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
     FileListResponse,
     DocumentMetadata
 )
@@ -16,6 +22,12 @@ __all__ = [
     "AgentState",
     "AgentQuery",
     "FileUploadResponse",
+    "IngestionJobResponse",
+    "BulkIngestionItem",
+    "BulkIngestionResponse",
+    "IngestionBatchResponse",
+    "BulkDeleteRequest",
+    "BulkDeleteResponse",
     "FileListResponse",
     "DocumentMetadata",
     "Base",
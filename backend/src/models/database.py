@@ -37,6 +37,53 @@ class Document(Base):
         return f"<Document(id={self.id}, document_id={self.document_id}, filename={self.filename})>"
 
 
+class DocumentTombstone(Base):
+    """
+    Marca de borrado de un documento.
+    El documento deja de aparecer en las búsquedas en cuanto se escribe la marca; sus
+    vectores y archivos los elimina después el recolector en segundo plano (purged_at).
+    """
+    __tablename__ = "document_tombstones"
+
+    document_id = Column(String, primary_key=True)
+    filename = Column(String, nullable=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    purged_at = Column(DateTime, nullable=True, index=True)  # None = vectores pendientes de eliminar
+    points_deleted = Column(Integer, default=0)
+
+    def __repr__(self):
+        return f"<DocumentTombstone(document_id={self.document_id}, purged_at={self.purged_at})>"
+
+
+class EmbeddingMigration(Base):
+    """
+    Re-embedding de la colección vectorial en una colección sombra.
+    Guarda el punto de reanudación (offset del scroll) y el progreso; al terminar, el
+    alias de la colección pasa a apuntar a la sombra y el modelo/dimensiones quedan activos.
+    """
+    __tablename__ = "embedding_migrations"
+
+    id = Column(String, primary_key=True)
+    alias = Column(String, index=True, nullable=False)  # Nombre lógico que usa QdrantRepository
+    source_collection = Column(String, nullable=False)
+    target_collection = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="copying")  # copying | reconciling | swapped | failed
+    next_offset = Column(Text, nullable=True)  # Offset del scroll (JSON) desde el que reanudar la copia
+    points_total = Column(Integer, default=0)
+    points_copied = Column(Integer, default=0)
+    points_skipped = Column(Integer, default=0)  # Puntos sin texto que embeber
+    tokens = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    swapped_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<EmbeddingMigration(id={self.id}, {self.source_collection} -> {self.target_collection}, status={self.status})>"
+
+
 class Session(Base):
     """
     Modelo para sesiones de usuario.
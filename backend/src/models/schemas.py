@@ -76,6 +76,75 @@ class FileUploadResponse(BaseModel):
     uploaded_at: Optional[datetime] = None
 
 
+class IngestionJobResponse(BaseModel):
+    """Estado de un job de ingesta asíncrona"""
+    job_id: str
+    document_id: str
+    filename: str
+    status: str  # queued | running | done | failed
+    stage: str
+    total_pages: Optional[int] = None
+    pages: int = 0
+    chunks: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    chunks_stored: int = 0
+    pages_per_second: float = 0.0
+    chunks_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    status_url: Optional[str] = None
+    duplicate: bool = False  # El archivo ya estaba indexado (o en ingesta) y no se vuelve a procesar
+
+
+class BulkIngestionItem(BaseModel):
+    """Resultado de un archivo en una subida múltiple"""
+    filename: str
+    status: str  # queued | duplicate | rejected | invalid
+    job: Optional[IngestionJobResponse] = None
+    error: Optional[str] = None
+
+
+class BulkIngestionResponse(BaseModel):
+    """Respuesta de una subida múltiple (PDFs o ZIP)"""
+    batch_id: Optional[str] = None
+    accepted: int = 0
+    rejected: int = 0
+    items: List[BulkIngestionItem] = Field(default_factory=list)
+    status_url: Optional[str] = None
+
+
+class IngestionBatchResponse(BaseModel):
+    """Estado conjunto de los jobs de una subida múltiple"""
+    batch_id: str
+    total: int
+    queued: int = 0
+    running: int = 0
+    done: int = 0
+    failed: int = 0
+    finished: bool = False
+    pages: int = 0
+    chunks_stored: int = 0
+    elapsed_seconds: float = 0.0
+    pages_per_second: float = 0.0
+    chunks_per_second: float = 0.0
+    jobs: List[IngestionJobResponse] = Field(default_factory=list)
+
+
+class BulkDeleteRequest(BaseModel):
+    """Borrado de varios documentos en una llamada"""
+    document_ids: List[str] = Field(..., min_length=1)
+
+
+class BulkDeleteResponse(BaseModel):
+    """Documentos marcados como borrados (sus vectores se eliminan en segundo plano)"""
+    status: str = "deleted"
+    deleted: List[str] = Field(default_factory=list)
+    not_found: List[str] = Field(default_factory=list)
+
+
 class FileListResponse(BaseModel):
     """Respuesta al listar archivos"""
     document_id: str
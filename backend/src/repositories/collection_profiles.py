@@ -0,0 +1,206 @@
+"""
+Perfiles de configuración de la colección de documentos en Qdrant.
+Un perfil agrupa los parámetros que determinan el compromiso recall / latencia / RAM:
+HNSW (m, ef_construct), ef de búsqueda, vectores en disco, cuantización (int8 escalar
+o binaria con rescoring) y umbrales del optimizador.
+
+El perfil se elige con settings.qdrant_collection_profile y cada parámetro puede
+sobrescribirse individualmente con las variables qdrant_<parámetro>. Se aplica al
+crear la colección y, para colecciones existentes, con scripts/migrate_collection.py.
+"""
+import logging
+from typing import Any, Dict, Optional
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qmodels
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+# None = usar el valor por defecto de Qdrant (m=16, ef_construct=100, vectores float32 en RAM)
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # Comportamiento histórico: solo tamaño y distancia COSINE
+    "default": {},
+    # Menor latencia a costa de RAM: grafo más denso e int8 en RAM sobre vectores en RAM
+    "fast": {
+        "hnsw_m": 32,
+        "hnsw_ef_construct": 256,
+        "search_ef": 128,
+        "quantization": "scalar",
+        "quantization_always_ram": True,
+        "quantization_oversampling": 1.5,
+    },
+    # Millones de chunks: float32 en disco, int8 en RAM (x4 menos) y rescoring con los originales
+    "balanced": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 128,
+        "search_ef": 96,
+        "vectors_on_disk": True,
+        "quantization": "scalar",
+        "quantization_always_ram": True,
+        "quantization_oversampling": 2.0,
+        "indexing_threshold": 20000,
+        "memmap_threshold": 50000,
+    },
+    # Mínima RAM: cuantización binaria (x32 menos) con oversampling alto; adecuada para 1536+ dims
+    "compact": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "search_ef": 128,
+        "vectors_on_disk": True,
+        "hnsw_on_disk": True,
+        "quantization": "binary",
+        "quantization_always_ram": True,
+        "quantization_oversampling": 3.0,
+        "indexing_threshold": 20000,
+        "memmap_threshold": 20000,
+    },
+}
+
+PROFILE_KEYS = (
+    "hnsw_m",
+    "hnsw_ef_construct",
+    "hnsw_on_disk",
+    "search_ef",
+    "vectors_on_disk",
+    "quantization",
+    "quantization_always_ram",
+    "quantization_rescore",
+    "quantization_oversampling",
+    "indexing_threshold",
+    "memmap_threshold",
+)
+
+
+def resolve_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Resuelve un perfil aplicando las sobrescrituras de settings (qdrant_<parámetro>).
+
+    Args:
+        name: Nombre del perfil (None = settings.qdrant_collection_profile)
+
+    Returns:
+        Diccionario con todos los parámetros de PROFILE_KEYS (None = valor de Qdrant)
+    """
+    name = name or settings.qdrant_collection_profile
+    if name not in PROFILES:
+        logger.warning(f"[CollectionProfiles] Perfil '{name}' desconocido, usando 'default'")
+        name = "default"
+
+    profile = {key: PROFILES[name].get(key) for key in PROFILE_KEYS}
+    for key in PROFILE_KEYS:
+        override = getattr(settings, f"qdrant_{key}", None)
+        if override is not None:
+            profile[key] = override
+    profile["name"] = name
+    return profile
+
+
+def hnsw_config(profile: Dict[str, Any]) -> Optional[qmodels.HnswConfigDiff]:
+    """Parámetros del grafo HNSW del perfil"""
+    if profile.get("hnsw_m") is None and profile.get("hnsw_ef_construct") is None and profile.get("hnsw_on_disk") is None:
+        return None
+    return qmodels.HnswConfigDiff(
+        m=profile.get("hnsw_m"),
+        ef_construct=profile.get("hnsw_ef_construct"),
+        on_disk=profile.get("hnsw_on_disk"),
+    )
+
+
+def quantization_config(profile: Dict[str, Any]):
+    """Cuantización int8 escalar o binaria del perfil (None = sin cuantización)"""
+    kind = (profile.get("quantization") or "none").lower()
+    always_ram = profile.get("quantization_always_ram")
+    if kind == "scalar":
+        return qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(
+                type=qmodels.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=always_ram,
+            )
+        )
+    if kind == "binary":
+        return qmodels.BinaryQuantization(binary=qmodels.BinaryQuantizationConfig(always_ram=always_ram))
+    if kind != "none":
+        logger.warning(f"[CollectionProfiles] Cuantización '{kind}' no soportada, se ignora")
+    return None
+
+
+def optimizers_config(profile: Dict[str, Any]) -> Optional[qmodels.OptimizersConfigDiff]:
+    """Umbrales del optimizador (indexación HNSW y paso de segmentos a memmap)"""
+    if profile.get("indexing_threshold") is None and profile.get("memmap_threshold") is None:
+        return None
+    return qmodels.OptimizersConfigDiff(
+        indexing_threshold=profile.get("indexing_threshold"),
+        memmap_threshold=profile.get("memmap_threshold"),
+    )
+
+
+def search_params(profile: Dict[str, Any]) -> Optional[qmodels.SearchParams]:
+    """Parámetros de búsqueda densa: ef de HNSW y rescoring/oversampling de la cuantización"""
+    quantization = None
+    if (profile.get("quantization") or "none").lower() in ("scalar", "binary"):
+        rescore = profile.get("quantization_rescore")
+        quantization = qmodels.QuantizationSearchParams(
+            rescore=True if rescore is None else rescore,
+            oversampling=profile.get("quantization_oversampling"),
+        )
+    if profile.get("search_ef") is None and quantization is None:
+        return None
+    return qmodels.SearchParams(hnsw_ef=profile.get("search_ef"), quantization=quantization)
+
+
+def dense_vector_params(vector_size: int, profile: Dict[str, Any]) -> qmodels.VectorParams:
+    """Vector denso (sin nombre) con almacenamiento en disco según el perfil"""
+    return qmodels.VectorParams(
+        size=vector_size,
+        distance=qmodels.Distance.COSINE,
+        on_disk=profile.get("vectors_on_disk"),
+    )
+
+
+def collection_profile_kwargs(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos adicionales de create_collection() para el perfil (sin vectors_config)"""
+    kwargs = {
+        "hnsw_config": hnsw_config(profile),
+        "quantization_config": quantization_config(profile),
+        "optimizers_config": optimizers_config(profile),
+    }
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+def apply_profile(client: QdrantClient, collection_name: str, profile: Dict[str, Any]) -> bool:
+    """
+    Aplica un perfil a una colección existente con update_collection().
+    Qdrant reconstruye índice y cuantización en segundo plano; la colección sigue
+    respondiendo mientras tanto (estado 'yellow' hasta terminar la optimización).
+
+    Args:
+        client: Cliente Qdrant síncrono
+        collection_name: Colección a migrar
+        profile: Perfil resuelto con resolve_profile()
+
+    Returns:
+        True si Qdrant aceptó la actualización
+    """
+    quantization = quantization_config(profile)
+    if quantization is None and (profile.get("quantization") or "").lower() == "none":
+        # Desactivar explícitamente una cuantización previa
+        quantization = qmodels.Disabled.DISABLED
+
+    vector_diff = qmodels.VectorParamsDiff(
+        hnsw_config=hnsw_config(profile),
+        on_disk=profile.get("vectors_on_disk"),
+    )
+    return client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": vector_diff},
+        hnsw_config=hnsw_config(profile),
+        quantization_config=quantization,
+        optimizers_config=optimizers_config(profile),
+    )
+
+
+def describe_profile(profile: Dict[str, Any]) -> str:
+    """Resumen legible de los parámetros definidos de un perfil (para logs y scripts)"""
+    values = [f"{key}={profile[key]}" for key in PROFILE_KEYS if profile.get(key) is not None]
+    return f"{profile.get('name', '?')}: " + (", ".join(values) if values else "valores por defecto de Qdrant")
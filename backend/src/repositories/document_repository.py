@@ -3,13 +3,21 @@ Repositorio para gestión de documentos (archivos y metadatos)
 """
 import uuid
 import os
+import gzip
+import json
+import hashlib
 from pathlib import Path
-from typing import List, Optional, Dict, Tuple
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Dict, Tuple
 from sqlalchemy.orm import Session as SQLSession
 from ..models.database import Document, get_db
 from ..models.schemas import DocumentMetadata
 from datetime import datetime
 
+# Texto extraído por página, junto al PDF subido (JSON Lines comprimido, una página por línea)
+PAGE_TEXT_SUFFIX = ".pages.jsonl.gz"
+# Bloque de copia de las subidas
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
 
 class DocumentRepository:
     """
@@ -48,6 +56,59 @@ class DocumentRepository:
         
         return document_id, str(file_path)
     
+    def save_stream(
+        self,
+        source: BinaryIO,
+        filename: str,
+        document_id: Optional[str] = None,
+        block_size: int = UPLOAD_BLOCK_SIZE
+    ) -> Tuple[str, str, str, int]:
+        """
+        Guarda un archivo copiándolo por bloques desde un objeto de archivo, sin cargarlo
+        entero en memoria, y calcula su SHA-256 y su tamaño durante la copia.
+        Es E/S bloqueante: desde código async se llama con asyncio.to_thread.
+        
+        Args:
+            source: Archivo de origen abierto en binario (p. ej. UploadFile.file)
+            filename: Nombre original del archivo
+            document_id: ID del documento (se genera si no se proporciona)
+            block_size: Tamaño de cada bloque copiado
+        
+        Returns:
+            Tupla (document_id, file_path, sha256, tamaño en bytes)
+        """
+        if document_id is None:
+            document_id = str(uuid.uuid4())
+        
+        file_path = self.upload_dir / f"{document_id}_{filename}"
+        # Nombre temporal que get_file_path() no encuentra hasta que la copia termina
+        part_path = self.upload_dir / f"{document_id}.upload.part"
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        readinto = getattr(source, "readinto", None)
+        try:
+            with open(part_path, "wb") as f:
+                while True:
+                    if readinto is not None:
+                        read = readinto(buffer)
+                        block = view[:read]
+                    else:
+                        block = source.read(block_size)
+                        read = len(block)
+                    if not read:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    size += read
+            os.replace(part_path, file_path)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+        
+        return document_id, str(file_path), digest.hexdigest(), size
+    
     def get_file_path(self, document_id: str) -> Optional[Path]:
         """
         Obtiene la ruta de un archivo por su document_id.
@@ -65,7 +126,7 @@ class DocumentRepository:
     
     def delete_file(self, document_id: str) -> bool:
         """
-        Elimina un archivo del sistema de archivos.
+        Elimina un archivo del sistema de archivos (y su texto extraído, si existe).
         
         Args:
             document_id: ID del documento a eliminar
@@ -73,12 +134,71 @@ class DocumentRepository:
         Returns:
             True si se eliminó correctamente
         """
+        self.page_text_path(document_id).unlink(missing_ok=True)
         file_path = self.get_file_path(document_id)
         if file_path and file_path.exists():
             file_path.unlink()
             return True
         return False
     
+    def page_text_path(self, document_id: str) -> Path:
+        """Ruta del texto extraído por página de un documento"""
+        # Sin "_" tras el document_id para que get_file_path() no lo confunda con el PDF
+        return self.upload_dir / f"{document_id}{PAGE_TEXT_SUFFIX}"
+    
+    def has_page_text(self, document_id: str) -> bool:
+        """Indica si el documento tiene el texto por página guardado"""
+        return self.page_text_path(document_id).exists()
+    
+    def tee_page_text(self, document_id: str, pages: Iterable[str]) -> Iterator[str]:
+        """
+        Devuelve las páginas tal cual y las guarda comprimidas a medida que pasan.
+        El archivo solo se publica (rename atómico) si se consumen todas las páginas;
+        una ingesta interrumpida no deja un texto parcial.
+        
+        Args:
+            document_id: ID del documento
+            pages: Texto de cada página en orden
+        
+        Yields:
+            Las mismas páginas
+        """
+        path = self.page_text_path(document_id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        completed = False
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                for page in pages:
+                    f.write(json.dumps(page, ensure_ascii=False) + "\n")
+                    yield page
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed:
+                tmp_path.unlink(missing_ok=True)
+    
+    def iter_page_text(self, document_id: str) -> Iterator[str]:
+        """
+        Lee el texto guardado de cada página.
+        
+        Args:
+            document_id: ID del documento
+        
+        Yields:
+            Texto de cada página en orden
+        
+        Raises:
+            FileNotFoundError: Si el documento no tiene texto guardado
+        """
+        with gzip.open(self.page_text_path(document_id), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    
+    def count_page_text(self, document_id: str) -> int:
+        """Número de páginas del texto guardado"""
+        with gzip.open(self.page_text_path(document_id), "rt", encoding="utf-8") as f:
+            return sum(1 for _ in f)
+    
     def create_document_metadata(
         self,
         db: SQLSession,
@@ -118,6 +238,30 @@ class DocumentRepository:
         db.refresh(doc)
         return doc
     
+    def update_chunk_count(
+        self,
+        db: SQLSession,
+        document_id: str,
+        chunk_count: int
+    ) -> bool:
+        """
+        Actualiza el número de chunks de un documento (p. ej. tras re-indexarlo).
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            chunk_count: Número de chunks actual
+        
+        Returns:
+            True si el documento existe
+        """
+        doc = self.get_document_by_id(db, document_id)
+        if doc is None:
+            return False
+        doc.chunk_count = chunk_count
+        db.commit()
+        return True
+    
     def get_document_by_id(
         self,
         db: SQLSession,
@@ -137,6 +281,25 @@ class DocumentRepository:
             Document.document_id == document_id
         ).first()
     
+    def get_documents_by_ids(
+        self,
+        db: SQLSession,
+        document_ids: List[str]
+    ) -> List[Document]:
+        """
+        Obtiene los documentos existentes entre `document_ids` (una sola consulta).
+        
+        Args:
+            db: Sesión de base de datos
+            document_ids: IDs de los documentos
+        
+        Returns:
+            Lista de documentos encontrados
+        """
+        if not document_ids:
+            return []
+        return db.query(Document).filter(Document.document_id.in_(document_ids)).all()
+    
     def list_documents(
         self,
         db: SQLSession,
@@ -178,6 +341,29 @@ class DocumentRepository:
             return True
         return False
     
+    def delete_documents(
+        self,
+        db: SQLSession,
+        document_ids: List[str]
+    ) -> int:
+        """
+        Elimina varios documentos de la base de datos en una sola transacción.
+        
+        Args:
+            db: Sesión de base de datos
+            document_ids: IDs de los documentos
+        
+        Returns:
+            Número de documentos eliminados
+        """
+        if not document_ids:
+            return 0
+        deleted = db.query(Document).filter(
+            Document.document_id.in_(document_ids)
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    
     def to_schema(self, doc: Document) -> DocumentMetadata:
         """
         Convierte un modelo Document a schema DocumentMetadata.
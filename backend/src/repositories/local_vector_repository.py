@@ -0,0 +1,430 @@
+"""
+Backend vectorial embebido (sin servicio externo) para instalaciones de un solo nodo y CI.
+Implementa la misma interfaz que QdrantRepository sobre:
+  - una matriz float32 memory-mapped (vectors.f32) con los vectores normalizados
+  - un almacén de payloads en SQLite (points.db) con la fila de cada punto
+La búsqueda es fuerza bruta exacta (producto matriz-vector + argpartition), sin red.
+
+Pensado para un único proceso: otros workers no ven los cambios hasta reiniciar.
+"""
+import os
+import json
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..settings import settings
+from .tombstone_repository import get_tombstone_repository
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+PAYLOADS_FILE = "points.db"
+INITIAL_CAPACITY = 1024
+
+
+class LocalVectorRepository:
+    """
+    Índice vectorial local con la interfaz de QdrantRepository.
+    La búsqueda híbrida se degrada a densa (no hay vector disperso).
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, collection_name: str = "documents"):
+        self.collection_name = collection_name
+        self.base_dir = os.path.join(base_dir or settings.local_vector_dir, collection_name)
+        os.makedirs(self.base_dir, exist_ok=True)
+
+        # Compatibilidad con el código que consulta estos atributos de QdrantRepository
+        self.sparse_enabled = False
+        self._search_method = "local"
+        self._search_method_name = "numpy"
+
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(self.base_dir, PAYLOADS_FILE), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            "id TEXT PRIMARY KEY, row INTEGER UNIQUE NOT NULL, document_id TEXT, payload TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_points_document ON points(document_id)")
+        # Índices de expresión para la deduplicación de la ingesta por hash de archivo y de chunk
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_points_file_hash ON points(json_extract(payload, '$.file_hash'))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_points_chunk_hash ON points(json_extract(payload, '$.chunk_hash'))")
+        self._db.commit()
+
+        self._vectors: Optional[np.memmap] = None
+        self._dimensions = 0
+        self._capacity = 0
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        """Abre la matriz y reconstruye el mapa fila -> id desde SQLite"""
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'dimensions'").fetchone()
+        self._dimensions = int(row[0]) if row else 0
+
+        rows = self._db.execute("SELECT row, id, document_id FROM points ORDER BY row").fetchall()
+        self._ids: List[str] = [point_id for _, point_id, _ in rows]
+        self._document_ids: List[Optional[str]] = [document_id for _, _, document_id in rows]
+        self._rows: Dict[str, int] = {point_id: i for i, point_id in enumerate(self._ids)}
+
+        path = os.path.join(self.base_dir, VECTORS_FILE)
+        if self._dimensions and os.path.exists(path):
+            self._capacity = os.path.getsize(path) // (self._dimensions * 4)
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(self._capacity, self._dimensions))
+        logger.info(
+            f"[LocalVectorRepository] Índice local '{self.base_dir}': {len(self._ids)} puntos, "
+            f"dimensiones={self._dimensions or 'sin definir'}"
+        )
+
+    def _reset(self, dimensions: int):
+        """Vacía el índice y lo prepara para vectores de otro tamaño (equivale a recrear la colección)"""
+        self._vectors = None
+        path = os.path.join(self.base_dir, VECTORS_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+        self._db.execute("DELETE FROM points")
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dimensions', ?)", (str(dimensions),))
+        self._db.commit()
+        self._dimensions = dimensions
+        self._capacity = 0
+        self._ids, self._document_ids, self._rows = [], [], {}
+
+    def _ensure_capacity(self, rows: int):
+        """Amplía el archivo memory-mapped duplicando la capacidad cuando hace falta"""
+        if rows <= self._capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < rows:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        path = os.path.join(self.base_dir, VECTORS_FILE)
+        with open(path, "ab") as f:
+            f.truncate(capacity * self._dimensions * 4)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self._dimensions))
+        self._capacity = capacity
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def upsert_points(self, points: List[Dict], vector_size: Optional[int] = None, barrier: bool = True) -> bool:
+        """
+        Inserta o actualiza puntos (id, vector, payload). Como en QdrantRepository, un
+        índice vacío adopta el tamaño de vector nuevo y uno con datos nunca se vacía.
+        Las escrituras son síncronas: `barrier` se acepta por compatibilidad.
+
+        Raises:
+            ValueError: Si el índice tiene puntos de otro tamaño de vector
+        """
+        if not points:
+            logger.warning("[LocalVectorRepository] No hay puntos para insertar")
+            return False
+
+        vector_size = vector_size or len(points[0]["vector"])
+        with self._lock:
+            if self._dimensions != vector_size:
+                if self._ids:
+                    raise ValueError(
+                        f"El índice local '{self.base_dir}' tiene {len(self._ids)} vectores de {self._dimensions} "
+                        f"dimensiones y se intentaron insertar de {vector_size}. Para cambiar de modelo o "
+                        f"dimensiones elimina el índice local y vuelve a indexar los documentos "
+                        f"(python -m scripts.reindex_documents --all)."
+                    )
+                self._reset(vector_size)
+        try:
+            with self._lock:
+
+                matrix = self._normalize(np.asarray([p["vector"] for p in points], dtype=np.float32))
+                records = []
+                new_rows = 0
+                for point in points:
+                    point_id = str(point.get("id") or uuid.uuid4())
+                    point["id"] = point_id
+                    if point_id not in self._rows:
+                        self._rows[point_id] = len(self._ids) + new_rows
+                        new_rows += 1
+
+                self._ensure_capacity(len(self._ids) + new_rows)
+                self._ids.extend([None] * new_rows)
+                self._document_ids.extend([None] * new_rows)
+                for i, point in enumerate(points):
+                    row = self._rows[point["id"]]
+                    payload = point.get("payload", {})
+                    self._vectors[row] = matrix[i]
+                    self._ids[row] = point["id"]
+                    self._document_ids[row] = payload.get("document_id")
+                    records.append((point["id"], row, payload.get("document_id"), json.dumps(payload, ensure_ascii=False)))
+
+                self._vectors.flush()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO points (id, row, document_id, payload) VALUES (?, ?, ?, ?)", records
+                )
+                self._db.commit()
+            logger.info(f"[LocalVectorRepository] {len(points)} puntos insertados (total {len(self._ids)})")
+            return True
+        except Exception as e:
+            logger.error(f"[LocalVectorRepository] Error al insertar puntos: {e}", exc_info=True)
+            return False
+
+    def wait_for_updates(self):
+        """Sin efecto: upsert_points ya retorna con los puntos visibles"""
+
+    def delete_by_document_id(self, document_id: str) -> bool:
+        """
+        Elimina los puntos de un documento. Cada fila borrada se rellena con la última
+        fila de la matriz para mantenerla compacta (sin huecos que recorrer al buscar).
+        """
+        try:
+            with self._lock:
+                rows = [row for row, doc_id in enumerate(self._document_ids) if doc_id == document_id]
+                self._delete_rows(rows)
+            logger.info(f"[LocalVectorRepository] {len(rows)} vectores eliminados para document_id={document_id}")
+            return True
+        except Exception as e:
+            logger.error(f"[LocalVectorRepository] Error eliminando vectores para document_id={document_id}: {e}", exc_info=True)
+            return False
+
+    def delete_points_batch(self, document_id: str, limit: int) -> int:
+        """Elimina hasta `limit` puntos de un documento; retorna cuántos (0 = ya no tiene)"""
+        with self._lock:
+            rows = [row for row, doc_id in enumerate(self._document_ids) if doc_id == document_id][:limit]
+            self._delete_rows(rows)
+        return len(rows)
+
+    def delete_revision(self, document_id: str, revision: str, keep: bool = False) -> bool:
+        """
+        Elimina los puntos de un documento de esa revisión de ingesta (keep=False) o
+        todos menos los de esa revisión (keep=True), como QdrantRepository.delete_revision
+        """
+        operator = "IS NOT" if keep else "IS"
+        try:
+            with self._lock:
+                rows = [row for (row,) in self._db.execute(
+                    f"SELECT row FROM points WHERE document_id = ? AND json_extract(payload, '$.revision') {operator} ?",
+                    (document_id, revision)
+                ).fetchall()]
+                self._delete_rows(rows)
+            logger.info(f"[LocalVectorRepository] {len(rows)} vectores eliminados para document_id={document_id} (revisión {revision}, keep={keep})")
+            return True
+        except Exception as e:
+            logger.error(f"[LocalVectorRepository] Error eliminando la revisión {revision} de document_id={document_id}: {e}", exc_info=True)
+            return False
+
+    def _delete_rows(self, rows: List[int]):
+        """Borra filas rellenando cada hueco con la última fila (llamar con el lock tomado)"""
+        for row in sorted(rows, reverse=True):
+            last = len(self._ids) - 1
+            removed_id = self._ids[row]
+            if row != last:
+                moved_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved_id
+                self._document_ids[row] = self._document_ids[last]
+                self._rows[moved_id] = row
+                self._db.execute("DELETE FROM points WHERE id = ?", (removed_id,))
+                self._db.execute("UPDATE points SET row = ? WHERE id = ?", (row, moved_id))
+            else:
+                self._db.execute("DELETE FROM points WHERE id = ?", (removed_id,))
+            self._ids.pop()
+            self._document_ids.pop()
+            del self._rows[removed_id]
+        if rows:
+            self._vectors.flush()
+        self._db.commit()
+
+    def get_vectors_by_chunk_hashes(self, chunk_hashes: List[str], signature: str) -> Dict[str, List[float]]:
+        """Vectores almacenados para chunks con esos hashes y la misma firma de embeddings"""
+        wanted = list(set(chunk_hashes))
+        if not wanted:
+            return {}
+        placeholders = ",".join("?" * len(wanted))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT json_extract(payload, '$.chunk_hash'), row FROM points "
+                f"WHERE json_extract(payload, '$.chunk_hash') IN ({placeholders}) "
+                f"AND json_extract(payload, '$.embedding_signature') = ?",
+                [*wanted, signature]
+            ).fetchall()
+            found: Dict[str, List[float]] = {}
+            for content_hash, row in rows:
+                if content_hash not in found:
+                    found[content_hash] = self._vectors[row].tolist()
+            return found
+
+    def find_document_id_by_file_hash(self, file_hash: str) -> Optional[str]:
+        """document_id de un documento ya indexado con el mismo hash de archivo (None si no hay)"""
+        deleted = get_tombstone_repository().deleted_ids()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT document_id FROM points WHERE json_extract(payload, '$.file_hash') = ?", (file_hash,)
+            ).fetchall()
+        return next((document_id for (document_id,) in rows if document_id not in deleted), None)
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def _filter_mask(self, filter_conditions: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Máscara booleana de filas que cumplen todas las condiciones de igualdad
+        y no pertenecen a documentos borrados pendientes de recolectar
+        """
+        deleted = get_tombstone_repository().deleted_ids()
+        if not filter_conditions and not deleted:
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        if deleted:
+            mask &= np.fromiter((doc_id not in deleted for doc_id in self._document_ids), dtype=bool, count=len(self._ids))
+        for key, value in (filter_conditions or {}).items():
+            if key == "document_id":
+                mask &= np.fromiter((doc_id == value for doc_id in self._document_ids), dtype=bool, count=len(self._ids))
+                continue
+            matching = self._db.execute(
+                "SELECT row FROM points WHERE json_extract(payload, ?) = ?", (f"$.{key}", value)
+            ).fetchall()
+            key_mask = np.zeros(len(self._ids), dtype=bool)
+            key_mask[[row for (row,) in matching]] = True
+            mask &= key_mask
+        return mask
+
+    def _top_k(self, query_vector: List[float], top_k: int, filter_conditions: Optional[Dict]) -> List[Tuple[str, float, int]]:
+        with self._lock:
+            count = len(self._ids)
+            if not count or self._vectors is None or len(query_vector) != self._dimensions:
+                if count and len(query_vector) != self._dimensions:
+                    logger.error(
+                        f"[LocalVectorRepository] Dimensiones de la consulta ({len(query_vector)}) "
+                        f"distintas a las del índice ({self._dimensions})"
+                    )
+                return []
+            query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+            scores = self._vectors[:count] @ query
+            mask = self._filter_mask(filter_conditions)
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            k = min(top_k, count)
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            ordered = candidates[np.argsort(-scores[candidates])]
+            return [(self._ids[row], float(scores[row]), int(row)) for row in ordered if scores[row] != -np.inf]
+
+    def _payloads(self, ids: List[str], payload_fields: Optional[List[str]]) -> Dict[str, Dict]:
+        """Payloads por id, proyectados a payload_fields (None = todos, [] = ninguno)"""
+        if payload_fields is not None and not payload_fields:
+            return {point_id: {} for point_id in ids}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT id, payload FROM points WHERE id IN ({placeholders})", ids).fetchall()
+        payloads = {}
+        for point_id, raw in rows:
+            payload = json.loads(raw)
+            if payload_fields is not None:
+                payload = {key: payload[key] for key in payload_fields if key in payload}
+            payloads[point_id] = payload
+        return payloads
+
+    def search(
+        self,
+        query_vector: List[float],
+        top_k: int = 5,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict]:
+        """Búsqueda exacta por similitud coseno sobre la matriz local"""
+        try:
+            scored = self._top_k(query_vector, top_k, filter_conditions)
+            if not scored:
+                return []
+            payloads = self._payloads([point_id for point_id, _, _ in scored], payload_fields)
+            results = []
+            for point_id, score, row in scored:
+                result = {"id": point_id, "score": score, "payload": payloads.get(point_id, {})}
+                if with_vectors:
+                    result["vector"] = np.array(self._vectors[row]).tolist()
+                results.append(result)
+            return results
+        except Exception as e:
+            logger.error(f"[LocalVectorRepository] Error en búsqueda: {e}", exc_info=True)
+            return []
+
+    async def asearch(
+        self,
+        query_vector: List[float],
+        top_k: int = 5,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict]:
+        """Versión asíncrona de search (NumPy libera el GIL durante el producto matricial)"""
+        return await asyncio.to_thread(self.search, query_vector, top_k, filter_conditions, payload_fields, with_vectors)
+
+    def hybrid_search(
+        self,
+        query_vector: List[float],
+        sparse_vector: Optional[Dict] = None,
+        top_k: int = 10,
+        sparse_top_k: int = 10,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict], bool]:
+        """Sin vector disperso: búsqueda densa con scores coseno (fused=False)"""
+        return self.search(query_vector, top_k=top_k, filter_conditions=filter_conditions, payload_fields=payload_fields), False
+
+    async def ahybrid_search(
+        self,
+        query_vector: List[float],
+        sparse_vector: Optional[Dict] = None,
+        top_k: int = 10,
+        sparse_top_k: int = 10,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> Tuple[List[Dict], bool]:
+        """Versión asíncrona de hybrid_search"""
+        return await self.asearch(
+            query_vector, top_k=top_k, filter_conditions=filter_conditions,
+            payload_fields=payload_fields, with_vectors=with_vectors
+        ), False
+
+    def fetch_payloads(self, hits: List[Dict], payload_fields: Optional[List[str]] = None) -> List[Dict]:
+        """Segunda fase de una búsqueda en dos pasos (ver QdrantRepository.fetch_payloads)"""
+        if not hits:
+            return []
+        payloads = self._payloads([hit["id"] for hit in hits], payload_fields)
+        return [{**hit, "payload": payloads.get(hit["id"], hit.get("payload") or {})} for hit in hits]
+
+    async def afetch_payloads(self, hits: List[Dict], payload_fields: Optional[List[str]] = None) -> List[Dict]:
+        """Versión asíncrona de fetch_payloads"""
+        return await asyncio.to_thread(self.fetch_payloads, hits, payload_fields)
+
+    def get_collection_info(self) -> Dict:
+        """Información del índice local con el mismo formato que QdrantRepository"""
+        with self._lock:
+            count = len(self._ids)
+        result = {
+            "name": self.collection_name,
+            "points_count": count,
+            "vectors_count": count,
+            "config": {
+                "size": self._dimensions or None,
+                "distance": "COSINE"
+            },
+            "backend": "local"
+        }
+        logger.info(f"[LocalVectorRepository] Información de colección: {count} puntos, tamaño={result['config']['size']}")
+        return result
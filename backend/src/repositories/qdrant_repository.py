@@ -3,15 +3,56 @@ Repositorio para operaciones con Qdrant (base de datos vectorial)
 """
 import uuid
 import logging
-from typing import List, Dict, Optional
-from qdrant_client import QdrantClient
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_EXCEPTION
+from typing import List, Dict, Optional, Tuple
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.http import models as qmodels
 from ..settings import settings
 from ..utils.embeddings import embedding_for_text_batch
+from ..core.qdrant_connection import get_qdrant_client, get_async_qdrant_client
+from ..core.async_clients import LoopBound
+from ..core.metrics import register_metrics
+from ..core.active_embedding import get_active_embedding
+from .search_batcher import SearchMicroBatcher, BatchMetrics
+from .tombstone_repository import get_tombstone_repository
+from .collection_profiles import (
+    resolve_profile,
+    describe_profile,
+    dense_vector_params,
+    collection_profile_kwargs,
+    search_params,
+)
 
 logger = logging.getLogger(__name__)
 
 QDRANT_COLLECTION = "documents"
+# Alias por el que se accede a la colección viva. Un re-embedding lo cambia de colección de
+# forma atómica (ver swap_alias). En instalaciones anteriores a los alias "documents" es una
+# colección real: el alias pasa a apuntar a ella sin moverla ni borrarla.
+QDRANT_ALIAS = f"{QDRANT_COLLECTION}_live"
+# Nombre del vector disperso (BM25) usado en la búsqueda híbrida
+SPARSE_VECTOR_NAME = "text-sparse"
+# Campos del payload con índice keyword (filtros de borrado y deduplicación de la ingesta)
+PAYLOAD_INDEX_FIELDS = ("document_id", "file_hash", "chunk_hash", "revision")
+# ID que nunca se asigna a un punto: la barrera de consistencia borra "este punto" en todos los shards
+_BARRIER_POINT_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def resolve_alias(client, name: str) -> str:
+    """Colección real a la que apunta el alias `name` (el propio nombre si no es un alias)"""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+def _configured_vector_size(info) -> Optional[int]:
+    """Tamaño del vector denso (sin nombre) en la respuesta de get_collection"""
+    vectors = getattr(getattr(getattr(info, "config", None), "params", None), "vectors", None)
+    if isinstance(vectors, dict):
+        vectors = vectors.get("")
+    return getattr(vectors, "size", None)
 
 
 class QdrantRepository:
@@ -20,87 +61,182 @@ class QdrantRepository:
     Encapsula toda la lógica de acceso a la base de datos vectorial.
     """
     
-    def __init__(self, collection_name: str = QDRANT_COLLECTION):
-        # Normalizar URL de Qdrant y configurar cliente
-        original_url = settings.qdrant_url
-        qdrant_url = self._normalize_qdrant_url(original_url)
-        
-        logger.info(f"[QdrantRepository] URL original: {self._mask_url(original_url)}")
-        logger.info(f"[QdrantRepository] URL normalizada: {self._mask_url(qdrant_url)}")
-        
-        # Configurar cliente con API key si está disponible
-        client_kwargs = {
-            "url": qdrant_url,
-            "prefer_grpc": False
-        }
-        
-        if settings.qdrant_api_key:
-            client_kwargs["api_key"] = settings.qdrant_api_key
-            logger.info(f"[QdrantRepository] Configurando Qdrant con API key")
-        else:
-            logger.warning(f"[QdrantRepository] Configurando Qdrant sin API key - puede fallar si Qdrant Cloud requiere autenticación")
-        
-        try:
-            self.client = QdrantClient(**client_kwargs)
-            logger.info(f"[QdrantRepository] Cliente Qdrant creado exitosamente")
-        except Exception as e:
-            logger.error(f"[QdrantRepository] Error al crear cliente Qdrant: {e}")
-            raise
+    def __init__(self, collection_name: str = QDRANT_ALIAS):
+        # Cliente compartido por todo el proceso (pool keep-alive o gRPC según settings)
+        self.client = get_qdrant_client()
         
         self.collection_name = collection_name
+        # Tamaño de vector de la colección: se consulta una vez y se actualiza al crearla o recrearla
+        self._vector_size: Optional[int] = None
+        # Hilos para los lotes de upsert en paralelo (se crean en la primera ingesta grande)
+        self._upsert_executor: Optional[ThreadPoolExecutor] = None
+        self._upsert_lock = threading.Lock()
+        
+        # Perfil de la colección (HNSW, cuantización, disco) y parámetros de búsqueda derivados
+        self.profile = resolve_profile()
+        self.search_params = search_params(self.profile)
+        logger.info(f"[QdrantRepository] Perfil de colección {describe_profile(self.profile)}")
         self._ensure_collection()
+        self._ensure_payload_indexes()
         
         # Detectar qué método de búsqueda está disponible (una sola vez al inicializar)
         self._detect_search_method()
-    
-    def _normalize_qdrant_url(self, url: str) -> str:
-        """
-        Normaliza la URL de Qdrant.
-        - Si es HTTPS, asegura que no tenga puerto duplicado
-        - Si tiene puerto :6333 en HTTPS, lo quita (Qdrant Cloud usa 443 por defecto)
-        """
-        if not url:
-            return url
         
-        # Si es HTTPS y tiene :6333, quitar el puerto (Qdrant Cloud usa 443)
-        if url.startswith('https://') and ':6333' in url:
-            url = url.replace(':6333', '')
-            logger.info(f"[QdrantRepository] URL normalizada (puerto 6333 removido para HTTPS): {self._mask_url(url)}")
+        # Detectar si la colección tiene vector disperso para búsqueda híbrida
+        self._detect_sparse_support()
         
-        return url
+        # Micro-batching opcional de búsquedas async concurrentes (un batcher por event loop)
+        self._batch_metrics = BatchMetrics()
+        self._batchers = LoopBound(lambda: SearchMicroBatcher(
+            client_getter=get_async_qdrant_client,
+            collection_name=self.collection_name,
+            max_batch_size=settings.qdrant_search_batch_max_size,
+            max_wait_ms=settings.qdrant_search_batch_max_wait_ms,
+            metrics=self._batch_metrics
+        ))
+        if settings.qdrant_search_batching_enabled:
+            register_metrics("qdrant_search_batching", self._batch_metrics.snapshot)
+            logger.info(
+                f"[QdrantRepository] Micro-batching de búsquedas habilitado "
+                f"(max_batch={settings.qdrant_search_batch_max_size}, max_wait={settings.qdrant_search_batch_max_wait_ms} ms)"
+            )
     
-    def _mask_url(self, url: str) -> str:
-        """Enmascara información sensible en la URL para logging."""
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            if parsed.hostname:
-                # Mostrar solo el dominio, no el path completo
-                return f"{parsed.scheme}://{parsed.hostname}{':' + str(parsed.port) if parsed.port else ''}"
-            return url
-        except Exception:
-            return url
+    @property
+    def aclient(self) -> AsyncQdrantClient:
+        """Cliente AsyncQdrantClient compartido del event loop actual."""
+        return get_async_qdrant_client()
+    
+    def _collection_config(self, vector_size: int) -> Dict:
+        """Configuración de la colección (vectores denso + disperso y perfil) para crearla"""
+        return {
+            "vectors_config": dense_vector_params(vector_size, self.profile),
+            # El IDF se calcula en el servidor; los chunks solo aportan la TF saturada (BM25)
+            "sparse_vectors_config": {
+                SPARSE_VECTOR_NAME: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)
+            },
+            **collection_profile_kwargs(self.profile)
+        }
     
     def _ensure_collection(self):
         """Asegura que la colección existe con la configuración correcta"""
         try:
-            # Intentar obtener información de la colección
-            self.client.get_collection(self.collection_name)
+            # Intentar obtener información de la colección (o de la colección tras el alias)
+            info = self.client.get_collection(self.collection_name)
+            self._vector_size = _configured_vector_size(info)
         except Exception:
-            # Si no existe, crear con tamaño por defecto (1536 para text-embedding-3-large)
-            # Se ajustará automáticamente cuando se inserten los primeros vectores
             try:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=qmodels.VectorParams(
-                        size=1536,  # Tamaño por defecto para text-embedding-3-large
-                        distance=qmodels.Distance.COSINE
-                    )
-                )
+                legacy = self._legacy_collection()
+                if legacy is not None:
+                    # Instalación anterior a los alias: el alias apunta a la colección existente
+                    self.swap_alias(legacy)
+                else:
+                    # Si no existe, crearla con las dimensiones del modelo de embeddings activo
+                    self._create_live_collection(get_active_embedding()[1])
             except Exception:
-                # Si falla, probablemente ya existe, continuar
+                # Si falla, probablemente otro worker creó el alias a la vez, continuar
                 pass
     
+    def _legacy_collection(self) -> Optional[str]:
+        """Colección real "documents" de una instalación anterior a los alias (None si no hay)"""
+        if self.collection_name != QDRANT_ALIAS:
+            return None
+        legacy = resolve_alias(self.client, QDRANT_COLLECTION)
+        return legacy if self.client.collection_exists(legacy) else None
+    
+    def resolve_collection(self) -> str:
+        """Colección real a la que apunta el alias (el propio nombre si no es un alias)"""
+        return resolve_alias(self.client, self.collection_name)
+    
+    def create_shadow_collection(self, vector_size: int) -> str:
+        """
+        Crea una colección versionada vacía ({nombre}_{sufijo}) con la configuración de la viva.
+        
+        Returns:
+            Nombre de la colección creada
+        """
+        prefix = QDRANT_COLLECTION if self.collection_name == QDRANT_ALIAS else self.collection_name
+        name = f"{prefix}_{uuid.uuid4().hex[:8]}"
+        self.client.create_collection(collection_name=name, **self._collection_config(vector_size))
+        self._ensure_payload_indexes(name)
+        return name
+    
+    def _create_live_collection(self, vector_size: int):
+        """
+        Crea la colección detrás de un alias con el nombre lógico: un re-embedding posterior
+        puede sustituirla cambiando el alias de forma atómica (ver swap_alias).
+        """
+        target = self.create_shadow_collection(vector_size)
+        self.swap_alias(target)
+        self._vector_size = vector_size
+    
+    def swap_alias(self, target_collection: str) -> Optional[str]:
+        """
+        Apunta el alias (nombre lógico de la colección) a `target_collection`.
+        
+        Si el alias ya existe, borrarlo y recrearlo va en una sola operación atómica: las
+        búsquedas y upserts pasan de una colección a otra sin ventana intermedia. Nunca se
+        elimina ninguna colección.
+        
+        Returns:
+            Colección a la que apuntaba antes (None si no había ninguna)
+        
+        Raises:
+            ValueError: Si el nombre del alias es una colección real
+        """
+        previous = None
+        operations = []
+        if any(alias.alias_name == self.collection_name for alias in self.client.get_aliases().aliases):
+            previous = self.resolve_collection()
+            operations.append(qmodels.DeleteAliasOperation(
+                delete_alias=qmodels.DeleteAlias(alias_name=self.collection_name)
+            ))
+        elif self.client.collection_exists(self.collection_name):
+            raise ValueError(f"'{self.collection_name}' es una colección real, no un alias: no se puede cambiar")
+        operations.append(qmodels.CreateAliasOperation(
+            create_alias=qmodels.CreateAlias(collection_name=target_collection, alias_name=self.collection_name)
+        ))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        logger.info(f"[QdrantRepository] Alias '{self.collection_name}' -> '{target_collection}' (antes: {previous})")
+        self._vector_size = None
+        return previous
+    
+    def _ensure_payload_indexes(self, collection_name: Optional[str] = None):
+        """Crea los índices keyword de PAYLOAD_INDEX_FIELDS (idempotente)"""
+        for field_name in PAYLOAD_INDEX_FIELDS:
+            try:
+                self.client.create_payload_index(
+                    collection_name=collection_name or self.collection_name,
+                    field_name=field_name,
+                    field_schema=qmodels.PayloadSchemaType.KEYWORD
+                )
+            except Exception as e:
+                logger.debug(f"[QdrantRepository] No se pudo crear el índice de payload '{field_name}': {e}")
+    
+    def _detect_sparse_support(self):
+        """
+        Detecta si la colección tiene configurado el vector disperso.
+        Las colecciones creadas antes de la búsqueda híbrida no lo tienen: en ese caso
+        se indexa y busca solo con el vector denso hasta que se recree la colección.
+        """
+        self.sparse_enabled = False
+        if not settings.hybrid_search_enabled:
+            logger.info("[QdrantRepository] Búsqueda híbrida deshabilitada por configuración")
+            return
+        try:
+            info = self.client.get_collection(self.collection_name)
+            sparse_config = getattr(info.config.params, 'sparse_vectors', None) or {}
+            self.sparse_enabled = SPARSE_VECTOR_NAME in sparse_config and self._search_method == 'query_points'
+        except Exception as e:
+            logger.warning(f"[QdrantRepository] No se pudo detectar soporte de vectores dispersos: {e}")
+        
+        if self.sparse_enabled:
+            logger.info(f"[QdrantRepository] Búsqueda híbrida habilitada (vector disperso '{SPARSE_VECTOR_NAME}')")
+        else:
+            logger.warning(
+                f"[QdrantRepository] La colección '{self.collection_name}' no tiene vector disperso "
+                f"'{SPARSE_VECTOR_NAME}' (o el cliente no soporta query_points). Usando solo búsqueda densa."
+            )
+    
     def _detect_search_method(self):
         """
         Detecta qué método de búsqueda está disponible en el cliente Qdrant.
@@ -129,19 +265,28 @@ class QdrantRepository:
     def upsert_points(
         self, 
         points: List[Dict],
-        vector_size: Optional[int] = None
+        vector_size: Optional[int] = None,
+        barrier: bool = True
     ) -> bool:
         """
         Inserta o actualiza puntos en Qdrant.
         
+        Los puntos se envían en lotes de settings.qdrant_upsert_batch_size, hasta
+        settings.qdrant_upsert_parallel a la vez. Con settings.qdrant_upsert_pipelined cada
+        lote se confirma al escribirse en el WAL (wait=False), sin esperar a que se aplique,
+        y una barrera final espera a que todos sean visibles en las búsquedas.
+        
         Args:
             points: Lista de diccionarios con estructura:
                    {
                        "id": str (opcional, se genera si no se proporciona),
                        "vector": List[float],
+                       "sparse_vector": {"indices": [...], "values": [...]} (opcional),
                        "payload": Dict
                    }
             vector_size: Tamaño del vector (se detecta automáticamente si no se proporciona)
+            barrier: False = no esperar a que se apliquen los lotes (en modo pipelined); quien
+                     llama debe invocar wait_for_updates() antes de depender de los puntos
         
         Returns:
             True si la operación fue exitosa
@@ -155,90 +300,419 @@ class QdrantRepository:
             if vector_size is None:
                 vector_size = len(points[0]["vector"])
             
-            logging.info(f"Insertando {len(points)} puntos en Qdrant (vector_size: {vector_size})")
-            
-            # Asegurar que la colección tiene el tamaño correcto
-            try:
-                collection_info = self.client.get_collection(self.collection_name)
-                if collection_info.config.params.vectors.size != vector_size:
-                    logging.warning(
-                        f"Tamaño de vector no coincide. Colección: {collection_info.config.params.vectors.size}, "
-                        f"Esperado: {vector_size}. Recreando colección..."
-                    )
-                    # Recrear colección con el tamaño correcto
-                    self.client.recreate_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=qmodels.VectorParams(
-                            size=vector_size,
-                            distance=qmodels.Distance.COSINE
-                        )
-                    )
-                    logging.info(f"Colección recreada con tamaño {vector_size}")
-            except Exception as e:
-                # Si no existe, crearla
-                logging.info(f"Colección no existe, creándola con tamaño {vector_size}")
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=qmodels.VectorParams(
-                        size=vector_size,
-                        distance=qmodels.Distance.COSINE
-                    )
-                )
+            # Solo se consulta la colección si el tamaño no coincide con el conocido
+            if self._vector_size != vector_size:
+                self._prepare_collection(vector_size)
             
-            # Qdrant puede tener límites en el tamaño del batch
-            # Dividir en batches de 100 puntos para evitar problemas
-            batch_size = 100
-            total_points = len(points)
-            inserted_count = 0
+            batch_size = max(1, settings.qdrant_upsert_batch_size)
+            pipelined = settings.qdrant_upsert_pipelined
+            batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+            logger.debug(
+                f"[QdrantRepository] Insertando {len(points)} puntos en {len(batches)} lotes "
+                f"(vector_size={vector_size}, wait={not pipelined})"
+            )
             
-            for i in range(0, total_points, batch_size):
-                batch = points[i:i + batch_size]
-                qdrant_points = [
-                    qmodels.PointStruct(
-                        id=p.get("id") or str(uuid.uuid4()),
-                        vector=p["vector"],
-                        payload=p["payload"]
-                    )
-                    for p in batch
+            if len(batches) == 1 or settings.qdrant_upsert_parallel <= 1:
+                for batch in batches:
+                    self._upsert_batch(batch, wait=not pipelined)
+            else:
+                futures = [
+                    self._get_upsert_executor().submit(self._upsert_batch, batch, not pipelined)
+                    for batch in batches
                 ]
-                
-                # Insertar batch
-                try:
-                    result = self.client.upsert(
-                        collection_name=self.collection_name,
-                        points=qdrant_points
-                    )
-                    inserted_count += len(batch)
-                    logging.info(f"Batch {i//batch_size + 1}/{(total_points + batch_size - 1)//batch_size}: {len(batch)} puntos insertados (total: {inserted_count}/{total_points})")
-                except Exception as e:
-                    logging.error(f"Error al insertar batch {i//batch_size + 1}: {str(e)}")
-                    raise
-            
-            logging.info(f"✅ Todos los puntos insertados exitosamente: {inserted_count}/{total_points}")
-            
-            # Verificar que se insertaron todos los puntos
-            if inserted_count != total_points:
-                logging.warning(f"⚠️ Advertencia: Se esperaban {total_points} puntos pero se insertaron {inserted_count}")
+                done, pending = wait_futures(futures, return_when=FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+                for future in done:
+                    # Propaga el primer error de un lote
+                    future.result()
             
+            if pipelined and barrier:
+                self.wait_for_updates()
             return True
             
         except Exception as e:
+            # La colección pudo cambiar (borrada o recreada por otro proceso): volver a comprobarla
+            self._vector_size = None
             logging.error(f"Error en upsert_points: {str(e)}", exc_info=True)
             raise
     
+    def _prepare_collection(self, vector_size: int):
+        """
+        Asegura que la colección existe con vectores de `vector_size`.
+        Una colección vacía con otro tamaño se sustituye; una con datos nunca se borra: el
+        cambio de modelo o dimensiones se hace con un re-embedding (scripts/reembed_collection.py).
+        
+        Raises:
+            ValueError: Si la colección tiene puntos de otro tamaño de vector
+        """
+        try:
+            collection_info = self.client.get_collection(self.collection_name)
+        except Exception:
+            logging.info(f"Colección no existe, creándola con tamaño {vector_size}")
+            self._create_live_collection(vector_size)
+            self._ensure_payload_indexes()
+            self._detect_sparse_support()
+            self._vector_size = vector_size
+            return
+        
+        current_size = _configured_vector_size(collection_info)
+        if current_size != vector_size:
+            if collection_info.points_count:
+                raise ValueError(
+                    f"La colección '{self.collection_name}' tiene {collection_info.points_count} vectores de "
+                    f"{current_size} dimensiones y se intentaron insertar de {vector_size}. Para cambiar de modelo "
+                    f"o dimensiones ejecuta el re-embedding (python -m scripts.reembed_collection)."
+                )
+            logging.warning(
+                f"Tamaño de vector no coincide. Colección: {current_size}, "
+                f"Esperado: {vector_size}. La colección está vacía: se sustituye..."
+            )
+            previous = self.resolve_collection()
+            self._create_live_collection(vector_size)
+            if previous != self.collection_name:
+                self.client.delete_collection(previous)
+            logging.info(f"Colección sustituida con tamaño {vector_size}")
+        self._vector_size = vector_size
+    
+    def _get_upsert_executor(self) -> ThreadPoolExecutor:
+        if self._upsert_executor is None:
+            with self._upsert_lock:
+                if self._upsert_executor is None:
+                    self._upsert_executor = ThreadPoolExecutor(
+                        max_workers=settings.qdrant_upsert_parallel,
+                        thread_name_prefix="qdrant-upsert"
+                    )
+        return self._upsert_executor
+    
+    def _upsert_batch(self, batch: List[Dict], wait: bool):
+        """Envía un lote de puntos en una sola petición de upsert"""
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                qmodels.PointStruct(
+                    id=p.get("id") or str(uuid.uuid4()),
+                    vector=self._point_vector(p),
+                    payload=p["payload"]
+                )
+                for p in batch
+            ],
+            wait=wait
+        )
+    
+    def wait_for_updates(self):
+        """
+        Barrera de consistencia: retorna cuando todos los upserts ya confirmados están aplicados.
+        
+        Qdrant aplica las actualizaciones de cada shard en orden. Un borrado por filtro llega
+        a todos los shards y, con wait=True, solo responde cuando se aplicó, es decir, después
+        de todo lo encolado antes. El filtro no coincide con ningún punto real.
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=qmodels.FilterSelector(
+                filter=qmodels.Filter(must=[qmodels.HasIdCondition(has_id=[_BARRIER_POINT_ID])])
+            ),
+            wait=True
+        )
+    
+    def _point_vector(self, point: Dict):
+        """Vector del punto: denso sin nombre y, si aplica, el disperso con nombre"""
+        sparse = point.get("sparse_vector")
+        if not self.sparse_enabled or not sparse or not sparse.get("indices"):
+            return point["vector"]
+        return {
+            "": point["vector"],
+            SPARSE_VECTOR_NAME: qmodels.SparseVector(
+                indices=sparse["indices"],
+                values=sparse["values"]
+            )
+        }
+    
+    def _build_filter(self, filter_conditions: Optional[Dict]) -> Optional[qmodels.Filter]:
+        """
+        Construye un filtro Qdrant (must + MatchValue) desde un diccionario de condiciones.
+        Excluye los documentos borrados cuyos vectores aún no eliminó el recolector.
+        """
+        deleted = get_tombstone_repository().deleted_ids()
+        if not filter_conditions and not deleted:
+            return None
+        return qmodels.Filter(
+            must=[
+                qmodels.FieldCondition(key=key, match=qmodels.MatchValue(value=value))
+                for key, value in (filter_conditions or {}).items()
+            ] or None,
+            must_not=[
+                qmodels.FieldCondition(key="document_id", match=qmodels.MatchAny(any=sorted(deleted)))
+            ] if deleted else None
+        )
+    
+    def _payload_selector(self, payload_fields: Optional[List[str]]):
+        """
+        Proyección del payload para with_payload.
+        None = payload completo, [] = sin payload (solo ids y scores), lista = solo esos campos.
+        """
+        if payload_fields is None:
+            return True
+        return list(payload_fields) if payload_fields else False
+    
+    def _to_results(self, hits) -> List[Dict]:
+        """Convierte ScoredPoint de Qdrant al formato de resultados del repositorio"""
+        results = []
+        for hit in hits:
+            result = {
+                "id": hit.id,
+                "score": hit.score if hasattr(hit, 'score') else 0.0,
+                "payload": (hit.payload if hasattr(hit, 'payload') else None) or {}
+            }
+            vector = getattr(hit, 'vector', None)
+            if vector is not None:
+                # Con vector disperso configurado Qdrant retorna {"": denso, SPARSE_VECTOR_NAME: ...}
+                result["vector"] = vector.get("") if isinstance(vector, dict) else vector
+            results.append(result)
+        return results
+    
+    def hybrid_search(
+        self,
+        query_vector: List[float],
+        sparse_vector: Optional[Dict] = None,
+        top_k: int = 10,
+        sparse_top_k: int = 10,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Búsqueda híbrida (densa + dispersa) en una sola llamada a Qdrant.
+        Ambas búsquedas se lanzan como prefetch y se fusionan en el servidor con
+        Reciprocal Rank Fusion, por lo que el score resultante NO es una similitud coseno.
+        
+        Si la colección no tiene vector disperso o la consulta no tiene términos,
+        se degrada a búsqueda densa (scores coseno).
+        
+        Args:
+            query_vector: Vector denso de consulta
+            sparse_vector: Vector disperso {"indices": [...], "values": [...]}
+            top_k: Número de resultados fusionados a retornar (y límite del prefetch denso)
+            sparse_top_k: Límite del prefetch disperso
+            filter_conditions: Condiciones de filtro (opcional)
+            payload_fields: Campos del payload a retornar (None = todos, [] = ninguno)
+        
+        Returns:
+            Tupla (resultados, fused) donde fused indica si los scores son de fusión
+        """
+        if not self._can_hybrid(sparse_vector):
+            return self.search(query_vector, top_k=top_k, filter_conditions=filter_conditions, payload_fields=payload_fields), False
+        
+        try:
+            query_result = self.client.query_points(
+                **self._query_kwargs(self._hybrid_request(query_vector, sparse_vector, top_k, sparse_top_k, filter_conditions, payload_fields))
+            )
+            hits = query_result.points if hasattr(query_result, 'points') else []
+            logger.debug(f"[QdrantRepository] Búsqueda híbrida retornó {len(hits)} resultados")
+            return self._to_results(hits), True
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error en búsqueda híbrida, usando búsqueda densa: {e}", exc_info=True)
+            return self.search(query_vector, top_k=top_k, filter_conditions=filter_conditions, payload_fields=payload_fields), False
+    
+    async def ahybrid_search(
+        self,
+        query_vector: List[float],
+        sparse_vector: Optional[Dict] = None,
+        top_k: int = 10,
+        sparse_top_k: int = 10,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Versión asíncrona de hybrid_search usando AsyncQdrantClient
+        (agrupada con otras consultas concurrentes si el micro-batching está habilitado).
+        with_vectors=True añade el vector denso de cada hit (para MMR en el empaquetado de contexto).
+        
+        Returns:
+            Tupla (resultados, fused) donde fused indica si los scores son de fusión
+        """
+        if not self._can_hybrid(sparse_vector):
+            return await self.asearch(
+                query_vector, top_k=top_k, filter_conditions=filter_conditions,
+                payload_fields=payload_fields, with_vectors=with_vectors
+            ), False
+        
+        try:
+            hits = await self._aquery(
+                self._hybrid_request(
+                    query_vector, sparse_vector, top_k, sparse_top_k, filter_conditions, payload_fields, with_vectors
+                )
+            )
+            logger.debug(f"[QdrantRepository] Búsqueda híbrida async retornó {len(hits)} resultados")
+            return self._to_results(hits), True
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error en búsqueda híbrida async, usando búsqueda densa: {e}", exc_info=True)
+            return await self.asearch(
+                query_vector, top_k=top_k, filter_conditions=filter_conditions,
+                payload_fields=payload_fields, with_vectors=with_vectors
+            ), False
+    
+    def _can_hybrid(self, sparse_vector: Optional[Dict]) -> bool:
+        """La búsqueda híbrida requiere vector disperso en la colección y términos en la consulta"""
+        return bool(self.sparse_enabled and sparse_vector and sparse_vector.get("indices"))
+    
+    def _hybrid_request(
+        self,
+        query_vector: List[float],
+        sparse_vector: Dict,
+        top_k: int,
+        sparse_top_k: int,
+        filter_conditions: Optional[Dict],
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> qmodels.QueryRequest:
+        """Consulta híbrida: prefetch denso + disperso fusionados con RRF"""
+        filter_obj = self._build_filter(filter_conditions)
+        return qmodels.QueryRequest(
+            prefetch=[
+                qmodels.Prefetch(query=query_vector, limit=top_k, filter=filter_obj, params=self.search_params),
+                qmodels.Prefetch(
+                    query=qmodels.SparseVector(
+                        indices=sparse_vector["indices"],
+                        values=sparse_vector["values"]
+                    ),
+                    using=SPARSE_VECTOR_NAME,
+                    limit=sparse_top_k,
+                    filter=filter_obj
+                ),
+            ],
+            query=qmodels.FusionQuery(fusion=qmodels.Fusion.RRF),
+            limit=top_k,
+            with_payload=self._payload_selector(payload_fields),
+            with_vector=with_vectors,
+        )
+    
+    def _dense_request(
+        self,
+        query_vector: List[float],
+        top_k: int,
+        filter_conditions: Optional[Dict],
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> qmodels.QueryRequest:
+        """Consulta densa simple sobre el vector sin nombre"""
+        return qmodels.QueryRequest(
+            query=query_vector,
+            filter=self._build_filter(filter_conditions),
+            params=self.search_params,
+            limit=top_k,
+            with_payload=self._payload_selector(payload_fields),
+            with_vector=with_vectors,
+        )
+    
+    def _query_kwargs(self, request: qmodels.QueryRequest) -> Dict:
+        """Convierte un QueryRequest en argumentos de query_points()"""
+        return {
+            "collection_name": self.collection_name,
+            "prefetch": request.prefetch,
+            "query": request.query,
+            "using": request.using,
+            "query_filter": request.filter,
+            "search_params": request.params,
+            "limit": request.limit,
+            "with_payload": request.with_payload,
+            "with_vectors": request.with_vector,
+        }
+    
+    async def _aquery(self, request: qmodels.QueryRequest) -> List:
+        """Ejecuta una consulta async, agrupándola en un lote si el micro-batching está habilitado"""
+        if settings.qdrant_search_batching_enabled:
+            return await self._batchers.get().submit(request)
+        query_result = await self.aclient.query_points(**self._query_kwargs(request))
+        return query_result.points if hasattr(query_result, 'points') else []
+    
+    async def asearch(
+        self,
+        query_vector: List[float],
+        top_k: int = 5,
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None,
+        with_vectors: bool = False
+    ) -> List[Dict]:
+        """
+        Versión asíncrona de search usando AsyncQdrantClient.query_points()
+        (agrupada con otras consultas concurrentes si el micro-batching está habilitado).
+        
+        Returns:
+            Lista de resultados con score y payload
+        """
+        try:
+            hits = await self._aquery(self._dense_request(query_vector, top_k, filter_conditions, payload_fields, with_vectors))
+            logger.debug(f"[QdrantRepository] Búsqueda async retornó {len(hits)} resultados")
+            return self._to_results(hits)
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error en búsqueda async: {e}", exc_info=True)
+            return []
+    
+    def _merge_payloads(self, hits: List[Dict], records) -> List[Dict]:
+        """Asigna a cada hit el payload recuperado por id (conserva orden y scores)"""
+        payloads = {record.id: record.payload or {} for record in records}
+        return [{**hit, "payload": payloads.get(hit["id"], hit.get("payload") or {})} for hit in hits]
+    
+    def fetch_payloads(self, hits: List[Dict], payload_fields: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Segunda fase de una búsqueda en dos pasos: recupera el payload solo de los hits
+        que sobrevivieron al filtrado (la primera fase se hace con payload_fields=[]).
+        
+        Args:
+            hits: Resultados de search/hybrid_search (id y score)
+            payload_fields: Campos del payload a recuperar (None = todos)
+        
+        Returns:
+            Los mismos hits, en el mismo orden, con el payload completado
+        """
+        if not hits:
+            return []
+        try:
+            records = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=[hit["id"] for hit in hits],
+                with_payload=self._payload_selector(payload_fields),
+                with_vectors=False
+            )
+            return self._merge_payloads(hits, records)
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error al recuperar payloads: {e}", exc_info=True)
+            return hits
+    
+    async def afetch_payloads(self, hits: List[Dict], payload_fields: Optional[List[str]] = None) -> List[Dict]:
+        """Versión asíncrona de fetch_payloads usando AsyncQdrantClient.retrieve()"""
+        if not hits:
+            return []
+        try:
+            records = await self.aclient.retrieve(
+                collection_name=self.collection_name,
+                ids=[hit["id"] for hit in hits],
+                with_payload=self._payload_selector(payload_fields),
+                with_vectors=False
+            )
+            return self._merge_payloads(hits, records)
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error al recuperar payloads async: {e}", exc_info=True)
+            return hits
+    
     def search(
         self, 
         query_vector: List[float], 
         top_k: int = 5,
-        filter_conditions: Optional[Dict] = None
+        filter_conditions: Optional[Dict] = None,
+        payload_fields: Optional[List[str]] = None
     ) -> List[Dict]:
         """
         Busca vectores similares en Qdrant.
+        Nunca retorna los vectores almacenados; el payload se proyecta a payload_fields.
         
         Args:
             query_vector: Vector de consulta
             top_k: Número de resultados a retornar
             filter_conditions: Condiciones de filtro (opcional)
+            payload_fields: Campos del payload a retornar (None = todos, [] = ninguno)
         
         Returns:
             Lista de resultados con score y payload
@@ -249,18 +723,9 @@ class QdrantRepository:
                 logger.error("[QdrantRepository] Cliente Qdrant no está disponible")
                 return []
             
-            filter_obj = None
-            if filter_conditions:
-                # Construir filtro Qdrant desde condiciones
-                must_conditions = []
-                for key, value in filter_conditions.items():
-                    must_conditions.append(
-                        qmodels.FieldCondition(
-                            key=key,
-                            match=qmodels.MatchValue(value=value)
-                        )
-                    )
-                filter_obj = qmodels.Filter(must=must_conditions)
+            # Construir filtro Qdrant desde condiciones
+            filter_obj = self._build_filter(filter_conditions)
+            with_payload = self._payload_selector(payload_fields)
             
             logger.debug(f"[QdrantRepository] Buscando en colección '{self.collection_name}' con top_k={top_k}, vector_size={len(query_vector)}")
             
@@ -278,7 +743,10 @@ class QdrantRepository:
                         collection_name=self.collection_name,
                         query_vector=query_vector,
                         limit=top_k,
-                        query_filter=filter_obj
+                        query_filter=filter_obj,
+                        with_payload=with_payload,
+                        with_vectors=False,
+                        search_params=self.search_params
                     )
                     hits = search_result if isinstance(search_result, list) else (search_result.points if hasattr(search_result, 'points') else [])
                     
@@ -290,7 +758,10 @@ class QdrantRepository:
                             collection_name=self.collection_name,
                             query=query_vector,  # Vector directo como lista
                             limit=top_k,
-                            query_filter=filter_obj
+                            query_filter=filter_obj,
+                            with_payload=with_payload,
+                            with_vectors=False,
+                            search_params=self.search_params
                         )
                         hits = query_result.points if hasattr(query_result, 'points') else []
                     except Exception:
@@ -299,7 +770,10 @@ class QdrantRepository:
                             collection_name=self.collection_name,
                             query=qmodels.Query(vector=query_vector),
                             limit=top_k,
-                            query_filter=filter_obj
+                            query_filter=filter_obj,
+                            with_payload=with_payload,
+                            with_vectors=False,
+                            search_params=self.search_params
                         )
                         hits = query_result.points if hasattr(query_result, 'points') else []
                     
@@ -309,7 +783,10 @@ class QdrantRepository:
                         collection_name=self.collection_name,
                         query_vector=query_vector,
                         limit=top_k,
-                        query_filter=filter_obj
+                        query_filter=filter_obj,
+                        with_payload=with_payload,
+                        with_vectors=False,
+                        search_params=self.search_params
                     )
                 
                 logger.debug(f"[QdrantRepository] Búsqueda con {self._search_method_name} retornó {len(hits)} resultados")
@@ -321,17 +798,8 @@ class QdrantRepository:
             logger.debug(f"[QdrantRepository] Búsqueda retornó {len(hits)} resultados")
             
             # Procesar resultados según el tipo de respuesta
-            results = []
-            for hit in hits:
-                # query_points() retorna ScoredPoint, search() retorna ScoredPoint también
-                # Ambos tienen id, score y payload
-                results.append({
-                    "id": hit.id if hasattr(hit, 'id') else str(hit.id),
-                    "score": hit.score if hasattr(hit, 'score') else 0.0,
-                    "payload": hit.payload if hasattr(hit, 'payload') else {}
-                })
-            
-            return results
+            # query_points() y search() retornan ScoredPoint (id, score y payload)
+            return self._to_results(hits)
         except Exception as e:
             logger.error(f"[QdrantRepository] Error en búsqueda: {e}", exc_info=True)
             return []
@@ -401,6 +869,122 @@ class QdrantRepository:
             logger.warning(f"Error al eliminar (puede que no existan vectores): {e}")
             return True  # Considerar éxito si no es error de conexión
     
+    def delete_points_batch(self, document_id: str, limit: int) -> int:
+        """
+        Elimina hasta `limit` puntos de un documento (recolección de documentos borrados).
+        Borrar por IDs en lotes acotados no bloquea la colección como un borrado por filtro
+        de decenas de miles de puntos.
+        
+        Returns:
+            Puntos eliminados (0 = el documento ya no tiene puntos)
+        """
+        records, _ = self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="document_id", match=qmodels.MatchValue(value=document_id))
+            ]),
+            limit=limit,
+            with_payload=False,
+            with_vectors=False
+        )
+        if not records:
+            return 0
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=qmodels.PointIdsList(points=[record.id for record in records]),
+            wait=True
+        )
+        return len(records)
+    
+    def delete_revision(self, document_id: str, revision: str, keep: bool = False) -> bool:
+        """
+        Elimina los puntos de un documento según su revisión de ingesta.
+        
+        Args:
+            document_id: ID del documento
+            revision: Revisión (payload "revision") escrita por una ingesta
+            keep: False = eliminar los puntos de esa revisión (rollback de una re-indexación);
+                  True = conservar solo esa revisión y eliminar el resto (fin de una re-indexación)
+        
+        Returns:
+            True si la operación fue exitosa
+        """
+        document_condition = qmodels.FieldCondition(key="document_id", match=qmodels.MatchValue(value=document_id))
+        revision_condition = qmodels.FieldCondition(key="revision", match=qmodels.MatchValue(value=revision))
+        if keep:
+            # Los puntos sin campo "revision" (ingestas anteriores) también se eliminan
+            points_filter = qmodels.Filter(must=[document_condition], must_not=[revision_condition])
+        else:
+            points_filter = qmodels.Filter(must=[document_condition, revision_condition])
+        try:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=qmodels.FilterSelector(filter=points_filter)
+            )
+            return True
+        except Exception as e:
+            logger.error(f"[QdrantRepository] Error eliminando la revisión {revision} de document_id={document_id}: {e}")
+            return False
+    
+    def get_vectors_by_chunk_hashes(self, chunk_hashes: List[str], signature: str) -> Dict[str, List[float]]:
+        """
+        Vectores densos ya almacenados para chunks con esos hashes de contenido.
+        
+        Args:
+            chunk_hashes: Hashes de chunk (ver utils.content_hash.chunk_hash)
+            signature: Firma del espacio de embeddings; solo se reutilizan vectores del mismo modelo
+        
+        Returns:
+            Diccionario {chunk_hash: vector} con los hashes encontrados
+        """
+        wanted = set(chunk_hashes)
+        found: Dict[str, List[float]] = {}
+        if not wanted:
+            return found
+        scroll_filter = qmodels.Filter(must=[
+            qmodels.FieldCondition(key="chunk_hash", match=qmodels.MatchAny(any=list(wanted))),
+            qmodels.FieldCondition(key="embedding_signature", match=qmodels.MatchValue(value=signature)),
+        ])
+        offset = None
+        try:
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=scroll_filter,
+                    limit=max(len(wanted), 64),
+                    offset=offset,
+                    with_payload=["chunk_hash"],
+                    with_vectors=True
+                )
+                for record in records:
+                    vector = record.vector.get("") if isinstance(record.vector, dict) else record.vector
+                    content_hash = (record.payload or {}).get("chunk_hash")
+                    if content_hash and vector is not None:
+                        found.setdefault(content_hash, vector)
+                # El mismo chunk puede estar en varios documentos: parar en cuanto estén todos
+                if offset is None or len(found) == len(wanted):
+                    break
+        except Exception as e:
+            logger.warning(f"[QdrantRepository] Error al buscar vectores por hash de chunk: {e}")
+        return found
+    
+    def find_document_id_by_file_hash(self, file_hash: str) -> Optional[str]:
+        """
+        document_id de un documento ya indexado con el mismo hash de archivo (None si no hay).
+        """
+        try:
+            records, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._build_filter({"file_hash": file_hash}),
+                limit=1,
+                with_payload=["document_id"],
+                with_vectors=False
+            )
+        except Exception as e:
+            logger.warning(f"[QdrantRepository] Error al buscar documento por hash de archivo: {e}")
+            return None
+        return (records[0].payload or {}).get("document_id") if records else None
+    
     def get_collection_info(self) -> Dict:
         """Obtiene información sobre la colección"""
         try:
@@ -454,12 +1038,18 @@ _qdrant_repo_instance = None
 
 def get_qdrant_repository() -> QdrantRepository:
     """
-    Obtiene la instancia singleton de QdrantRepository.
+    Obtiene la instancia singleton del repositorio vectorial.
     Garantiza que solo se inicialice una vez la conexión con Qdrant.
+    Con settings.vector_backend = "local" retorna el índice embebido (LocalVectorRepository),
+    que expone la misma interfaz sin servicio externo.
     """
     global _qdrant_repo_instance
     if _qdrant_repo_instance is None:
-        _qdrant_repo_instance = QdrantRepository()
+        if settings.vector_backend == "local":
+            from .local_vector_repository import LocalVectorRepository
+            _qdrant_repo_instance = LocalVectorRepository()
+        else:
+            _qdrant_repo_instance = QdrantRepository()
     return _qdrant_repo_instance
 
 
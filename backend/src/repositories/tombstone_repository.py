@@ -0,0 +1,179 @@
+"""
+Repositorio de marcas de borrado (tombstones) de documentos.
+
+Borrar un documento no elimina sus vectores en línea: se escribe una marca en
+PostgreSQL (persistente) y en un set de Redis (compartido entre workers), y las
+búsquedas excluyen esos document_id desde ese momento. El recolector en segundo
+plano (services/document_gc.py) elimina después los vectores y archivos por lotes
+y marca la tombstone como purgada.
+
+Cada proceso mantiene una copia en memoria del conjunto de document_id borrados y la
+renueva como mucho cada settings.tombstone_refresh_seconds en un hilo aparte, de modo que
+filtrar una búsqueda (dentro del event loop) no añade viajes a Redis ni a la base de
+datos. Sin Redis el conjunto se lee de la base de datos.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, FrozenSet, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session as SQLSession
+from ..settings import settings
+from ..core.cache import get_redis_client
+from ..models.database import DocumentTombstone, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_SET_KEY = "docs:tombstones"
+
+
+class TombstoneRepository:
+    """Marcas de borrado de documentos pendientes de purgar"""
+
+    def __init__(self, redis_client: Optional[Any] = None, refresh_seconds: Optional[float] = None):
+        """
+        Args:
+            redis_client: Cliente Redis (por defecto el compartido; None si no hay Redis)
+            refresh_seconds: Antigüedad máxima de la copia en memoria (settings.tombstone_refresh_seconds)
+        """
+        self.redis_client = redis_client if redis_client is not None else get_redis_client()
+        self.refresh_seconds = settings.tombstone_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._lock = threading.Lock()
+        self._ids: FrozenSet[str] = frozenset()
+        self._loaded_at = 0.0
+        self._refreshing = False
+        # Marcados por este proceso desde la última renovación (una lectura en curso puede no verlos)
+        self._added: Set[str] = set()
+
+    def add(self, db: SQLSession, documents: Iterable[Tuple[str, Optional[str]]]) -> List[str]:
+        """
+        Marca documentos como borrados (idempotente).
+
+        Args:
+            db: Sesión de base de datos
+            documents: Pares (document_id, filename)
+
+        Returns:
+            document_id marcados
+        """
+        # Un document_id repetido en la misma llamada se marca una sola vez
+        documents = list(dict(documents).items())
+        if not documents:
+            return []
+        document_ids = [document_id for document_id, _ in documents]
+        existing = {
+            document_id for (document_id,) in
+            db.query(DocumentTombstone.document_id).filter(DocumentTombstone.document_id.in_(document_ids)).all()
+        }
+        for document_id, filename in documents:
+            if document_id not in existing:
+                db.add(DocumentTombstone(document_id=document_id, filename=filename))
+        db.commit()
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.sadd(TOMBSTONE_SET_KEY, *document_ids)
+            except Exception as e:
+                logger.warning(f"[Tombstones] Error al publicar tombstones en Redis: {e}")
+        # Visibles de inmediato en este proceso; el resto de workers las ve al renovar su copia
+        with self._lock:
+            self._ids = self._ids.union(document_ids)
+            self._added.update(document_ids)
+        return document_ids
+
+    def deleted_ids(self) -> FrozenSet[str]:
+        """
+        document_id borrados cuyas búsquedas deben excluirse.
+        No bloquea: si la copia caducó, se renueva en un hilo y se retorna la actual.
+        """
+        if time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self.refresh, name="tombstones-refresh", daemon=True).start()
+        return self._ids
+
+    def is_deleted(self, document_id: str) -> bool:
+        return document_id in self.deleted_ids()
+
+    def refresh(self):
+        """Relee el conjunto de tombstones (bloqueante: al arrancar o desde el hilo de renovación)"""
+        try:
+            self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        ids: Optional[FrozenSet[str]] = None
+        if self.redis_client is not None:
+            try:
+                ids = frozenset(self.redis_client.smembers(TOMBSTONE_SET_KEY))
+            except Exception as e:
+                logger.debug(f"[Tombstones] Error al leer tombstones de Redis, usando la base de datos: {e}")
+        if ids is None:
+            db = SessionLocal()
+            try:
+                ids = frozenset(document_id for (document_id,) in self._pending_query(db).all())
+            except Exception as e:
+                logger.warning(f"[Tombstones] Error al leer tombstones de la base de datos: {e}")
+                ids = self._ids
+            finally:
+                db.close()
+        with self._lock:
+            self._ids = ids.union(self._added)
+            self._added = set()
+            self._loaded_at = time.monotonic()
+
+    def _pending_query(self, db: SQLSession):
+        return db.query(DocumentTombstone.document_id).filter(DocumentTombstone.purged_at.is_(None))
+
+    def pending(self, db: SQLSession, limit: int = 100) -> List[DocumentTombstone]:
+        """Tombstones cuyos vectores aún no se eliminaron, de la más antigua a la más reciente"""
+        return (
+            db.query(DocumentTombstone)
+            .filter(DocumentTombstone.purged_at.is_(None))
+            .order_by(DocumentTombstone.deleted_at)
+            .limit(limit)
+            .all()
+        )
+
+    def publish_pending(self, db: SQLSession):
+        """Vuelve a publicar en Redis las tombstones pendientes (p. ej. tras reiniciar Redis)"""
+        if self.redis_client is None:
+            return
+        document_ids = [document_id for (document_id,) in self._pending_query(db).all()]
+        if not document_ids:
+            return
+        try:
+            self.redis_client.sadd(TOMBSTONE_SET_KEY, *document_ids)
+        except Exception as e:
+            logger.debug(f"[Tombstones] Error al publicar tombstones pendientes en Redis: {e}")
+
+    def mark_purged(self, db: SQLSession, document_id: str, points_deleted: int):
+        """Registra que los vectores del documento ya se eliminaron y deja de filtrarlo"""
+        tombstone = db.query(DocumentTombstone).filter(DocumentTombstone.document_id == document_id).first()
+        if tombstone is not None:
+            tombstone.purged_at = datetime.utcnow()
+            tombstone.points_deleted = (tombstone.points_deleted or 0) + points_deleted
+            db.commit()
+        if self.redis_client is not None:
+            try:
+                self.redis_client.srem(TOMBSTONE_SET_KEY, document_id)
+            except Exception as e:
+                logger.debug(f"[Tombstones] Error al retirar la tombstone {document_id} de Redis: {e}")
+        with self._lock:
+            self._ids = self._ids - {document_id}
+            self._added.discard(document_id)
+
+
+# Instancia global del repositorio de tombstones
+_tombstone_repository: Optional[TombstoneRepository] = None
+
+
+def get_tombstone_repository() -> TombstoneRepository:
+    """Obtiene la instancia global del repositorio de tombstones."""
+    global _tombstone_repository
+    if _tombstone_repository is None:
+        _tombstone_repository = TombstoneRepository()
+    return _tombstone_repository
@@ -0,0 +1,210 @@
+"""
+Recolector de documentos borrados.
+
+DELETE /files/{document_id} solo escribe una tombstone (repositories/tombstone_repository.py)
+y elimina los metadatos: las búsquedas dejan de ver el documento al instante. Este
+recolector elimina después, en segundo plano, los vectores por lotes de
+settings.document_gc_batch_size puntos, el PDF y el texto extraído, y marca la tombstone
+como purgada.
+
+Corre en cada worker cada settings.document_gc_interval segundos (o antes, al borrar
+documentos). Con Redis, un lock evita que varios workers recolecten a la vez; sin Redis
+el trabajo es idempotente y solo se repetiría.
+"""
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+from ..settings import settings
+from ..core.cache import get_redis_client
+from ..core.metrics import register_metrics
+from ..models.database import SessionLocal
+from ..repositories.qdrant_repository import get_qdrant_repository
+from ..repositories.document_repository import DocumentRepository
+from ..repositories.tombstone_repository import TombstoneRepository, get_tombstone_repository
+
+logger = logging.getLogger(__name__)
+
+GC_LOCK_KEY = "docs:gc:lock"
+
+
+class DocumentGarbageCollector:
+    """Elimina en segundo plano los vectores y archivos de los documentos borrados"""
+
+    def __init__(
+        self,
+        vector_repo=None,
+        document_repo: Optional[DocumentRepository] = None,
+        tombstones: Optional[TombstoneRepository] = None,
+        batch_size: int = 1000,
+        interval: float = 30.0,
+        redis_client: Optional[Any] = None
+    ):
+        """
+        Args:
+            vector_repo: Repositorio vectorial (por defecto get_qdrant_repository())
+            document_repo: Repositorio de archivos subidos
+            tombstones: Repositorio de tombstones (por defecto el global)
+            batch_size: Puntos eliminados por petición
+            interval: Segundos entre pasadas
+            redis_client: Cliente Redis para el lock entre workers (None = sin lock)
+        """
+        self._vector_repo = vector_repo
+        self.document_repo = document_repo or DocumentRepository()
+        self.tombstones = tombstones or get_tombstone_repository()
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.redis_client = redis_client
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._lock = threading.Lock()
+        self.passes = 0
+        self.documents_purged = 0
+        self.points_deleted = 0
+        self.errors = 0
+        self.pending = 0
+        self.last_pass_seconds = 0.0
+
+    @property
+    def vector_repo(self):
+        if self._vector_repo is None:
+            self._vector_repo = get_qdrant_repository()
+        return self._vector_repo
+
+    def run_once(self) -> int:
+        """
+        Una pasada: purga todas las tombstones pendientes.
+
+        Returns:
+            Documentos purgados en la pasada
+        """
+        token = uuid.uuid4().hex
+        if not self._acquire_lock(token):
+            return 0
+        start = time.perf_counter()
+        purged = 0
+        db = SessionLocal()
+        try:
+            self.tombstones.publish_pending(db)
+            pending = self.tombstones.pending(db)
+            for tombstone in pending:
+                try:
+                    deleted = self._purge(tombstone.document_id)
+                except Exception as e:
+                    # Se reintenta en la siguiente pasada; la tombstone sigue filtrando las búsquedas
+                    with self._lock:
+                        self.errors += 1
+                    logger.warning(f"[DocumentGC] Error al purgar document_id={tombstone.document_id}: {e}")
+                    continue
+                self.tombstones.mark_purged(db, tombstone.document_id, deleted)
+                purged += 1
+                logger.info(f"[DocumentGC] document_id={tombstone.document_id} purgado ({deleted} vectores)")
+            remaining = len(pending) - purged
+        finally:
+            db.close()
+            self._release_lock(token)
+        with self._lock:
+            self.passes += 1
+            self.documents_purged += purged
+            self.pending = remaining
+            self.last_pass_seconds = time.perf_counter() - start
+        return purged
+
+    def _purge(self, document_id: str) -> int:
+        """Elimina los vectores del documento por lotes y después sus archivos"""
+        total = 0
+        while True:
+            deleted = self.vector_repo.delete_points_batch(document_id, self.batch_size)
+            if not deleted:
+                break
+            total += deleted
+            with self._lock:
+                self.points_deleted += deleted
+        self.document_repo.delete_file(document_id)
+        return total
+
+    def _acquire_lock(self, token: str) -> bool:
+        if self.redis_client is None:
+            return True
+        try:
+            # El TTL libera el lock si el worker que lo tiene muere a mitad de una pasada
+            return bool(self.redis_client.set(GC_LOCK_KEY, token, nx=True, ex=max(60, int(self.interval * 10))))
+        except Exception as e:
+            logger.debug(f"[DocumentGC] Error al tomar el lock en Redis, se recolecta sin lock: {e}")
+            return True
+
+    def _release_lock(self, token: str):
+        if self.redis_client is None:
+            return
+        try:
+            if self.redis_client.get(GC_LOCK_KEY) == token:
+                self.redis_client.delete(GC_LOCK_KEY)
+        except Exception as e:
+            logger.debug(f"[DocumentGC] Error al liberar el lock en Redis: {e}")
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"[DocumentGC] Error en la pasada de recolección: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        """Lanza el recolector en el event loop actual (idempotente)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_forever())
+        logger.info(f"[DocumentGC] Recolector iniciado (intervalo {self.interval}s, lotes de {self.batch_size} puntos)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def wake(self):
+        """Adelanta la siguiente pasada (p. ej. tras borrar documentos); seguro desde cualquier hilo"""
+        if self._loop is None or self._wakeup is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "documents_purged": self.documents_purged,
+                "points_deleted": self.points_deleted,
+                "errors": self.errors,
+                "pending": self.pending,
+                "last_pass_ms": round(self.last_pass_seconds * 1000, 1),
+                "tombstones_filtered": len(self.tombstones.deleted_ids()),
+            }
+
+
+# Instancia global del recolector
+_document_gc: Optional[DocumentGarbageCollector] = None
+
+
+def get_document_gc() -> DocumentGarbageCollector:
+    """Obtiene la instancia global del recolector de documentos borrados."""
+    global _document_gc
+    if _document_gc is None:
+        _document_gc = DocumentGarbageCollector(
+            batch_size=settings.document_gc_batch_size,
+            interval=settings.document_gc_interval,
+            redis_client=get_redis_client()
+        )
+        register_metrics("document_gc", _document_gc.stats)
+    return _document_gc
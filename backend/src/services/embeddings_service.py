@@ -1,29 +1,42 @@
 """
 Servicio de embeddings - Refactorizado para usar repositorios y utilidades
 """
-import os
 import uuid
+import asyncio
 import logging
-from typing import List
+from typing import Optional
 from ..repositories.qdrant_repository import get_qdrant_repository
-from ..utils.text_processing import text_splitter, process_pdf_to_text
-from ..utils.embeddings import embedding_for_text_batch
-from ..settings import settings
+from ..repositories.document_repository import DocumentRepository
+from ..utils.content_hash import file_sha256
+from .ingestion_pipeline import ingest_pdf, ingest_pages, IngestionProgress
 
 logger = logging.getLogger(__name__)
 
 # Instancia global del repositorio Qdrant (Lazy loaded via singleton)
 # _qdrant_repo se puede reemplazar por llamadas directas a get_qdrant_repository() pero para minimizar cambios:
 _qdrant_repo = get_qdrant_repository()
+# Archivos subidos y texto extraído por página (para re-indexar sin volver a leer el PDF)
+_document_repo = DocumentRepository()
 
 
-async def process_and_store_pdf(path: str, document_id: str = None) -> str:
+async def process_and_store_pdf(
+    path: str,
+    document_id: str = None,
+    progress: Optional[IngestionProgress] = None,
+    file_hash: Optional[str] = None
+) -> str:
     """
     Procesa un PDF, genera embeddings y los guarda en Qdrant.
+    OPTIMIZACIÓN: Pipeline por etapas (páginas -> chunks -> embeddings -> upserts) con colas
+    acotadas: la memoria es constante y las etapas se solapan (ver ingestion_pipeline.py).
+    El texto extraído de cada página se guarda comprimido junto al PDF para re-indexar
+    después sin volver a parsearlo (ver reindex_document).
     
     Args:
         path: Ruta al archivo PDF
         document_id: ID del documento (se genera si no se proporciona)
+        progress: IngestionProgress opcional para seguir el avance
+        file_hash: SHA-256 del archivo si ya se calculó al subirlo
     
     Returns:
         document_id del documento procesado
@@ -33,81 +46,110 @@ async def process_and_store_pdf(path: str, document_id: str = None) -> str:
 
     logger.info(f"Procesando PDF: {path} (document_id: {document_id})")
     
-    # Extraer texto del PDF
     try:
-        text = process_pdf_to_text(path)
-        if not text or not text.strip():
-            raise ValueError(f"No se pudo extraer texto del PDF o el PDF está vacío: {path}")
-        logger.info(f"Texto extraído: {len(text)} caracteres")
-    except Exception as e:
-        logger.error(f"Error al extraer texto del PDF: {str(e)}", exc_info=True)
-        raise
-    
-    # Dividir en chunks
-    try:
-        chunks = text_splitter(
-            text, 
-            chunk_size=settings.chunk_size, 
-            overlap=settings.chunk_overlap
+        progress = await ingest_pdf(
+            path,
+            document_id,
+            _qdrant_repo,
+            progress=progress,
+            file_hash=file_hash,
+            page_sink=lambda pages: _document_repo.tee_page_text(document_id, pages)
         )
-        if not chunks:
-            raise ValueError("No se generaron chunks del texto")
-        logger.info(f"Texto dividido en {len(chunks)} chunks")
     except Exception as e:
-        logger.error(f"Error al dividir texto en chunks: {str(e)}", exc_info=True)
+        logger.error(f"❌ Error en la ingesta del PDF {path}: {str(e)}", exc_info=True)
+        # Retirar los batches que ya se hubieran insertado
+        rollback_document(document_id)
         raise
     
-    # Generar embeddings
-    try:
-        logger.info(f"Generando embeddings para {len(chunks)} chunks...")
-        embeddings = embedding_for_text_batch(chunks)
-        if not embeddings or len(embeddings) != len(chunks):
-            raise ValueError(f"Error al generar embeddings: se esperaban {len(chunks)}, se obtuvieron {len(embeddings) if embeddings else 0}")
-        logger.info(f"Embeddings generados exitosamente")
-    except Exception as e:
-        logger.error(f"Error al generar embeddings: {str(e)}", exc_info=True)
-        raise
+    if progress.chunks_stored == 0:
+        raise ValueError(f"No se pudo extraer texto del PDF o el PDF está vacío: {path}")
+    
+    logger.info(f"✅ Puntos insertados exitosamente en Qdrant para document_id: {document_id} ({progress.chunks_stored} chunks)")
+    return document_id
+
+
+async def reindex_document(document_id: str, progress: Optional[IngestionProgress] = None) -> IngestionProgress:
+    """
+    Re-indexa un documento con la configuración de chunking actual (chunk_size, chunk_overlap).
+    Parte del texto por página guardado en la ingesta, sin volver a parsear el PDF, y solo
+    pide embeddings de los chunks cuyo texto cambió: los demás reutilizan su vector por hash.
+    Los chunks nuevos se escriben con una revisión nueva y al terminar se eliminan los de
+    revisiones anteriores; si falla, se retiran los nuevos y el documento queda como estaba.
+    
+    Args:
+        document_id: ID del documento
+        progress: IngestionProgress opcional para seguir el avance
+    
+    Returns:
+        IngestionProgress final (chunks_reused = chunks que no se volvieron a embeber)
     
-    # Preparar puntos para Qdrant
+    Raises:
+        FileNotFoundError: Si no hay texto guardado ni PDF del documento
+    """
+    revision = uuid.uuid4().hex
+    pdf_path = _document_repo.get_file_path(document_id)
+    has_text = _document_repo.has_page_text(document_id)
+    if pdf_path is None and not has_text:
+        raise FileNotFoundError(f"No hay texto guardado ni PDF para document_id={document_id}")
+    file_hash = await asyncio.to_thread(file_sha256, str(pdf_path)) if pdf_path else None
+
     try:
-        points = []
-        for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            points.append({
-                "vector": emb,
-                "payload": {
-                    "text": chunk,
-                    "source": os.path.basename(path),
-                    "chunk_index": i,
-                    "document_id": document_id
-                }
-            })
-        logger.info(f"Preparados {len(points)} puntos para insertar en Qdrant")
-    except Exception as e:
-        logger.error(f"Error al preparar puntos: {str(e)}", exc_info=True)
+        if has_text:
+            progress = await ingest_pages(
+                lambda: _document_repo.iter_page_text(document_id),
+                lambda: _document_repo.count_page_text(document_id),
+                pdf_path.name if pdf_path else document_id,
+                document_id,
+                _qdrant_repo,
+                progress=progress,
+                file_hash=file_hash,
+                revision=revision
+            )
+        else:
+            # Documento ingerido antes de guardar el texto: se extrae (y se guarda) una única vez
+            logger.info(f"document_id={document_id} sin texto guardado; extrayendo del PDF")
+            progress = await ingest_pdf(
+                str(pdf_path),
+                document_id,
+                _qdrant_repo,
+                progress=progress,
+                file_hash=file_hash,
+                page_sink=lambda pages: _document_repo.tee_page_text(document_id, pages),
+                revision=revision
+            )
+        if progress.chunks_stored == 0:
+            raise ValueError(f"La re-indexación de document_id={document_id} no generó chunks")
+    except Exception:
+        await asyncio.to_thread(_qdrant_repo.delete_revision, document_id, revision)
         raise
 
-    # Insertar en Qdrant usando el repositorio
+    await asyncio.to_thread(_qdrant_repo.delete_revision, document_id, revision, True)
+    logger.info(
+        f"✅ document_id={document_id} re-indexado: {progress.chunks_stored} chunks "
+        f"({progress.chunks_reused} con el vector reutilizado)"
+    )
+    return progress
+
+
+def rollback_document(document_id: str):
+    """Elimina los puntos de una ingesta fallida (parciales, o completos si no se pudo registrar el documento)"""
     try:
-        logger.info(f"Insertando {len(points)} puntos en Qdrant para document_id: {document_id}")
-        success = _qdrant_repo.upsert_points(points)
-        if not success:
-            raise ValueError("upsert_points retornó False")
-        
-        # Verificar que se insertaron todos los puntos
-        collection_info = _qdrant_repo.get_collection_info()
-        if isinstance(collection_info, dict) and "error" not in collection_info:
-            points_count = collection_info.get('points_count', 0)
-            logger.info(f"✅ Verificación: Colección Qdrant tiene {points_count} puntos totales después de insertar {len(points)} puntos para document_id: {document_id}")
-        else:
-            logger.warning(f"⚠️ No se pudo verificar la inserción en Qdrant: {collection_info}")
-        
-        logger.info(f"✅ Puntos insertados exitosamente en Qdrant para document_id: {document_id} ({len(points)} chunks)")
+        _qdrant_repo.delete_by_document_id(document_id)
     except Exception as e:
-        logger.error(f"❌ Error al insertar puntos en Qdrant: {str(e)}", exc_info=True)
-        logger.error(f"❌ Se intentaron insertar {len(points)} puntos pero falló")
-        raise
+        logger.warning(f"No se pudieron retirar los puntos parciales de document_id={document_id}: {e}")
+
+
+def find_document_by_file_hash(file_hash: str) -> Optional[str]:
+    """
+    Busca un documento ya indexado con el mismo contenido.
     
-    return document_id
+    Args:
+        file_hash: SHA-256 del archivo
+    
+    Returns:
+        document_id del documento existente o None
+    """
+    return _qdrant_repo.find_document_id_by_file_hash(file_hash)
 
 
 def delete_by_id(document_id: str) -> bool:
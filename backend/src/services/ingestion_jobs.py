@@ -0,0 +1,417 @@
+"""
+Jobs de ingesta asíncronos.
+
+POST /files/upload guarda el archivo, crea un job y responde 202 de inmediato; la
+ingesta (pipeline de ingestion_pipeline.py) corre en segundo plano en un pool
+acotado de ingest_max_concurrent_jobs jobs por worker. El estado del job (etapa,
+páginas y chunks procesados, ETA) se consulta en GET /files/jobs/{id}.
+
+El estado se guarda en memoria y, si Redis está disponible, también en Redis para
+que cualquier worker de la API pueda responder la consulta de progreso. Las escrituras
+en Redis las hace un único hilo escritor (en orden), nunca el event loop.
+"""
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..settings import settings
+from ..core.cache import get_redis_client
+from ..core.metrics import register_metrics
+from .ingestion_pipeline import IngestionProgress
+from .embeddings_service import process_and_store_pdf, rollback_document
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "ingest:job:"
+BATCH_KEY_PREFIX = "ingest:batch:"
+
+
+class JobQueueFullError(Exception):
+    """No se aceptan más jobs: la cola de ingesta está llena"""
+
+
+def _eta_seconds(progress: IngestionProgress) -> Optional[float]:
+    """
+    Tiempo restante estimado. Con chunks ya insertados se extrapola el total de chunks
+    a partir de las páginas leídas; antes, solo a partir del avance de la extracción.
+    """
+    elapsed = progress.elapsed
+    if not progress.total_pages or not progress.pages or elapsed <= 0:
+        return None
+    if progress.chunks_stored and progress.chunks:
+        expected_chunks = progress.chunks * progress.total_pages / progress.pages
+        remaining = max(0.0, expected_chunks - progress.chunks_stored)
+        return round(elapsed * remaining / progress.chunks_stored, 1)
+    remaining_pages = max(0, progress.total_pages - progress.pages)
+    return round(elapsed * remaining_pages / progress.pages, 1)
+
+
+class IngestionJobManager:
+    """
+    Pool acotado de jobs de ingesta en el event loop del worker.
+    Los jobs por encima de max_concurrent esperan en estado "queued".
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_queued: int = 50,
+        ttl: int = 86400,
+        redis_client: Optional[Any] = None
+    ):
+        """
+        Args:
+            max_concurrent: Jobs que ingieren a la vez
+            max_queued: Jobs pendientes o en curso admitidos antes de rechazar subidas
+            ttl: Segundos que se conserva el estado de un job
+            redis_client: Cliente Redis (texto) para compartir el estado entre workers
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.redis_client = redis_client
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Subidas múltiples: batch_id -> (creado, job_ids)
+        self._batches: Dict[str, Tuple[float, List[str]]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._last_publish: Dict[str, float] = {}
+        # Un solo hilo: las escrituras de un job llegan a Redis en el orden en que se publicaron
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.duplicates = 0
+
+    def _new_job(self, document_id: str, filename: str, file_hash: Optional[str]) -> Dict[str, Any]:
+        now = datetime.utcnow().isoformat()
+        return {
+            "job_id": uuid.uuid4().hex,
+            "document_id": document_id,
+            "filename": filename,
+            "file_hash": file_hash,
+            "status": "queued",
+            "stage": "queued",
+            "total_pages": None,
+            "pages": 0,
+            "chunks": 0,
+            "chunks_embedded": 0,
+            "chunks_reused": 0,
+            "chunks_stored": 0,
+            "pages_per_second": 0.0,
+            "chunks_per_second": 0.0,
+            "eta_seconds": None,
+            "error": None,
+            "duplicate": False,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def submit(
+        self,
+        file_path: str,
+        filename: str,
+        document_id: str,
+        on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_failure: Optional[Callable[[Dict[str, Any]], None]] = None,
+        file_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Crea un job y programa su ejecución (debe llamarse desde el event loop).
+
+        Args:
+            file_path: Ruta del PDF ya guardado
+            filename: Nombre original del archivo
+            document_id: ID del documento
+            on_complete: Se llama (en un hilo) con el job al terminar la ingesta
+            on_failure: Se llama (en un hilo) con el job si la ingesta falla
+            file_hash: SHA-256 del archivo (deduplicación de subidas simultáneas)
+
+        Returns:
+            Estado inicial del job
+
+        Raises:
+            JobQueueFullError: Si ya hay max_queued jobs pendientes o en curso
+        """
+        with self._lock:
+            if len(self._tasks) >= self.max_queued:
+                self.rejected += 1
+                raise JobQueueFullError(f"Hay {len(self._tasks)} ingestas pendientes; inténtalo más tarde")
+            self.submitted += 1
+
+        job = self._new_job(document_id, filename, file_hash)
+        self._publish(job, force=True)
+        task = asyncio.create_task(self._run(job, file_path, on_complete, on_failure))
+        with self._lock:
+            self._tasks[job["job_id"]] = task
+        task.add_done_callback(lambda _: self._forget_task(job["job_id"]))
+        logger.info(f"[IngestionJobs] Job {job['job_id']} en cola para {filename} (document_id: {document_id})")
+        return dict(job)
+
+    def find_active(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """Job pendiente o en curso de este worker para el mismo archivo (None si no hay)"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.get("file_hash") == file_hash and job["status"] in ("queued", "running"):
+                    return dict(job)
+        return None
+
+    def register_duplicate(self, document_id: str, filename: str, file_hash: str) -> Dict[str, Any]:
+        """
+        Registra una subida de un archivo ya indexado como un job terminado sin trabajo,
+        para que el cliente siga el mismo flujo (consultar el job hasta "done").
+        """
+        job = self._new_job(document_id, filename, file_hash)
+        job.update(status="done", stage="duplicate", eta_seconds=0.0, duplicate=True)
+        self._publish(job, force=True)
+        with self._lock:
+            self.duplicates += 1
+        logger.info(f"[IngestionJobs] {filename} ya estaba indexado como document_id {document_id}; no se reprocesa")
+        return dict(job)
+
+    def register_batch(self, job_ids: List[str]) -> str:
+        """
+        Agrupa los jobs de una subida múltiple para consultar su estado conjunto.
+        Como los jobs, el batch se guarda en memoria y en Redis, de modo que cualquier
+        worker responde GET /files/batches/{id}.
+        
+        Returns:
+            ID del batch
+        """
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._batches[batch_id] = (time.time(), list(job_ids))
+            cutoff = time.time() - self.ttl
+            for expired in [key for key, (created, _) in self._batches.items() if created < cutoff]:
+                self._batches.pop(expired, None)
+        if self.redis_client is not None:
+            self._write(BATCH_KEY_PREFIX + batch_id, json.dumps(job_ids), f"el batch {batch_id}", logging.WARNING)
+        return batch_id
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado de una subida múltiple: jobs, recuento por estado y throughput agregado.
+        """
+        with self._lock:
+            entry = self._batches.get(batch_id)
+        job_ids = entry[1] if entry is not None else None
+        if job_ids is None and self.redis_client is not None:
+            try:
+                raw = self.redis_client.get(BATCH_KEY_PREFIX + batch_id)
+                job_ids = json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"[IngestionJobs] Error al leer el batch {batch_id} de Redis: {e}")
+        if job_ids is None:
+            return None
+
+        jobs = self.get_many(job_ids)
+        counts = {status: 0 for status in ("queued", "running", "done", "failed")}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        pages = sum(job["pages"] for job in jobs)
+        chunks_stored = sum(job["chunks_stored"] for job in jobs)
+        # Throughput agregado: del primer job creado a la última actualización
+        elapsed = 0.0
+        if jobs:
+            started = min(datetime.fromisoformat(job["created_at"]) for job in jobs)
+            updated = max(datetime.fromisoformat(job["updated_at"]) for job in jobs)
+            elapsed = (updated - started).total_seconds()
+        return {
+            "batch_id": batch_id,
+            "total": len(jobs),
+            **counts,
+            "finished": counts["done"] + counts["failed"] == len(jobs),
+            "pages": pages,
+            "chunks_stored": chunks_stored,
+            "elapsed_seconds": round(elapsed, 2),
+            "pages_per_second": round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+            "chunks_per_second": round(chunks_stored / elapsed, 2) if elapsed > 0 else 0.0,
+            "jobs": jobs,
+        }
+
+    def get_many(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Estado de varios jobs en su orden. Los que no están en este worker se leen de Redis
+        en una sola petición (MGET): un batch se consulta a menudo desde otro worker.
+        """
+        with self._lock:
+            found = {job_id: dict(self._jobs[job_id]) for job_id in job_ids if job_id in self._jobs}
+        missing = [job_id for job_id in job_ids if job_id not in found]
+        if missing and self.redis_client is not None:
+            try:
+                raws = self.redis_client.mget([JOB_KEY_PREFIX + job_id for job_id in missing])
+                found.update({job_id: json.loads(raw) for job_id, raw in zip(missing, raws) if raw})
+            except Exception as e:
+                logger.warning(f"[IngestionJobs] Error al leer {len(missing)} jobs de Redis: {e}")
+        return [found[job_id] for job_id in job_ids if job_id in found]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de un job (memoria local o Redis si lo creó otro worker)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        if self.redis_client is None:
+            return None
+        try:
+            raw = self.redis_client.get(JOB_KEY_PREFIX + job_id)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"[IngestionJobs] Error al leer el job {job_id} de Redis: {e}")
+            return None
+
+    async def _fail(self, job: Dict[str, Any], error: str, on_failure):
+        job.update(status="failed", stage="failed", error=error, eta_seconds=None)
+        self._publish(job, force=True)
+        with self._lock:
+            self.failed += 1
+        if on_failure is not None:
+            try:
+                await asyncio.to_thread(on_failure, dict(job))
+            except Exception as hook_error:
+                logger.warning(f"[IngestionJobs] Error en la limpieza del job {job['job_id']}: {hook_error}")
+
+    async def _run(self, job: Dict[str, Any], file_path: str, on_complete, on_failure):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self._semaphore:
+            job.update(status="running", stage="starting")
+            self._publish(job, force=True)
+            progress = IngestionProgress(on_update=lambda p: self._on_progress(job, p))
+            try:
+                await process_and_store_pdf(
+                    file_path,
+                    document_id=job["document_id"],
+                    progress=progress,
+                    file_hash=job.get("file_hash")
+                )
+            except Exception as e:
+                # process_and_store_pdf ya retiró los puntos parciales
+                logger.error(f"[IngestionJobs] Job {job['job_id']} falló: {e}", exc_info=True)
+                await self._fail(job, str(e), on_failure)
+                return
+
+            if on_complete is not None:
+                try:
+                    await asyncio.to_thread(on_complete, dict(job))
+                except Exception as e:
+                    # Vectores sin metadatos no se podrían borrar desde la API: se retiran
+                    logger.error(
+                        f"[IngestionJobs] Job {job['job_id']}: error al registrar el documento, "
+                        f"se retiran sus vectores: {e}", exc_info=True
+                    )
+                    await asyncio.to_thread(rollback_document, job["document_id"])
+                    await self._fail(job, f"Error al registrar el documento: {e}", on_failure)
+                    return
+
+            job.update(status="done", stage="done", eta_seconds=0.0)
+            self._publish(job, force=True)
+            with self._lock:
+                self.completed += 1
+            logger.info(
+                f"[IngestionJobs] Job {job['job_id']} completado: {job['chunks_stored']} chunks "
+                f"en {progress.elapsed:.1f}s"
+            )
+
+    def _on_progress(self, job: Dict[str, Any], progress: IngestionProgress):
+        snapshot = progress.snapshot()
+        job.update(
+            stage=snapshot["stage"],
+            total_pages=snapshot["total_pages"],
+            pages=snapshot["pages"],
+            chunks=snapshot["chunks"],
+            chunks_embedded=snapshot["chunks_embedded"],
+            chunks_reused=snapshot["chunks_reused"],
+            chunks_stored=snapshot["chunks_stored"],
+            pages_per_second=snapshot["pages_per_second"],
+            chunks_per_second=snapshot["chunks_per_second"],
+            eta_seconds=_eta_seconds(progress),
+        )
+        self._publish(job)
+
+    def _publish(self, job: Dict[str, Any], force: bool = False):
+        """Guarda el estado en memoria y (como máximo una vez por segundo, salvo force) en Redis"""
+        job["updated_at"] = datetime.utcnow().isoformat()
+        job_id = job["job_id"]
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+            self._prune()
+        if self.redis_client is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_publish.get(job_id, 0.0) < 1.0:
+            return
+        self._last_publish[job_id] = now
+        # Progreso frecuente: con Redis caído no se llena el log
+        self._write(JOB_KEY_PREFIX + job_id, json.dumps(job), f"el job {job_id}", logging.DEBUG)
+
+    def _write(self, key: str, value: str, label: str, error_level: int):
+        """Encola un SETEX en el hilo escritor (la llamada a Redis bloquea hasta su timeout)"""
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-jobs-redis")
+            writer = self._writer
+        writer.submit(self._setex, key, value, label, error_level)
+
+    def _setex(self, key: str, value: str, label: str, error_level: int):
+        try:
+            self.redis_client.setex(key, self.ttl, value)
+        except Exception as e:
+            logger.log(error_level, f"[IngestionJobs] Error al publicar {label} en Redis: {e}")
+
+    def _prune(self):
+        """Olvida los jobs terminados más antiguos que el TTL (llamar con el lock tomado)"""
+        cutoff = datetime.utcnow().timestamp() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in ("done", "failed") and datetime.fromisoformat(job["updated_at"]).timestamp() < cutoff
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._last_publish.pop(job_id, None)
+
+    def _forget_task(self, job_id: str):
+        with self._lock:
+            self._tasks.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+            queued = sum(1 for job in self._jobs.values() if job["status"] == "queued")
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "duplicates": self.duplicates,
+                "running": running,
+                "queued": queued,
+                "max_concurrent": self.max_concurrent,
+            }
+
+
+# Instancia global del gestor de jobs de ingesta
+_job_manager: Optional[IngestionJobManager] = None
+
+
+def get_ingestion_job_manager() -> IngestionJobManager:
+    """Obtiene la instancia global del gestor de jobs de ingesta."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = IngestionJobManager(
+            max_concurrent=settings.ingest_max_concurrent_jobs,
+            max_queued=settings.ingest_max_queued_jobs,
+            ttl=settings.ingest_job_ttl,
+            redis_client=get_redis_client()
+        )
+        register_metrics("ingestion_jobs", _job_manager.stats)
+    return _job_manager
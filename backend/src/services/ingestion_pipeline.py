@@ -0,0 +1,361 @@
+"""
+Pipeline de ingesta de PDFs por etapas con memoria acotada.
+
+    páginas -> chunks -> batches de embeddings -> upserts en Qdrant
+
+Cada etapa es una tarea asyncio unida a la siguiente por una cola acotada: el embedding
+del batch N se solapa con la extracción de las páginas siguientes y con el upsert del
+batch N-1, y hasta embedding_concurrency batches se embeben a la vez (EmbeddingBatcher). Como en cada cola hay como máximo ingest_queue_size batches, la memoria
+no crece con el tamaño del documento (manuales de miles de páginas incluidos).
+
+Cada chunk se guarda con el hash de su texto normalizado: si ese texto ya se embebió
+(p. ej. una revisión del mismo manual) se reutiliza el vector almacenado.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+import itertools
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from ..settings import settings
+from ..utils.text_processing import iter_pdf_pages_parallel, iter_text_chunks, count_pdf_pages, TokenTextSplitter
+from ..utils.embedding_batcher import get_embedding_batcher
+from ..utils.sparse_vectors import sparse_vector_for_text
+from ..utils.content_hash import chunk_hash, file_sha256, embedding_signature
+from ..utils.context_packer import count_tokens
+from ..core.active_embedding import get_active_embedding
+from ..core.async_clients import LoopBound
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de cola
+_DONE = object()
+
+# Upserts simultáneos en el repositorio vectorial entre todas las ingestas del worker
+# (la concurrencia de embeddings ya la limita globalmente el EmbeddingBatcher)
+_upsert_slots = LoopBound(lambda: asyncio.Semaphore(settings.ingest_upsert_concurrency))
+
+
+class IngestionProgress:
+    """
+    Progreso de la ingesta de un documento.
+    on_update (opcional) se llama tras cada cambio, p. ej. para publicar el estado de un job.
+    """
+
+    def __init__(self, on_update: Optional[Callable[["IngestionProgress"], None]] = None):
+        self.on_update = on_update
+        self.stage = "pending"
+        self.total_pages: Optional[int] = None
+        self.pages = 0
+        self.chunks = 0
+        self.chunks_embedded = 0
+        # Chunks cuyo vector se reutilizó (mismo texto ya embebido) en lugar de pedirlo a la API
+        self.chunks_reused = 0
+        self.chunks_stored = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if self.on_update is not None:
+            try:
+                self.on_update(self)
+            except Exception as e:
+                logger.debug(f"[Ingestion] Error en callback de progreso: {e}")
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado actual con el throughput en páginas/s y chunks/s"""
+        elapsed = self.elapsed
+        return {
+            "stage": self.stage,
+            "total_pages": self.total_pages,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "chunks_stored": self.chunks_stored,
+            "elapsed_seconds": round(elapsed, 2),
+            "pages_per_second": round(self.pages / elapsed, 2) if elapsed > 0 else 0.0,
+            "chunks_per_second": round(self.chunks_stored / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def _take(iterator: Iterator[str], count: int) -> List[str]:
+    return list(itertools.islice(iterator, count))
+
+
+def iter_document_chunks(pages: Iterable[str]) -> Iterator[str]:
+    """Chunks de las páginas con el divisor configurado (settings.text_splitter)"""
+    if settings.text_splitter == "tokens":
+        splitter = TokenTextSplitter(chunk_tokens=settings.chunk_tokens, overlap_tokens=settings.chunk_overlap_tokens)
+        return splitter.iter_chunks(pages)
+    return iter_text_chunks(pages, chunk_size=settings.chunk_size, overlap=settings.chunk_overlap)
+
+
+def _average_chunk_words() -> int:
+    """Longitud media de un chunk en palabras (normalización de BM25 del vector disperso)"""
+    if settings.text_splitter == "tokens":
+        # ~1.3 tokens por palabra en español
+        return int(settings.chunk_tokens / 1.3)
+    return settings.chunk_size
+
+
+async def ingest_pdf(
+    path: str,
+    document_id: str,
+    repo,
+    progress: Optional[IngestionProgress] = None,
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    file_hash: Optional[str] = None,
+    page_sink: Optional[Callable[[Iterable[str]], Iterator[str]]] = None,
+    revision: Optional[str] = None
+) -> IngestionProgress:
+    """
+    Ingresa un PDF en el repositorio vectorial por etapas.
+
+    Args:
+        path: Ruta al archivo PDF
+        document_id: ID del documento (payload de cada chunk)
+        repo: Repositorio vectorial (QdrantRepository o LocalVectorRepository)
+        progress: Objeto de progreso a actualizar (se crea uno si no se proporciona)
+        batch_size: Chunks por petición de embeddings (settings.ingest_batch_size)
+        queue_size: Batches máximos en cada cola entre etapas (settings.ingest_queue_size)
+        file_hash: SHA-256 del archivo (se calcula si no se proporciona)
+        page_sink: Envuelve las páginas extraídas, p. ej. DocumentRepository.tee_page_text para guardarlas
+        revision: Revisión de ingesta guardada en cada chunk (se genera si no se proporciona)
+
+    Returns:
+        IngestionProgress final (chunks_stored = chunks insertados)
+    """
+    if file_hash is None:
+        file_hash = await asyncio.to_thread(file_sha256, path)
+
+    def pages() -> Iterable[str]:
+        extracted = iter_pdf_pages_parallel(
+            path,
+            workers=settings.pdf_extract_workers,
+            pages_per_shard=settings.pdf_pages_per_shard,
+            min_pages=settings.pdf_parallel_min_pages
+        )
+        return page_sink(extracted) if page_sink is not None else extracted
+
+    return await ingest_pages(
+        pages,
+        lambda: count_pdf_pages(path),
+        os.path.basename(path),
+        document_id,
+        repo,
+        progress=progress,
+        batch_size=batch_size,
+        queue_size=queue_size,
+        file_hash=file_hash,
+        revision=revision
+    )
+
+
+async def ingest_pages(
+    pages: Callable[[], Iterable[str]],
+    count_pages: Callable[[], int],
+    source: str,
+    document_id: str,
+    repo,
+    progress: Optional[IngestionProgress] = None,
+    batch_size: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    file_hash: Optional[str] = None,
+    revision: Optional[str] = None
+) -> IngestionProgress:
+    """
+    Ingresa un documento a partir del texto de sus páginas (extraído de un PDF o guardado).
+
+    Args:
+        pages: Retorna el iterador de páginas (se consume en un hilo)
+        count_pages: Retorna el número total de páginas, para el progreso
+        source: Nombre de la fuente (payload de cada chunk)
+        document_id: ID del documento (payload de cada chunk)
+        repo: Repositorio vectorial (QdrantRepository o LocalVectorRepository)
+        progress: Objeto de progreso a actualizar (se crea uno si no se proporciona)
+        batch_size: Chunks por petición de embeddings (settings.ingest_batch_size)
+        queue_size: Batches máximos en cada cola entre etapas (settings.ingest_queue_size)
+        file_hash: SHA-256 del archivo de origen
+        revision: Revisión de ingesta guardada en cada chunk (se genera si no se proporciona)
+
+    Returns:
+        IngestionProgress final (chunks_stored = chunks insertados)
+    """
+    progress = progress or IngestionProgress()
+    batch_size = batch_size or settings.ingest_batch_size
+    queue_size = queue_size or settings.ingest_queue_size
+    revision = revision or uuid.uuid4().hex
+
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    point_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def counted_pages() -> Iterator[str]:
+        for page in pages():
+            progress.pages += 1
+            yield page
+
+    async def extract():
+        # La extracción de PyPDF2 es CPU: cada batch se toma del generador en un hilo
+        chunks = iter_document_chunks(counted_pages())
+        index = 0
+        while True:
+            batch = await asyncio.to_thread(_take, chunks, batch_size)
+            if not batch:
+                break
+            progress.update(chunks=progress.chunks + len(batch))
+            await chunk_queue.put((index, batch))
+            index += len(batch)
+        await chunk_queue.put(_DONE)
+
+    async def embed_batch(batch: List[str]) -> Tuple[List[List[float]], List[str], int]:
+        """Vectores del batch reutilizando los de chunks ya embebidos; retorna (vectores, hashes, reutilizados)"""
+        hashes = [chunk_hash(chunk) for chunk in batch]
+        known: Dict[str, List[float]] = {}
+        if settings.ingest_dedup_enabled:
+            try:
+                known = await asyncio.to_thread(repo.get_vectors_by_chunk_hashes, hashes, signature)
+            except Exception as e:
+                logger.warning(f"[Ingestion] No se pudieron consultar vectores existentes: {e}")
+        # Cada texto nuevo se embebe una sola vez aunque se repita dentro del batch
+        pending: Dict[str, str] = {}
+        for chunk, content_hash in zip(batch, hashes):
+            if content_hash not in known:
+                pending.setdefault(content_hash, chunk)
+        if pending:
+            vectors = await batcher.embed(list(pending.values()), model, dimensions)
+            if len(vectors) != len(pending):
+                raise ValueError(f"Error al generar embeddings: se esperaban {len(pending)}, se obtuvieron {len(vectors)}")
+            known.update(zip(pending.keys(), vectors))
+        reused = sum(1 for content_hash in hashes if content_hash not in pending)
+        return [known[content_hash] for content_hash in hashes], hashes, reused
+
+    async def embed():
+        # Hasta embedding_concurrency batches en vuelo; se entregan a store() en orden
+        in_flight: Deque = deque()
+
+        async def deliver_oldest():
+            index, batch, task = in_flight.popleft()
+            vectors, hashes, reused = await task
+            progress.update(
+                stage="embedding",
+                chunks_embedded=progress.chunks_embedded + len(batch),
+                chunks_reused=progress.chunks_reused + reused
+            )
+            await point_queue.put((index, batch, vectors, hashes))
+
+        try:
+            while True:
+                item = await chunk_queue.get()
+                if item is _DONE:
+                    break
+                index, batch = item
+                in_flight.append((index, batch, asyncio.create_task(embed_batch(batch))))
+                if len(in_flight) >= settings.embedding_concurrency:
+                    await deliver_oldest()
+            while in_flight:
+                await deliver_oldest()
+        finally:
+            for _, _, task in in_flight:
+                task.cancel()
+        await point_queue.put(_DONE)
+
+    async def upsert(points: List[Dict]):
+        async with _upsert_slots.get():
+            # Sin barrera por batch: en modo pipelined los upserts se confirman sin esperar la
+            # indexación y la barrera se aplica una vez al terminar el documento
+            await asyncio.to_thread(repo.upsert_points, points, None, False)
+        progress.update(stage="storing", chunks_stored=progress.chunks_stored + len(points))
+
+    async def store():
+        # Hasta qdrant_upsert_parallel upserts del documento en vuelo (el orden no importa)
+        in_flight: Set[asyncio.Task] = set()
+        try:
+            while True:
+                item = await point_queue.get()
+                if item is _DONE:
+                    break
+                index, batch, vectors, hashes = item
+                points = [
+                    {
+                        "vector": vector,
+                        # Vector disperso BM25 para la búsqueda híbrida (prefetch léxico en Qdrant)
+                        "sparse_vector": sparse_vector_for_text(chunk, avg_doc_length=average_words),
+                        "payload": {
+                            "text": chunk,
+                            "source": source,
+                            "chunk_index": index + offset,
+                            "document_id": document_id,
+                            # Deduplicación: re-subidas del mismo archivo y chunks ya embebidos
+                            "file_hash": file_hash,
+                            "chunk_hash": content_hash,
+                            # El empaquetador de contexto elige chunks sin pedir su texto (RAG en dos fases)
+                            "tokens": count_tokens(chunk),
+                            "embedding_signature": signature,
+                            # Permite reemplazar los chunks de un documento al re-indexarlo
+                            "revision": revision
+                        }
+                    }
+                    for offset, (chunk, vector, content_hash) in enumerate(zip(batch, vectors, hashes))
+                ]
+                in_flight.add(asyncio.create_task(upsert(points)))
+                if len(in_flight) >= settings.qdrant_upsert_parallel:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+            if in_flight:
+                await asyncio.gather(*in_flight)
+                in_flight = set()
+        finally:
+            for task in in_flight:
+                task.cancel()
+        await asyncio.to_thread(repo.wait_for_updates)
+
+    progress.started_at = time.perf_counter()
+    batcher = get_embedding_batcher()
+    # Todo el documento se embebe con el modelo activo al empezar, aunque un re-embedding
+    # cambie el alias a mitad: la firma del payload permite re-embeber esos chunks después
+    model, dimensions = get_active_embedding()
+    signature = embedding_signature(model, dimensions)
+    average_words = _average_chunk_words()
+    try:
+        total_pages = await asyncio.to_thread(count_pages)
+    except Exception as e:
+        logger.warning(f"[Ingestion] No se pudo contar las páginas de {source}: {e}")
+        total_pages = None
+    progress.update(stage="extracting", total_pages=total_pages)
+
+    tasks = [asyncio.create_task(extract()), asyncio.create_task(embed()), asyncio.create_task(store())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        failed = [task for task in done if task.exception() is not None]
+        if failed:
+            raise failed[0].exception()
+    except BaseException:
+        # Una etapa falló (o se canceló la ingesta): detener el resto del pipeline
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        progress.finished_at = time.perf_counter()
+        progress.update(stage="failed")
+        raise
+
+    progress.finished_at = time.perf_counter()
+    progress.update(stage="done")
+    report = progress.snapshot()
+    logger.info(
+        f"[Ingestion] {source}: {report['pages']} páginas, {report['chunks_stored']} chunks "
+        f"({report['chunks_reused']} reutilizados) en {report['elapsed_seconds']:.2f}s ({report['pages_per_second']} páginas/s, {report['chunks_per_second']} chunks/s)"
+    )
+    return progress
@@ -0,0 +1,486 @@
+"""
+Re-embedding de la colección vectorial sin cortar el servicio.
+
+Cambiar de modelo o de dimensiones de embeddings invalida todos los vectores. En lugar
+de recrear la colección (lo que vaciaba el índice hasta re-subir los documentos), el
+re-embedding:
+
+  1. copying: crea una colección sombra ({colección}_{sufijo}) y recorre la colección viva
+     por páginas de settings.reembed_page_size puntos, embebe el texto de cada chunk con
+     el modelo nuevo (limitado a settings.reembed_tpm_limit tokens por minuto para dejar
+     cupo a la ingesta en vivo) y lo escribe en la sombra con el mismo ID y payload. El
+     offset del scroll y los contadores se guardan en embedding_migrations tras cada
+     página: un job interrumpido se reanuda donde se quedó.
+  2. reconciling: copia los puntos que la ingesta añadió durante la copia y elimina de la
+     sombra los que se borraron o reemplazaron.
+  3. swapped: cambia el alias de forma atómica y registra el modelo como activo
+     (core/active_embedding.py). Después espera a que los workers adopten el modelo, copia
+     los chunks que llegaron a la colección anterior en ese intervalo, vuelve a embeber los
+     que se escribieron con el modelo anterior y elimina los de documentos purgados.
+
+Mientras tanto las búsquedas siguen sirviéndose desde la colección viva con el modelo anterior.
+Un job que falla conserva su fase y se reanuda con el mismo ID; abort_migration lo descarta
+(estado failed) y elimina la sombra.
+"""
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from qdrant_client.http import models as qmodels
+from ..settings import settings
+from ..core.active_embedding import invalidate_active_embedding
+from ..core.semantic_cache import invalidate_semantic_cache
+from ..core.cache import get_cache_manager
+from ..models.database import SessionLocal, EmbeddingMigration, DocumentTombstone
+from ..repositories.qdrant_repository import (
+    QdrantRepository, SPARSE_VECTOR_NAME, get_qdrant_repository, resolve_alias
+)
+from ..repositories.tombstone_repository import get_tombstone_repository
+from ..utils.content_hash import embedding_signature
+from ..utils.embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("copying", "reconciling")
+_ID_PAGE_SIZE = 1000
+
+
+def start_migration(model: str, dimensions: int, repo: Optional[QdrantRepository] = None) -> EmbeddingMigration:
+    """
+    Crea la colección sombra y registra un re-embedding nuevo.
+
+    Raises:
+        ValueError: Si el backend es local o ya hay un re-embedding en curso
+    """
+    repo = repo or get_qdrant_repository()
+    if not isinstance(repo, QdrantRepository):
+        raise ValueError("El re-embedding requiere vector_backend = \"qdrant\" (el índice local se re-indexa con scripts.reindex_documents)")
+    db = SessionLocal()
+    try:
+        running = (
+            db.query(EmbeddingMigration)
+            .filter(EmbeddingMigration.alias == repo.collection_name, EmbeddingMigration.status.in_(ACTIVE_STATUSES))
+            .first()
+        )
+        if running is not None:
+            raise ValueError(f"Ya hay un re-embedding en curso ({running.id}); reanúdalo o abórtalo")
+        source = repo.resolve_collection()
+        target = repo.create_shadow_collection(dimensions)
+        migration = EmbeddingMigration(
+            id=str(uuid.uuid4()),
+            alias=repo.collection_name,
+            source_collection=source,
+            target_collection=target,
+            model=model,
+            dimensions=dimensions,
+            status="copying",
+            points_total=repo.client.count(source, exact=True).count
+        )
+        db.add(migration)
+        db.commit()
+        db.refresh(migration)
+        logger.info(f"[Reembedding] {migration.id}: {source} -> {target} ({model}, {dimensions} dimensiones)")
+        return migration
+    finally:
+        db.close()
+
+
+def abort_migration(migration_id: str, repo: Optional[QdrantRepository] = None) -> EmbeddingMigration:
+    """
+    Cancela un re-embedding que no llegó a cambiar el alias y elimina su colección sombra.
+    Nunca elimina la sombra si es la única copia de los vectores (el alias ya apunta a
+    ella o la colección origen no existe).
+
+    Raises:
+        ValueError: Si no existe, ya cambió el alias o la colección origen no existe
+    """
+    repo = repo or get_qdrant_repository()
+    db = SessionLocal()
+    try:
+        migration = db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration_id).first()
+        if migration is None:
+            raise ValueError(f"No existe el re-embedding {migration_id}")
+        if migration.status not in ACTIVE_STATUSES:
+            raise ValueError(f"El re-embedding {migration_id} está en estado '{migration.status}' y no se puede abortar")
+        if resolve_alias(repo.client, migration.alias) == migration.target_collection:
+            raise ValueError(f"El alias ya apunta a {migration.target_collection}: reanuda el re-embedding con --resume")
+        if not repo.client.collection_exists(migration.source_collection):
+            raise ValueError(
+                f"La colección origen {migration.source_collection} no existe: {migration.target_collection} "
+                f"es la única copia de los vectores y no se elimina"
+            )
+        if repo.client.collection_exists(migration.target_collection):
+            repo.client.delete_collection(migration.target_collection)
+        migration.status = "failed"
+        migration.error = migration.error or "abortado"
+        db.commit()
+        db.refresh(migration)
+        return migration
+    finally:
+        db.close()
+
+
+def list_migrations(limit: int = 20) -> List[EmbeddingMigration]:
+    """Re-embeddings registrados, del más reciente al más antiguo"""
+    db = SessionLocal()
+    try:
+        return db.query(EmbeddingMigration).order_by(EmbeddingMigration.created_at.desc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+class ReembeddingJob:
+    """Ejecuta (o reanuda) un re-embedding registrado en embedding_migrations"""
+
+    def __init__(
+        self,
+        migration_id: str,
+        repo: Optional[QdrantRepository] = None,
+        batcher: Optional[EmbeddingBatcher] = None,
+        page_size: Optional[int] = None,
+        grace_seconds: Optional[float] = None,
+        drop_old: bool = False,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            migration_id: ID del re-embedding (ver start_migration)
+            repo: Repositorio de la colección viva (por defecto el global)
+            batcher: Batcher de embeddings (por defecto uno propio limitado a settings.reembed_tpm_limit)
+            page_size: Puntos por página (settings.reembed_page_size)
+            grace_seconds: Espera tras el cambio de alias antes de la puesta al día final
+                           (por defecto 2 × settings.active_embedding_refresh_seconds)
+            drop_old: Eliminar la colección anterior al terminar
+            on_progress: Se llama con progress() tras cada página
+        """
+        self.migration_id = migration_id
+        self.repo = repo or get_qdrant_repository()
+        self.page_size = max(1, page_size or settings.reembed_page_size)
+        self.grace_seconds = 2 * settings.active_embedding_refresh_seconds if grace_seconds is None else grace_seconds
+        self.drop_old = drop_old
+        self.on_progress = on_progress
+        self._migration = self._load()
+        self.signature = embedding_signature(self._migration.model, self._migration.dimensions)
+        self.batcher = batcher or EmbeddingBatcher(
+            max_batch_tokens=settings.embedding_batch_max_tokens,
+            max_batch_inputs=settings.embedding_batch_max_inputs,
+            max_input_tokens=settings.embedding_max_input_tokens,
+            concurrency=settings.embedding_concurrency,
+            tokens_per_minute=settings.reembed_tpm_limit,
+            requests_per_minute=settings.embedding_rpm_limit,
+            max_retries=settings.embedding_max_retries,
+            retry_base_delay=settings.embedding_retry_base_delay,
+            retry_max_delay=settings.embedding_retry_max_delay,
+            model=self._migration.model,
+            dimensions=self._migration.dimensions
+        )
+        self._target: Optional[QdrantRepository] = None
+        self._started_at = time.perf_counter()
+
+    def _load(self) -> EmbeddingMigration:
+        db = SessionLocal()
+        try:
+            migration = db.query(EmbeddingMigration).filter(EmbeddingMigration.id == self.migration_id).first()
+        finally:
+            db.close()
+        if migration is None:
+            raise ValueError(f"No existe el re-embedding {self.migration_id}")
+        return migration
+
+    def _save(self, **fields):
+        """Actualiza el registro del re-embedding (y la copia local)"""
+        db = SessionLocal()
+        try:
+            migration = db.query(EmbeddingMigration).filter(EmbeddingMigration.id == self.migration_id).first()
+            for key, value in fields.items():
+                setattr(migration, key, value)
+            db.commit()
+            db.refresh(migration)
+            self._migration = migration
+        finally:
+            db.close()
+
+    @property
+    def target(self) -> QdrantRepository:
+        """Repositorio sobre la colección sombra (escribe por lotes en paralelo como la ingesta)"""
+        if self._target is None:
+            self._target = QdrantRepository(collection_name=self._migration.target_collection)
+        return self._target
+
+    def progress(self) -> Dict[str, Any]:
+        migration = self._migration
+        elapsed = time.perf_counter() - self._started_at
+        done = (migration.points_copied or 0) + (migration.points_skipped or 0)
+        return {
+            "migration_id": migration.id,
+            "status": migration.status,
+            "source": migration.source_collection,
+            "target": migration.target_collection,
+            "points_total": migration.points_total or 0,
+            "points_copied": migration.points_copied or 0,
+            "points_skipped": migration.points_skipped or 0,
+            "tokens": migration.tokens or 0,
+            "percent": 100.0 if migration.status == "swapped" or not migration.points_total
+            else round(min(100.0, 100.0 * done / migration.points_total), 1),
+            "elapsed_seconds": round(elapsed, 1),
+            "throttled_seconds": self.batcher.stats()["throttled_seconds"],
+        }
+
+    def _report(self):
+        if self.on_progress is not None:
+            self.on_progress(self.progress())
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Ejecuta las fases pendientes del re-embedding (también para reanudarlo).
+
+        Returns:
+            Progreso final (ver progress())
+        """
+        try:
+            if self._migration.status in ACTIVE_STATUSES and await asyncio.to_thread(self._alias_on_target):
+                # El alias ya cambió pero el proceso terminó antes de registrarlo: la sombra
+                # ya recibe escrituras en vivo y no se debe volver a reconciliar
+                await asyncio.to_thread(self._swap)
+            if self._migration.status == "copying":
+                await self._copy_all()
+                self._save(status="reconciling")
+            if self._migration.status == "reconciling":
+                await self._sync(self._migration.source_collection, delete_extra=True)
+                await asyncio.to_thread(self._swap)
+            if self._migration.status == "swapped":
+                await self._finalize()
+        except Exception as e:
+            # El estado no cambia: el job se puede reanudar desde la misma fase (o abortar)
+            self._save(error=str(e))
+            logger.error(f"[Reembedding] {self.migration_id}: {e}", exc_info=True)
+            raise
+        if self._migration.error:
+            self._save(error=None)
+        self._report()
+        return self.progress()
+
+    def _live_filter(self) -> Optional[qmodels.Filter]:
+        """Excluye los documentos borrados cuyos vectores aún no eliminó el recolector"""
+        deleted = get_tombstone_repository().deleted_ids()
+        if not deleted:
+            return None
+        return qmodels.Filter(must_not=[
+            qmodels.FieldCondition(key="document_id", match=qmodels.MatchAny(any=sorted(deleted)))
+        ])
+
+    def _with_vectors(self):
+        # Solo hace falta el vector disperso (BM25): el denso se vuelve a calcular
+        return [SPARSE_VECTOR_NAME] if self.repo.sparse_enabled else False
+
+    async def _copy_all(self):
+        """Fase copying: recorre la colección origen desde el último offset guardado"""
+        migration = self._migration
+        offset = json.loads(migration.next_offset) if migration.next_offset else None
+        if offset is not None:
+            logger.info(f"[Reembedding] {migration.id}: reanudando la copia en el offset {offset}")
+        while True:
+            records, next_offset = await asyncio.to_thread(
+                self.repo.client.scroll,
+                collection_name=migration.source_collection,
+                scroll_filter=self._live_filter(),
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=self._with_vectors()
+            )
+            copied, skipped, tokens = await self._copy(records)
+            # El offset se guarda después de escribir la página: reanudar nunca pierde puntos
+            self._save(
+                next_offset=json.dumps(next_offset) if next_offset is not None else None,
+                points_copied=(self._migration.points_copied or 0) + copied,
+                points_skipped=(self._migration.points_skipped or 0) + skipped,
+                tokens=(self._migration.tokens or 0) + tokens
+            )
+            self._report()
+            if next_offset is None:
+                return
+            offset = next_offset
+
+    async def _copy(self, records) -> Tuple[int, int, int]:
+        """
+        Embebe el texto de los puntos con el modelo nuevo y los escribe en la sombra.
+
+        Returns:
+            (puntos copiados, puntos sin texto omitidos, tokens embebidos)
+        """
+        with_text = [record for record in records if (record.payload or {}).get("text")]
+        skipped = len(records) - len(with_text)
+        records = with_text
+        if not records:
+            return 0, skipped, 0
+        tokens_before = self.batcher.stats()["tokens"]
+        vectors = await self.batcher.embed([record.payload["text"] for record in records])
+        points = []
+        for record, vector in zip(records, vectors):
+            sparse = record.vector.get(SPARSE_VECTOR_NAME) if isinstance(record.vector, dict) else None
+            points.append({
+                "id": record.id,
+                "vector": vector,
+                "sparse_vector": {"indices": sparse.indices, "values": sparse.values} if sparse is not None else None,
+                "payload": {**record.payload, "embedding_signature": self.signature}
+            })
+        await asyncio.to_thread(self.target.upsert_points, points)
+        return len(points), skipped, self.batcher.stats()["tokens"] - tokens_before
+
+    def _scan(self, collection: str, scroll_filter: Optional[qmodels.Filter]) -> Tuple[Set, Dict[str, Set]]:
+        """IDs de la colección y revisiones presentes por document_id"""
+        ids: Set = set()
+        revisions: Dict[str, Set] = {}
+        offset = None
+        while True:
+            records, offset = self.repo.client.scroll(
+                collection_name=collection,
+                scroll_filter=scroll_filter,
+                limit=_ID_PAGE_SIZE,
+                offset=offset,
+                with_payload=["document_id", "revision"],
+                with_vectors=False
+            )
+            for record in records:
+                ids.add(record.id)
+                payload = record.payload or {}
+                revisions.setdefault(payload.get("document_id"), set()).add(payload.get("revision"))
+            if offset is None:
+                return ids, revisions
+
+    async def _sync(self, source: str, delete_extra: bool) -> Tuple[int, int]:
+        """
+        Lleva a la sombra los puntos de `source` que le faltan.
+
+        Un punto que falta no se copia si su documento ya tiene en la sombra otra revisión
+        (se re-indexó). Con delete_extra (antes del cambio de alias, cuando solo el
+        re-embedding escribe en la sombra) también se eliminan los puntos que ya no existen
+        en el origen: borrados o reemplazados durante la copia.
+
+        Returns:
+            (puntos añadidos, puntos eliminados)
+        """
+        source_ids, _ = await asyncio.to_thread(self._scan, source, self._live_filter())
+        target_ids, target_revisions = await asyncio.to_thread(self._scan, self._migration.target_collection, None)
+        missing = [point_id for point_id in source_ids if point_id not in target_ids]
+        extra = [point_id for point_id in target_ids if point_id not in source_ids] if delete_extra else []
+
+        added = 0
+        for start in range(0, len(missing), self.page_size):
+            records = await asyncio.to_thread(
+                self.repo.client.retrieve,
+                collection_name=source,
+                ids=missing[start:start + self.page_size],
+                with_payload=True,
+                with_vectors=self._with_vectors()
+            )
+            records = [record for record in records if self._is_current(record, target_revisions)]
+            copied, skipped, tokens = await self._copy(records)
+            added += copied
+            self._save(
+                points_copied=(self._migration.points_copied or 0) + copied,
+                points_skipped=(self._migration.points_skipped or 0) + skipped,
+                tokens=(self._migration.tokens or 0) + tokens
+            )
+            self._report()
+        for start in range(0, len(extra), _ID_PAGE_SIZE):
+            await asyncio.to_thread(
+                self.repo.client.delete,
+                collection_name=self._migration.target_collection,
+                points_selector=qmodels.PointIdsList(points=extra[start:start + _ID_PAGE_SIZE]),
+                wait=True
+            )
+        logger.info(f"[Reembedding] {self.migration_id}: {source} -> sombra: {added} añadidos, {len(extra)} eliminados")
+        return added, len(extra)
+
+    @staticmethod
+    def _is_current(record, target_revisions: Dict[str, Set]) -> bool:
+        payload = record.payload or {}
+        revisions = target_revisions.get(payload.get("document_id"))
+        return not revisions or payload.get("revision") in revisions
+
+    def _swap(self):
+        """Cambia el alias a la sombra y registra el modelo como activo"""
+        migration = self._migration
+        self.repo.swap_alias(migration.target_collection)
+        self._save(status="swapped", swapped_at=datetime.utcnow(), next_offset=None)
+        invalidate_active_embedding()
+        # Las respuestas y vectores de consulta cacheados son del modelo anterior
+        invalidate_semantic_cache()
+        get_cache_manager().clear_prefix("rag")
+        logger.info(f"[Reembedding] {migration.id}: alias '{migration.alias}' -> {migration.target_collection}")
+
+    def _alias_on_target(self) -> bool:
+        return self.repo.resolve_collection() == self._migration.target_collection
+
+    async def _finalize(self):
+        """
+        Puesta al día tras el cambio de alias. Los workers tardan hasta
+        settings.active_embedding_refresh_seconds en adoptar el modelo nuevo y las ingestas
+        en curso siguen con el anterior: se copian los chunks que llegaron a la colección
+        anterior, se vuelven a embeber los escritos con el modelo anterior y se eliminan los
+        de documentos purgados por el recolector en la colección anterior.
+        """
+        migration = self._migration
+        if self.grace_seconds > 0:
+            logger.info(f"[Reembedding] {migration.id}: esperando {self.grace_seconds:.0f}s a que los workers adopten el modelo")
+            await asyncio.sleep(self.grace_seconds)
+        # Al reanudar tras --drop-old la colección anterior ya no existe: no hay nada que traer
+        source_exists = await asyncio.to_thread(self.repo.client.collection_exists, migration.source_collection)
+        if source_exists:
+            await self._sync(migration.source_collection, delete_extra=False)
+        await self._reembed_stale()
+        await asyncio.to_thread(self._purge_collected)
+        if self.drop_old and source_exists:
+            await asyncio.to_thread(self.repo.client.delete_collection, migration.source_collection)
+            logger.info(f"[Reembedding] {migration.id}: colección anterior {migration.source_collection} eliminada")
+
+    async def _reembed_stale(self):
+        """Vuelve a embeber los puntos de la sombra escritos con otro modelo o dimensiones"""
+        stale_filter = qmodels.Filter(must_not=[
+            qmodels.FieldCondition(key="embedding_signature", match=qmodels.MatchValue(value=self.signature))
+        ])
+        offset = None
+        while True:
+            records, offset = await asyncio.to_thread(
+                self.repo.client.scroll,
+                collection_name=self._migration.target_collection,
+                scroll_filter=stale_filter,
+                limit=self.page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=self._with_vectors()
+            )
+            if records:
+                copied, skipped, tokens = await self._copy(records)
+                self._save(tokens=(self._migration.tokens or 0) + tokens)
+                logger.info(f"[Reembedding] {self.migration_id}: {copied} chunks del modelo anterior re-embebidos")
+            if offset is None:
+                return
+
+    def _purge_collected(self):
+        """Elimina de la sombra los puntos de documentos purgados durante el re-embedding"""
+        db = SessionLocal()
+        try:
+            document_ids = [
+                document_id for (document_id,) in
+                db.query(DocumentTombstone.document_id)
+                .filter(DocumentTombstone.purged_at.isnot(None), DocumentTombstone.purged_at >= self._migration.created_at)
+                .all()
+            ]
+        finally:
+            db.close()
+        if not document_ids:
+            return
+        self.repo.client.delete(
+            collection_name=self._migration.target_collection,
+            points_selector=qmodels.FilterSelector(filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="document_id", match=qmodels.MatchAny(any=document_ids))
+            ])),
+            wait=True
+        )
+
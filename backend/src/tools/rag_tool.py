@@ -1,34 +1,49 @@
 """
 Herramienta RAG - Refactorizado para usar repositorios y utilidades
-OPTIMIZADO: Búsqueda híbrida paralela con asyncio.gather() y pre-compilación de prompts
+OPTIMIZADO: Búsqueda híbrida (densa + BM25) en una sola llamada a Qdrant y pre-compilación de prompts
 """
 import logging
 import re
 import asyncio
 import concurrent.futures
-from typing import Optional, List, Dict, Any
-from openai import OpenAI
+import contextvars
+from typing import Optional, List, Dict, Any, Callable
 from ..settings import settings
 from ..repositories.qdrant_repository import QdrantRepository, get_qdrant_repository
-from ..utils.embeddings import embedding_for_text
+from ..utils.embeddings import aembedding_for_text
+from ..utils.intent_classifier import get_intent_classifier, RELEVANCE, COMPLEXITY
+from ..utils.sparse_vectors import sparse_vector_for_query
+from ..utils.context_packer import get_context_packer, token_budget_for_complexity
 from ..core.cache import cache_result
+from ..core.semantic_cache import get_semantic_cache
+from ..core.async_clients import get_async_openai
 
-# Cliente OpenAI para generación de respuestas
-# NOTA: Este cliente es síncrono. Todas las llamadas deben envolverse con asyncio.to_thread()
-# para evitar bloquear el event loop. El cliente puede usar time.sleep internamente para retries.
-client = OpenAI(
-    api_key=settings.openai_api_key,
-    max_retries=2
-)
+# Relevancia, complejidad y generación usan el cliente AsyncOpenAI del event loop actual
+# (get_async_openai): las llamadas se esperan directamente, sin saltos a hilos del executor.
 logger = logging.getLogger(__name__)
 
+# Primera fase de la búsqueda en dos fases: lo que necesita el empaquetador para elegir
+# chunks (deduplicación y presupuesto de tokens) sin transferir su texto
+TWO_PHASE_PAYLOAD_FIELDS = ["chunk_hash", "tokens"]
+
+# Callback de streaming de la respuesta de la consulta en curso. Viaja en el contexto de
+# la tarea (no como argumento) para no formar parte de la clave del cache de resultados.
+_answer_stream_callback: contextvars.ContextVar[Optional[Callable[[str], None]]] = contextvars.ContextVar(
+    "rag_answer_stream_callback", default=None
+)
+# Búsqueda especulativa lanzada por el Planner para la consulta en curso (agent/speculation.py)
+_speculative_retrieval: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar(
+    "rag_speculative_retrieval", default=None
+)
+
 
 class RAGTool:
     """
-    Herramienta RAG optimizada con búsqueda híbrida paralela usando asyncio.gather().
+    Herramienta RAG optimizada con búsqueda híbrida en el servidor.
     
-    OPTIMIZACIÓN: Usa asyncio.gather() para ejecutar búsquedas densa y dispersa en paralelo,
-    mejorando el rendimiento al reducir la latencia total de las búsquedas.
+    OPTIMIZACIÓN: La búsqueda densa y la dispersa (BM25 sobre un índice invertido) se
+    resuelven en una única consulta a Qdrant con fusión RRF, en lugar de dos llamadas
+    y un escaneo de payloads en Python.
     """
     
     # OPTIMIZACIÓN: Pre-compilar prompts estáticos para evitar reconstruirlos en cada llamada
@@ -109,7 +124,7 @@ Respuesta:
     
     COMPLEXITY_SYSTEM_MESSAGE = "Eres un analizador que determina la complejidad de preguntas."
     
-    # Keywords comunes para búsqueda dispersa
+    # Keywords comunes para búsqueda dispersa (expansión de sinónimos de la consulta)
     KEYWORD_PATTERNS = {
         'wifi': ['wifi', 'wi-fi', 'wireless'],
         '802.11': ['802.11', '802.11a', '802.11b', '802.11g', '802.11n', '802.11ac', '802.11ax'],
@@ -141,8 +156,39 @@ Respuesta:
             logger.warning("_query_with_cache llamado con conversation_context - usando método sin cache")
             return await self._query_without_cache(query_text, top_k, conversation_context)
         
+        # OPTIMIZACIÓN: Cache semántico - reutilizar respuestas de consultas equivalentes
+        # El embedding queda en el cache de embeddings, así que la búsqueda posterior no lo recalcula
+        semantic_cache = get_semantic_cache()
+        query_vector = None
+        if semantic_cache is not None and query_text and query_text.strip():
+            try:
+                query_vector = await aembedding_for_text(query_text)
+                # lookup/store leen la versión del corpus en Redis (E/S bloqueante): en un hilo
+                cached = await asyncio.to_thread(semantic_cache.lookup, query_vector)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.warning(f"[RAG] Error al consultar cache semántico: {e}")
+        
         # Usar el decorador de cache solo cuando no hay contexto
-        return await self._execute_query_cached(query_text, top_k)
+        result = await self._execute_query_cached(query_text, top_k)
+        
+        if query_vector is not None and self._is_cacheable_result(result):
+            try:
+                await asyncio.to_thread(semantic_cache.store, query_text, query_vector, result)
+            except Exception as e:
+                logger.warning(f"[RAG] Error al guardar en cache semántico: {e}")
+        return result
+    
+    @staticmethod
+    def _is_cacheable_result(result: Any) -> bool:
+        """Solo se cachean respuestas generadas con documentos (sin errores ni casos vacíos)."""
+        return (
+            isinstance(result, dict)
+            and bool(result.get("answer"))
+            and not result.get("error")
+            and result.get("source") is None
+        )
     
     @cache_result("rag", ttl=7200)  # Cache por 2 horas (optimizado para mejor rendimiento)
     async def _execute_query_cached(self, query_text: str, top_k: int = 12):
@@ -152,14 +198,24 @@ Respuesta:
         """
         return await self._execute_query(query_text, top_k, None)
 
-    def query(self, query_text: str, top_k: int = 12, conversation_context: Optional[str] = None):
+    async def aquery(
+        self,
+        query_text: str,
+        top_k: int = 12,
+        conversation_context: Optional[str] = None,
+        stream_callback: Optional[Callable[[str], None]] = None,
+        speculation: Optional[Any] = None
+    ):
         """
-        Realiza una consulta RAG sobre los documentos indexados.
+        Realiza una consulta RAG sobre los documentos indexados (camino asíncrono nativo).
         
         Args:
             query_text: Texto de la consulta
             top_k: Número de resultados a recuperar (aumentado a 12 para mejor cobertura)
             conversation_context: Contexto opcional de la conversación previa (últimos mensajes)
+            stream_callback: Recibe los tokens de la respuesta a medida que el LLM los genera.
+                Si la respuesta sale de un cache, se envía completa en una sola llamada.
+            speculation: SpeculativeRetrieval con la búsqueda ya lanzada por el Planner (opcional)
         
         Returns:
             Dict con 'answer' y 'hits'
@@ -167,41 +223,77 @@ Respuesta:
         Nota: Si se proporciona conversation_context, NO se usará cache para evitar
         devolver respuestas de consultas anteriores sin contexto.
         
-        Nota: Este método es síncrono pero internamente usa asyncio para paralelización.
-        Maneja correctamente el caso cuando ya hay un event loop corriendo (FastAPI/LangGraph).
+        OPTIMIZACIÓN: Embeddings, búsqueda en Qdrant y llamadas al LLM usan clientes
+        asíncronos, por lo que la concurrencia escala con el event loop y no con el
+        tamaño del executor de hilos.
         """
-        # Helper para ejecutar async desde función síncrona
-        def _run_async(coro):
-            """Ejecuta una corrutina, manejando el caso cuando ya hay un event loop."""
-            try:
-                # Intentar obtener el event loop actual (si está corriendo)
-                loop = asyncio.get_running_loop()
-                # Si hay un loop corriendo, ejecutar en un thread separado con su propio loop
-                # Esto evita el error "RuntimeError: asyncio.run() cannot be called from a running event loop"
-                def run_in_new_loop():
-                    """Ejecuta la corrutina en un nuevo event loop en este thread."""
-                    new_loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(new_loop)
-                    try:
-                        return new_loop.run_until_complete(coro)
-                    finally:
-                        new_loop.close()
-                
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(run_in_new_loop)
-                    return future.result()
-            except RuntimeError:
-                # No hay event loop corriendo, usar asyncio.run() normalmente
-                return asyncio.run(coro)
-        
+        speculation_token = _speculative_retrieval.set(speculation)
+        try:
+            return await self._streamed_query(query_text, top_k, conversation_context, stream_callback)
+        finally:
+            _speculative_retrieval.reset(speculation_token)
+    
+    async def _streamed_query(
+        self,
+        query_text: str,
+        top_k: int,
+        conversation_context: Optional[str],
+        stream_callback: Optional[Callable[[str], None]]
+    ):
+        """Ejecuta la consulta enviando los tokens de la respuesta a stream_callback (si hay)"""
+        if stream_callback is None:
+            return await self._dispatch_query(query_text, top_k, conversation_context)
+        
+        streamed = False
+        
+        def on_token(token: str):
+            nonlocal streamed
+            streamed = True
+            stream_callback(token)
+        
+        context_token = _answer_stream_callback.set(on_token)
+        try:
+            result = await self._dispatch_query(query_text, top_k, conversation_context)
+        finally:
+            _answer_stream_callback.reset(context_token)
+        
+        if isinstance(result, dict) and result.get("answer"):
+            if not streamed:
+                # Respuesta desde cache o sin generación: enviarla completa de una vez
+                stream_callback(result["answer"])
+            # Copia para no marcar las entradas guardadas en los caches
+            result = {**result, "streamed": True}
+        return result
+    
+    async def _dispatch_query(self, query_text: str, top_k: int, conversation_context: Optional[str]):
+        """Elige el camino con o sin cache según haya contexto de conversación"""
         # Si hay contexto de conversación, NO usar cache (evitar respuestas incorrectas)
         if conversation_context:
             logger.info(f"Consulta RAG con contexto de conversación ({len(conversation_context)} chars) - NO usando cache")
-            return _run_async(self._query_without_cache(query_text, top_k, conversation_context))
-        else:
-            # Sin contexto, usar cache normal
-            logger.debug(f"Consulta RAG sin contexto - usando cache")
-            return _run_async(self._query_with_cache(query_text, top_k, None))
+            return await self._query_without_cache(query_text, top_k, conversation_context)
+        
+        # Sin contexto, usar cache normal
+        logger.debug(f"Consulta RAG sin contexto - usando cache")
+        return await self._query_with_cache(query_text, top_k, None)
+
+    def query(self, query_text: str, top_k: int = 12, conversation_context: Optional[str] = None):
+        """
+        Versión síncrona de aquery() para llamadores que no tienen event loop.
+        
+        Nota: Dentro de FastAPI/LangGraph se debe usar aquery() directamente; si se llama
+        con un event loop corriendo, la corrutina se ejecuta en un hilo con su propio loop.
+        """
+        coro = self.aquery(query_text, top_k, conversation_context)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No hay event loop corriendo, usar asyncio.run() normalmente
+            return asyncio.run(coro)
+        
+        # Hay un loop corriendo: ejecutar en un thread separado con su propio loop
+        # Esto evita el error "RuntimeError: asyncio.run() cannot be called from a running event loop"
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
 
     def _extract_keywords(self, query_text: str) -> List[str]:
         """
@@ -243,106 +335,67 @@ Respuesta:
             
         return keywords
     
-    async def _dense_search(self, query_text: str, top_k: int) -> List[Dict[str, Any]]:
+    async def _hybrid_search(self, query_text: str, keywords: List[str], top_k: int):
         """
-        Realiza búsqueda densa (vectorial) en Qdrant.
-        OPTIMIZACIÓN: Método asíncrono para ejecución paralela con asyncio.gather().
-        """
-        try:
-            # Ejecutar embedding y búsqueda en thread separado (operaciones síncronas)
-            def _sync_dense_search():
-                query_vector = embedding_for_text(query_text)
-                # Aumentar top_k a mínimo 10 para tener mejor cobertura
-                search_top_k = max(top_k, 10)
-                logger.debug(f"[RAG] Búsqueda densa con top_k={search_top_k} para: '{query_text[:50]}...'")
-                results = self.qdrant_repo.search(
-                    query_vector=query_vector,
-                    top_k=search_top_k
-                )
-                logger.debug(f"[RAG] Búsqueda densa retornó {len(results)} resultados")
-                return results
-            
-            # Usar asyncio.to_thread para ejecutar operación síncrona sin bloquear
-            hits = await asyncio.to_thread(_sync_dense_search)
-            return hits
-        except Exception as e:
-            logger.error(f"Error en búsqueda densa: {e}")
-            return []
-    
-    async def _sparse_search(self, keywords: List[str]) -> List[Dict[str, Any]]:
-        """
-        Realiza búsqueda dispersa (por keywords) en Qdrant.
-        OPTIMIZACIÓN: Método asíncrono para ejecución paralela con asyncio.gather().
-        """
-        if not keywords:
-            return []
+        Realiza la búsqueda híbrida (densa + dispersa) en Qdrant.
+        OPTIMIZACIÓN: Una sola consulta con prefetch denso y disperso y fusión en el servidor,
+        usando los clientes asíncronos de OpenAI y Qdrant.
         
+        Returns:
+            Tupla (hits, fused) donde fused indica si los scores son de fusión (no coseno)
+        """
         try:
-            # Ejecutar búsqueda dispersa en thread separado (operación síncrona)
-            def _sync_sparse_search():
-                from qdrant_client import QdrantClient
-                # Normalizar URL (quitar puerto si es HTTPS)
-                qdrant_url = settings.qdrant_url
-                if qdrant_url.startswith('https://') and ':6333' in qdrant_url:
-                    qdrant_url = qdrant_url.replace(':6333', '')
-                
-                # Configurar cliente con API key si está disponible
-                client_kwargs = {"url": qdrant_url, "prefer_grpc": False}
-                if settings.qdrant_api_key:
-                    client_kwargs["api_key"] = settings.qdrant_api_key
-                
-                direct_client = QdrantClient(**client_kwargs)
-                
-                # OPTIMIZACIÓN: Limitar scroll a menos puntos si hay muchos keywords
-                scroll_limit = min(500, 100 * len(keywords))
-                scroll_result = direct_client.scroll(
-                    collection_name="documents",
-                    limit=scroll_limit
-                )
-                
-                keyword_hits = []
-                keywords_lower = [kw.lower() for kw in keywords]
-                
-                for point in scroll_result[0]:
-                    text = point.payload.get("text", "").lower()
-                    # OPTIMIZACIÓN: Verificar todos los keywords de una vez
-                    if any(kw in text for kw in keywords_lower):
-                        keyword_hits.append({
-                            "id": point.id,
-                            "score": 1.0,  # Score alto para matches directos
-                            "payload": point.payload
-                        })
-                        # Limitar resultados temprano para mejor rendimiento
-                        if len(keyword_hits) >= 10:
-                            break
-                
-                return keyword_hits
-            
-            # Usar asyncio.to_thread para ejecutar operación síncrona sin bloquear
-            keyword_hits = await asyncio.to_thread(_sync_sparse_search)
-            return keyword_hits
+            query_vector = await aembedding_for_text(query_text)
+            # Los keywords ya incluyen la expansión de sinónimos técnicos de KEYWORD_PATTERNS
+            sparse_vector = sparse_vector_for_query(keywords) if keywords else None
+            # Aumentar top_k a mínimo 10 para tener mejor cobertura
+            search_top_k = max(top_k, 10)
+            logger.debug(f"[RAG] Búsqueda híbrida con top_k={search_top_k} para: '{query_text[:50]}...'")
+            two_phase = settings.rag_two_phase_fetch
+            hits, fused = await self.qdrant_repo.ahybrid_search(
+                query_vector=query_vector,
+                sparse_vector=sparse_vector,
+                top_k=search_top_k,
+                # En dos fases la primera consulta solo trae lo que necesita el empaquetador;
+                # el texto se pide después solo para los chunks elegidos (_execute_query)
+                payload_fields=TWO_PHASE_PAYLOAD_FIELDS if two_phase else settings.rag_payload_fields,
+                # Vectores densos solo si el MMR los usa (por defecto compara el texto)
+                with_vectors=settings.rag_mmr_enabled and settings.rag_mmr_dense_vectors
+            )
+            logger.debug(f"[RAG] Búsqueda híbrida retornó {len(hits)} resultados (fusionados={fused})")
+            return hits, fused
         except Exception as e:
-            logger.warning(f"Error en búsqueda dispersa: {e}")
-            return []
+            logger.error(f"Error en búsqueda híbrida: {e}")
+            return [], False
     
-    def _has_keyword_match(self, hits: List[Dict[str, Any]], keywords: List[str]) -> bool:
-        """
-        Verifica si algún hit contiene las keywords.
-        OPTIMIZACIÓN: Método separado para mejor legibilidad y testing.
-        """
-        if not keywords or not hits:
-            return False
-        
-        keywords_lower = [kw.lower() for kw in keywords]
-        return any(
-            any(kw in h["payload"].get("text", "").lower() for kw in keywords_lower)
-            for h in hits
+    async def _stream_answer(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        stream_callback: Callable[[str], None]
+    ) -> str:
+        """Genera la respuesta con stream=True enviando cada token al callback"""
+        stream = await get_async_openai().chat.completions.create(
+            model=settings.llm_model,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=max_tokens,
+            stream=True
         )
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                stream_callback(content)
+        return "".join(parts).strip()
     
     async def _execute_query(self, query_text: str, top_k: int = 12, conversation_context: Optional[str] = None):
         """
         Método interno que ejecuta la consulta RAG real.
-        OPTIMIZACIÓN: Búsqueda híbrida paralela (densa + dispersa) usando asyncio.gather().
+        OPTIMIZACIÓN: Búsqueda híbrida (densa + dispersa) en una sola llamada con fusión en Qdrant.
         
         Args:
             query_text: Texto de la consulta
@@ -360,39 +413,19 @@ Respuesta:
             # OPTIMIZACIÓN: Extraer keywords antes de las búsquedas
             keywords = self._extract_keywords(query_text)
             
-            # OPTIMIZACIÓN: Ejecutar búsqueda densa y dispersa en paralelo usando asyncio.gather()
-            # Esto es más eficiente que ThreadPoolExecutor para operaciones I/O
-            tasks = [self._dense_search(query_text, top_k)]
-            
-            # Agregar búsqueda dispersa solo si hay keywords
-            if keywords:
-                tasks.append(self._sparse_search(keywords))
-            
-            # Ejecutar ambas búsquedas en paralelo
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Procesar resultados
-            hits = results[0] if not isinstance(results[0], Exception) else []
-            keyword_hits = results[1] if len(results) > 1 and not isinstance(results[1], Exception) else []
-            
-            # Manejar excepciones
-            if isinstance(results[0], Exception):
-                logger.error(f"Error en búsqueda densa: {results[0]}")
-            if len(results) > 1 and isinstance(results[1], Exception):
-                logger.warning(f"Error en búsqueda dispersa: {results[1]}")
-            
-            # Combinar resultados solo si hay keyword_hits y no hay match en hits densos
-            if keyword_hits and not self._has_keyword_match(hits, keywords):
-                # Priorizar keyword matches al inicio
-                hits = keyword_hits[:3] + hits
-            elif keyword_hits:
-                # Si ya hay match, agregar algunos keyword hits adicionales
-                hits = keyword_hits[:2] + hits
+            # OPTIMIZACIÓN: Búsqueda densa y dispersa en una sola llamada a Qdrant.
+            # Si el Planner ya la lanzó en modo especulativo, se reutiliza su resultado.
+            speculation = _speculative_retrieval.get()
+            speculative = await speculation.consume(query_text, top_k) if speculation is not None else None
+            if speculative is not None:
+                hits, fused_scores = speculative
+            else:
+                hits, fused_scores = await self._hybrid_search(query_text, keywords, top_k)
 
             if not hits:
                 # Verificar si hay documentos en la colección
                 try:
-                    collection_info = self.qdrant_repo.get_collection_info()
+                    collection_info = await asyncio.to_thread(self.qdrant_repo.get_collection_info)
                     points_count = collection_info.get('points_count', 0) if isinstance(collection_info, dict) else 0
                     if points_count == 0:
                         logger.error(f"[RAG] ❌ No hay documentos indexados en Qdrant (0 puntos en la colección)")
@@ -412,11 +445,18 @@ Respuesta:
                         # Intentar una búsqueda más amplia con top_k mayor
                         logger.info(f"[RAG] Intentando búsqueda alternativa con top_k=20...")
                         try:
-                            query_vector = embedding_for_text(query_text)
-                            alternative_hits = self.qdrant_repo.search(query_vector=query_vector, top_k=20)
+                            # El embedding sale del cache: no se vuelve a llamar a la API
+                            query_vector = await aembedding_for_text(query_text)
+                            alternative_hits = await self.qdrant_repo.asearch(
+                                query_vector=query_vector,
+                                top_k=20,
+                                payload_fields=settings.rag_payload_fields,
+                                with_vectors=settings.rag_mmr_enabled and settings.rag_mmr_dense_vectors
+                            )
                             if alternative_hits:
                                 logger.info(f"[RAG] ✅ Búsqueda alternativa encontró {len(alternative_hits)} resultados")
                                 hits = alternative_hits
+                                fused_scores = False
                             else:
                                 logger.warning(f"[RAG] ⚠️ Búsqueda alternativa tampoco encontró resultados")
                         except Exception as e:
@@ -450,7 +490,42 @@ Respuesta:
                     "contexts": []
                 }
 
-        # OPTIMIZACIÓN: Validar relevancia y analizar complejidad en paralelo usando asyncio.gather()
+        # OPTIMIZACIÓN: Clasificador local (kNN sobre el embedding ya calculado para la búsqueda).
+        # Solo las decisiones con confianza baja se delegan al LLM.
+        classifier = get_intent_classifier()
+        query_vector = None
+        local_relevance = None
+        local_complexity = None
+        if classifier is not None:
+            try:
+                if await classifier.ensure_ready():
+                    query_vector = await aembedding_for_text(query_text)  # Sale del cache de embeddings
+                    local_relevance, relevance_confidence = classifier.classify(RELEVANCE, query_vector)
+                    # Rechazar una pregunta como fuera de temática lo decide siempre el LLM: el kNN solo
+                    # confirma relevancia (un falso "no_relevante" deja al usuario sin respuesta, y con
+                    # conversación previa puede ser un seguimiento como "¿cuáles son los tipos?")
+                    if local_relevance == "no_relevante":
+                        local_relevance = None
+                    local_complexity, complexity_confidence = classifier.classify(COMPLEXITY, query_vector)
+                    logger.info(
+                        f"[RAG] Clasificador local: relevancia={local_relevance or 'LLM'} ({relevance_confidence:.2f}), "
+                        f"complejidad={local_complexity or 'LLM'} ({complexity_confidence:.2f})"
+                    )
+            except Exception as e:
+                # La optimización nunca debe tumbar la consulta: ambas decisiones pasan al LLM
+                logger.warning(f"[RAG] Error en el clasificador local: {e}. Usando el LLM.")
+                query_vector = None
+                local_relevance = None
+                local_complexity = None
+
+        def learn(task: str, label: str):
+            """Incorpora la etiqueta del LLM al clasificador sin afectar a la decisión ya tomada"""
+            try:
+                classifier.learn(task, query_vector, label)
+            except Exception as e:
+                logger.warning(f"[RAG] Error al aprender del LLM en el clasificador local: {e}")
+        
+        # Validar relevancia y analizar complejidad en paralelo usando asyncio.gather()
         # IMPORTANTE: La validación de relevancia debe considerar el contexto de conversación
         async def check_relevance():
             """Verifica si la pregunta es relevante para la temática."""
@@ -488,22 +563,21 @@ Responde SOLO con una palabra: "relevante" o "no_relevante".
                 else:
                     relevance_prompt = self.RELEVANCE_CHECK_PROMPT_TEMPLATE.format(query_text=query_text)
                 
-                # Ejecutar llamada a OpenAI en thread separado (operación síncrona)
-                def _sync_relevance_check():
-                    relevance_response = client.chat.completions.create(
-                        model=settings.llm_model,
-                        messages=[
-                            {"role": "system", "content": self.RELEVANCE_SYSTEM_MESSAGE},
-                            {"role": "user", "content": relevance_prompt}
-                        ],
-                        temperature=0.0,
-                        max_tokens=10
-                    )
-                    return relevance_response.choices[0].message.content.strip().lower()
-                
-                response_text = await asyncio.to_thread(_sync_relevance_check)
+                relevance_response = await get_async_openai().chat.completions.create(
+                    model=settings.llm_model,
+                    messages=[
+                        {"role": "system", "content": self.RELEVANCE_SYSTEM_MESSAGE},
+                        {"role": "user", "content": relevance_prompt}
+                    ],
+                    temperature=0.0,
+                    max_tokens=10
+                )
+                response_text = relevance_response.choices[0].message.content.strip().lower()
                 is_relevant = "relevante" in response_text and "no_relevante" not in response_text
                 logger.info(f"[RAG] Validación de relevancia: respuesta LLM='{response_text}', is_relevant={is_relevant}, tiene_contexto={bool(conversation_context)}")
+                # Aprender solo de preguntas autocontenidas (con contexto la etiqueta depende de la conversación)
+                if query_vector is not None and not conversation_context:
+                    learn(RELEVANCE, "relevante" if is_relevant else "no_relevante")
                 return is_relevant
             except Exception as e:
                 logger.warning(f"[RAG] Error al verificar relevancia: {e}. Continuando con respuesta normal.")
@@ -514,31 +588,44 @@ Responde SOLO con una palabra: "relevante" o "no_relevante".
             try:
                 complexity_prompt = self.COMPLEXITY_PROMPT_TEMPLATE.format(query_text=query_text)
                 
-                # Ejecutar llamada a OpenAI en thread separado (operación síncrona)
-                def _sync_complexity_check():
-                    complexity_response = client.chat.completions.create(
-                        model=settings.llm_model,
-                        messages=[
-                            {"role": "system", "content": self.COMPLEXITY_SYSTEM_MESSAGE},
-                            {"role": "user", "content": complexity_prompt}
-                        ],
-                        temperature=0.0,
-                        max_tokens=10
-                    )
-                    return complexity_response.choices[0].message.content.strip().lower()
-                
-                complexity = await asyncio.to_thread(_sync_complexity_check)
-                return complexity
+                complexity_response = await get_async_openai().chat.completions.create(
+                    model=settings.llm_model,
+                    messages=[
+                        {"role": "system", "content": self.COMPLEXITY_SYSTEM_MESSAGE},
+                        {"role": "user", "content": complexity_prompt}
+                    ],
+                    temperature=0.0,
+                    max_tokens=10
+                )
+                complexity_text = complexity_response.choices[0].message.content.strip().lower()
+                if query_vector is not None:
+                    for label in ("simple", "moderada", "compleja"):
+                        if label in complexity_text:
+                            learn(COMPLEXITY, label)
+                            break
+                return complexity_text
             except Exception as e:
                 logger.warning(f"[RAG] Error al analizar complejidad: {e}. Usando longitud moderada por defecto.")
                 return "moderada"
         
+        async def resolve_relevance():
+            if local_relevance is not None:
+                return local_relevance == "relevante"
+            return await check_relevance()
+        
+        async def resolve_complexity():
+            if local_complexity is not None:
+                return local_complexity
+            return await check_complexity()
+        
         # OPTIMIZACIÓN: Ejecutar validación de relevancia y complejidad en paralelo usando asyncio.gather()
         is_relevant, complexity = await asyncio.gather(
-            check_relevance(),
-            check_complexity(),
+            resolve_relevance(),
+            resolve_complexity(),
             return_exceptions=True
         )
+        if classifier is not None:
+            classifier.record({RELEVANCE: local_relevance is not None, COMPLEXITY: local_complexity is not None})
         
         # Manejar excepciones
         if isinstance(is_relevant, Exception):
@@ -558,32 +645,51 @@ Responde SOLO con una palabra: "relevante" o "no_relevante".
                 "source": "out_of_topic"
             }
         
-        # Filtrar y concatenar los chunks más relevantes
-        # IMPORTANTE: Usar un umbral más bajo (0.25) para incluir más resultados relevantes y aumentar cobertura
-        relevant_hits = [h for h in hits if h.get('score', 0) > 0.25]
+        # Filtrar los chunks candidatos
+        # Los scores de fusión (RRF) dependen del rango, no de la similitud: se usa el orden fusionado.
+        # Con scores coseno, usar un umbral bajo (0.25) para incluir más resultados relevantes y aumentar cobertura
+        if fused_scores:
+            relevant_hits = hits[:settings.rag_context_candidates]
+        else:
+            relevant_hits = [h for h in hits if h.get('score', 0) > 0.25][:settings.rag_context_candidates]
         
         # Si no hay hits con score > 0.25, usar los top 5 resultados (incluso con scores bajos)
         if not relevant_hits:
             logger.warning(f"[RAG] No hay hits con score > 0.25. Usando top {min(5, len(hits))} resultados disponibles")
             relevant_hits = hits[:5] if hits else []
-        else:
-            # Limitar a máximo 6 chunks más relevantes para tener mejor cobertura (antes 3)
-            relevant_hits = relevant_hits[:6]
         
-        # Concatenar los textos más relevantes
-        context = "\n\n".join([h["payload"].get("text", "") for h in relevant_hits])
-        
-        # OPTIMIZACIÓN: Limitar tamaño del contexto para evitar problemas de memoria y latencia
-        MAX_CONTEXT_LENGTH = 5500  # Reducido de 7000 para mejorar velocidad y evitar timeouts
-        if len(context) > MAX_CONTEXT_LENGTH:
-            # Truncar contexto manteniendo los primeros chunks más relevantes
-            context = context[:MAX_CONTEXT_LENGTH]
-            logger.debug(f"[RAG] Contexto truncado a {MAX_CONTEXT_LENGTH} caracteres para optimizar memoria")
+        # OPTIMIZACIÓN: Empaquetar el contexto con MMR (sin chunks solapados/duplicados)
+        # hasta el presupuesto de tokens que corresponde a la complejidad de la pregunta
+        if query_vector is None and settings.rag_mmr_enabled and settings.rag_mmr_dense_vectors:
+            query_vector = await aembedding_for_text(query_text)
+        packer = get_context_packer()
+        token_budget = token_budget_for_complexity(complexity)
+        if settings.rag_two_phase_fetch:
+            # Chunks indexados antes de guardar "tokens": el empaquetador necesita su texto
+            legacy = [h for h in relevant_hits if not (h.get("payload") or {}).get("tokens")]
+            if legacy:
+                fetched = {
+                    h["id"]: h for h in
+                    await self.qdrant_repo.afetch_payloads(legacy, settings.rag_payload_fields + TWO_PHASE_PAYLOAD_FIELDS)
+                }
+                relevant_hits = [fetched.get(h["id"], h) for h in relevant_hits]
+        relevant_hits, packing_stats = packer.select(relevant_hits, token_budget, query_vector)
+        if settings.rag_two_phase_fetch:
+            # Segunda fase: payload solo de los chunks que entran en el contexto
+            missing = [h for h in relevant_hits if "text" not in (h.get("payload") or {})]
+            if missing:
+                fetched = {h["id"]: h for h in await self.qdrant_repo.afetch_payloads(missing, settings.rag_payload_fields)}
+                relevant_hits = [fetched.get(h["id"], h) for h in relevant_hits]
+        context = packer.render(relevant_hits, token_budget)
         
         # Logging detallado para debugging
         if relevant_hits:
             scores = [h.get('score', 0) for h in relevant_hits]
             logger.info(f"[RAG] Usando {len(relevant_hits)} chunks más relevantes (de {len(hits)} totales) con scores: {scores}")
+            logger.info(
+                f"[RAG] Contexto: {packing_stats['context_tokens']}/{packing_stats['token_budget']} tokens, "
+                f"{packing_stats['tokens_saved']} tokens ahorrados, {packing_stats['duplicates_removed']} duplicados descartados"
+            )
         else:
             logger.warning(f"[RAG] ⚠️ No hay chunks relevantes disponibles después del filtrado")
         
@@ -661,22 +767,23 @@ EJEMPLOS DE SEGUIMIENTO:
             query_text=query_text
         )
         
-        # Ejecutar llamada a OpenAI en thread separado (operación síncrona bloqueante)
-        def _sync_generate_answer():
-            """Genera la respuesta usando OpenAI (operación síncrona)."""
-            completion = client.chat.completions.create(
+        # Generar la respuesta con el cliente asíncrono (sin bloquear el event loop)
+        answer_messages = [
+            {"role": "system", "content": self.SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ]
+        stream_callback = _answer_stream_callback.get()
+        if stream_callback is not None:
+            # Streaming real: los tokens llegan al cliente mientras se generan
+            answer = await self._stream_answer(answer_messages, max_tokens_response, stream_callback)
+        else:
+            completion = await get_async_openai().chat.completions.create(
                 model=settings.llm_model,
-                messages=[
-                    {"role": "system", "content": self.SYSTEM_MESSAGE},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=answer_messages,
                 temperature=0.1,  # Temperatura baja para mayor fidelidad y determinismo
                 max_tokens=max_tokens_response  # Tokens adaptados según complejidad de la pregunta
             )
-            return completion.choices[0].message.content.strip()
-        
-        # Usar asyncio.to_thread para ejecutar la operación bloqueante sin bloquear el event loop
-        answer = await asyncio.to_thread(_sync_generate_answer)
+            answer = completion.choices[0].message.content.strip()
         
         # Validación post-generación general: verificar que afirmaciones clave estén respaldadas por el contexto
         # Este es un sistema de validación general que funciona para cualquier tipo de pregunta
@@ -721,7 +828,9 @@ EJEMPLOS DE SEGUIMIENTO:
         
         # Retornar respuesta con contextos para evaluación (si se necesita)
         # Los contextos se pueden usar para evaluación con Ragas
-        contexts_list = [h["payload"].get("text", "") for h in hits[:10] if h.get("payload", {}).get("text")]  # Primeros 10 chunks
+        # En dos fases solo los chunks del contexto traen texto
+        context_hits = relevant_hits if settings.rag_two_phase_fetch else hits[:10]
+        contexts_list = [h["payload"].get("text", "") for h in context_hits if h.get("payload", {}).get("text")]  # Primeros 10 chunks
         
         logger.info(f"[RAG] Retornando {len(contexts_list)} contextos de {len(hits)} hits totales")
         
@@ -729,7 +838,9 @@ EJEMPLOS DE SEGUIMIENTO:
             "answer": answer,
             "hits": len(hits),
             # Incluir contextos para evaluación (primeros chunks como lista)
-            "contexts": contexts_list
+            "contexts": contexts_list,
+            # Tokens de contexto enviados al LLM y ahorrados por el empaquetado
+            "context_packing": packing_stats
         }
         
         return result
@@ -2,12 +2,13 @@
 Utilidades y funciones auxiliares del sistema
 """
 from .text_processing import text_splitter, process_pdf_to_text
-from .embeddings import embedding_for_text, embedding_for_text_batch
+from .embeddings import embedding_for_text, aembedding_for_text, embedding_for_text_batch
 
 __all__ = [
     "text_splitter",
     "process_pdf_to_text",
     "embedding_for_text",
+    "aembedding_for_text",
     "embedding_for_text_batch",
 ]
 
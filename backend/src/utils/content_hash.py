@@ -0,0 +1,36 @@
+"""
+Hashes de contenido para deduplicar la ingesta.
+  - Archivo completo (SHA-256 de los bytes): una re-subida idéntica no se vuelve a ingerir.
+  - Chunk (SHA-256 del texto normalizado): si un chunk ya se embebió con el mismo modelo,
+    su vector se reutiliza en lugar de pedirlo de nuevo a la API. En las revisiones de un
+    manual la mayoría de los chunks no cambian.
+"""
+import hashlib
+from typing import Optional
+from ..core.active_embedding import get_active_embedding
+# Misma forma canónica (NFC y espacios colapsados) que las claves del cache de embeddings
+from ..core.embedding_cache import normalize_text
+
+
+def chunk_hash(text: str) -> str:
+    """SHA-256 (hex) del texto normalizado de un chunk"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 (hex) de un archivo leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def embedding_signature(model: Optional[str] = None, dimensions: Optional[int] = None) -> str:
+    """
+    Identifica el espacio de embeddings de un vector almacenado.
+    Solo se reutilizan vectores calculados con el mismo modelo y dimensiones
+    (por defecto, los activos).
+    """
+    active_model, active_dimensions = get_active_embedding()
+    return f"{model or active_model}:{dimensions or active_dimensions}"
@@ -0,0 +1,317 @@
+"""
+Empaquetado del contexto RAG con presupuesto de tokens.
+Antes de generar la respuesta se eligen los chunks que entran en el prompt:
+  1. se cuentan los tokens con el tokenizer real del modelo (tiktoken)
+  2. se ordenan con MMR (Maximal Marginal Relevance) descartando chunks casi duplicados
+     (mismo texto o muy parecidos). La redundancia entre chunks se mide con shingles de
+     palabras del texto (Jaccard), sin transferir vectores; si los hits traen el vector
+     denso (settings.rag_mmr_dense_vectors) se usa la similitud coseno
+  3. se llena el contexto solo hasta el presupuesto de tokens (según la complejidad)
+Menos tokens de prompt reducen directamente la latencia y el coste de la generación.
+
+La selección (select) no necesita el texto si el payload trae "chunk_hash" y "tokens"
+(guardados en la ingesta): en la búsqueda en dos fases el texto se pide después, solo
+para los chunks elegidos, y render construye el contexto. Sin texto ni vectores el MMR
+conserva el orden de recuperación (los duplicados exactos se descartan por chunk_hash).
+"""
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..settings import settings
+from ..core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    """Encoding de tiktoken para el modelo (None si tiktoken no está disponible)"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("[ContextPacker] tiktoken no disponible, estimando tokens por palabras")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Cuenta los tokens de un texto con el tokenizer del modelo de generación"""
+    encoding = _get_encoding(model or settings.llm_model)
+    if encoding is None:
+        # Aproximación para español cuando no hay tokenizer
+        return int(len(text.split()) * 1.3) + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Recorta un texto a max_tokens tokens"""
+    encoding = _get_encoding(model or settings.llm_model)
+    if encoding is None:
+        return " ".join(text.split()[:int(max_tokens / 1.3)])
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+
+
+def token_budget_for_complexity(complexity: str) -> int:
+    """Presupuesto de tokens de contexto según la complejidad de la pregunta"""
+    if "simple" in complexity:
+        return settings.rag_context_budget_simple
+    if "compleja" in complexity:
+        return settings.rag_context_budget_complex
+    return settings.rag_context_budget_moderate
+
+
+# Palabras por shingle para medir el solapamiento de texto entre chunks
+SHINGLE_WORDS = 3
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _chunk_metadata(hit: Dict) -> Optional[Tuple[str, int]]:
+    """Clave de deduplicación y tokens del chunk (None si no hay texto ni metadatos)"""
+    payload = hit.get("payload") or {}
+    text = payload.get("text")
+    if text is not None:
+        if not text.strip():
+            return None
+        return payload.get("chunk_hash") or _text_key(text), payload.get("tokens") or count_tokens(text)
+    if payload.get("chunk_hash") and payload.get("tokens"):
+        return payload["chunk_hash"], payload["tokens"]
+    return None
+
+
+def _shingles(text: str, size: int = SHINGLE_WORDS) -> frozenset:
+    """Hashes de los grupos de `size` palabras consecutivas (texto en minúsculas)"""
+    words = text.lower().split()
+    if len(words) <= size:
+        return frozenset([hash(tuple(words))]) if words else frozenset()
+    return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def _text_similarity(texts: List[str]) -> np.ndarray:
+    """Matriz de similitud de Jaccard entre los shingles de los textos"""
+    shingles = [_shingles(text) for text in texts]
+    similarity = np.eye(len(texts), dtype=np.float32)
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            union = len(shingles[i] | shingles[j])
+            similarity[i, j] = similarity[j, i] = len(shingles[i] & shingles[j]) / union if union else 0.0
+    return similarity
+
+
+def _mmr_order(
+    hits: List[Dict],
+    query_vector: Optional[List[float]],
+    mmr_lambda: float,
+    duplicate_threshold: float,
+    text_duplicate_threshold: float = 0.8
+) -> Tuple[List[Dict], int]:
+    """
+    Ordena los hits con MMR y descarta los casi duplicados.
+    Con vectores densos en todos los hits usa la similitud coseno (y la relevancia respecto
+    a query_vector); si no, la similitud de Jaccard entre shingles del texto con relevancia
+    decreciente según el orden de recuperación. Sin vectores ni texto conserva el orden.
+
+    Returns:
+        Tupla (hits ordenados, número de duplicados descartados)
+    """
+    if len(hits) < 2:
+        return hits, 0
+    # Sin vector de consulta: relevancia decreciente según el orden de recuperación
+    relevance = np.linspace(1.0, 0.5, len(hits), dtype=np.float32)
+    if all(hit.get("vector") is not None for hit in hits):
+        matrix = np.asarray([hit["vector"] for hit in hits], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        if query_vector is not None:
+            query = np.asarray(query_vector, dtype=np.float32)
+            relevance = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        similarity = matrix @ matrix.T
+    else:
+        texts = [(hit.get("payload") or {}).get("text") for hit in hits]
+        if any(text is None for text in texts):
+            return hits, 0
+        similarity = _text_similarity(texts)
+        duplicate_threshold = text_duplicate_threshold
+
+    selected: List[int] = []
+    remaining = list(range(len(hits)))
+    duplicates = 0
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        candidate = remaining.pop(best)
+        if selected and redundancy[best] >= duplicate_threshold:
+            duplicates += 1
+            continue
+        selected.append(candidate)
+    return [hits[i] for i in selected], duplicates
+
+
+class ContextPacker:
+    """Selecciona los chunks del prompt dentro de un presupuesto de tokens y acumula el ahorro"""
+
+    def __init__(
+        self,
+        mmr_enabled: bool = True,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.95,
+        text_duplicate_threshold: float = 0.8
+    ):
+        self.mmr_enabled = mmr_enabled
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.text_duplicate_threshold = text_duplicate_threshold
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.candidate_tokens = 0
+        self.packed_tokens = 0
+        self.duplicates_removed = 0
+
+    def pack(
+        self,
+        hits: List[Dict],
+        token_budget: int,
+        query_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Dict], str, Dict[str, Any]]:
+        """
+        Elige los chunks que entran en el contexto y lo construye.
+
+        Args:
+            hits: Candidatos ordenados por relevancia (con payload["text"] y opcionalmente "vector")
+            token_budget: Máximo de tokens de contexto
+            query_vector: Embedding de la consulta (relevancia para MMR)
+
+        Returns:
+            Tupla (hits seleccionados, contexto concatenado, estadísticas de tokens)
+        """
+        selected, stats = self.select(hits, token_budget, query_vector)
+        return selected, self.render(selected, token_budget), stats
+
+    def render(self, selected: List[Dict], token_budget: int) -> str:
+        """
+        Contexto con el texto de los chunks elegidos por select (deben traer payload["text"]).
+        Un único chunk mayor que el presupuesto se recorta.
+        """
+        texts = [(hit.get("payload") or {}).get("text", "") for hit in selected]
+        if len(texts) == 1:
+            texts[0] = truncate_to_tokens(texts[0], token_budget)
+        return "\n\n".join(text for text in texts if text)
+
+    def select(
+        self,
+        hits: List[Dict],
+        token_budget: int,
+        query_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        Elige los chunks que entran en el contexto sin construirlo.
+
+        Args:
+            hits: Candidatos ordenados por relevancia, con payload["text"] o con
+                  payload["chunk_hash"] y payload["tokens"] (sin texto se omiten)
+            token_budget: Máximo de tokens de contexto
+            query_vector: Embedding de la consulta (relevancia para MMR)
+
+        Returns:
+            Tupla (hits seleccionados, estadísticas de tokens)
+        """
+        separator_tokens = count_tokens("\n\n")
+
+        # Duplicados exactos (mismo texto normalizado), habituales al subir un PDF dos veces
+        seen = set()
+        candidates = []
+        token_counts: Dict[int, int] = {}
+        duplicates = 0
+        baseline_tokens = 0
+        for hit in hits:
+            metadata = _chunk_metadata(hit)
+            if metadata is None:
+                continue
+            key, tokens = metadata
+            if key in seen:
+                duplicates += 1
+                baseline_tokens += tokens + separator_tokens
+                continue
+            seen.add(key)
+            token_counts[id(hit)] = tokens
+            baseline_tokens += tokens + (separator_tokens if baseline_tokens else 0)
+            candidates.append(hit)
+
+        if self.mmr_enabled:
+            candidates, near_duplicates = _mmr_order(
+                candidates, query_vector, self.mmr_lambda, self.duplicate_threshold, self.text_duplicate_threshold
+            )
+            duplicates += near_duplicates
+
+        selected: List[Dict] = []
+        used = 0
+        for hit in candidates:
+            cost = token_counts[id(hit)] + (separator_tokens if selected else 0)
+            if used + cost <= token_budget:
+                selected.append(hit)
+                used += cost
+            elif not selected:
+                # El chunk más relevante no cabe entero: render lo recorta al presupuesto
+                selected.append(hit)
+                used = token_budget
+
+        stats = {
+            "candidates": len(hits),
+            "selected": len(selected),
+            "duplicates_removed": duplicates,
+            "token_budget": token_budget,
+            # Referencia: todos los candidatos concatenados sin empaquetar
+            "candidate_tokens": baseline_tokens,
+            "context_tokens": used,
+            "tokens_saved": max(0, baseline_tokens - used),
+        }
+        with self._lock:
+            self.requests += 1
+            self.candidate_tokens += baseline_tokens
+            self.packed_tokens += used
+            self.duplicates_removed += duplicates
+        return selected, stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Tokens ahorrados acumulados desde el arranque"""
+        with self._lock:
+            saved = self.candidate_tokens - self.packed_tokens
+            return {
+                "requests": self.requests,
+                "candidate_tokens": self.candidate_tokens,
+                "context_tokens": self.packed_tokens,
+                "tokens_saved": saved,
+                "avg_tokens_saved": round(saved / self.requests, 1) if self.requests else 0.0,
+                "duplicates_removed": self.duplicates_removed,
+            }
+
+
+# Instancia global del empaquetador de contexto
+_context_packer: Optional[ContextPacker] = None
+
+
+def get_context_packer() -> ContextPacker:
+    """Obtiene la instancia global del empaquetador de contexto."""
+    global _context_packer
+    if _context_packer is None:
+        _context_packer = ContextPacker(
+            mmr_enabled=settings.rag_mmr_enabled,
+            mmr_lambda=settings.rag_mmr_lambda,
+            duplicate_threshold=settings.rag_mmr_duplicate_threshold,
+            text_duplicate_threshold=settings.rag_mmr_text_duplicate_threshold
+        )
+        register_metrics("context_packer", _context_packer.stats)
+    return _context_packer
@@ -0,0 +1,355 @@
+"""
+Batcher de embeddings para la ingesta.
+
+Enviar todos los chunks de un documento en una sola llamada a embeddings.create
+choca con los límites por petición de la API (entradas y tokens) y no aprovecha
+paralelismo. El batcher:
+
+  - parte las entradas en peticiones de como máximo embedding_batch_max_tokens tokens
+    y embedding_batch_max_inputs textos,
+  - ejecuta hasta embedding_concurrency peticiones a la vez (en todo el proceso) bajo un limitador de
+    tokens por minuto (TPM) y peticiones por minuto (RPM),
+  - reintenta los errores transitorios (429, 5xx, red) con backoff exponencial con jitter,
+  - devuelve los vectores en el mismo orden que los textos de entrada.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import openai
+from openai import AsyncOpenAI
+from ..settings import settings
+from ..core.async_clients import LoopBound, get_async_openai
+from ..core.active_embedding import get_active_embedding
+from ..core.metrics import register_metrics
+from .context_packer import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Doble token bucket (tokens/min y peticiones/min) compartido por todos los event loops.
+    Cada petición reserva su cupo al llegar y, si el bucket queda en negativo, espera a
+    que se recupere: las esperas se reparten en orden de llegada.
+    """
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        """
+        Args:
+            tokens_per_minute: Tokens por minuto permitidos (0 = sin límite)
+            requests_per_minute: Peticiones por minuto permitidas (0 = sin límite)
+        """
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._updated = time.monotonic()
+
+    def _reserve(self, tokens: int) -> float:
+        """Descuenta el cupo de una petición y retorna los segundos que debe esperar"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            wait = 0.0
+            if self.tokens_per_minute > 0:
+                rate = self.tokens_per_minute / 60.0
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * rate)
+                # Una petición mayor que el TPM nunca cabría: cuenta como un minuto completo
+                self._tokens -= min(tokens, self.tokens_per_minute)
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / rate)
+            if self.requests_per_minute > 0:
+                rate = self.requests_per_minute / 60.0
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * rate)
+                self._requests -= 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests / rate)
+            return wait
+
+    async def acquire(self, tokens: int) -> float:
+        """Espera hasta que haya cupo para una petición de `tokens` tokens; retorna los segundos esperados"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class ConcurrencyLimit:
+    """
+    Límite de peticiones simultáneas compartido por todos los event loops.
+    Cada loop tiene además su propio semáforo con el mismo tope, así que como mucho
+    `limit` hilos del executor por loop quedan bloqueados esperando un hueco global.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._global = threading.BoundedSemaphore(limit)
+        self._local = LoopBound(lambda: asyncio.Semaphore(limit))
+
+    async def __aenter__(self):
+        local = self._local.get()
+        await local.acquire()
+        if self._global.acquire(blocking=False):
+            return self
+        future = asyncio.get_running_loop().run_in_executor(None, self._global.acquire)
+        try:
+            await asyncio.shield(future)
+        except BaseException:
+            # Cancelada mientras el hilo esperaba: el hueco se libera en cuanto se obtenga
+            future.add_done_callback(lambda _: self._global.release())
+            local.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._global.release()
+        self._local.get().release()
+
+
+def split_batches(token_counts: List[int], max_tokens: int, max_inputs: int) -> List[Tuple[int, int]]:
+    """
+    Agrupa entradas consecutivas en peticiones acotadas por tokens y por número de textos.
+
+    Returns:
+        Lista de rangos (inicio, fin) sobre la lista de entradas, en orden
+    """
+    ranges = []
+    start = 0
+    tokens = 0
+    for index, count in enumerate(token_counts):
+        if index > start and (tokens + count > max_tokens or index - start >= max_inputs):
+            ranges.append((start, index))
+            start = index
+            tokens = 0
+        tokens += count
+    if start < len(token_counts):
+        ranges.append((start, len(token_counts)))
+    return ranges
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Errores transitorios: red, timeouts, 408/409/429 y 5xx"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: Exception) -> float:
+    """Segundos indicados por la cabecera Retry-After de la respuesta (0 si no hay)"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class EmbeddingBatcher:
+    """Genera embeddings de listas grandes de textos en peticiones concurrentes y limitadas"""
+
+    def __init__(
+        self,
+        max_batch_tokens: int = 50000,
+        max_batch_inputs: int = 512,
+        max_input_tokens: int = 8191,
+        concurrency: int = 4,
+        tokens_per_minute: int = 0,
+        requests_per_minute: int = 0,
+        max_retries: int = 5,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 30.0,
+        client_factory: Optional[Callable[[], AsyncOpenAI]] = None,
+        model: Optional[str] = None,
+        dimensions: Optional[int] = None
+    ):
+        """
+        Args:
+            max_batch_tokens: Tokens máximos por petición
+            max_batch_inputs: Textos máximos por petición
+            max_input_tokens: Los textos más largos se recortan a este número de tokens
+            concurrency: Peticiones simultáneas (en total, sumando todos los event loops)
+            tokens_per_minute: Límite TPM (0 = sin límite)
+            requests_per_minute: Límite RPM (0 = sin límite)
+            max_retries: Reintentos por petición ante errores transitorios
+            retry_base_delay: Base del backoff exponencial (segundos)
+            retry_max_delay: Tope del backoff (segundos)
+            client_factory: Cliente AsyncOpenAI a usar (por defecto el del event loop, sin reintentos propios)
+            model: Modelo de embeddings (por defecto el activo, ver core/active_embedding.py)
+            dimensions: Dimensiones forzadas en la API (por defecto las activas)
+        """
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.max_input_tokens = max_input_tokens
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # None = seguir el modelo activo (cambia al completar un re-embedding)
+        self.model = model
+        self.dimensions = dimensions
+        # Los reintentos los gestiona el batcher (con jitter y respetando el limitador)
+        self._client_factory = client_factory or (lambda: get_async_openai().with_options(max_retries=0))
+        self._limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+        # Los workers de ingesta ejecutan cada documento en su propio asyncio.run:
+        # el tope debe ser de proceso, no de loop
+        self._semaphore = ConcurrencyLimit(self.concurrency)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.inputs = 0
+        self.tokens = 0
+        self.retries = 0
+        self.failures = 0
+        self.truncated = 0
+        self.request_seconds = 0.0
+        self.throttled_seconds = 0.0
+
+    async def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        dimensions: Optional[int] = None
+    ) -> List[List[float]]:
+        """
+        Genera los embeddings de `texts`.
+
+        Args:
+            texts: Textos a convertir en embeddings
+            model: Modelo para esta llamada (por defecto el del batcher o el activo)
+            dimensions: Dimensiones para esta llamada (por defecto las del batcher o las activas)
+
+        Returns:
+            Lista de embeddings en el mismo orden que los textos
+
+        Raises:
+            openai.OpenAIError: Si una petición falla tras agotar los reintentos
+        """
+        if not texts:
+            return []
+
+        active_model, active_dimensions = get_active_embedding()
+        model = model or self.model or active_model
+        dimensions = dimensions or self.dimensions or active_dimensions
+        texts = list(texts)
+        counts = [count_tokens(text, model=model) for text in texts]
+        for index, count in enumerate(counts):
+            if count > self.max_input_tokens:
+                texts[index] = truncate_to_tokens(texts[index], self.max_input_tokens, model=model)
+                counts[index] = self.max_input_tokens
+                with self._lock:
+                    self.truncated += 1
+                logger.warning(f"[EmbeddingBatcher] Texto {index} recortado de {count} a {self.max_input_tokens} tokens")
+
+        client = self._client_factory()
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        async def run(start: int, end: int):
+            results[start:end] = await self._request(client, texts[start:end], sum(counts[start:end]), model, dimensions)
+
+        ranges = split_batches(counts, self.max_batch_tokens, self.max_batch_inputs)
+        tasks = [asyncio.create_task(run(start, end)) for start, end in ranges]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Una petición falló definitivamente: no seguir gastando cupo en el resto
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return results
+
+    async def _request(
+        self,
+        client: AsyncOpenAI,
+        texts: List[str],
+        tokens: int,
+        model: str,
+        dimensions: int
+    ) -> List[List[float]]:
+        """Una petición a embeddings.create con limitador y reintentos"""
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                throttled = await self._limiter.acquire(tokens)
+                start = time.perf_counter()
+                try:
+                    response = await client.embeddings.create(
+                        model=model,
+                        input=texts,
+                        dimensions=dimensions
+                    )
+                except Exception as e:
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        with self._lock:
+                            self.failures += 1
+                        raise
+                    # Full jitter: evita que las peticiones rechazadas a la vez reintenten a la vez
+                    delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                    delay = max(delay, min(self.retry_max_delay, _retry_after(e)))
+                    attempt += 1
+                    with self._lock:
+                        self.retries += 1
+                    logger.warning(
+                        f"[EmbeddingBatcher] Petición de {len(texts)} textos falló ({e.__class__.__name__}), "
+                        f"reintento {attempt}/{self.max_retries} en {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+
+                data = sorted(response.data, key=lambda item: item.index)
+                if len(data) != len(texts):
+                    raise ValueError(f"Error al generar embeddings: se esperaban {len(texts)}, se obtuvieron {len(data)}")
+                with self._lock:
+                    self.requests += 1
+                    self.inputs += len(texts)
+                    self.tokens += tokens
+                    self.request_seconds += time.perf_counter() - start
+                    self.throttled_seconds += throttled
+                return [item.embedding for item in data]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "inputs": self.inputs,
+                "tokens": self.tokens,
+                "retries": self.retries,
+                "failures": self.failures,
+                "truncated_inputs": self.truncated,
+                "avg_inputs_per_request": round(self.inputs / self.requests, 1) if self.requests else 0.0,
+                "avg_request_ms": round(self.request_seconds * 1000 / self.requests, 1) if self.requests else 0.0,
+                # Tiempo total esperando cupo del limitador TPM/RPM
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "concurrency": self.concurrency,
+            }
+
+
+# Instancia global del batcher de embeddings
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Obtiene la instancia global del batcher de embeddings."""
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher(
+            max_batch_tokens=settings.embedding_batch_max_tokens,
+            max_batch_inputs=settings.embedding_batch_max_inputs,
+            max_input_tokens=settings.embedding_max_input_tokens,
+            concurrency=settings.embedding_concurrency,
+            tokens_per_minute=settings.embedding_tpm_limit,
+            requests_per_minute=settings.embedding_rpm_limit,
+            max_retries=settings.embedding_max_retries,
+            retry_base_delay=settings.embedding_retry_base_delay,
+            retry_max_delay=settings.embedding_retry_max_delay
+        )
+        register_metrics("embedding_batcher", _embedding_batcher.stats)
+    return _embedding_batcher
@@ -1,11 +1,18 @@
 """
 Utilidades para generación de embeddings
 """
+import time
+import asyncio
+import concurrent.futures
 from typing import List
 from openai import OpenAI
 from ..settings import settings
+from ..core.embedding_cache import get_embedding_cache
+from ..core.async_clients import get_async_openai
+from ..core.active_embedding import get_active_embedding
+from .embedding_batcher import get_embedding_batcher
 
-# Cliente OpenAI global para embeddings
+# Cliente OpenAI global para embeddings (el asíncrono se obtiene por event loop)
 _client = OpenAI(api_key=settings.openai_api_key)
 
 
@@ -13,6 +20,8 @@ def embedding_for_text(text: str) -> List[float]:
     """
     Genera un embedding para un texto usando OpenAI.
     IMPORTANTE: Usa dimensions=1536 para text-embedding-3-large para mantener consistencia.
+    OPTIMIZACIÓN: Consulta primero el cache de embeddings (memoria + Redis) para evitar
+    la llamada a la API en consultas repetidas.
     
     Args:
         text: Texto a convertir en embedding
@@ -20,21 +29,75 @@ def embedding_for_text(text: str) -> List[float]:
     Returns:
         Lista de floats representando el embedding (1536 dimensiones)
     """
+    model, dimensions = get_active_embedding()
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get(model, dimensions, text)
+        if cached is not None:
+            return cached
+
     # text-embedding-3-large por defecto genera 3072 dimensiones
     # Especificamos dimensions=1536 para mantener consistencia con la configuración de Qdrant
+    start = time.perf_counter()
     response = _client.embeddings.create(
-        model=settings.embedding_model,
+        model=model,
+        input=text,
+        dimensions=dimensions  # Forzar 1536 dimensiones en lugar de 3072 por defecto
+    )
+    embedding = response.data[0].embedding
+
+    if cache is not None:
+        cache.record_miss_latency(time.perf_counter() - start)
+        cache.set(model, dimensions, text, embedding)
+    return embedding
+
+
+async def aembedding_for_text(text: str) -> List[float]:
+    """
+    Versión asíncrona de embedding_for_text: usa AsyncOpenAI sin ocupar hilos del executor.
+    El cache en memoria se consulta directamente; el nivel Redis (E/S bloqueante) se
+    consulta en un hilo para no bloquear el event loop.
+    
+    Args:
+        text: Texto a convertir en embedding
+    
+    Returns:
+        Lista de floats representando el embedding (1536 dimensiones)
+    """
+    model, dimensions = get_active_embedding()
+    cache = get_embedding_cache()
+    uses_redis = cache is not None and cache.redis_client is not None
+    if cache is not None:
+        if uses_redis:
+            cached = await asyncio.to_thread(cache.get, model, dimensions, text)
+        else:
+            cached = cache.get(model, dimensions, text)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    response = await get_async_openai().embeddings.create(
+        model=model,
         input=text,
-        dimensions=1536  # Forzar 1536 dimensiones en lugar de 3072 por defecto
+        dimensions=dimensions
     )
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+
+    if cache is not None:
+        cache.record_miss_latency(time.perf_counter() - start)
+        if uses_redis:
+            await asyncio.to_thread(cache.set, model, dimensions, text, embedding)
+        else:
+            cache.set(model, dimensions, text, embedding)
+    return embedding
 
 
 def embedding_for_text_batch(texts: List[str]) -> List[List[float]]:
     """
     Genera embeddings para una lista de textos usando OpenAI.
     Más eficiente que llamar embedding_for_text múltiples veces.
-    IMPORTANTE: Usa dimensions=1536 para text-embedding-3-large para mantener consistencia.
+    Los textos se reparten en peticiones acotadas por tokens y concurrentes (ver
+    EmbeddingBatcher), así que no hay límite práctico de tamaño de la lista.
     
     Args:
         texts: Lista de textos a convertir en embeddings
@@ -45,12 +108,24 @@ def embedding_for_text_batch(texts: List[str]) -> List[List[float]]:
     if not texts:
         return []
 
-    # text-embedding-3-large por defecto genera 3072 dimensiones
-    # Especificamos dimensions=1536 para mantener consistencia con la configuración de Qdrant
-    response = _client.embeddings.create(
-        model=settings.embedding_model,
-        input=texts,
-        dimensions=1536  # Forzar 1536 dimensiones en lugar de 3072 por defecto
-    )
-    return [d.embedding for d in response.data]
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(aembedding_for_text_batch(texts))
+
+    # Hay un loop corriendo en este hilo: ejecutar en un hilo separado con su propio loop
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, aembedding_for_text_batch(texts)).result()
+
 
+async def aembedding_for_text_batch(texts: List[str]) -> List[List[float]]:
+    """
+    Versión asíncrona de embedding_for_text_batch.
+    
+    Args:
+        texts: Lista de textos a convertir en embeddings
+    
+    Returns:
+        Lista de embeddings en el mismo orden que los textos
+    """
+    return await get_embedding_batcher().embed(texts)
@@ -0,0 +1,333 @@
+"""
+Clasificador local de intención de la consulta RAG (relevancia temática y complejidad).
+
+Sustituye las dos llamadas al LLM que se hacían por cada consulta (check_relevance y
+check_complexity) por un kNN sobre embeddings de preguntas de ejemplo etiquetadas,
+reutilizando el embedding de la consulta que ya se calculó para la búsqueda.
+Solo cuando el voto de los vecinos no es claro se recurre al LLM; la etiqueta que
+devuelve el LLM se incorpora como ejemplo para que el clasificador aprenda del tráfico.
+Los ejemplos se embeben con el modelo activo (core/active_embedding.py) y se recalculan
+cuando un re-embedding lo cambia. RAGTool solo acepta localmente "relevante": un "no_relevante" siempre se confirma con el
+LLM antes de rechazar la pregunta. Se activa con settings.intent_classifier_enabled.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..settings import settings
+from ..core.async_clients import get_async_openai
+from ..core.embedding_cache import get_embedding_cache
+from ..core.active_embedding import get_active_embedding
+from ..core.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+RELEVANCE = "relevance"
+COMPLEXITY = "complexity"
+
+# Preguntas de ejemplo etiquetadas (mismo criterio que los prompts de RAGTool)
+EXAMPLES: Dict[str, Dict[str, List[str]]] = {
+    RELEVANCE: {
+        "relevante": [
+            "¿Qué es TCP?",
+            "¿Qué es DNS?",
+            "¿Cómo funciona el protocolo HTTP?",
+            "Explica qué es un ping",
+            "¿Para qué sirve traceroute?",
+            "¿Qué diferencia hay entre TCP y UDP?",
+            "¿Cuáles son las capas del modelo OSI?",
+            "¿Qué es una dirección IP?",
+            "¿Qué es una máscara de subred?",
+            "¿Cómo funciona DHCP?",
+            "¿Qué hace un router?",
+            "¿Qué diferencia hay entre un switch y un hub?",
+            "¿Qué es una VLAN?",
+            "¿Cuáles son los tipos de firewalls?",
+            "¿Qué es una VPN y cómo funciona?",
+            "¿Qué es el protocolo BGP?",
+            "¿Cómo funciona OSPF?",
+            "¿Qué es NAT?",
+            "¿Qué estándares WiFi existen?",
+            "¿Qué es la latencia en una red?",
+            "¿Qué es el monitoreo y la analítica de red?",
+            "¿Qué es IPv6 y en qué se diferencia de IPv4?",
+            "¿Qué son los registros MX de DNS?",
+            "¿Cómo se configura una red Ethernet?",
+            "¿Qué es la fibra óptica en telecomunicaciones?",
+            "¿Qué es QoS en redes?",
+            "¿Qué es el protocolo ARP?",
+            "¿Qué es SNMP?",
+        ],
+        "no_relevante": [
+            "¿Qué es la teoría de la relatividad?",
+            "¿Cómo funciona la fotosíntesis?",
+            "¿Quién ganó el mundial?",
+            "Dame una receta de paella",
+            "¿Cuál es la capital de Francia?",
+            "¿Quién escribió Don Quijote?",
+            "¿Qué es la mecánica cuántica?",
+            "¿Cómo se resuelve una ecuación de segundo grado?",
+            "¿Qué síntomas tiene la gripe?",
+            "¿Cuándo empezó la Segunda Guerra Mundial?",
+            "Recomiéndame una película",
+            "¿Qué es el ADN?",
+            "¿Cómo se prepara un café espresso?",
+            "¿Cuántos planetas tiene el sistema solar?",
+            "¿Qué es una reacción química?",
+            "Escribe un poema sobre el mar",
+        ],
+    },
+    COMPLEXITY: {
+        "simple": [
+            "¿Qué es TCP?",
+            "¿Qué es DNS?",
+            "¿Qué es una dirección IP?",
+            "¿Qué significa LAN?",
+            "¿Cuál es el puerto de HTTPS?",
+            "¿Qué es un router?",
+            "¿Qué es NAT?",
+            "¿Qué es una VLAN?",
+            "¿Qué es la latencia?",
+            "¿Qué es un switch?",
+            "¿Cuál es el puerto por defecto de SSH?",
+            "¿Qué es ARP?",
+        ],
+        "moderada": [
+            "¿Cómo funciona DHCP?",
+            "Explica cómo funciona el protocolo HTTP",
+            "¿Cómo funciona una VPN?",
+            "Explica el handshake de TCP",
+            "¿Cómo resuelve DNS un nombre de dominio?",
+            "¿Cómo funciona NAT en un router doméstico?",
+            "Explica qué hace traceroute",
+            "¿Para qué sirve una máscara de subred y cómo se usa?",
+            "¿Cómo funciona el enrutamiento OSPF?",
+            "Explica el funcionamiento de un firewall",
+            "¿Qué ventajas tiene IPv6?",
+        ],
+        "compleja": [
+            "¿Cuáles son las capas del modelo OSI?",
+            "Compara TCP y UDP en detalle",
+            "¿Cuáles son los tipos de firewalls?",
+            "Menciona todos los protocolos de la capa de aplicación",
+            "Explica todos los aspectos de la seguridad de red",
+            "Compara IPv4 e IPv6 en todos sus aspectos",
+            "Lista todas las capas del modelo TCP/IP y sus protocolos",
+            "¿Cuáles son todos los tipos de registros DNS?",
+            "Compara OSPF, RIP y BGP",
+            "Describe la arquitectura completa de una red empresarial",
+            "¿Cuáles son las topologías de red que existen?",
+        ],
+    },
+}
+
+
+class IntentClassifier:
+    """
+    kNN por similitud coseno sobre preguntas de ejemplo.
+    Decide localmente cuando el voto de los vecinos supera min_confidence; si no,
+    devuelve None y la decisión se delega al LLM.
+    """
+
+    def __init__(
+        self,
+        k: int = 5,
+        min_confidence: float = 0.75,
+        min_similarity: float = 0.3,
+        max_learned: int = 500
+    ):
+        """
+        Args:
+            k: Número de vecinos que votan
+            min_confidence: Fracción mínima del voto ponderado para decidir sin LLM
+            min_similarity: Similitud mínima con el vecino más cercano (por debajo la consulta no se parece a ningún ejemplo)
+            max_learned: Máximo de ejemplos aprendidos de las respuestas del LLM por tarea
+        """
+        self.k = k
+        self.min_confidence = min_confidence
+        self.min_similarity = min_similarity
+        self.max_learned = max_learned
+
+        self._lock = threading.Lock()
+        # Por tarea: matriz normalizada de ejemplos y etiqueta de cada fila
+        self._matrix: Dict[str, Optional[np.ndarray]] = {RELEVANCE: None, COMPLEXITY: None}
+        self._labels: Dict[str, List[str]] = {RELEVANCE: [], COMPLEXITY: []}
+        self._learned: Dict[str, int] = {RELEVANCE: 0, COMPLEXITY: 0}
+        # (modelo, dimensiones) con que se calcularon las matrices
+        self._embedding: Optional[Tuple[str, int]] = None
+
+        self.requests = 0
+        self.local_decisions: Dict[str, int] = {RELEVANCE: 0, COMPLEXITY: 0}
+        self.llm_fallbacks: Dict[str, int] = {RELEVANCE: 0, COMPLEXITY: 0}
+
+    @property
+    def ready(self) -> bool:
+        return (
+            self._matrix[RELEVANCE] is not None
+            and self._matrix[COMPLEXITY] is not None
+            and self._embedding == get_active_embedding()
+        )
+
+    async def ensure_ready(self) -> bool:
+        """
+        Calcula los embeddings de los ejemplos en una sola llamada a la API, una vez por
+        modelo activo: tras un re-embedding se recalculan y se descartan los ejemplos
+        aprendidos (sus vectores son del modelo anterior). Los embeddings pasan por el
+        cache de embeddings, así que con Redis no se recalculan al reiniciar.
+
+        Returns:
+            True si el clasificador puede usarse
+        """
+        if self.ready:
+            return True
+        model, dimensions = get_active_embedding()
+        texts = sorted({text for labels in EXAMPLES.values() for group in labels.values() for text in group})
+        try:
+            vectors = await _aembed_texts(texts, model, dimensions)
+        except Exception as e:
+            logger.warning(f"[IntentClassifier] No se pudieron calcular los embeddings de ejemplo: {e}")
+            return False
+
+        by_text = dict(zip(texts, vectors))
+        with self._lock:
+            for task, labels in EXAMPLES.items():
+                rows = []
+                row_labels = []
+                for label, group in labels.items():
+                    for text in group:
+                        rows.append(by_text[text])
+                        row_labels.append(label)
+                self._matrix[task] = _normalize(np.asarray(rows, dtype=np.float32))
+                self._labels[task] = row_labels
+                self._learned[task] = 0
+            self._embedding = (model, dimensions)
+        logger.info(f"[IntentClassifier] Listo con {len(texts)} preguntas de ejemplo ({model}, {dimensions} dimensiones)")
+        return True
+
+    def classify(self, task: str, query_vector: List[float]) -> Tuple[Optional[str], float]:
+        """
+        Clasifica la consulta para una tarea.
+
+        Args:
+            task: RELEVANCE o COMPLEXITY
+            query_vector: Embedding de la consulta (el mismo usado en la búsqueda)
+
+        Returns:
+            Tupla (etiqueta o None si la confianza es baja, confianza)
+        """
+        with self._lock:
+            matrix = self._matrix[task]
+            labels = self._labels[task]
+        query = np.asarray(query_vector, dtype=np.float32)
+        # Consulta embebida con otro modelo (re-embedding en curso de adoptarse): lo decide el LLM
+        if matrix is None or matrix.shape[1] != query.shape[0]:
+            return None, 0.0
+
+        similarities = matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        k = min(self.k, len(similarities))
+        neighbors = np.argpartition(-similarities, k - 1)[:k]
+        if float(similarities[neighbors].max()) < self.min_similarity:
+            return None, 0.0
+
+        votes: Dict[str, float] = {}
+        for index in neighbors:
+            # Peso = similitud (acotada a 0); los vecinos más cercanos cuentan más
+            votes[labels[index]] = votes.get(labels[index], 0.0) + max(float(similarities[index]), 0.0)
+        total = sum(votes.values())
+        if total <= 0:
+            return None, 0.0
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        confidence = weight / total
+        return (label if confidence >= self.min_confidence else None), confidence
+
+    def learn(self, task: str, query_vector: List[float], label: str):
+        """Incorpora como ejemplo una consulta que tuvo que resolver el LLM"""
+        with self._lock:
+            matrix = self._matrix[task]
+            if matrix is None or self._learned[task] >= self.max_learned or matrix.shape[1] != len(query_vector):
+                return
+            row = _normalize(np.asarray([query_vector], dtype=np.float32))
+            self._matrix[task] = np.vstack([matrix, row])
+            self._labels[task] = self._labels[task] + [label]
+            self._learned[task] += 1
+
+    def record(self, local: Dict[str, bool]):
+        """
+        Registra cómo se resolvió cada tarea de una consulta.
+
+        Args:
+            local: {tarea: True si se decidió localmente, False si hizo falta el LLM}
+        """
+        with self._lock:
+            self.requests += 1
+            for task, was_local in local.items():
+                if was_local:
+                    self.local_decisions[task] += 1
+                else:
+                    self.llm_fallbacks[task] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Llamadas al LLM evitadas sobre el tráfico real desde el arranque"""
+        with self._lock:
+            avoided = sum(self.local_decisions.values())
+            fallbacks = sum(self.llm_fallbacks.values())
+            return {
+                "ready": self.ready,
+                "requests": self.requests,
+                "local_decisions": dict(self.local_decisions),
+                "llm_fallbacks": dict(self.llm_fallbacks),
+                "learned_examples": dict(self._learned),
+                "llm_calls_avoided": avoided,
+                "llm_calls_avoided_per_request": round(avoided / self.requests, 3) if self.requests else 0.0,
+                "llm_calls_per_request": round(fallbacks / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+async def _aembed_texts(texts: List[str], model: str, dimensions: int) -> List[List[float]]:
+    """Embeddings de varios textos: los que faltan en el cache se piden en un único batch"""
+    cache = get_embedding_cache()
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    if cache is not None:
+        for i, text in enumerate(texts):
+            vectors[i] = await asyncio.to_thread(cache.get, model, dimensions, text)
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        response = await get_async_openai().embeddings.create(
+            model=model,
+            input=[texts[i] for i in missing],
+            dimensions=dimensions
+        )
+        for i, data in zip(missing, response.data):
+            vectors[i] = data.embedding
+            if cache is not None:
+                await asyncio.to_thread(cache.set, model, dimensions, texts[i], data.embedding)
+    return vectors
+
+
+# Instancia global del clasificador de intención
+_intent_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """
+    Obtiene la instancia global del clasificador de intención.
+    Retorna None si está deshabilitado por configuración.
+    """
+    global _intent_classifier
+    if not settings.intent_classifier_enabled:
+        return None
+    if _intent_classifier is None:
+        _intent_classifier = IntentClassifier(
+            k=settings.intent_classifier_k,
+            min_confidence=settings.intent_classifier_min_confidence,
+            min_similarity=settings.intent_classifier_min_similarity,
+            max_learned=settings.intent_classifier_max_learned
+        )
+        register_metrics("intent_classifier", _intent_classifier.stats)
+    return _intent_classifier
@@ -0,0 +1,109 @@
+"""
+Utilidades para generación de vectores dispersos (sparse) tipo BM25.
+Los documentos se indexan con la componente TF saturada de BM25 y Qdrant aplica
+el IDF en el servidor (Modifier.IDF), de modo que la búsqueda léxica se resuelve
+con un índice invertido en lugar de escanear payloads.
+"""
+import re
+import zlib
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List
+
+# Parámetros BM25 para la saturación de la frecuencia de términos
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Longitud media (en términos) de un chunk; coincide con settings.chunk_size por defecto
+DEFAULT_AVG_DOC_LENGTH = 500
+
+# Tokens técnicos: palabras, números y compuestos como "802.11ac", "tcp/ip" o "wi-fi"
+_TOKEN_PATTERN = re.compile(r"\w+(?:[./-]\w+)*")
+
+STOPWORDS = frozenset({
+    'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'y', 'o', 'de', 'del', 'al', 'a', 'en',
+    'con', 'por', 'para', 'sin', 'sobre', 'que', 'cual', 'quien', 'como', 'donde', 'cuando',
+    'es', 'son', 'fue', 'fueron', 'tiene', 'tienen', 'hay', 'hacer', 'esta', 'este', 'ese', 'esa',
+    'se', 'lo', 'le', 'les', 'su', 'sus', 'mas', 'pero', 'si', 'no', 'ya', 'muy', 'entre',
+    'what', 'is', 'are', 'the', 'an', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'and', 'or', 'be', 'as', 'it', 'this', 'that', 'from'
+})
+
+
+def _strip_accents(text: str) -> str:
+    """Elimina tildes para que "qué" y "que" generen el mismo término."""
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokeniza un texto para indexación dispersa.
+
+    Args:
+        text: Texto a tokenizar
+
+    Returns:
+        Lista de términos normalizados (minúsculas, sin tildes, sin stopwords)
+    """
+    if not text:
+        return []
+    normalized = _strip_accents(text.lower())
+    return [
+        token for token in _TOKEN_PATTERN.findall(normalized)
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def term_index(term: str) -> int:
+    """Índice estable (uint31) de un término; no requiere vocabulario compartido."""
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse(weights: Dict[int, float]) -> Dict[str, List]:
+    indices = sorted(weights)
+    return {"indices": indices, "values": [weights[i] for i in indices]}
+
+
+def sparse_vector_for_text(text: str, avg_doc_length: int = DEFAULT_AVG_DOC_LENGTH) -> Dict[str, List]:
+    """
+    Genera el vector disperso de un chunk usando la TF saturada de BM25.
+
+    Args:
+        text: Texto del chunk
+        avg_doc_length: Longitud media esperada de un chunk (en términos)
+
+    Returns:
+        Dict con 'indices' y 'values' listo para qmodels.SparseVector
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return {"indices": [], "values": []}
+
+    doc_length = len(tokens)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length / max(avg_doc_length, 1))
+
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(tokens).items():
+        idx = term_index(term)
+        # Las colisiones de hash se suman (muy raras en vocabularios de este tamaño)
+        weights[idx] = weights.get(idx, 0.0) + tf * (BM25_K1 + 1) / (tf + length_norm)
+    return _to_sparse(weights)
+
+
+def sparse_vector_for_query(terms: Iterable[str]) -> Dict[str, List]:
+    """
+    Genera el vector disperso de una consulta.
+    Cada término único pesa 1.0; el IDF lo aplica Qdrant al puntuar.
+
+    Args:
+        terms: Keywords o fragmentos de la consulta (se tokenizan igual que los chunks)
+
+    Returns:
+        Dict con 'indices' y 'values' listo para qmodels.SparseVector
+    """
+    weights: Dict[int, float] = {}
+    for term in terms:
+        for token in tokenize(term):
+            weights[term_index(token)] = 1.0
+    return _to_sparse(weights)
@@ -1,9 +1,31 @@
 """
 Utilidades para procesamiento de texto
 """
-from typing import List
+import os
+import re
+import bisect
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from PyPDF2 import PdfReader
 
+# Fin de frase: puntuación final seguida opcionalmente de comillas o paréntesis de cierre
+_SENTENCE_END_CHARS = frozenset(".!?…:;")
+_SENTENCE_CLOSERS = "\"')]»”"
+# Separadores entre palabras (mismas palabras que str.split); el grupo los conserva en re.split
+_WHITESPACE_PATTERN = re.compile(r"(\s+)")
+
+
+def _check_window(chunk_size: int, overlap: int):
+    """Con overlap >= chunk_size la ventana no avanza (bucle infinito)"""
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size debe ser positivo (recibido {chunk_size})")
+    if overlap < 0 or overlap >= chunk_size:
+        raise ValueError(f"overlap debe estar entre 0 y chunk_size - 1 (recibido {overlap} con chunk_size {chunk_size})")
+
 
 def text_splitter(text: str, chunk_size: int = 200, overlap: int = 20) -> List[str]:
     """
@@ -16,7 +38,11 @@ def text_splitter(text: str, chunk_size: int = 200, overlap: int = 20) -> List[s
     
     Returns:
         Lista de chunks de texto
+    
+    Raises:
+        ValueError: Si overlap no es menor que chunk_size
     """
+    _check_window(chunk_size, overlap)
     tokens = text.split()
     chunks = []
     i = 0
@@ -27,23 +53,307 @@ def text_splitter(text: str, chunk_size: int = 200, overlap: int = 20) -> List[s
     return chunks
 
 
-def process_pdf_to_text(path: str) -> str:
+def iter_text_chunks(texts: Iterable[str], chunk_size: int = 200, overlap: int = 20) -> Iterator[str]:
     """
-    Extrae texto de un archivo PDF.
+    Versión incremental de text_splitter: consume los textos (p. ej. páginas) a medida
+    que llegan y produce los mismos chunks que text_splitter sobre el texto concatenado,
+    guardando en memoria solo la ventana de palabras pendiente.
+    
+    Args:
+        texts: Iterable de textos consecutivos
+        chunk_size: Tamaño de cada chunk en tokens/palabras
+        overlap: Número de palabras que se superponen entre chunks
+    
+    Yields:
+        Chunks de texto
+    
+    Raises:
+        ValueError: Si overlap no es menor que chunk_size
+    """
+    _check_window(chunk_size, overlap)
+    step = chunk_size - overlap
+    window: List[str] = []
+    for text in texts:
+        window.extend(text.split())
+        # Solo se emiten chunks completos; el resto espera a la siguiente página
+        while len(window) >= chunk_size:
+            yield " ".join(window[:chunk_size])
+            del window[:step]
+    # Cola final: mismos chunks parciales que text_splitter
+    while window:
+        yield " ".join(window[:chunk_size])
+        if len(window) <= chunk_size and len(window) <= step:
+            break
+        del window[:step]
+
+
+class TokenTextSplitter:
+    """
+    Divisor por offsets de caracteres con tamaño en tokens del modelo de embeddings.
+
+    Una sola pasada de re.split alterna palabras y separadores, y los offsets de cada
+    palabra en el texto original son las longitudes acumuladas de esas partes;
+    cada chunk es un único slice de ese texto (sin normalizarlo ni re-unir listas de
+    palabras, conserva los saltos de línea) de como máximo chunk_tokens tokens. Con sentence_aware el corte se adelanta al último fin de frase de la ventana
+    (si el chunk conserva al menos min_sentence_fill de su tamaño) y el solapamiento
+    empieza, si puede, al inicio de una frase. Los tokens de cada palabra se cuentan una
+    vez y se cachean.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = 512,
+        overlap_tokens: int = 64,
+        model: Optional[str] = None,
+        sentence_aware: bool = True,
+        min_sentence_fill: float = 0.5,
+        max_cached_words: int = 200000
+    ):
+        """
+        Args:
+            chunk_tokens: Tokens máximos por chunk
+            overlap_tokens: Tokens que se repiten entre chunks consecutivos
+            model: Modelo cuyo tokenizer se usa (settings.embedding_model)
+            sentence_aware: Cortar en fin de frase cuando sea posible
+            min_sentence_fill: Fracción mínima de chunk_tokens para aceptar un corte en fin de frase
+            max_cached_words: Tamaño máximo del cache palabra -> tokens
+        """
+        _check_window(chunk_tokens, overlap_tokens)
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model = model
+        self.sentence_aware = sentence_aware
+        self.min_sentence_fill = min_sentence_fill
+        self.max_cached_words = max_cached_words
+        self._encoding = None
+        self._encoding_loaded = False
+        self._counts: Dict[str, int] = {}
+
+    def _count_new_word(self, word: str) -> int:
+        if not self._encoding_loaded:
+            # Import diferido: los procesos de extracción de PDFs no necesitan el tokenizer
+            from .context_packer import _get_encoding
+            from ..settings import settings
+            self._encoding = _get_encoding(self.model or settings.embedding_model)
+            self._encoding_loaded = True
+        if self._encoding is not None:
+            # El espacio inicial reproduce cómo se tokeniza la palabra dentro del texto
+            count = len(self._encoding.encode_ordinary(" " + word))
+        else:
+            count = len(word) // 4 + 1
+        if len(self._counts) >= self.max_cached_words:
+            self._counts.clear()
+        self._counts[word] = count
+        return count
+
+    def _token_counts(self, words: List[str]) -> List[int]:
+        counts = list(map(self._counts.get, words))
+        if None in counts:
+            counts = [
+                count if count is not None else self._counts.get(word) or self._count_new_word(word)
+                for word, count in zip(words, counts)
+            ]
+        return counts
+
+    def _spans(self, text: str, final: bool) -> Tuple[List[Tuple[int, int]], int]:
+        """
+        Chunks de `text` como rangos (inicio, fin) de caracteres.
+        Con final=False no se emite el chunk que llegaría al final del texto (puede
+        continuar en el siguiente fragmento) y se retorna el offset desde el que seguir.
+
+        Returns:
+            Tupla (rangos, offset consumido)
+        """
+        # [palabra, separador, palabra, ...]: sin un objeto Match por palabra (finditer
+        # es ~4x más lento que str.split en textos de varios MB)
+        parts = _WHITESPACE_PATTERN.split(text)
+        leading = 0
+        if not parts[0]:
+            leading = len(parts[1]) if len(parts) > 1 else 0
+            del parts[:2]
+        if parts and not parts[-1]:
+            parts.pop()
+        words = parts[0::2]
+        count = len(words)
+        # Palabra n = text[bounds[2n]:bounds[2n + 1]]
+        bounds = list(itertools.accumulate(map(len, parts), initial=leading))
+        cumulative = list(itertools.accumulate(self._token_counts(words), initial=0))
+
+        spans: List[Tuple[int, int]] = []
+        min_fill = self.min_sentence_fill * self.chunk_tokens
+        i = 0
+        while i < count:
+            # Mayor j tal que las palabras [i, j) caben en chunk_tokens (al menos una palabra)
+            j = max(i + 1, bisect.bisect_right(cumulative, cumulative[i] + self.chunk_tokens, lo=i + 1) - 1)
+            if j >= count and not final:
+                break
+            if j < count and self.sentence_aware:
+                for k in range(j - 1, i, -1):
+                    if cumulative[k + 1] - cumulative[i] < min_fill:
+                        break
+                    if _is_sentence_end(words[k]):
+                        j = k + 1
+                        break
+            spans.append((bounds[2 * i], bounds[2 * j - 1]))
+            if j >= count:
+                i = count
+                break
+            # Solapamiento: primera palabra k con a lo sumo overlap_tokens tokens en [k, j)
+            k = bisect.bisect_left(cumulative, cumulative[j] - self.overlap_tokens, lo=i + 1, hi=j)
+            if self.sentence_aware:
+                k = next((m for m in range(k, j) if _is_sentence_end(words[m - 1])), k)
+            i = max(k, i + 1)
+        return spans, (bounds[2 * i] if i < count else len(text))
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Rangos (inicio, fin) de cada chunk sobre `text`"""
+        return self._spans(text, final=True)[0]
+
+    def split_text(self, text: str) -> List[str]:
+        """Divide `text` en chunks (un slice del texto por chunk)"""
+        return [text[start:end] for start, end in self._spans(text, final=True)[0]]
+
+    def iter_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """
+        Versión incremental de split_text sobre textos consecutivos (p. ej. páginas):
+        produce los mismos chunks que split_text(" ".join(texts)), guardando en memoria solo
+        el fragmento pendiente del último chunk.
+        """
+        pending = ""
+        for text in texts:
+            joined = pending + " " + text if pending else text
+            spans, consumed = self._spans(joined, final=False)
+            for start, end in spans:
+                yield joined[start:end]
+            pending = joined[consumed:]
+        for start, end in self._spans(pending, final=True)[0]:
+            yield pending[start:end]
+
+
+def _is_sentence_end(word: str) -> bool:
+    """La palabra termina una frase (puntuación final, con o sin comillas/paréntesis de cierre)"""
+    return word.rstrip(_SENTENCE_CLOSERS)[-1:] in _SENTENCE_END_CHARS
+
+
+def count_pdf_pages(path: str) -> int:
+    """Número de páginas de un PDF (solo lee el árbol de páginas, no extrae texto)"""
+    return len(PdfReader(path).pages)
+
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """
+    Extrae el texto de un PDF página a página (sin cargar el texto completo en memoria).
+    Las páginas que fallan al extraerse se omiten.
     
     Args:
         path: Ruta al archivo PDF
     
-    Returns:
-        Texto extraído del PDF concatenado
+    Yields:
+        Texto de cada página
     """
     reader = PdfReader(path)
-    texts = []
     for page in reader.pages:
         try:
-            extracted = page.extract_text() or ""
-            texts.append(extracted)
+            yield page.extract_text() or ""
         except Exception:
             continue
-    return "\n".join(texts)
+
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extrae las páginas [start, end) en un proceso del pool (abre su propio PdfReader)"""
+    reader = PdfReader(path)
+    texts = []
+    for index in range(start, end):
+        try:
+            texts.append(reader.pages[index].extract_text() or "")
+        except Exception:
+            continue
+    return texts
+
+
+# Pool de procesos compartido para la extracción de PDFs (se crea al primer uso)
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_workers = 0
+_pdf_pool_lock = threading.Lock()
+
+
+def get_pdf_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Obtiene el pool de procesos de extracción con `workers` procesos.
+    Usa forkserver (o spawn) en lugar de fork: el proceso de la API tiene hilos activos.
+    """
+    global _pdf_pool, _pdf_pool_workers
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_workers != workers:
+            if _pdf_pool is not None:
+                _pdf_pool.shutdown(wait=False)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pdf_pool_workers = workers
+        return _pdf_pool
+
+
+def iter_pdf_pages_parallel(
+    path: str,
+    workers: int = 0,
+    pages_per_shard: int = 16,
+    min_pages: int = 64
+) -> Iterator[str]:
+    """
+    Extrae el texto de un PDF repartiendo rangos de páginas entre un pool de procesos
+    (la extracción de PyPDF2 es Python puro y limitada por CPU). Las páginas se
+    entregan en orden y solo hay 2 rangos por proceso en vuelo, así que la memoria
+    sigue acotada. Los PDFs pequeños se extraen en serie.
+    
+    Args:
+        path: Ruta al archivo PDF
+        workers: Procesos de extracción (0 = número de CPUs)
+        pages_per_shard: Páginas por tarea del pool
+        min_pages: Por debajo de este número de páginas se extrae en serie
+    
+    Yields:
+        Texto de cada página
+    """
+    workers = workers or os.cpu_count() or 1
+    total = count_pdf_pages(path)
+    if workers <= 1 or total < min_pages:
+        yield from iter_pdf_pages(path)
+        return
+
+    pool = get_pdf_process_pool(workers)
+    shards = iter(range(0, total, pages_per_shard))
+    in_flight = deque()
+
+    def submit_next() -> bool:
+        start = next(shards, None)
+        if start is None:
+            return False
+        in_flight.append(pool.submit(_extract_page_range, path, start, min(start + pages_per_shard, total)))
+        return True
+
+    try:
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+        while in_flight:
+            texts = in_flight.popleft().result()
+            submit_next()
+            yield from texts
+    finally:
+        # Si el consumidor se detiene antes de tiempo, no seguir extrayendo
+        for future in in_flight:
+            future.cancel()
+
+
+def process_pdf_to_text(path: str) -> str:
+    """
+    Extrae texto de un archivo PDF.
+    
+    Args:
+        path: Ruta al archivo PDF
+    
+    Returns:
+        Texto extraído del PDF concatenado
+    """
+    return "\n".join(iter_pdf_pages(path))
 
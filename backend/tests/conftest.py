@@ -0,0 +1,96 @@
+"""
+Configuración común de los tests unitarios (desde backend/: python -m pytest -q tests).
+
+Settings exige OPENAI_API_KEY y una base de datos al importar src; los tests no llaman
+a servicios externos: usan una base SQLite temporal y dobles en memoria de Redis/Qdrant.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+_TEST_DIR = tempfile.mkdtemp(prefix="netmind-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Tablas creadas una vez en la base SQLite temporal"""
+    from src.models.database import init_db
+    init_db()
+
+
+class FakeRedis:
+    """Doble en memoria de un cliente Redis (subconjunto de comandos que usa el backend)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def sadd(self, key, *members):
+        members_set = self.data.setdefault(key, set())
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return added
+
+    def srem(self, key, *members):
+        members_set = self.data.get(key, set())
+        removed = len(members_set & set(members))
+        members_set.difference_update(members)
+        return removed
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def ping(self):
+        return True
+
+
+@pytest.fixture
+def fake_redis():
+    """Redis en memoria compartido por los objetos de un test (varios "workers")"""
+    return FakeRedis()
+
+
+@pytest.fixture
+def qdrant_client(monkeypatch):
+    """Qdrant en memoria (modo local de qdrant-client) en lugar del servidor"""
+    from qdrant_client import QdrantClient
+    from src.repositories import qdrant_repository
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(qdrant_repository, "get_qdrant_client", lambda: client)
+    return client
+
+
+@pytest.fixture
+def qdrant_repo(qdrant_client):
+    """QdrantRepository sobre el Qdrant en memoria (alias, colecciones y filtros reales)"""
+    from src.repositories.qdrant_repository import QdrantRepository
+    return QdrantRepository()
@@ -0,0 +1,131 @@
+import io
+import asyncio
+import zipfile
+from types import SimpleNamespace
+import pytest
+from src.api import files
+from src.repositories.document_repository import DocumentRepository
+from src.services.ingestion_jobs import IngestionJobManager
+
+
+def make_zip(members):
+    """ZIP en memoria con las entradas {nombre: bytes} (los nombres acabados en / son directorios)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    repo = DocumentRepository(upload_dir=str(tmp_path))
+    monkeypatch.setattr(files, "document_repo", repo)
+    return tmp_path
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """Gestor de jobs sin Redis; _start_ingestion registra el job sin ingerir nada"""
+    job_manager = IngestionJobManager()
+    started = []
+
+    async def start_ingestion(document_id, file_path, filename, file_hash):
+        started.append(filename)
+        job = job_manager._new_job(document_id, filename, file_hash)
+        job_manager._publish(job, force=True)
+        return job, 202
+
+    monkeypatch.setattr(files, "_start_ingestion", start_ingestion)
+    monkeypatch.setattr(files, "get_ingestion_job_manager", lambda: job_manager)
+    job_manager.started = started
+    return job_manager
+
+
+def upload(filename, content):
+    return SimpleNamespace(filename=filename, file=io.BytesIO(content))
+
+
+def saved_files(directory):
+    return sorted(path.name.split("_", 1)[1] for path in directory.iterdir() if "_" in path.name)
+
+
+def test_zip_extraction_skips_non_pdf_entries(uploads):
+    archive = make_zip({
+        "manual.pdf": b"%PDF-1" * 10,
+        "docs/": b"",
+        "docs/guia.PDF": b"%PDF-2" * 10,
+        "__MACOSX/._manual.pdf": b"metadatos",
+        ".oculto.pdf": b"%PDF-3",
+        "notas.txt": b"texto",
+    })
+    budget = {"files": 10, "bytes": 10_000}
+    entries = files._save_zip_members(archive, budget)
+
+    assert [entry["filename"] for entry in entries] == ["manual.pdf", "guia.PDF"]
+    assert all("error" not in entry and entry["file_hash"] for entry in entries)
+    assert saved_files(uploads) == ["guia.PDF", "manual.pdf"]
+    assert budget == {"files": 8, "bytes": 10_000 - 120}
+
+
+def test_zip_extraction_respects_the_file_budget(uploads):
+    archive = make_zip({"a.pdf": b"a" * 10, "b.pdf": b"b" * 10, "c.pdf": b"c" * 10})
+    budget = {"files": 2, "bytes": 10_000}
+    entries = files._save_zip_members(archive, budget)
+
+    assert [("error" in entry) for entry in entries] == [False, False, True]
+    assert "máximo" in entries[2]["error"]
+    assert budget["files"] == 0
+    assert saved_files(uploads) == ["a.pdf", "b.pdf"]
+
+
+def test_zip_extraction_checks_declared_sizes_before_extracting(uploads):
+    # Muy comprimible: el tamaño declarado (descomprimido) es el que cuenta
+    archive = make_zip({"grande.pdf": b"0" * 5000, "pequeno.pdf": b"1" * 100})
+    budget = {"files": 10, "bytes": 1000}
+    entries = files._save_zip_members(archive, budget)
+
+    assert entries[0] == {"filename": "grande.pdf", "error": "Se superó el tamaño máximo de la subida"}
+    assert entries[1]["filename"] == "pequeno.pdf" and "error" not in entries[1]
+    assert budget == {"files": 9, "bytes": 900}
+    assert saved_files(uploads) == ["pequeno.pdf"]
+
+
+def test_invalid_zip_is_reported(uploads):
+    assert files._save_zip_members(io.BytesIO(b"no es un zip"), {"files": 10, "bytes": 10_000}) == [{"error": "ZIP inválido"}]
+
+
+def test_bulk_upload_shares_the_budget_across_pdfs_and_zips(uploads, manager, monkeypatch):
+    monkeypatch.setattr(files.settings, "bulk_upload_max_files", 3)
+    monkeypatch.setattr(files.settings, "bulk_upload_max_bytes", 10_000)
+    response = asyncio.run(files.upload_bulk([
+        upload("uno.pdf", b"1" * 100),
+        upload("lote.zip", make_zip({"dos.pdf": b"2" * 100, "tres.pdf": b"3" * 100}).getvalue()),
+        upload("cuatro.pdf", b"4" * 100),
+        upload("notas.txt", b"texto"),
+    ]))
+
+    statuses = [(item.filename, item.status) for item in response.items]
+    assert statuses == [("uno.pdf", "queued"), ("dos.pdf", "queued"), ("tres.pdf", "queued"), ("cuatro.pdf", "invalid"), ("notas.txt", "invalid")]
+    assert (response.accepted, response.rejected) == (3, 2)
+    assert manager.started == ["uno.pdf", "dos.pdf", "tres.pdf"]
+    batch = manager.get_batch(response.batch_id)
+    assert batch["total"] == 3 and batch["queued"] == 3
+
+
+def test_bulk_upload_discards_pdfs_over_the_byte_budget(uploads, manager, monkeypatch):
+    monkeypatch.setattr(files.settings, "bulk_upload_max_files", 10)
+    monkeypatch.setattr(files.settings, "bulk_upload_max_bytes", 150)
+    response = asyncio.run(files.upload_bulk([upload("uno.pdf", b"1" * 100), upload("dos.pdf", b"2" * 100)]))
+
+    assert [(item.filename, item.status) for item in response.items] == [("uno.pdf", "queued"), ("dos.pdf", "invalid")]
+    assert response.items[1].error == "Se superó el tamaño máximo de la subida"
+    # El archivo que superó el límite no queda en disco
+    assert saved_files(uploads) == ["uno.pdf"]
+
+
+def test_bulk_upload_without_accepted_files_has_no_batch(uploads, manager):
+    response = asyncio.run(files.upload_bulk([upload("notas.txt", b"texto")]))
+    assert response.batch_id is None and response.accepted == 0
+    assert manager.started == []
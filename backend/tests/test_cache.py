@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+from src.core import cache
+from src.core.cache import cache_result
+
+
+class FakeCacheManager:
+    """CacheManager con Redis simulado: registra el hilo de cada operación"""
+
+    enabled = True
+
+    def __init__(self):
+        self.data = {}
+        self.threads = []
+
+    def get_cache_key(self, prefix, *args, **kwargs):
+        return f"{prefix}:{args}:{sorted(kwargs.items())}"
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.threads.append(threading.get_ident())
+        self.data[key] = value
+
+
+def test_async_cache_result_does_redis_io_off_the_loop(monkeypatch):
+    manager = FakeCacheManager()
+    monkeypatch.setattr(cache, "get_cache_manager", lambda: manager)
+    calls = []
+
+    @cache_result("rag", ttl=60)
+    async def answer(question: str):
+        calls.append(question)
+        return {"answer": question.upper()}
+
+    async def main():
+        loop_thread = threading.get_ident()
+        first = await answer("dns")
+        second = await answer("dns")
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(main())
+    assert first == second == {"answer": "DNS"}
+    assert calls == ["dns"]
+    assert len(manager.threads) == 3  # get (miss), set, get (hit)
+    assert loop_thread not in manager.threads
+
+
+def test_errors_are_not_cached(monkeypatch):
+    manager = FakeCacheManager()
+    monkeypatch.setattr(cache, "get_cache_manager", lambda: manager)
+
+    @cache_result("rag", ttl=60)
+    async def failing(question: str):
+        return {"error": "qdrant_connection_error"}
+
+    asyncio.run(failing("dns"))
+    assert manager.data == {}
+
+
+@pytest.fixture
+def flaky_redis(monkeypatch, fake_redis):
+    """Redis que rechaza las primeras conexiones; reloj controlado por el test"""
+    state = {"failures": 1, "connects": 0, "now": 1000.0}
+
+    def from_url(url, **kwargs):
+        state["connects"] += 1
+        if state["failures"] > 0:
+            state["failures"] -= 1
+            raise ConnectionError("connection refused")
+        return fake_redis
+
+    stub = SimpleNamespace(
+        from_url=from_url,
+        ConnectionError=ConnectionError,
+        TimeoutError=TimeoutError,
+        RedisError=Exception
+    )
+    monkeypatch.setattr(cache, "REDIS_AVAILABLE", True)
+    monkeypatch.setattr(cache, "redis", stub)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: state["now"]))
+    monkeypatch.setattr(cache.settings, "cache_enabled", True)
+    monkeypatch.setattr(cache.settings, "redis_url", "redis://localhost:6379/0")
+    monkeypatch.setattr(cache.settings, "redis_retry_interval", 30)
+    for name in ("_redis_client", "_redis_retry_at", "_binary_redis_client", "_binary_redis_retry_at", "_cache_manager"):
+        monkeypatch.setattr(cache, name, None)
+    return state
+
+
+def test_redis_connection_is_retried_after_backoff(flaky_redis, fake_redis):
+    assert cache.get_redis_client() is None
+    # Dentro del backoff no se vuelve a pagar el timeout de conexión
+    flaky_redis["now"] += 10
+    assert cache.get_redis_client() is None
+    assert flaky_redis["connects"] == 1
+    assert not cache.redis_reconnect_due()
+
+    flaky_redis["now"] += 30
+    assert cache.redis_reconnect_due()
+    assert cache.get_redis_client() is fake_redis
+    assert flaky_redis["connects"] == 2
+    assert not cache.redis_reconnect_due()
+
+
+def test_binary_redis_connection_is_retried_after_backoff(flaky_redis, fake_redis):
+    assert cache.get_binary_redis_client() is None
+    assert cache.get_binary_redis_client() is None
+    assert flaky_redis["connects"] == 1
+    flaky_redis["now"] += 31
+    assert cache.redis_reconnect_due(binary=True)
+    assert cache.get_binary_redis_client() is fake_redis
+
+
+def test_cache_manager_recovers_when_redis_comes_back(flaky_redis, fake_redis):
+    manager = cache.get_cache_manager()
+    assert not manager.enabled
+    flaky_redis["now"] += 31
+    assert cache.get_cache_manager() is manager
+    assert manager.enabled
+    manager.set("rag:1", {"answer": "ok"}, ttl=60)
+    assert manager.get("rag:1") == {"answer": "ok"}
@@ -0,0 +1,120 @@
+from src.utils.context_packer import ContextPacker, count_tokens
+
+
+def hit(text: str, tokens: int = None, vector=None, chunk_hash: str = None):
+    payload = {"text": text}
+    if tokens is not None:
+        payload["tokens"] = tokens
+    if chunk_hash is not None:
+        payload["chunk_hash"] = chunk_hash
+    return {"payload": payload, "vector": vector}
+
+
+SEPARATOR = count_tokens("\n\n")
+
+
+def test_selection_respects_token_budget():
+    packer = ContextPacker(mmr_enabled=False)
+    hits = [hit(f"chunk {i}", tokens=100) for i in range(4)]
+    selected, context, stats = packer.pack(hits, token_budget=250)
+    assert selected == hits[:2]
+    assert context == "chunk 0\n\nchunk 1"
+    assert stats["context_tokens"] == 200 + SEPARATOR <= 250
+    assert stats["candidate_tokens"] == 400 + 3 * SEPARATOR
+    assert stats["tokens_saved"] == stats["candidate_tokens"] - stats["context_tokens"]
+
+
+def test_smaller_chunks_fill_the_remaining_budget():
+    packer = ContextPacker(mmr_enabled=False)
+    hits = [hit("a", tokens=150), hit("b", tokens=150), hit("c", tokens=50)]
+    selected, _, _ = packer.pack(hits, token_budget=220)
+    assert [h["payload"]["text"] for h in selected] == ["a", "c"]
+
+
+def test_single_chunk_over_budget_is_truncated():
+    packer = ContextPacker(mmr_enabled=False)
+    text = " ".join(f"palabra{i}" for i in range(400))
+    selected, context, stats = packer.pack([hit(text)], token_budget=50)
+    assert len(selected) == 1
+    assert stats["context_tokens"] == 50
+    assert count_tokens(context) <= 50 + 1
+    assert text.startswith(context)
+
+
+def test_exact_duplicates_are_removed():
+    packer = ContextPacker(mmr_enabled=False)
+    hits = [hit("DNS resuelve nombres", tokens=10), hit("dns  resuelve NOMBRES", tokens=10), hit("otro", tokens=10)]
+    selected, _, stats = packer.pack(hits, token_budget=1000)
+    assert selected == [hits[0], hits[2]]
+    assert stats["duplicates_removed"] == 1
+
+
+def test_mmr_drops_near_duplicates():
+    packer = ContextPacker(mmr_enabled=True, mmr_lambda=0.7, duplicate_threshold=0.95)
+    hits = [
+        hit("a", tokens=10, vector=[1.0, 0.0, 0.0]),
+        hit("a'", tokens=10, vector=[0.99, 0.01, 0.0]),
+        hit("b", tokens=10, vector=[0.6, 0.8, 0.0]),
+    ]
+    selected, _, stats = packer.pack(hits, token_budget=1000, query_vector=[1.0, 0.0, 0.0])
+    assert [h["payload"]["text"] for h in selected] == ["a", "b"]
+    assert stats["duplicates_removed"] == 1
+
+
+def test_mmr_prefers_diverse_chunk_over_redundant_one():
+    hits = [
+        hit("a", tokens=10, vector=[1.0, 0.0, 0.0]),
+        hit("a2", tokens=10, vector=[0.9, 0.3, 0.0]),
+        hit("c", tokens=10, vector=[0.75, 0.0, 0.6]),
+    ]
+    query = [1.0, 0.1, 0.1]
+    relevance_only, _, _ = ContextPacker(mmr_lambda=1.0).pack(hits, token_budget=1000, query_vector=query)
+    assert [h["payload"]["text"] for h in relevance_only] == ["a", "a2", "c"]
+    diverse, _, _ = ContextPacker(mmr_lambda=0.5).pack(hits, token_budget=1000, query_vector=query)
+    assert [h["payload"]["text"] for h in diverse] == ["a", "c", "a2"]
+
+
+def test_select_without_text_matches_pack():
+    """Búsqueda en dos fases: chunk_hash y tokens bastan para elegir los mismos chunks"""
+    texts = ["uno dos tres", "cuatro cinco", "uno dos tres", "seis siete ocho nueve"]
+    vectors = [[1.0, 0.0], [0.7, 0.7], [1.0, 0.0], [0.0, 1.0]]
+    full = [hit(t, tokens=count_tokens(t), vector=v, chunk_hash=t) for t, v in zip(texts, vectors)]
+    light = [
+        {"payload": {"chunk_hash": t, "tokens": count_tokens(t)}, "vector": v}
+        for t, v in zip(texts, vectors)
+    ]
+    packer = ContextPacker()
+    selected_full, _, stats_full = packer.pack(full, token_budget=8, query_vector=[1.0, 0.2])
+    selected_light, stats_light = packer.select(light, token_budget=8, query_vector=[1.0, 0.2])
+    assert [full.index(h) for h in selected_full] == [light.index(h) for h in selected_light]
+    assert stats_full == stats_light
+
+
+def test_hits_without_text_or_metadata_are_skipped():
+    packer = ContextPacker()
+    selected, context, stats = packer.pack([{"payload": {}}, hit("   ")], token_budget=100)
+    assert (selected, context, stats["selected"]) == ([], "", 0)
+
+
+def test_text_mmr_drops_overlapping_chunks_without_vectors():
+    base = " ".join(f"palabra{i}" for i in range(60))
+    hits = [
+        hit(base, tokens=60),
+        hit(base + " final", tokens=61),
+        hit(" ".join(f"otro{i}" for i in range(60)), tokens=60),
+    ]
+    selected, _, stats = ContextPacker(text_duplicate_threshold=0.8).pack(hits, token_budget=1000)
+    assert selected == [hits[0], hits[2]]
+    assert stats["duplicates_removed"] == 1
+
+
+def test_text_mmr_prefers_less_overlapping_chunk():
+    words = [f"w{i}" for i in range(100)]
+    hits = [
+        hit(" ".join(words[:60]), tokens=60),
+        hit(" ".join(words[20:80]), tokens=60),  # Solapa 40 palabras con el primero
+        hit(" ".join(f"x{i}" for i in range(60)), tokens=60),
+    ]
+    selected, _, stats = ContextPacker(mmr_lambda=0.5).pack(hits, token_budget=1000)
+    assert selected == [hits[0], hits[2], hits[1]]
+    assert stats["duplicates_removed"] == 0
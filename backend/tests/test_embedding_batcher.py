@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from src.utils import embedding_batcher
+from src.utils.embedding_batcher import EmbeddingBatcher, split_batches
+
+MODEL = "text-embedding-3-small"
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+
+def api_error(status: int) -> openai.APIStatusError:
+    response = httpx.Response(status, request=REQUEST)
+    error_class = {429: openai.RateLimitError, 400: openai.BadRequestError}.get(status, openai.InternalServerError)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class FakeClient:
+    """embeddings.create asíncrono: falla con `errors` en orden y luego responde (datos desordenados)"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.embeddings = SimpleNamespace(create=self.create)
+
+    async def create(self, model, input, dimensions):
+        self.calls.append(list(input))
+        if self.errors:
+            raise self.errors.pop(0)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+class SlowClient(FakeClient):
+    """Cuenta las peticiones en vuelo desde cualquier hilo o event loop"""
+
+    def __init__(self, delay: float = 0.05):
+        super().__init__()
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    async def create(self, model, input, dimensions):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return await super().create(model, input, dimensions)
+
+
+@pytest.fixture(autouse=True)
+def active_embedding(monkeypatch):
+    monkeypatch.setattr(embedding_batcher, "get_active_embedding", lambda: (MODEL, 2))
+
+
+def make_batcher(client: FakeClient, **kwargs) -> EmbeddingBatcher:
+    options = {"retry_base_delay": 0.0, "retry_max_delay": 0.0, "model": MODEL, "dimensions": 2}
+    options.update(kwargs)
+    return EmbeddingBatcher(client_factory=lambda: client, **options)
+
+
+def test_split_batches_by_tokens():
+    assert split_batches([40, 40, 40, 10], max_tokens=100, max_inputs=10) == [(0, 2), (2, 4)]
+
+
+def test_split_batches_by_inputs():
+    assert split_batches([1] * 5, max_tokens=100, max_inputs=2) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_split_batches_oversized_input_goes_alone():
+    assert split_batches([10, 500, 10], max_tokens=100, max_inputs=10) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_split_batches_covers_every_input_in_order():
+    counts = [7, 3, 90, 1, 1, 60, 45, 12, 0, 100]
+    ranges = split_batches(counts, max_tokens=100, max_inputs=3)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(counts)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    for start, end in ranges:
+        assert end - start <= 3
+        assert end - start == 1 or sum(counts[start:end]) <= 100
+    assert split_batches([], max_tokens=100, max_inputs=3) == []
+
+
+def test_embed_keeps_input_order_across_batches():
+    client = FakeClient()
+    texts = [f"texto {'x' * i}" for i in range(7)]
+    vectors = asyncio.run(make_batcher(client, max_batch_inputs=3).embed(texts))
+    assert [vector[0] for vector in vectors] == [float(len(text)) for text in texts]
+    assert [len(call) for call in client.calls] == [3, 3, 1]
+
+
+def test_transient_errors_are_retried():
+    client = FakeClient(errors=[api_error(429), api_error(503), openai.APIConnectionError(request=REQUEST)])
+    batcher = make_batcher(client, max_retries=3)
+    vectors = asyncio.run(batcher.embed(["a", "b"]))
+    assert len(vectors) == 2
+    stats = batcher.stats()
+    assert (stats["retries"], stats["requests"], stats["failures"]) == (3, 1, 0)
+
+
+def test_retries_are_bounded():
+    client = FakeClient(errors=[api_error(500)] * 3)
+    batcher = make_batcher(client, max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(batcher.embed(["a"]))
+    assert len(client.calls) == 3
+    assert batcher.stats()["failures"] == 1
+
+
+def test_client_errors_are_not_retried():
+    client = FakeClient(errors=[api_error(400)])
+    batcher = make_batcher(client)
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(batcher.embed(["a"]))
+    assert len(client.calls) == 1
+    assert batcher.stats()["retries"] == 0
+
+
+def test_long_inputs_are_truncated():
+    client = FakeClient()
+    batcher = make_batcher(client, max_input_tokens=20)
+    asyncio.run(batcher.embed([" ".join(["palabra"] * 200)]))
+    assert batcher.stats()["truncated_inputs"] == 1
+    assert len(client.calls[0][0].split()) < 200
+
+
+def test_concurrency_is_capped_across_event_loops():
+    # Cada worker de ingesta usa su propio asyncio.run: el tope debe ser global
+    client = SlowClient()
+    batcher = make_batcher(client, max_batch_inputs=1, concurrency=2)
+    errors = []
+
+    def worker():
+        try:
+            asyncio.run(batcher.embed([f"texto {i}" for i in range(4)]))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(client.calls) == 12
+    assert client.max_in_flight == 2
+
+
+def test_cancelled_waiter_does_not_leak_slots():
+    client = SlowClient(delay=0.2)
+    batcher = make_batcher(client, max_batch_inputs=1, concurrency=1)
+    holder = threading.Thread(target=lambda: asyncio.run(batcher.embed(["ocupa"])))
+    holder.start()
+    time.sleep(0.05)
+
+    async def cancel_waiter():
+        task = asyncio.create_task(batcher.embed(["espera"]))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_waiter())
+    holder.join()
+    # El hueco que obtuvo el hilo de la espera cancelada vuelve al límite
+    vectors = asyncio.run(asyncio.wait_for(batcher.embed(["libre"]), timeout=2))
+    assert len(vectors) == 1
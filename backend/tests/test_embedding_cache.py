@@ -0,0 +1,78 @@
+import pytest
+from src.core.embedding_cache import EmbeddingCache, pack_vector, unpack_vector, _ENTRY_OVERHEAD_BYTES
+
+MODEL = "text-embedding-3-small"
+DIMS = 8
+
+
+def vector(seed: float):
+    return [seed + i / 10 for i in range(DIMS)]
+
+
+def entry_bytes() -> int:
+    return 4 * DIMS + _ENTRY_OVERHEAD_BYTES
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = EmbeddingCache(max_bytes=3 * entry_bytes())
+    for i in range(5):
+        cache.set(MODEL, DIMS, f"consulta {i}", vector(i))
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["memory_bytes"] <= cache.max_bytes
+    assert stats["evictions"] == 2
+    assert cache.get(MODEL, DIMS, "consulta 0") is None
+    assert cache.get(MODEL, DIMS, "consulta 4") == pytest.approx(vector(4))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_bytes=2 * entry_bytes())
+    cache.set(MODEL, DIMS, "a", vector(1))
+    cache.set(MODEL, DIMS, "b", vector(2))
+    assert cache.get(MODEL, DIMS, "a") is not None
+    cache.set(MODEL, DIMS, "c", vector(3))
+    assert cache.get(MODEL, DIMS, "b") is None
+    assert cache.get(MODEL, DIMS, "a") is not None
+
+
+def test_overwriting_a_key_does_not_leak_bytes():
+    cache = EmbeddingCache(max_bytes=10 * entry_bytes())
+    for _ in range(3):
+        cache.set(MODEL, DIMS, "a", vector(1))
+    assert cache.stats()["memory_bytes"] == entry_bytes()
+
+
+def test_key_depends_on_model_dimensions_and_normalized_text():
+    key = EmbeddingCache.make_key(MODEL, DIMS, "¿Qué es  DNS?\n")
+    assert key == EmbeddingCache.make_key(MODEL, DIMS, " ¿Qué es DNS?")
+    assert key != EmbeddingCache.make_key(MODEL, DIMS * 2, "¿Qué es DNS?")
+    assert key != EmbeddingCache.make_key("text-embedding-3-large", DIMS, "¿Qué es DNS?")
+
+
+def test_float16_round_trip():
+    values = [0.0, 1.0, -0.5, 0.123456, -0.987654, 3.14159]
+    data = pack_vector(values, "float16")
+    assert len(data) == 2 * len(values)
+    assert unpack_vector(data, "float16") == pytest.approx(values, abs=1e-3)
+
+
+def test_float16_redis_hit_fills_memory(fake_redis):
+    EmbeddingCache(redis_client=fake_redis, redis_dtype="float16").set(MODEL, DIMS, "a", vector(0.5))
+    # Otro worker: memoria vacía, el vector llega desde Redis a mitad de tamaño
+    cache = EmbeddingCache(redis_client=fake_redis, redis_dtype="float16")
+    assert cache.get(MODEL, DIMS, "a") == pytest.approx(vector(0.5), abs=1e-2)
+    assert cache.get(MODEL, DIMS, "a") == pytest.approx(vector(0.5), abs=1e-2)
+    stats = cache.stats()
+    assert (stats["redis_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_redis_vector_with_other_dimensions_is_a_miss(fake_redis):
+    cache = EmbeddingCache(redis_client=fake_redis)
+    fake_redis.data[cache.make_key(MODEL, DIMS, "a")] = pack_vector(vector(1)[:4])
+    assert cache.get(MODEL, DIMS, "a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        EmbeddingCache(redis_dtype="int8")
@@ -0,0 +1,166 @@
+import json
+import time
+import asyncio
+import threading
+import pytest
+from src.services import ingestion_jobs
+from src.services.ingestion_jobs import IngestionJobManager, JobQueueFullError, JOB_KEY_PREFIX
+
+
+class SlowRedis:
+    """Redis lento: cada SETEX tarda `delay` segundos y registra el hilo que lo hizo"""
+
+    def __init__(self, fake_redis, delay: float):
+        self.fake_redis = fake_redis
+        self.delay = delay
+        self.threads = []
+
+    def setex(self, key, ttl, value):
+        time.sleep(self.delay)
+        self.threads.append(threading.get_ident())
+        return self.fake_redis.setex(key, ttl, value)
+
+    def __getattr__(self, name):
+        return getattr(self.fake_redis, name)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condición no cumplida a tiempo"
+        time.sleep(0.01)
+
+
+def test_publish_does_not_block_and_keeps_order(fake_redis):
+    redis = SlowRedis(fake_redis, delay=0.2)
+    manager = IngestionJobManager(redis_client=redis)
+    job = manager._new_job("doc-1", "a.pdf", None)
+
+    start = time.monotonic()
+    for stage in ("queued", "running", "done"):
+        job["stage"] = stage
+        manager._publish(job, force=True)
+    assert time.monotonic() - start < 0.1
+    # En memoria el estado es inmediato
+    assert manager.get(job["job_id"])["stage"] == "done"
+
+    key = JOB_KEY_PREFIX + job["job_id"]
+    wait_for(lambda: len(redis.threads) == 3)
+    assert json.loads(fake_redis.get(key))["stage"] == "done"
+    assert threading.get_ident() not in redis.threads
+
+
+def test_progress_updates_are_throttled(fake_redis):
+    manager = IngestionJobManager(redis_client=fake_redis)
+    job = manager._new_job("doc-1", "a.pdf", None)
+    manager._publish(job, force=True)
+    for pages in range(1, 20):
+        job["pages"] = pages
+        manager._publish(job)
+    wait_for(lambda: fake_redis.get(JOB_KEY_PREFIX + job["job_id"]) is not None)
+    assert json.loads(fake_redis.get(JOB_KEY_PREFIX + job["job_id"]))["pages"] == 0
+    assert manager.get(job["job_id"])["pages"] == 19
+
+
+class FakeIngestion:
+    """process_and_store_pdf y rollback_document simulados"""
+
+    def __init__(self, error=None, gate=None):
+        self.error = error
+        self.gate = gate
+        self.calls = []
+        self.rolled_back = []
+
+    async def process(self, file_path, document_id, progress, file_hash=None):
+        self.calls.append(document_id)
+        progress.started_at = time.perf_counter()
+        progress.update(stage="embedding", total_pages=4, pages=2, chunks=10, chunks_embedded=10)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        progress.update(stage="done", pages=4, chunks=20, chunks_embedded=20, chunks_stored=20)
+        return progress
+
+    def rollback(self, document_id):
+        self.rolled_back.append(document_id)
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    def install(**kwargs):
+        fake = FakeIngestion(**kwargs)
+        monkeypatch.setattr(ingestion_jobs, "process_and_store_pdf", fake.process)
+        monkeypatch.setattr(ingestion_jobs, "rollback_document", fake.rollback)
+        return fake
+    return install
+
+
+async def run_jobs(manager, *jobs):
+    """Envía los jobs (document_id, hooks) y espera a que terminen todas sus tareas"""
+    submitted = [manager.submit(f"/tmp/{document_id}.pdf", f"{document_id}.pdf", document_id, **hooks) for document_id, hooks in jobs]
+    await asyncio.gather(*list(manager._tasks.values()))
+    return [manager.get(job["job_id"]) for job in submitted]
+
+
+def test_job_reports_progress_and_completes(ingestion, fake_redis):
+    fake = ingestion()
+    manager = IngestionJobManager(redis_client=fake_redis)
+    completed = []
+
+    (job,) = asyncio.run(run_jobs(manager, ("doc-1", {"on_complete": completed.append})))
+    assert fake.calls == ["doc-1"]
+    assert (job["status"], job["stage"], job["chunks_stored"], job["eta_seconds"]) == ("done", "done", 20, 0.0)
+    assert [hook_job["document_id"] for hook_job in completed] == ["doc-1"]
+    assert manager.stats()["completed"] == 1
+    # Otro worker (sin el job en memoria) lo lee del estado compartido en Redis
+    other = IngestionJobManager(redis_client=fake_redis)
+    wait_for(lambda: (other.get(job["job_id"]) or {}).get("status") == "done")
+
+
+def test_failed_ingestion_marks_the_job_failed(ingestion, fake_redis):
+    ingestion(error=RuntimeError("PDF corrupto"))
+    manager = IngestionJobManager(redis_client=fake_redis)
+    failures, completed = [], []
+
+    (job,) = asyncio.run(run_jobs(manager, ("doc-1", {"on_complete": completed.append, "on_failure": failures.append})))
+    assert (job["status"], job["stage"], job["error"]) == ("failed", "failed", "PDF corrupto")
+    assert job["eta_seconds"] is None
+    assert completed == [] and [hook_job["job_id"] for hook_job in failures] == [job["job_id"]]
+    assert manager.stats()["failed"] == 1
+
+
+def test_registration_failure_rolls_back_the_vectors(ingestion):
+    fake = ingestion()
+    manager = IngestionJobManager()
+    failures = []
+
+    def on_complete(job):
+        raise RuntimeError("base de datos no disponible")
+
+    (job,) = asyncio.run(run_jobs(manager, ("doc-1", {"on_complete": on_complete, "on_failure": failures.append})))
+    assert fake.rolled_back == ["doc-1"]
+    assert job["status"] == "failed" and "base de datos no disponible" in job["error"]
+    assert len(failures) == 1
+    assert manager.stats()["completed"] == 0
+
+
+def test_jobs_beyond_the_limit_wait_queued(ingestion):
+    async def main():
+        gate = asyncio.Event()
+        ingestion(gate=gate)
+        manager = IngestionJobManager(max_concurrent=1, max_queued=2)
+        first = manager.submit("/tmp/a.pdf", "a.pdf", "doc-a")
+        second = manager.submit("/tmp/b.pdf", "b.pdf", "doc-b")
+        with pytest.raises(JobQueueFullError):
+            manager.submit("/tmp/c.pdf", "c.pdf", "doc-c")
+        for _ in range(5):
+            await asyncio.sleep(0)
+        states = (manager.get(first["job_id"])["status"], manager.get(second["job_id"])["status"])
+        gate.set()
+        await asyncio.gather(*list(manager._tasks.values()))
+        return manager, states
+
+    manager, states = asyncio.run(main())
+    assert states == ("running", "queued")
+    assert manager.stats()["completed"] == 2 and manager.stats()["rejected"] == 1
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import pytest
+from src.services import ingestion_pipeline
+from src.services.ingestion_pipeline import IngestionProgress, ingest_pages
+from src.repositories.local_vector_repository import LocalVectorRepository
+
+MODEL = "text-embedding-3-small"
+DIMENSIONS = 4
+
+
+def vector_for(text: str):
+    """Vector determinista por texto (los mismos textos dan el mismo vector)"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [float(byte) + 1.0 for byte in digest[:DIMENSIONS]]
+
+
+def make_pages(count: int, words: int = 100, prefix: str = "p"):
+    return [" ".join(f"{prefix}{page}w{word}" for word in range(words)) for page in range(count)]
+
+
+class FakeBatcher:
+    """EmbeddingBatcher simulado: registra los textos de cada llamada y puede fallar en la n-ésima"""
+
+    def __init__(self, fail_on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    async def embed(self, texts, model=None, dimensions=None):
+        self.calls.append(list(texts))
+        if self.fail_on_call is not None and len(self.calls) >= self.fail_on_call:
+            raise RuntimeError("embeddings no disponibles")
+        await asyncio.sleep(0)
+        return [vector_for(text) for text in texts]
+
+    @property
+    def embedded(self):
+        return [text for call in self.calls for text in call]
+
+
+class RecordingRepository(LocalVectorRepository):
+    """Índice local que registra el orden de los upserts y de la barrera final"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def upsert_points(self, points, vector_size=None, barrier=True):
+        self.events.append(("upsert", len(points), barrier))
+        return super().upsert_points(points, vector_size, barrier)
+
+    def wait_for_updates(self):
+        self.events.append(("wait",))
+
+
+@pytest.fixture
+def batcher(monkeypatch):
+    fake = FakeBatcher()
+    monkeypatch.setattr(ingestion_pipeline, "get_embedding_batcher", lambda: fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def pipeline_settings(monkeypatch):
+    monkeypatch.setattr(ingestion_pipeline, "get_active_embedding", lambda: (MODEL, DIMENSIONS))
+    monkeypatch.setattr(ingestion_pipeline.settings, "text_splitter", "words")
+    monkeypatch.setattr(ingestion_pipeline.settings, "chunk_size", 40)
+    monkeypatch.setattr(ingestion_pipeline.settings, "chunk_overlap", 5)
+    monkeypatch.setattr(ingestion_pipeline.settings, "ingest_dedup_enabled", True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return RecordingRepository(base_dir=str(tmp_path))
+
+
+def ingest(repo, pages, document_id="doc-1", **kwargs):
+    return asyncio.run(ingest_pages(
+        lambda: iter(pages), lambda: len(pages), "manual.pdf", document_id, repo,
+        batch_size=3, queue_size=1, **kwargs
+    ))
+
+
+def stored_payloads(repo, document_id):
+    hits = repo.search([1.0] * DIMENSIONS, top_k=10000, filter_conditions={"document_id": document_id})
+    return sorted((hit["payload"] for hit in hits), key=lambda payload: payload["chunk_index"])
+
+
+def test_pipeline_stores_every_chunk_in_order(repo, batcher):
+    pages = make_pages(6)
+    progress = ingest(repo, pages, revision="rev-1")
+
+    expected = list(ingestion_pipeline.iter_document_chunks(pages))
+    assert progress.stage == "done"
+    assert (progress.pages, progress.total_pages) == (6, 6)
+    assert progress.chunks == progress.chunks_embedded == progress.chunks_stored == len(expected)
+    payloads = stored_payloads(repo, "doc-1")
+    assert [payload["text"] for payload in payloads] == expected
+    assert [payload["chunk_index"] for payload in payloads] == list(range(len(expected)))
+    assert {payload["revision"] for payload in payloads} == {"rev-1"}
+    assert {payload["embedding_signature"] for payload in payloads} == {f"{MODEL}:{DIMENSIONS}"}
+
+
+def test_upserts_skip_the_barrier_until_the_document_ends(repo, batcher):
+    ingest(repo, make_pages(4))
+    upserts = [event for event in repo.events if event[0] == "upsert"]
+    assert upserts and all(barrier is False for _, _, barrier in upserts)
+    assert all(size <= 3 for _, size, _ in upserts)
+    # Una sola barrera, después del último upsert
+    assert repo.events[-1] == ("wait",)
+    assert repo.events.count(("wait",)) == 1
+
+
+def test_failed_stage_stops_the_pipeline(repo, monkeypatch):
+    failing = FakeBatcher(fail_on_call=1)
+    monkeypatch.setattr(ingestion_pipeline, "get_embedding_batcher", lambda: failing)
+    updates = []
+    progress = IngestionProgress(on_update=lambda p: updates.append(p.stage))
+
+    with pytest.raises(RuntimeError, match="embeddings no disponibles"):
+        ingest(repo, make_pages(200), progress=progress)
+
+    assert progress.stage == "failed" and updates[-1] == "failed"
+    # Las colas acotadas frenan la extracción: no se leyó el documento entero
+    assert progress.pages < 200
+    assert progress.chunks_stored == 0
+    assert repo.get_collection_info()["points_count"] == 0
+
+
+def test_reingest_reuses_stored_vectors(repo, batcher):
+    pages = make_pages(5)
+    first = ingest(repo, pages, document_id="doc-1")
+    embedded = len(batcher.embedded)
+    assert first.chunks_reused == 0 and embedded == first.chunks
+
+    second = ingest(repo, pages, document_id="doc-2")
+    assert second.chunks_reused == second.chunks_stored == first.chunks
+    assert len(batcher.embedded) == embedded
+    assert [p["text"] for p in stored_payloads(repo, "doc-2")] == [p["text"] for p in stored_payloads(repo, "doc-1")]
+
+
+def test_repeated_chunks_are_embedded_once(repo, batcher):
+    # Texto periódico con periodo chunk_size - overlap: todos los chunks completos son iguales
+    pages = [" ".join(f"w{word % 35}" for word in range(700))]
+    progress = ingest(repo, pages)
+    # Dentro de un batch cada texto se pide una vez (los batches en vuelo a la vez no se ven entre sí)
+    assert all(len(call) == len(set(call)) for call in batcher.calls)
+    assert len(batcher.embedded) < progress.chunks
+    assert progress.chunks_stored == progress.chunks
+
+
+def test_vectors_from_another_model_are_not_reused(repo, batcher, monkeypatch):
+    pages = make_pages(3)
+    ingest(repo, pages, document_id="doc-1")
+    embedded = len(batcher.embedded)
+
+    monkeypatch.setattr(ingestion_pipeline, "get_active_embedding", lambda: ("text-embedding-3-large", DIMENSIONS))
+    progress = ingest(repo, pages, document_id="doc-2")
+    assert progress.chunks_reused == 0
+    assert len(batcher.embedded) == 2 * embedded
+
+
+def test_file_hash_identifies_an_indexed_document(repo, batcher):
+    ingest(repo, make_pages(2), document_id="doc-1", file_hash="sha-manual")
+    assert repo.find_document_id_by_file_hash("sha-manual") == "doc-1"
+    assert repo.find_document_id_by_file_hash("sha-otro") is None
@@ -0,0 +1,114 @@
+import pytest
+from src.repositories.local_vector_repository import LocalVectorRepository
+
+
+def point(point_id: str, vector, document_id: str = "doc-1", **payload):
+    return {"id": point_id, "vector": vector, "payload": {"document_id": document_id, "text": point_id, **payload}}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return LocalVectorRepository(base_dir=str(tmp_path))
+
+
+def test_dimension_mismatch_with_data_raises_and_keeps_points(repo, tmp_path):
+    repo.upsert_points([point("a", [1.0, 0.0, 0.0]), point("b", [0.0, 1.0, 0.0])])
+    with pytest.raises(ValueError, match="reindex_documents"):
+        repo.upsert_points([point("c", [1.0, 0.0])])
+    reopened = LocalVectorRepository(base_dir=str(tmp_path))
+    assert [hit["id"] for hit in reopened.search([1.0, 0.0, 0.0], top_k=5)] == ["a", "b"]
+
+
+def test_empty_index_adopts_new_dimensions(repo):
+    repo.upsert_points([point("a", [1.0, 0.0, 0.0])])
+    repo.delete_by_document_id("doc-1")
+    assert repo.upsert_points([point("b", [0.0, 1.0])])
+    assert [hit["id"] for hit in repo.search([0.0, 1.0], top_k=5)] == ["b"]
+
+
+@pytest.fixture
+def filled(repo):
+    """Dos documentos con dos revisiones de ingesta en doc-1"""
+    repo.upsert_points([
+        point("a", [1.0, 0.0, 0.0], revision="rev-1", chunk_hash="h-a", embedding_signature="m:3"),
+        point("b", [0.9, 0.1, 0.0], revision="rev-1", chunk_hash="h-b", embedding_signature="m:3"),
+        point("c", [0.7, 0.7, 0.0], revision="rev-2", chunk_hash="h-c", embedding_signature="m:3"),
+        point("d", [0.0, 1.0, 0.0], document_id="doc-2", chunk_hash="h-a", embedding_signature="otro:3"),
+        point("e", [0.0, 0.0, 1.0], document_id="doc-2", chunk_hash="h-e", embedding_signature="m:3"),
+    ])
+    return repo
+
+
+def ids(hits):
+    return [hit["id"] for hit in hits]
+
+
+def test_search_orders_by_cosine_and_applies_filters(filled):
+    hits = filled.search([1.0, 0.0, 0.0], top_k=3)
+    assert ids(hits) == ["a", "b", "c"]
+    assert hits[0]["score"] == pytest.approx(1.0)
+    assert hits[0]["score"] >= hits[1]["score"] >= hits[2]["score"]
+    assert ids(filled.search([1.0, 0.0, 0.0], top_k=10, filter_conditions={"document_id": "doc-2"})) == ["d", "e"]
+    # Filtros sobre el payload (json) y sobre document_id se combinan
+    assert ids(filled.search([1.0, 0.0, 0.0], top_k=10, filter_conditions={"document_id": "doc-1", "revision": "rev-2"})) == ["c"]
+    assert filled.search([1.0, 0.0], top_k=3) == []
+
+
+def test_payload_projection_and_vectors(filled):
+    hit = filled.search([1.0, 0.0, 0.0], top_k=1, payload_fields=["text", "missing"], with_vectors=True)[0]
+    assert hit["payload"] == {"text": "a"}
+    assert hit["vector"] == pytest.approx([1.0, 0.0, 0.0])
+    assert filled.search([1.0, 0.0, 0.0], top_k=1, payload_fields=[])[0]["payload"] == {}
+
+
+def test_fetch_payloads_completes_a_two_phase_search(filled):
+    hits = filled.search([0.0, 1.0, 0.0], top_k=2, payload_fields=[])
+    full = filled.fetch_payloads(hits, payload_fields=["document_id", "text"])
+    assert [hit["payload"] for hit in full] == [{"document_id": "doc-2", "text": "d"}, {"document_id": "doc-1", "text": "c"}]
+    assert [hit["score"] for hit in full] == [hit["score"] for hit in hits]
+    assert filled.fetch_payloads([]) == []
+
+
+def test_hybrid_search_degrades_to_dense(filled):
+    hits, fused = filled.hybrid_search([1.0, 0.0, 0.0], sparse_vector={"indices": [1], "values": [1.0]}, top_k=2)
+    assert fused is False and ids(hits) == ["a", "b"]
+
+
+def test_upsert_of_an_existing_id_replaces_it(filled):
+    filled.upsert_points([point("a", [0.0, 0.0, 1.0], text="nuevo")])
+    assert filled.get_collection_info()["points_count"] == 5
+    hit = filled.search([0.0, 0.0, 1.0], top_k=1)[0]
+    assert hit["id"] == "a" and hit["payload"]["text"] == "nuevo"
+
+
+def test_deletes_compact_the_matrix_and_persist(filled, tmp_path):
+    assert filled.delete_by_document_id("doc-1")
+    assert filled.get_collection_info()["points_count"] == 2
+    # Las filas que quedan se movieron a los huecos y siguen siendo buscables
+    assert ids(filled.search([0.0, 1.0, 0.0], top_k=5)) == ["d", "e"]
+    reopened = LocalVectorRepository(base_dir=str(tmp_path))
+    assert ids(reopened.search([0.0, 0.0, 1.0], top_k=5)) == ["e", "d"]
+    assert reopened.get_collection_info()["config"]["size"] == 3
+
+
+def test_delete_points_batch_removes_at_most_the_limit(filled):
+    assert filled.delete_points_batch("doc-1", limit=2) == 2
+    assert filled.delete_points_batch("doc-1", limit=2) == 1
+    assert filled.delete_points_batch("doc-1", limit=2) == 0
+    assert set(ids(filled.search([1.0, 0.0, 0.0], top_k=5))) == {"d", "e"}
+
+
+def test_delete_revision_removes_or_keeps_one_revision(filled):
+    assert filled.delete_revision("doc-1", "rev-2", keep=True)
+    assert ids(filled.search([1.0, 0.0, 0.0], top_k=10, filter_conditions={"document_id": "doc-1"})) == ["c"]
+    assert filled.delete_revision("doc-1", "rev-2")
+    assert filled.search([1.0, 0.0, 0.0], top_k=10, filter_conditions={"document_id": "doc-1"}) == []
+    assert filled.get_collection_info()["points_count"] == 2
+
+
+def test_vectors_are_reused_only_with_the_same_signature(filled):
+    found = filled.get_vectors_by_chunk_hashes(["h-a", "h-e", "h-x", "h-a"], "m:3")
+    assert set(found) == {"h-a", "h-e"}
+    assert found["h-a"] == pytest.approx([1.0, 0.0, 0.0])
+    assert set(filled.get_vectors_by_chunk_hashes(["h-a", "h-e"], "otro:3")) == {"h-a"}
+    assert filled.get_vectors_by_chunk_hashes([], "m:3") == {}
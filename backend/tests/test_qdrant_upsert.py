@@ -0,0 +1,105 @@
+import threading
+import pytest
+from src.repositories import qdrant_repository
+
+DIMENSIONS = 4
+
+
+def make_points(count: int, document_id: str = "doc-1"):
+    return [
+        {"vector": [1.0, float(i % 3), 0.5, 0.0], "payload": {"document_id": document_id, "text": f"chunk {i}", "chunk_index": i}}
+        for i in range(count)
+    ]
+
+
+class RecordingClient:
+    """Envuelve el cliente: registra cada upsert (tamaño, wait, hilo) y cada barrera"""
+
+    def __init__(self, client, fail_on_upsert=None):
+        self.client = client
+        self.fail_on_upsert = fail_on_upsert
+        self.events = []
+        self._lock = threading.Lock()
+
+    def upsert(self, collection_name, points, wait=True):
+        with self._lock:
+            self.events.append(("upsert", len(points), wait, threading.current_thread().name))
+            failing = self.fail_on_upsert is not None and sum(1 for e in self.events if e[0] == "upsert") == self.fail_on_upsert
+        if failing:
+            raise RuntimeError("Qdrant no disponible")
+        return self.client.upsert(collection_name=collection_name, points=points, wait=wait)
+
+    def delete(self, collection_name, points_selector, wait=True):
+        with self._lock:
+            self.events.append(("delete", wait))
+        return self.client.delete(collection_name=collection_name, points_selector=points_selector, wait=wait)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def upserts(self):
+        return [event for event in self.events if event[0] == "upsert"]
+
+
+@pytest.fixture
+def upsert_settings(monkeypatch):
+    monkeypatch.setattr(qdrant_repository.settings, "qdrant_upsert_batch_size", 4)
+    monkeypatch.setattr(qdrant_repository.settings, "qdrant_upsert_parallel", 3)
+    monkeypatch.setattr(qdrant_repository.settings, "qdrant_upsert_pipelined", True)
+
+
+@pytest.fixture
+def recorder(qdrant_repo, upsert_settings):
+    # La colección se prepara (tamaño de vector) antes de empezar a registrar
+    qdrant_repo.upsert_points(make_points(1, document_id="inicial"))
+    recording = RecordingClient(qdrant_repo.client)
+    qdrant_repo.client = recording
+    return recording
+
+
+def count_points(repo, document_id):
+    return repo.client.count(
+        collection_name=repo.collection_name,
+        count_filter=repo._build_filter({"document_id": document_id}),
+        exact=True
+    ).count
+
+
+def test_pipelined_upsert_sends_parallel_batches_and_one_barrier(qdrant_repo, recorder):
+    assert qdrant_repo.upsert_points(make_points(10))
+
+    upserts = recorder.upserts()
+    assert sorted(size for _, size, _, _ in upserts) == [2, 4, 4]
+    assert all(wait is False for _, _, wait, _ in upserts)
+    assert all(name.startswith("qdrant-upsert") for _, _, _, name in upserts)
+    # La barrera llega después de todos los lotes
+    assert recorder.events[-1] == ("delete", True)
+    assert recorder.events.count(("delete", True)) == 1
+    assert count_points(qdrant_repo, "doc-1") == 10
+
+
+def test_barrier_can_be_deferred_to_the_caller(qdrant_repo, recorder):
+    for _ in range(3):
+        qdrant_repo.upsert_points(make_points(5), None, False)
+    assert not [event for event in recorder.events if event[0] == "delete"]
+
+    qdrant_repo.wait_for_updates()
+    assert recorder.events[-1] == ("delete", True)
+    # La barrera no borra ningún punto real
+    assert count_points(qdrant_repo, "doc-1") == 15
+
+
+def test_non_pipelined_upsert_waits_for_every_batch(qdrant_repo, recorder, monkeypatch):
+    monkeypatch.setattr(qdrant_repository.settings, "qdrant_upsert_pipelined", False)
+    qdrant_repo.upsert_points(make_points(9))
+    assert [wait for _, _, wait, _ in recorder.upserts()] == [True, True, True]
+    assert not [event for event in recorder.events if event[0] == "delete"]
+
+
+def test_failed_batch_is_raised_and_the_collection_rechecked(qdrant_repo, recorder):
+    recorder.fail_on_upsert = 2
+    with pytest.raises(RuntimeError, match="Qdrant no disponible"):
+        qdrant_repo.upsert_points(make_points(12))
+    assert qdrant_repo._vector_size is None
+    # Sin barrera tras un fallo
+    assert not [event for event in recorder.events if event[0] == "delete"]
@@ -0,0 +1,220 @@
+import time
+import asyncio
+import hashlib
+import pytest
+from src.core import active_embedding
+from src.models.database import SessionLocal, EmbeddingMigration, DocumentTombstone
+from src.repositories import tombstone_repository
+from src.repositories.tombstone_repository import TombstoneRepository
+from src.services import reembedding
+from src.services.reembedding import ReembeddingJob, abort_migration, start_migration
+
+OLD_DIMENSIONS = 4
+NEW_MODEL = "text-embedding-3-large"
+NEW_DIMENSIONS = 3
+
+
+class FakeBatcher:
+    """Batcher del modelo nuevo: vectores deterministas; `on_call` simula la ingesta en vivo"""
+
+    def __init__(self, fail_on_call=None, on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+        self.on_call = on_call
+        self.tokens = 0
+
+    async def embed(self, texts, model=None, dimensions=None):
+        self.calls.append(list(texts))
+        if self.on_call is not None:
+            self.on_call(len(self.calls))
+        if self.fail_on_call is not None and len(self.calls) == self.fail_on_call:
+            raise RuntimeError("límite de la API agotado")
+        self.tokens += sum(len(text.split()) for text in texts)
+        return [[float(byte) + 1.0 for byte in hashlib.sha256(text.encode()).digest()[:NEW_DIMENSIONS]] for text in texts]
+
+    def stats(self):
+        return {"tokens": self.tokens, "throttled_seconds": 0.0}
+
+    @property
+    def embedded(self):
+        return [text for call in self.calls for text in call]
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Sin re-embeddings ni tombstones de otros tests; el modelo activo vuelve al de settings al terminar"""
+    def clear():
+        db = SessionLocal()
+        try:
+            db.query(EmbeddingMigration).delete()
+            db.query(DocumentTombstone).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    clear()
+    monkeypatch.setattr(tombstone_repository, "_tombstone_repository", TombstoneRepository(refresh_seconds=3600))
+    monkeypatch.setattr(reembedding, "invalidate_semantic_cache", lambda: None)
+    monkeypatch.setattr(active_embedding, "_active", None)
+    monkeypatch.setattr(active_embedding, "_loaded_at", 0.0)
+    yield
+    # Una renovación en segundo plano del modelo activo no debe terminar después del test
+    while active_embedding._refreshing:
+        time.sleep(0.01)
+    clear()
+
+
+def make_points(count, document_id="doc-1"):
+    return [
+        {
+            "vector": [1.0, float(i), 0.5, 0.25],
+            "sparse_vector": {"indices": [i + 1], "values": [1.0]},
+            "payload": {
+                "document_id": document_id,
+                "text": f"chunk {i} de {document_id}",
+                "revision": "rev-1",
+                "embedding_signature": f"text-embedding-3-small:{OLD_DIMENSIONS}",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def live(qdrant_repo):
+    """Colección viva con 10 chunks del modelo anterior"""
+    qdrant_repo.upsert_points(make_points(10))
+    return qdrant_repo
+
+
+def collection_points(repo, collection):
+    records, _ = repo.client.scroll(collection_name=collection, limit=1000, with_payload=True, with_vectors=True)
+    return {record.payload["text"]: record for record in records}
+
+
+def run_job(migration, repo, batcher, **kwargs):
+    job = ReembeddingJob(migration.id, repo=repo, batcher=batcher, page_size=4, grace_seconds=0, **kwargs)
+    return job, asyncio.run(job.run())
+
+
+def test_migration_copies_everything_and_swaps_the_alias(live):
+    source = live.resolve_collection()
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    assert migration.points_total == 10
+
+    batcher = FakeBatcher()
+    _, progress = run_job(migration, live, batcher)
+    assert progress["status"] == "swapped" and progress["percent"] == 100.0
+    assert progress["points_copied"] == 10
+    assert live.resolve_collection() == migration.target_collection
+
+    points = collection_points(live, migration.target_collection)
+    assert len(points) == 10 and len(batcher.embedded) == 10
+    for record in points.values():
+        assert record.payload["embedding_signature"] == f"{NEW_MODEL}:{NEW_DIMENSIONS}"
+        assert len(record.vector[""]) == NEW_DIMENSIONS
+        # El vector disperso (BM25) se conserva sin recalcularlo
+        assert record.vector["text-sparse"].indices
+    # La colección anterior se conserva (rollback manual) salvo con drop_old
+    assert live.client.collection_exists(source)
+    # Los workers adoptan el modelo nuevo al renovar su copia
+    active_embedding.refresh_active_embedding()
+    assert active_embedding._active == (NEW_MODEL, NEW_DIMENSIONS)
+    assert live.search([1.0, 2.0, 3.0], top_k=3)
+
+
+def test_interrupted_copy_resumes_from_the_saved_offset(live):
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    with pytest.raises(RuntimeError, match="límite de la API"):
+        run_job(migration, live, FakeBatcher(fail_on_call=2))
+
+    db = SessionLocal()
+    saved = db.query(EmbeddingMigration).filter(EmbeddingMigration.id == migration.id).one()
+    db.close()
+    assert saved.status == "copying" and saved.points_copied == 4
+    assert saved.next_offset is not None and "límite de la API" in saved.error
+    assert live.resolve_collection() == migration.source_collection
+
+    resumed = FakeBatcher()
+    _, progress = run_job(migration, live, resumed)
+    # Solo se embeben las páginas que faltaban
+    assert len(resumed.embedded) == 6
+    assert progress["status"] == "swapped" and progress["points_copied"] == 10
+    assert len(collection_points(live, migration.target_collection)) == 10
+
+
+def test_reconcile_applies_live_writes_made_during_the_copy(live):
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    source = migration.source_collection
+    first_page = {}
+
+    def live_ingestion(call):
+        if call != 1:
+            return
+        # Mientras se copia la primera página: llega un documento nuevo y se reemplaza un chunk ya leído
+        live.upsert_points(make_points(2, document_id="doc-2"))
+        records, _ = live.client.scroll(collection_name=source, limit=1, with_payload=True)
+        first_page["text"] = records[0].payload["text"]
+        live.client.delete(collection_name=source, points_selector=[records[0].id], wait=True)
+
+    run_job(migration, live, FakeBatcher(on_call=live_ingestion))
+
+    points = collection_points(live, migration.target_collection)
+    assert set(collection_points(live, source)) == set(points)
+    assert first_page["text"] not in points
+    assert {"chunk 0 de doc-2", "chunk 1 de doc-2"} <= set(points)
+
+
+def test_resume_after_an_unrecorded_swap_does_not_reconcile(live, monkeypatch):
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    original_save = ReembeddingJob._save
+
+    def crash_before_recording_the_swap(self, **fields):
+        if fields.get("status") == "swapped":
+            raise RuntimeError("proceso terminado")
+        return original_save(self, **fields)
+
+    monkeypatch.setattr(ReembeddingJob, "_save", crash_before_recording_the_swap)
+    with pytest.raises(RuntimeError, match="proceso terminado"):
+        run_job(migration, live, FakeBatcher())
+    monkeypatch.setattr(ReembeddingJob, "_save", original_save)
+    assert live.resolve_collection() == migration.target_collection
+
+    # La sombra ya recibe escrituras en vivo de los workers con el modelo nuevo
+    live.upsert_points([{
+        "vector": [0.5, 0.5, 1.0],
+        "payload": {"document_id": "doc-nuevo", "text": "chunk 0 de doc-nuevo", "embedding_signature": f"{NEW_MODEL}:{NEW_DIMENSIONS}"}
+    }])
+    batcher = FakeBatcher()
+    _, progress = run_job(migration, live, batcher)
+    assert progress["status"] == "swapped"
+    points = collection_points(live, migration.target_collection)
+    # Reconciliar ahora borraría el chunk escrito en vivo (no existe en la colección anterior)
+    assert len(points) == 11 and "chunk 0 de doc-nuevo" in points
+    assert batcher.embedded == []
+
+
+def test_only_one_migration_runs_per_alias(live):
+    start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    with pytest.raises(ValueError, match="en curso"):
+        start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+
+
+def test_abort_drops_the_shadow_and_keeps_serving_the_live_collection(live):
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    aborted = abort_migration(migration.id, repo=live)
+
+    assert aborted.status == "failed" and aborted.error == "abortado"
+    assert not live.client.collection_exists(migration.target_collection)
+    assert live.resolve_collection() == migration.source_collection
+    assert len(live.search([1.0, 1.0, 0.5, 0.25], top_k=20)) == 10
+    with pytest.raises(ValueError, match="no se puede abortar"):
+        abort_migration(migration.id, repo=live)
+
+
+def test_abort_refuses_once_the_alias_points_to_the_shadow(live):
+    migration = start_migration(NEW_MODEL, NEW_DIMENSIONS, repo=live)
+    live.swap_alias(migration.target_collection)
+    with pytest.raises(ValueError, match="--resume"):
+        abort_migration(migration.id, repo=live)
+    assert live.client.collection_exists(migration.target_collection)
@@ -0,0 +1,111 @@
+import time
+import asyncio
+from types import SimpleNamespace
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models as qmodels
+from src.repositories.search_batcher import BatchMetrics, SearchMicroBatcher
+
+
+class FakeAsyncClient:
+    """query_batch_points simulado: registra el tamaño de cada lote y responde el limit de cada consulta"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    async def query_batch_points(self, collection_name, requests):
+        self.batches.append(len(requests))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [SimpleNamespace(points=[request.limit]) for request in requests]
+
+
+def request(limit: int) -> qmodels.QueryRequest:
+    return qmodels.QueryRequest(query=[1.0, 0.0, 0.0], limit=limit)
+
+
+def make_batcher(client, **kwargs):
+    return SearchMicroBatcher(client_getter=lambda: client, collection_name="documents", metrics=BatchMetrics(), **kwargs)
+
+
+def test_concurrent_queries_share_one_round_trip():
+    client = FakeAsyncClient()
+    batcher = make_batcher(client, max_batch_size=16, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(request(limit)) for limit in range(1, 6)))
+
+    results = asyncio.run(main())
+    # Cada consulta recibe su propio resultado aunque viajen juntas
+    assert results == [[1], [2], [3], [4], [5]]
+    assert client.batches == [5]
+    metrics = batcher.metrics.snapshot()
+    assert (metrics["batches"], metrics["requests"], metrics["round_trips_saved"]) == (1, 5, 4)
+
+
+def test_full_batches_are_sent_without_waiting():
+    client = FakeAsyncClient()
+    batcher = make_batcher(client, max_batch_size=2, max_wait_ms=200)
+
+    async def main():
+        start = time.perf_counter()
+        first = asyncio.gather(batcher.submit(request(1)), batcher.submit(request(2)))
+        results = await first
+        return time.perf_counter() - start, results, await asyncio.gather(*(batcher.submit(request(limit)) for limit in (3, 4, 5)))
+
+    elapsed, first, rest = asyncio.run(main())
+    assert elapsed < 0.15
+    assert first == [[1], [2]] and rest == [[3], [4], [5]]
+    assert client.batches == [2, 2, 1]
+    assert batcher.metrics.snapshot()["batch_size_histogram"] == {1: 1, 2: 2}
+
+
+def test_a_lone_query_waits_at_most_the_window():
+    client = FakeAsyncClient()
+    batcher = make_batcher(client, max_batch_size=16, max_wait_ms=20)
+
+    async def main():
+        start = time.perf_counter()
+        result = await batcher.submit(request(7))
+        return time.perf_counter() - start, result
+
+    elapsed, result = asyncio.run(main())
+    assert result == [7] and client.batches == [1]
+    assert 0.015 <= elapsed < 0.5
+    assert batcher.metrics.snapshot()["max_queue_delay_ms"] >= 15
+
+
+def test_a_failed_batch_fails_every_query_in_it():
+    client = FakeAsyncClient(error=RuntimeError("Qdrant no disponible"))
+    batcher = make_batcher(client, max_batch_size=16, max_wait_ms=5)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(request(limit)) for limit in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.metrics.snapshot()["failed_batches"] == 1
+
+
+def test_batched_results_match_individual_queries():
+    async def main():
+        client = AsyncQdrantClient(":memory:")
+        await client.create_collection(
+            "documents", vectors_config=qmodels.VectorParams(size=3, distance=qmodels.Distance.COSINE)
+        )
+        await client.upsert("documents", points=[
+            qmodels.PointStruct(id=i, vector=[1.0, float(i), float(i % 3)], payload={"i": i}) for i in range(20)
+        ])
+        batcher = make_batcher(client, max_batch_size=8, max_wait_ms=5)
+        requests = [qmodels.QueryRequest(query=[1.0, float(i), 1.0], limit=3) for i in range(10)]
+        batched = await asyncio.gather(*(batcher.submit(query) for query in requests))
+        individual = [
+            (await client.query_points("documents", query=query.query, limit=query.limit)).points
+            for query in requests
+        ]
+        return batched, individual, batcher.metrics.snapshot()
+
+    batched, individual, metrics = asyncio.run(main())
+    assert [[point.id for point in points] for points in batched] == [[point.id for point in points] for points in individual]
+    assert metrics["batches"] == 2 and metrics["requests"] == 10
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from src.core.semantic_cache import SemanticCache, CORPUS_VERSION_KEY
+
+DIMS = 4
+RESULT = {"answer": "DNS resuelve nombres", "hits": 3, "contexts": []}
+
+
+def rotated(similarity: float):
+    """Vector con similitud coseno `similarity` respecto a [1, 0, 0, 0]"""
+    return [similarity, float(np.sqrt(1 - similarity ** 2)), 0.0, 0.0]
+
+
+BASE = [1.0, 0.0, 0.0, 0.0]
+
+
+def test_hit_above_threshold_and_miss_below():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.9)
+    cache.store("¿qué es DNS?", BASE, RESULT)
+    hit = cache.lookup(rotated(0.95))
+    assert hit["answer"] == RESULT["answer"]
+    assert hit["semantic_cache"] == {"similarity": pytest.approx(0.95, abs=1e-4), "query": "¿qué es DNS?"}
+    assert cache.lookup(rotated(0.85)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_similarity_ignores_vector_norm():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.99)
+    cache.store("a", [2.0, 0.0, 0.0, 0.0], RESULT)
+    assert cache.lookup([0.5, 0.0, 0.0, 0.0]) is not None
+
+
+def test_invalid_vectors_are_ignored():
+    cache = SemanticCache(dimensions=DIMS)
+    cache.store("a", [0.0] * DIMS, RESULT)
+    cache.store("b", [1.0, 0.0], RESULT)
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup([1.0, 0.0]) is None
+
+
+def test_invalidate_clears_local_entries():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.9)
+    cache.store("a", BASE, RESULT)
+    cache.invalidate()
+    assert cache.lookup(BASE) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_corpus_version_bump_from_another_worker_invalidates(fake_redis):
+    worker_a = SemanticCache(dimensions=DIMS, threshold=0.9, redis_client=fake_redis)
+    worker_b = SemanticCache(dimensions=DIMS, threshold=0.9, redis_client=fake_redis)
+    worker_a.store("a", BASE, RESULT)
+    assert worker_a.lookup(BASE) is not None
+
+    worker_b.invalidate()
+    assert fake_redis.get(CORPUS_VERSION_KEY) == b"1"
+    assert worker_a.lookup(BASE) is None
+    assert worker_a.stats()["stale_skipped"] == 1
+
+
+def test_expired_entries_are_skipped():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.9, ttl=0)
+    cache.store("a", BASE, RESULT)
+    cache._entries[0]["created_at"] -= 1
+    assert cache.lookup(BASE) is None
+
+
+def test_ring_buffer_replaces_oldest_entry():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.99, max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0, 0.0], RESULT)
+    cache.store("b", [0.0, 1.0, 0.0, 0.0], RESULT)
+    cache.store("c", [0.0, 0.0, 1.0, 0.0], RESULT)
+    assert cache.lookup([1.0, 0.0, 0.0, 0.0]) is None
+    assert cache.lookup([0.0, 0.0, 1.0, 0.0])["semantic_cache"]["query"] == "c"
+
+
+def test_active_model_change_flushes_and_resizes():
+    cache = SemanticCache(dimensions=DIMS, threshold=0.9, model="modelo-a")
+    cache.store("a", BASE, RESULT)
+    cache.use_embedding("modelo-a", DIMS)
+    assert cache.lookup(BASE) is not None
+
+    # Mismas dimensiones, otro modelo: los vectores antiguos no son comparables
+    cache.use_embedding("modelo-b", DIMS)
+    assert cache.lookup(BASE) is None
+
+    cache.use_embedding("modelo-c", 6)
+    cache.store("c", [1.0, 0, 0, 0, 0, 0], RESULT)
+    assert cache.lookup([1.0, 0, 0, 0, 0, 0])["semantic_cache"]["query"] == "c"
+    assert cache.lookup(BASE) is None
+    assert cache.stats()["model"] == "modelo-c"
@@ -0,0 +1,46 @@
+import pytest
+from src.utils.sparse_vectors import (
+    BM25_K1,
+    tokenize,
+    term_index,
+    sparse_vector_for_text,
+    sparse_vector_for_query,
+)
+
+
+def test_tokenize_normalizes_and_drops_stopwords():
+    assert tokenize("¿Qué es el protocolo TCP/IP?") == ["protocolo", "tcp/ip"]
+    assert tokenize("Estándar 802.11ac y Wi-Fi 6") == ["estandar", "802.11ac", "wi-fi", "6"]
+    assert tokenize("") == []
+
+
+def test_term_index_is_stable_uint31():
+    assert term_index("dns") == term_index("dns")
+    assert term_index("dns") != term_index("dhcp")
+    assert 0 <= term_index("dns") < 2 ** 31
+
+
+def test_text_vector_is_sorted_and_saturated():
+    vector = sparse_vector_for_text("dns dns dns dhcp", avg_doc_length=4)
+    assert vector["indices"] == sorted(vector["indices"])
+    weights = dict(zip(vector["indices"], vector["values"]))
+    assert set(weights) == {term_index("dns"), term_index("dhcp")}
+    # Más frecuencia pesa más, pero la TF saturada nunca supera k1 + 1
+    assert weights[term_index("dhcp")] < weights[term_index("dns")] < BM25_K1 + 1
+
+
+def test_longer_chunks_weigh_less():
+    short = sparse_vector_for_text("dns", avg_doc_length=10)
+    long = sparse_vector_for_text("dns " + " ".join(f"termino{i}" for i in range(30)), avg_doc_length=10)
+    index = short["indices"].index(term_index("dns"))
+    assert long["values"][long["indices"].index(term_index("dns"))] < short["values"][index]
+
+
+def test_text_without_terms():
+    assert sparse_vector_for_text("el de la y") == {"indices": [], "values": []}
+
+
+def test_query_vector_has_unit_weights():
+    vector = sparse_vector_for_query(["Protocolo DNS", "dns"])
+    assert vector["indices"] == sorted([term_index("protocolo"), term_index("dns")])
+    assert vector["values"] == pytest.approx([1.0, 1.0])
@@ -0,0 +1,71 @@
+import random
+import pytest
+from src.utils.text_processing import TokenTextSplitter, text_splitter, iter_text_chunks
+
+WORDS = "el protocolo TCP garantiza la entrega. ordenada de segmentos? mientras UDP (prioriza) la latencia» 192.168.0.1/24".split()
+
+
+def random_pages(seed: int, pages: int = 5):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 400))) + rng.choice(["", "\n", "  "])
+        for _ in range(pages)
+    ]
+
+
+def chunk_tokens(splitter: TokenTextSplitter, chunk: str) -> int:
+    return sum(splitter._token_counts(chunk.split()))
+
+
+@pytest.mark.parametrize("size, overlap", [(10, 10), (10, 15), (0, 0), (10, -1)])
+def test_invalid_window_is_rejected(size, overlap):
+    with pytest.raises(ValueError):
+        TokenTextSplitter(chunk_tokens=size, overlap_tokens=overlap)
+    with pytest.raises(ValueError):
+        text_splitter("a b c", chunk_size=size, overlap=overlap)
+    with pytest.raises(ValueError):
+        list(iter_text_chunks(["a b c"], chunk_size=size, overlap=overlap))
+
+
+@pytest.mark.parametrize("sentence_aware", [True, False])
+@pytest.mark.parametrize("seed", range(5))
+def test_iter_chunks_matches_split_text(seed, sentence_aware):
+    splitter = TokenTextSplitter(chunk_tokens=40, overlap_tokens=8, sentence_aware=sentence_aware)
+    pages = random_pages(seed)
+    assert list(splitter.iter_chunks(pages)) == splitter.split_text(" ".join(pages))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_iter_text_chunks_matches_text_splitter(seed):
+    pages = random_pages(seed)
+    assert list(iter_text_chunks(pages, chunk_size=30, overlap=5)) == text_splitter(" ".join(pages), 30, 5)
+
+
+def test_chunks_are_slices_within_token_budget():
+    splitter = TokenTextSplitter(chunk_tokens=30, overlap_tokens=6)
+    text = " ".join(random_pages(7, pages=1))
+    spans = splitter.split_spans(text)
+    assert spans
+    for start, end in spans:
+        chunk = text[start:end]
+        assert chunk == chunk.strip()
+        assert chunk_tokens(splitter, chunk) <= 30
+    # Cada chunk avanza y se solapa con el anterior
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert start < next_start <= end < next_end
+
+
+def test_preserves_original_whitespace():
+    splitter = TokenTextSplitter(chunk_tokens=100, overlap_tokens=10)
+    assert splitter.split_text("  Capa 1.\n\nCapa 2.  ") == ["Capa 1.\n\nCapa 2."]
+    assert splitter.split_text("") == []
+    assert splitter.split_text(" \n ") == []
+
+
+def test_cuts_at_sentence_end():
+    splitter = TokenTextSplitter(chunk_tokens=12, overlap_tokens=2, min_sentence_fill=0.3)
+    text = "uno dos tres cuatro. cinco seis siete ocho nueve diez once doce trece"
+    first = splitter.split_text(text)[0]
+    assert first == "uno dos tres cuatro."
+    unaware = TokenTextSplitter(chunk_tokens=12, overlap_tokens=2, sentence_aware=False).split_text(text)[0]
+    assert unaware != first and unaware.startswith(first)
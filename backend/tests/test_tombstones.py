@@ -0,0 +1,147 @@
+import uuid
+import pytest
+from src.models.database import SessionLocal, DocumentTombstone
+from src.repositories import tombstone_repository
+from src.repositories.tombstone_repository import TombstoneRepository, TOMBSTONE_SET_KEY
+from src.repositories.local_vector_repository import LocalVectorRepository
+from src.repositories.document_repository import DocumentRepository
+from src.services.document_gc import DocumentGarbageCollector, GC_LOCK_KEY
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    # Cada test empieza sin tombstones pendientes de otros tests
+    session.query(DocumentTombstone).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def tombstones(db, fake_redis, monkeypatch):
+    """Repositorio de tombstones global del test (lo usan los repositorios vectoriales al filtrar)"""
+    repo = TombstoneRepository(redis_client=fake_redis, refresh_seconds=3600)
+    repo.refresh()
+    monkeypatch.setattr(tombstone_repository, "_tombstone_repository", repo)
+    return repo
+
+
+@pytest.fixture
+def local_repo(tmp_path):
+    return LocalVectorRepository(base_dir=str(tmp_path / "vectors"))
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+
+def make_points(document_id: str, count: int, file_hash: str = None):
+    return [
+        {"vector": [1.0, float(i), 0.5], "payload": {"document_id": document_id, "text": f"{document_id} {i}", "file_hash": file_hash}}
+        for i in range(count)
+    ]
+
+
+def documents_in(hits):
+    return {hit["payload"]["document_id"] for hit in hits}
+
+
+def test_deleted_documents_disappear_from_local_search(local_repo, tombstones, db):
+    kept, deleted = new_id("doc"), new_id("doc")
+    local_repo.upsert_points(make_points(kept, 3) + make_points(deleted, 3, file_hash="sha-borrado"))
+    assert documents_in(local_repo.search([1.0, 1.0, 0.5], top_k=10)) == {kept, deleted}
+
+    tombstones.add(db, [(deleted, "borrado.pdf")])
+    assert documents_in(local_repo.search([1.0, 1.0, 0.5], top_k=10)) == {kept}
+    assert local_repo.find_document_id_by_file_hash("sha-borrado") is None
+
+
+def test_deleted_documents_disappear_from_qdrant_search(qdrant_repo, tombstones, db):
+    kept, deleted = new_id("doc"), new_id("doc")
+    qdrant_repo.upsert_points(make_points(kept, 3) + make_points(deleted, 3))
+
+    tombstones.add(db, [(deleted, "borrado.pdf")])
+    assert documents_in(qdrant_repo.search([1.0, 1.0, 0.5], top_k=10)) == {kept}
+    hits, _ = qdrant_repo.hybrid_search([1.0, 1.0, 0.5], top_k=10)
+    assert documents_in(hits) == {kept}
+
+
+def test_other_workers_see_tombstones_after_refresh(tombstones, fake_redis, db):
+    document_id = new_id("doc")
+    other = TombstoneRepository(redis_client=fake_redis, refresh_seconds=3600)
+    other.refresh()
+    tombstones.add(db, [(document_id, "a.pdf"), (document_id, "a.pdf")])
+    tombstones.add(db, [(document_id, "a.pdf")])
+    assert tombstones.is_deleted(document_id)
+    assert document_id in fake_redis.smembers(TOMBSTONE_SET_KEY)
+
+    other.refresh()
+    assert document_id in other.deleted_ids()
+    # Sin Redis la copia se lee de la base de datos
+    without_redis = TombstoneRepository(refresh_seconds=3600)
+    without_redis.redis_client = None
+    without_redis.refresh()
+    assert document_id in without_redis.deleted_ids()
+
+
+def gc_for(vector_repo, tombstones, tmp_path, **kwargs):
+    return DocumentGarbageCollector(
+        vector_repo=vector_repo,
+        document_repo=DocumentRepository(upload_dir=str(tmp_path / "uploads")),
+        tombstones=tombstones,
+        **kwargs
+    )
+
+
+def test_gc_purges_vectors_in_batches_and_files(local_repo, tombstones, db, tmp_path):
+    kept, deleted = new_id("doc"), new_id("doc")
+    local_repo.upsert_points(make_points(kept, 2) + make_points(deleted, 5))
+    gc = gc_for(local_repo, tombstones, tmp_path, batch_size=2)
+    gc.document_repo.save_file(b"%PDF", "borrado.pdf", document_id=deleted)
+    tombstones.add(db, [(deleted, "borrado.pdf")])
+
+    assert gc.run_once() == 1
+    stats = gc.stats()
+    assert (stats["documents_purged"], stats["points_deleted"], stats["pending"]) == (1, 5, 0)
+    assert gc.document_repo.get_file_path(deleted) is None
+    assert local_repo.get_collection_info()["points_count"] == 2
+    # Purgado: deja de filtrarse y su tombstone queda registrada
+    assert not tombstones.is_deleted(deleted)
+    assert deleted not in tombstones.redis_client.smembers(TOMBSTONE_SET_KEY)
+    tombstone = db.query(DocumentTombstone).filter(DocumentTombstone.document_id == deleted).one()
+    db.refresh(tombstone)
+    assert tombstone.purged_at is not None and tombstone.points_deleted == 5
+    assert gc.run_once() == 0
+
+
+def test_gc_failure_keeps_the_document_filtered(tombstones, db, tmp_path):
+    class FailingRepo:
+        def delete_points_batch(self, document_id, limit):
+            raise RuntimeError("Qdrant no disponible")
+
+    deleted = new_id("doc")
+    tombstones.add(db, [(deleted, "borrado.pdf")])
+    gc = gc_for(FailingRepo(), tombstones, tmp_path)
+
+    assert gc.run_once() == 0
+    assert gc.stats()["errors"] == 1 and gc.stats()["pending"] == 1
+    assert tombstones.is_deleted(deleted)
+    assert [t.document_id for t in tombstones.pending(db)] == [deleted]
+
+
+def test_gc_skips_the_pass_while_another_worker_holds_the_lock(local_repo, tombstones, db, tmp_path, fake_redis):
+    deleted = new_id("doc")
+    local_repo.upsert_points(make_points(deleted, 3))
+    tombstones.add(db, [(deleted, "borrado.pdf")])
+    gc = gc_for(local_repo, tombstones, tmp_path, redis_client=fake_redis)
+
+    fake_redis.set(GC_LOCK_KEY, "otro-worker")
+    assert gc.run_once() == 0
+    assert local_repo.get_collection_info()["points_count"] == 3
+
+    fake_redis.delete(GC_LOCK_KEY)
+    assert gc.run_once() == 1
+    assert local_repo.get_collection_info()["points_count"] == 0
+    # El lock se libera al terminar la pasada
+    assert fake_redis.get(GC_LOCK_KEY) is None
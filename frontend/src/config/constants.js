@@ -23,6 +23,9 @@ export const API_ENDPOINTS = {
     FILES_UPLOAD: "/files/upload",
     FILES_LIST: "/files/",
     FILES_DELETE: "/files",
+    FILES_JOBS: "/files/jobs",
+    FILES_UPLOAD_BULK: "/files/upload/bulk",
+    FILES_BATCHES: "/files/batches",
 };
 
 // Configuración de sesión
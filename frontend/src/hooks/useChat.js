@@ -216,6 +216,17 @@ export function useChat() {
           setError(errorMessage)
           setIsLoading(false)
           abortControllerRef.current = null
+        },
+        // onRevision: otro nodo revisa la respuesta, empezar de nuevo con su texto
+        () => {
+          accumulatedContent = ''
+          setMessages((prev) =>
+            prev.map((msg) =>
+              msg.id === assistantMessageId
+                ? { ...msg, content: '' }
+                : msg
+            )
+          )
         }
       )
 
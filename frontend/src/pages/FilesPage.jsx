@@ -10,6 +10,7 @@ import { Upload, Trash2, FileText, Calendar } from 'lucide-react'
  */
 export function FilesPage() {
   const [uploading, setUploading] = useState(false)
+  const [uploadProgress, setUploadProgress] = useState(null)
   const fileInputRef = useRef(null)
 
   const {
@@ -28,9 +29,45 @@ export function FilesPage() {
     fileInputRef.current?.click()
   }
 
+  const handleBulkUpload = async (selected) => {
+    const result = await filesService.uploadFiles(selected)
+    const invalid = result.items.filter((item) => !item.job)
+    if (!result.batch_id) {
+      throw new Error(invalid.map((item) => `${item.filename}: ${item.error}`).join('\n') || 'Ningún archivo aceptado')
+    }
+    // Los archivos se ingieren en paralelo: consultar el estado conjunto hasta que terminen
+    const batch = await filesService.waitForBatch(result.batch_id, setUploadProgress)
+    await refetch()
+    const failed = batch.jobs.filter((job) => job.status === 'failed')
+    const duplicates = batch.jobs.filter((job) => job.duplicate).length
+    const lines = [`${batch.done} de ${batch.total} archivos indexados`]
+    if (duplicates) lines.push(`${duplicates} ya estaban indexados`)
+    for (const job of failed) lines.push(`✗ ${job.filename}: ${job.error || 'La ingesta falló'}`)
+    for (const item of invalid) lines.push(`✗ ${item.filename}: ${item.error}`)
+    alert(lines.join('\n'))
+  }
+
   const handleFileUpload = async (e) => {
-    const file = e.target.files?.[0]
-    if (!file) return
+    const selected = Array.from(e.target.files || [])
+    if (selected.length === 0) return
+
+    const isZip = (f) => f.name.toLowerCase().endsWith('.zip')
+    if (selected.length > 1 || isZip(selected[0])) {
+      setUploading(true)
+      try {
+        await handleBulkUpload(selected)
+      } catch (error) {
+        console.error('Error al subir archivos:', error)
+        alert(`Error al subir archivos: ${error.message || 'Error desconocido'}`)
+      } finally {
+        e.target.value = '' // Reset input
+        setUploading(false)
+        setUploadProgress(null)
+      }
+      return
+    }
+
+    const file = selected[0]
 
     if (file.type !== 'application/pdf') {
       alert('Solo se permiten archivos PDF')
@@ -40,9 +77,14 @@ export function FilesPage() {
 
     setUploading(true)
     try {
-      await filesService.uploadFile(file)
+      const job = await filesService.uploadFile(file)
+      // La ingesta sigue en segundo plano: consultar el progreso hasta que termine
+      const finalJob = await filesService.waitForJob(job.job_id, setUploadProgress)
+      if (finalJob.status === 'failed') {
+        throw new Error(finalJob.error || 'La ingesta del documento falló')
+      }
       await refetch()
-      alert('Archivo subido correctamente')
+      alert(finalJob.duplicate ? 'El archivo ya estaba indexado' : 'Archivo subido correctamente')
       e.target.value = '' // Reset input
     } catch (error) {
       console.error('Error al subir archivo:', error)
@@ -50,6 +92,7 @@ export function FilesPage() {
       e.target.value = '' // Reset input
     } finally {
       setUploading(false)
+      setUploadProgress(null)
     }
   }
 
@@ -93,7 +136,8 @@ export function FilesPage() {
             <input
               ref={fileInputRef}
               type="file"
-              accept=".pdf"
+              accept=".pdf,.zip"
+              multiple
               onChange={handleFileUpload}
               disabled={uploading}
               className="hidden"
@@ -107,7 +151,13 @@ export function FilesPage() {
               {uploading ? (
                 <>
                   <Loading size="sm" className="sm:mr-2" />
-                  <span className="hidden sm:inline">Subiendo...</span>
+                  <span className="hidden sm:inline">
+                    {uploadProgress?.batch_id
+                      ? `Procesando ${uploadProgress.done + uploadProgress.failed}/${uploadProgress.total} archivos...`
+                      : uploadProgress?.total_pages
+                        ? `Procesando ${uploadProgress.pages}/${uploadProgress.total_pages} páginas...`
+                        : 'Subiendo...'}
+                  </span>
                   <span className="sm:hidden">Subiendo...</span>
                 </>
               ) : (
@@ -113,9 +113,10 @@ export const agentService = {
    * @param {Function} onToken - Callback para cada token recibido
    * @param {Function} onComplete - Callback cuando se completa la respuesta
    * @param {Function} onError - Callback para errores
+   * @param {Function} onRevision - Callback (opcional) cuando un nodo posterior reemplaza el texto ya mostrado
    * @returns {Function} - Función para cancelar el streaming
    */
-  sendQueryStream({ session_id, user_id = null, messages }, onToken, onComplete, onError) {
+  sendQueryStream({ session_id, user_id = null, messages }, onToken, onComplete, onError, onRevision = null) {
     const controller = new AbortController()
     
     // Usar fetch con streaming en lugar de EventSource para poder enviar POST
@@ -163,7 +164,12 @@ export const agentService = {
               try {
                 const data = JSON.parse(line.slice(6))
                 
-                if (data.type === 'token') {
+                if (data.type === 'stream_start') {
+                  // Nuevo segmento: si reemplaza a otro, descartar el texto ya mostrado
+                  if (data.data.replaces && onRevision) {
+                    onRevision(data.data)
+                  }
+                } else if (data.type === 'token') {
                   // Enviar token al callback
                   onToken(data.data.content)
                 } else if (data.type === 'final_response') {
@@ -207,9 +213,9 @@ export const agentService = {
  */
 export const filesService = {
   /**
-   * Sube un archivo al servidor
+   * Sube un archivo al servidor. La ingesta continúa en segundo plano (202)
    * @param {File} file - Archivo a subir
-   * @returns {Promise} - Respuesta con información del archivo
+   * @returns {Promise} - Job de ingesta (job_id, status, status_url...)
    */
   async uploadFile(file) {
     const formData = new FormData()
@@ -229,6 +235,82 @@ export const filesService = {
     return response.data
   },
 
+  /**
+   * Sube varios PDFs (o ZIPs con PDFs). Cada archivo se ingiere como un job independiente
+   * @param {File[]} files - Archivos a subir
+   * @returns {Promise} - Resultado por archivo (items) y batch_id para consultar el estado conjunto
+   */
+  async uploadFiles(files) {
+    const formData = new FormData()
+    for (const file of files) {
+      formData.append('files', file)
+    }
+
+    const uploadClient = axios.create({
+      baseURL: API_URL,
+      timeout: 300000, // 5 minutos: la subida incluye todos los archivos
+    })
+
+    const response = await uploadClient.post(API_ENDPOINTS.FILES_UPLOAD_BULK, formData)
+    return response.data
+  },
+
+  /**
+   * Obtiene el estado conjunto de una subida múltiple
+   * @param {string} batchId - ID del batch
+   * @returns {Promise} - Jobs por estado, progreso y throughput agregado
+   */
+  async getBatch(batchId) {
+    const response = await apiClient.get(`${API_ENDPOINTS.FILES_BATCHES}/${batchId}`)
+    return response.data
+  },
+
+  /**
+   * Espera a que terminen todos los jobs de una subida múltiple
+   * @param {string} batchId - ID del batch
+   * @param {Function} onProgress - Callback opcional con cada estado recibido
+   * @param {number} intervalMs - Intervalo entre consultas
+   * @returns {Promise} - Estado final del batch
+   */
+  async waitForBatch(batchId, onProgress = null, intervalMs = 2000) {
+    while (true) {
+      const batch = await this.getBatch(batchId)
+      if (onProgress) onProgress(batch)
+      if (batch.finished) {
+        return batch
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs))
+    }
+  },
+
+  /**
+   * Obtiene el estado de un job de ingesta
+   * @param {string} jobId - ID del job
+   * @returns {Promise} - Estado del job (stage, pages, chunks_stored, eta_seconds...)
+   */
+  async getJob(jobId) {
+    const response = await apiClient.get(`${API_ENDPOINTS.FILES_JOBS}/${jobId}`)
+    return response.data
+  },
+
+  /**
+   * Espera a que termine un job de ingesta consultando su estado periódicamente
+   * @param {string} jobId - ID del job
+   * @param {Function} onProgress - Callback opcional con cada estado recibido
+   * @param {number} intervalMs - Intervalo entre consultas
+   * @returns {Promise} - Estado final del job (status "done" o "failed")
+   */
+  async waitForJob(jobId, onProgress = null, intervalMs = 1500) {
+    while (true) {
+      const job = await this.getJob(jobId)
+      if (onProgress) onProgress(job)
+      if (job.status === 'done' || job.status === 'failed') {
+        return job
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs))
+    }
+  },
+
   /**
    * Obtiene la lista de archivos subidos
    * @returns {Promise} - Lista de archivos
@@ -258,6 +340,18 @@ export const filesService = {
     )
     return response.data
   },
+
+  /**
+   * Elimina varios archivos en una llamada (los vectores se eliminan en segundo plano)
+   * @param {string[]} documentIds - IDs de los documentos
+   * @returns {Promise} - Documentos eliminados (deleted) y no encontrados (not_found)
+   */
+  async deleteFiles(documentIds) {
+    const response = await apiClient.post(`${API_ENDPOINTS.FILES_DELETE}/delete`, {
+      document_ids: documentIds,
+    })
+    return response.data
+  },
 }
 
 export default apiClient